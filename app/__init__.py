@@ -6,7 +6,17 @@ from flask import Flask
 
 from app import config
 from app.api import blueprint as api
-from app.commands import create_db, drop_db, recreate_db
+from app.commands import (
+    compact_bodies_command,
+    create_db,
+    dead_letters,
+    drop_db,
+    import_recipients_command,
+    reconcile_schedule_command,
+    recreate_db,
+    run_dispatcher_command,
+    run_scheduler_command,
+)
 from app.database import db
 from app.extensions import login, mail, migrate, rq
 from app.logging_config import configure_logging, get_app_logger
@@ -92,6 +102,12 @@ def register_commands(app):
     """Register custom commands for the Flask CLI."""
     for command in [create_db, drop_db, recreate_db]:
         app.cli.command()(command)
+    app.cli.add_command(dead_letters)
+    app.cli.add_command(run_dispatcher_command)
+    app.cli.add_command(reconcile_schedule_command)
+    app.cli.add_command(run_scheduler_command)
+    app.cli.add_command(import_recipients_command)
+    app.cli.add_command(compact_bodies_command)
 
     # Register init_db command
     from app.database.init_db import register_commands as register_db_commands
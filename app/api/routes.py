@@ -4,14 +4,25 @@ This module provides RESTful API endpoints
 for scheduling emails and checking API health.
 """
 
+import io
 import logging
 from datetime import UTC, datetime, timedelta
 
-from flask import request
+from flask import current_app, request
 from flask_restx import Namespace, Resource, fields
 from pytz import timezone
+from redis.exceptions import RedisError
 
+from app.database import db
+from app.database.models import Event, ImportStatus, MailingList, RecipientImport
+from app.event.bulk import add_events, parse_ndjson
+from app.event.imports import detect_format, import_recipients
 from app.event.jobs import add_event
+from app.event.leader import current_leader
+from app.event.lists import add_members, create_list, member_count, remove_members
+from app.event.retry import list_dead_letters, redrive
+from app.extensions import rq
+from app.utils import metrics
 
 # Get logger for this module
 logger = logging.getLogger(__name__)
@@ -45,11 +56,36 @@ mail_event = ns.model(
                   Assume as server timezone when timezone not provided.",
             example=local_now.strftime("%d %b %Y %H:%M %Z"),
         ),
+        "timezone": fields.String(
+            description="IANA timezone of a timestamp without offset, e.g. "
+            "Asia/Jakarta; the server timezone by default",
+            example="Asia/Singapore",
+        ),
         "recipients": fields.String(
-            required=True,
-            description="Mail recipients separated by comma(s)",
-            pattern=r"\w+@\w+\.\w+(,\s*\w+@\w+\.\w+)*",
-            example="retphern@gmail.com, vedafarm.id@gmail.com",
+            description="Mail recipients separated by comma(s), optionally "
+            'with a display name, e.g. "Doe, Jane" <jane@example.com>. '
+            "Required unless mailing_list_id is given.",
+            example="retphern@gmail.com, Veda Farm <vedafarm.id@gmail.com>",
+        ),
+        "mailing_list_id": fields.Integer(
+            description="Send to the members of this mailing list, as of the "
+            "time the send starts, instead of to recipients"
+        ),
+    },
+)
+
+update_event = ns.model(
+    "UpdateEvent",
+    {
+        "subject": fields.String(description="New mail subject"),
+        "content": fields.String(description="New mail body content"),
+        "timestamp": fields.String(
+            description="New time to send; moves the scheduled send job",
+            example=local_now.strftime("%d %b %Y %H:%M %Z"),
+        ),
+        "timezone": fields.String(
+            description="IANA timezone of a timestamp without offset",
+            example="Asia/Singapore",
         ),
     },
 )
@@ -67,6 +103,21 @@ event_model = ns.model(
         "done_at": fields.DateTime(
             description="Time when the email was sent", required=False
         ),
+        "chunks_total": fields.Integer(
+            description="Number of recipient chunks the send was split into"
+        ),
+        "chunks_done": fields.Integer(description="Number of chunks already sent"),
+        "progress": fields.Float(description="Fraction of chunks sent (0.0 - 1.0)"),
+        "sent_count": fields.Integer(
+            description="Number of recipients the email was delivered to"
+        ),
+        "failed_count": fields.Integer(
+            description="Number of recipients whose delivery failed"
+        ),
+        "job_id": fields.String(description="ID of the scheduled send job"),
+        "mailing_list_id": fields.Integer(
+            description="Mailing list the email is sent to, if any"
+        ),
     },
 )
 
@@ -87,15 +138,109 @@ class HealthCheck(Resource):
         Return API health status.
 
         This endpoint can be used by monitoring tools to verify service
-        availability. Returns a simple JSON response with status and current
-        timestamp.
+        availability. Returns a simple JSON response with status, current
+        timestamp and the scheduler node currently elected leader (None when
+        no node holds the lease or Redis is unavailable).
         """
+        try:
+            leader = current_leader(rq.connection)
+        except (RedisError, OSError) as e:
+            logger.warning(f"Could not read the scheduler leader: {e}")
+            leader = None
         return (
-            {"status": "ok", "timestamp": datetime.now(UTC).isoformat()},
+            {
+                "status": "ok",
+                "timestamp": datetime.now(UTC).isoformat(),
+                "scheduler_leader": leader,
+            },
             200,
         )
 
 
+@ns.route("/metrics")
+class Metrics(Resource):
+    """Counters recorded by the workers."""
+
+    @ns.doc(
+        description="Returns the counters shared by the workers, e.g. rate "
+        "limit waits and throttled sends.",
+        responses={200: "Current metric values"},
+    )
+    def get(self):
+        """
+        Return every recorded metric.
+
+        Returns:
+            tuple: Mapping of metric name to value and HTTP status code
+        """
+        return metrics.snapshot(), 200
+
+
+dead_letter_model = ns.model(
+    "DeadLetter",
+    {
+        "id": fields.String(description="Dead letter job ID"),
+        "description": fields.String(description="Job call that gave up"),
+        "reason": fields.String(description="Error of the last attempt"),
+        "attempts": fields.Integer(description="Number of attempts made"),
+        "failed_at": fields.String(description="Time of the last attempt"),
+    },
+)
+
+redrive_request = ns.model(
+    "RedriveDeadLetters",
+    {
+        "ids": fields.List(
+            fields.String,
+            required=False,
+            description="Dead letters to re-drive; all of them when omitted",
+        ),
+    },
+)
+
+
+@ns.route("/dead-letters")
+class DeadLetters(Resource):
+    """Send jobs that ran out of attempts or failed permanently."""
+
+    @ns.doc(
+        description="Lists the dead-letter queue with the failure reasons.",
+        responses={200: "Dead letters, oldest first"},
+    )
+    @ns.marshal_list_with(dead_letter_model)
+    def get(self):
+        """
+        Return every dead letter.
+
+        Returns:
+            tuple: List of dead letters and HTTP status code
+        """
+        return list_dead_letters(), 200
+
+
+@ns.route("/dead-letters/redrive")
+class RedriveDeadLetters(Resource):
+    """Bulk re-drive of dead letters."""
+
+    @ns.expect(redrive_request, validate=True)
+    @ns.doc(
+        description="Enqueues dead letters again with a fresh set of attempts. "
+        "Recipients already sent to are skipped.",
+        responses={200: "Dead letters re-driven"},
+    )
+    def post(self):
+        """
+        Re-drive the given dead letters, or all of them.
+
+        Returns:
+            tuple: IDs of the re-driven dead letters and HTTP status code
+        """
+        ids = (request.get_json(silent=True) or {}).get("ids")
+        redriven = redrive(ids)
+        logger.info(f"Re-drove {len(redriven)} dead letter(s) via the API")
+        return {"redriven": redriven, "count": len(redriven)}, 200
+
+
 @ns.route("/save_emails")
 class EventApi(Resource):
     """
@@ -154,6 +299,57 @@ class EventApi(Resource):
             return {"message": f"An unexpected error occurred: {str(e)}"}, 500
 
 
+@ns.route("/events/bulk")
+class BulkEventApi(Resource):
+    """Schedule many emails in one request."""
+
+    @ns.doc(
+        description="Schedule a batch of emails. The body is a JSON array of "
+        "SubmitEvent objects, or one object per line with the content type "
+        "application/x-ndjson. Valid items are stored in one transaction and "
+        "scheduled in one Redis round trip; invalid ones are reported by "
+        "index.",
+        responses={
+            201: "Every event was scheduled",
+            207: "Some items were rejected, see their errors",
+            400: "No item could be scheduled",
+            413: "More items than BULK_EVENTS_MAX_ITEMS",
+        },
+    )
+    def post(self):
+        """
+        Submit a batch of email events for scheduling.
+
+        Returns:
+            tuple: Counts of created and rejected items, one result per
+                item and HTTP status code
+        """
+        if request.mimetype == "application/x-ndjson":
+            items = parse_ndjson(request.get_data(as_text=True))
+        else:
+            items = request.get_json(silent=True)
+            if not isinstance(items, list):
+                return {"message": "Expected a JSON array of events"}, 400
+        limit = current_app.config.get("BULK_EVENTS_MAX_ITEMS", 100000)
+        if len(items) > limit:
+            return {"message": f"At most {limit} events per request"}, 413
+        if not items:
+            return {"message": "No events provided"}, 400
+
+        try:
+            results = add_events(items)
+        except Exception as e:
+            logger.error(f"Unexpected error in bulk event request: {e}", exc_info=True)
+            return {"message": f"An unexpected error occurred: {str(e)}"}, 500
+        created = sum(1 for result in results if "id" in result)
+        status = 201 if created == len(results) else 207 if created else 400
+        return {
+            "created": created,
+            "rejected": len(results) - created,
+            "results": results,
+        }, status
+
+
 @ns.route("/events/<int:event_id>")
 class EventDetailApi(Resource):
     """
@@ -209,3 +405,324 @@ class EventDetailApi(Resource):
                 f"Unexpected error retrieving event {event_id}: {str(e)}", exc_info=True
             )
             ns.abort(500, "An unexpected error occurred while retrieving the event")
+
+    @ns.expect(update_event, validate=True)
+    @ns.doc(
+        description="Update a scheduled email that has not been sent yet. A "
+        "new timestamp moves its scheduled send job.",
+        params={"event_id": "The ID of the event to update"},
+        responses={
+            200: "Event updated",
+            400: "Invalid request data",
+            404: "Event not found",
+            409: "Event was already sent, or a new timestamp was given while "
+            "it is being sent",
+        },
+    )
+    def put(self, event_id):
+        """
+        Update the subject, content or send time of an event.
+
+        Args:
+            event_id (int): The ID of the event to update
+
+        Returns:
+            tuple: A JSON message and HTTP status code
+        """
+        from app.services.event_service import EventService
+
+        event = EventService.get_by_id(event_id)
+        if not event:
+            return {"message": f"Event with ID {event_id} not found"}, 404
+        if event.is_done:
+            return {"message": "Cannot edit an email that has already been sent"}, 409
+
+        payload = request.get_json(silent=True) or {}
+        data = {
+            key: payload[field]
+            for key, field in (
+                ("name", "subject"),
+                ("notes", "content"),
+                ("timestamp", "timestamp"),
+                ("timezone", "timezone"),
+            )
+            if payload.get(field)
+        }
+        if "timestamp" in data and event.is_sending:
+            return {"message": "Cannot re-time an email that is being sent"}, 409
+        result = EventService.update(event_id, data)
+        if result is not True:
+            return {"message": str(result)}, 400
+        return {"message": "Event updated", "id": event_id, "job_id": event.job_id}, 200
+
+    @ns.doc(
+        description="Delete a scheduled email and cancel its send job",
+        params={"event_id": "The ID of the event to delete"},
+        responses={200: "Event deleted", 404: "Event not found", 500: "Error"},
+    )
+    def delete(self, event_id):
+        """
+        Delete an event and cancel its scheduled send job.
+
+        Args:
+            event_id (int): The ID of the event to delete
+
+        Returns:
+            tuple: A JSON message and HTTP status code
+        """
+        from app.services.event_service import EventService
+
+        if not EventService.get_by_id(event_id):
+            return {"message": f"Event with ID {event_id} not found"}, 404
+        result = EventService.delete(event_id)
+        if result is not True:
+            return {"message": str(result)}, 500
+        return {"message": "Event deleted", "id": event_id}, 200
+
+
+recipient_import_model = ns.model(
+    "RecipientImport",
+    {
+        "id": fields.Integer(description="Import ID"),
+        "event_id": fields.Integer(description="Event the recipients are for"),
+        "source": fields.String(description="Name of the imported file"),
+        "format": fields.String(description="csv or ndjson"),
+        "status": fields.String(description="running, done or failed"),
+        "rows_read": fields.Integer(description="Rows read so far"),
+        "imported": fields.Integer(description="Recipients added"),
+        "duplicates": fields.Integer(
+            description="Rows skipped because the address was already there"
+        ),
+        "invalid": fields.Integer(description="Rows without a valid address"),
+        "error": fields.String(description="Why the import failed"),
+        "started_at": fields.DateTime(description="Start of the import"),
+        "finished_at": fields.DateTime(description="End of the import"),
+    },
+)
+
+
+@ns.route("/events/<int:event_id>/recipients/import")
+class RecipientImportApi(Resource):
+    """Streaming import of a recipient list for an event."""
+
+    @ns.doc(
+        description="Add recipients from a CSV or NDJSON file, uploaded as "
+        "the multipart field `file` or sent as the request body with the "
+        "content type text/csv or application/x-ndjson. The file is read as "
+        "it arrives; progress can be polled at "
+        "/events/<event_id>/recipients/imports while it runs.",
+        params={"event_id": "The ID of the event to add recipients to"},
+        responses={
+            201: "Import finished",
+            400: "Unknown format, or the file could not be parsed",
+            404: "Event not found",
+            409: "Event was already sent",
+        },
+    )
+    @ns.marshal_with(recipient_import_model, code=201)
+    def post(self, event_id):
+        """
+        Import recipients for an event.
+
+        Args:
+            event_id (int): The ID of the event to add recipients to
+
+        Returns:
+            tuple: The import record and HTTP status code
+        """
+        event = db.session.get(Event, event_id)
+        if event is None:
+            ns.abort(404, f"Event with ID {event_id} not found")
+        if event.is_done:
+            ns.abort(409, "Cannot add recipients to an email that was sent")
+
+        upload = request.files.get("file")
+        if upload is not None:
+            source, mimetype, raw = upload.filename, upload.mimetype, upload.stream
+        else:
+            source, mimetype, raw = None, request.mimetype, request.stream
+        file_format = request.args.get("format") or detect_format(source, mimetype)
+        if file_format is None:
+            ns.abort(400, "Send a .csv or .ndjson file, or pass ?format=")
+
+        stream = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+        try:
+            record = import_recipients(event_id, stream, file_format, source=source)
+        except ValueError as e:
+            ns.abort(400, str(e))
+        finally:
+            stream.detach()
+        return record, 400 if record.status == ImportStatus.FAILED else 201
+
+
+@ns.route("/events/<int:event_id>/recipients/imports")
+class RecipientImportListApi(Resource):
+    """Progress of an event's recipient imports."""
+
+    @ns.doc(
+        description="Lists the recipient imports of an event, newest first, "
+        "with their progress.",
+        params={"event_id": "The ID of the event"},
+        responses={200: "Imports of the event"},
+    )
+    @ns.marshal_list_with(recipient_import_model)
+    def get(self, event_id):
+        """
+        Return the imports of an event.
+
+        Args:
+            event_id (int): The ID of the event
+
+        Returns:
+            tuple: List of import records and HTTP status code
+        """
+        imports = db.session.scalars(
+            db.select(RecipientImport)
+            .where(RecipientImport.event_id == event_id)
+            .order_by(RecipientImport.id.desc())
+        ).all()
+        return imports, 200
+
+
+mailing_list_model = ns.model(
+    "MailingList",
+    {
+        "id": fields.Integer(description="List ID"),
+        "name": fields.String(description="Unique name of the list"),
+        "created_at": fields.DateTime(description="List creation time"),
+        "members": fields.Integer(description="Number of current members"),
+    },
+)
+
+new_mailing_list = ns.model(
+    "NewMailingList",
+    {"name": fields.String(required=True, description="Unique name of the list")},
+)
+
+list_members = ns.model(
+    "ListMembers",
+    {
+        "recipients": fields.String(
+            required=True,
+            description="Addresses separated by comma(s), optionally with a "
+            "display name",
+            example="retphern@gmail.com, Veda Farm <vedafarm.id@gmail.com>",
+        ),
+    },
+)
+
+
+def _list_or_404(list_id):
+    """Return a mailing list, aborting with 404 if it does not exist."""
+    mailing_list = db.session.get(MailingList, list_id)
+    if mailing_list is None:
+        ns.abort(404, f"Mailing list with ID {list_id} not found")
+    return mailing_list
+
+
+def _list_body(mailing_list):
+    """Serialize a mailing list with its current member count."""
+    return {
+        "id": mailing_list.id,
+        "name": mailing_list.name,
+        "created_at": mailing_list.created_at,
+        "members": member_count(mailing_list.id),
+    }
+
+
+@ns.route("/lists")
+class MailingListApi(Resource):
+    """Mailing lists that events can be sent to."""
+
+    @ns.expect(new_mailing_list, validate=True)
+    @ns.doc(
+        description="Create an empty mailing list. Events created with its "
+        "mailing_list_id are sent to its members as of the send time.",
+        responses={201: "List created", 400: "Name missing or taken"},
+    )
+    @ns.marshal_with(mailing_list_model, code=201)
+    def post(self):
+        """
+        Create a mailing list.
+
+        Returns:
+            tuple: The new list and HTTP status code
+        """
+        try:
+            mailing_list = create_list(request.json["name"])
+        except ValueError as e:
+            ns.abort(400, str(e))
+        return _list_body(mailing_list), 201
+
+
+@ns.route("/lists/<int:list_id>")
+class MailingListDetailApi(Resource):
+    """A single mailing list."""
+
+    @ns.doc(
+        params={"list_id": "The ID of the list"},
+        responses={200: "List found", 404: "List not found"},
+    )
+    @ns.marshal_with(mailing_list_model)
+    def get(self, list_id):
+        """
+        Return a mailing list with its member count.
+
+        Args:
+            list_id (int): The ID of the list
+
+        Returns:
+            tuple: The list and HTTP status code
+        """
+        return _list_body(_list_or_404(list_id)), 200
+
+
+@ns.route("/lists/<int:list_id>/members")
+class ListMembersApi(Resource):
+    """Incremental changes to the members of a mailing list."""
+
+    @ns.expect(list_members, validate=True)
+    @ns.doc(
+        description="Add addresses to the list. Current members count as "
+        "duplicates; invalid entries are returned and skipped.",
+        params={"list_id": "The ID of the list"},
+        responses={200: "Members added", 404: "List not found"},
+    )
+    def post(self, list_id):
+        """
+        Add members to a mailing list.
+
+        Args:
+            list_id (int): The ID of the list
+
+        Returns:
+            tuple: Counts of added and duplicate addresses, the invalid
+                entries and HTTP status code
+        """
+        _list_or_404(list_id)
+        result = add_members(list_id, request.json["recipients"])
+        return {
+            "added": len(result.addresses),
+            "duplicates": result.duplicates,
+            "invalid": result.invalid,
+        }, 200
+
+    @ns.expect(list_members, validate=True)
+    @ns.doc(
+        description="Remove addresses from the list. Sends that already "
+        "started still go to them.",
+        params={"list_id": "The ID of the list"},
+        responses={200: "Members removed", 404: "List not found"},
+    )
+    def delete(self, list_id):
+        """
+        Remove members from a mailing list.
+
+        Args:
+            list_id (int): The ID of the list
+
+        Returns:
+            tuple: Number of members removed and HTTP status code
+        """
+        _list_or_404(list_id)
+        return {"removed": remove_members(list_id, request.json["recipients"])}, 200
@@ -1,6 +1,17 @@
+import signal
+
 import click
+from flask.cli import with_appcontext
 
 from app.database import db
+from app.database.models import Event, ImportStatus
+from app.event.bodies import compact_bodies
+from app.event.db_dispatcher import get_db_dispatcher
+from app.event.dispatcher import get_dispatcher
+from app.event.imports import IMPORT_FORMATS, detect_format, import_recipients
+from app.event.leader import get_elected_scheduler
+from app.event.reconcile import reconcile, schedule_reconcile
+from app.event.retry import list_dead_letters, redrive
 
 
 def create_db():
@@ -23,3 +34,149 @@ def recreate_db():
     """Same as running drop_db() and create_db()."""
     drop_db()
     create_db()
+
+
+@click.group("dead-letters")
+def dead_letters() -> None:
+    """Inspect and re-drive send jobs that gave up."""
+
+
+@dead_letters.command("list")
+@with_appcontext
+def list_dead_letters_command() -> None:
+    """List dead letters with their failure reason."""
+    letters = list_dead_letters()
+    for letter in letters:
+        click.echo(
+            f"{letter['id']}  {letter['description']}  "
+            f"attempts={letter['attempts']}  failed_at={letter['failed_at']}"
+        )
+        click.echo(f"    {letter['reason']}")
+    click.echo(f"{len(letters)} dead letter(s).")
+
+
+@dead_letters.command("redrive")
+@click.argument("job_ids", nargs=-1)
+@click.option("--all", "redrive_all", is_flag=True, help="Re-drive every letter.")
+@with_appcontext
+def redrive_dead_letters_command(job_ids, redrive_all) -> None:
+    """Enqueue dead letters again, either JOB_IDS or --all of them."""
+    if not job_ids and not redrive_all:
+        raise click.UsageError("Pass dead letter IDs or --all.")
+    redriven = redrive(None if redrive_all else job_ids)
+    click.echo(f"Re-drove {len(redriven)} dead letter(s).")
+
+
+@click.command("run-dispatcher")
+@click.option(
+    "--database",
+    is_flag=True,
+    help="Claim due events from the database instead of the Redis schedule.",
+)
+@with_appcontext
+def run_dispatcher_command(database: bool) -> None:
+    """Move scheduled jobs to their queues the moment they are due."""
+    dispatcher = get_db_dispatcher() if database else get_dispatcher()
+
+    def stop(signum, frame):
+        dispatcher.stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    click.echo("Dispatcher started.")
+    dispatcher.run()
+    click.echo(f"Dispatcher stopped after {dispatcher.dispatched} job(s).")
+
+
+@click.command("run-scheduler")
+@click.option(
+    "--mode",
+    type=click.Choice(["rqscheduler", "dispatcher"]),
+    default="rqscheduler",
+    show_default=True,
+    help="Poll with rq-scheduler or run the precise dispatcher.",
+)
+@with_appcontext
+def run_scheduler_command(mode: str) -> None:
+    """Schedule jobs on whichever replica is elected leader."""
+    scheduler = get_elected_scheduler(mode)
+
+    def stop(signum, frame):
+        scheduler.stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    click.echo(f"Scheduler node {scheduler.lease.name} started.")
+    scheduler.run()
+    click.echo(f"Scheduler node {scheduler.lease.name} stopped.")
+
+
+@click.command("reconcile-schedule")
+@click.option("--dry-run", is_flag=True, help="Only report the differences.")
+@click.option(
+    "--every",
+    type=int,
+    default=None,
+    help="Install a periodic reconcile job running every N seconds (0 removes it).",
+)
+@with_appcontext
+def reconcile_schedule_command(dry_run: bool, every: int) -> None:
+    """Repair drift between pending events and scheduled send jobs."""
+    if every is not None:
+        schedule_reconcile(every)
+        if every:
+            click.echo(f"Reconciling every {every}s (needs `flask rq scheduler`).")
+        else:
+            click.echo("Periodic reconcile removed.")
+        return
+    click.echo(reconcile(dry_run=dry_run).summary())
+
+
+@click.command("compact-bodies")
+@click.option(
+    "--grace",
+    type=float,
+    default=None,
+    help="Seconds an unreferenced body is kept (default EMAIL_BODY_GC_GRACE).",
+)
+@with_appcontext
+def compact_bodies_command(grace: float) -> None:
+    """Move inline email bodies to the body store and drop unused ones."""
+    click.echo(compact_bodies(grace).summary())
+
+
+@click.command("import-recipients")
+@click.argument("event_id", type=int)
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--format",
+    "file_format",
+    type=click.Choice(IMPORT_FORMATS),
+    default=None,
+    help="File format; guessed from the extension when omitted.",
+)
+@with_appcontext
+def import_recipients_command(event_id: int, path: str, file_format: str) -> None:
+    """Stream recipients for EVENT_ID from a CSV or NDJSON file at PATH."""
+    event = db.session.get(Event, event_id)
+    if event is None:
+        raise click.ClickException(f"Event {event_id} not found.")
+    if event.is_done:
+        raise click.ClickException(f"Event {event_id} was already sent.")
+    file_format = file_format or detect_format(path, None)
+    if file_format is None:
+        raise click.UsageError("Cannot tell the format, pass --format.")
+
+    def progress(record):
+        click.echo(f"{record.rows_read} row(s) read, {record.imported} imported")
+
+    with open(path, encoding="utf-8-sig", newline="") as stream:
+        record = import_recipients(
+            event_id, stream, file_format, source=path, on_chunk=progress
+        )
+    click.echo(
+        f"Import {record.id} {record.status}: {record.imported} imported, "
+        f"{record.duplicates} duplicate(s), {record.invalid} invalid."
+    )
+    if record.status == ImportStatus.FAILED:
+        raise click.ClickException(record.error or "Import failed.")
@@ -97,11 +97,92 @@ class Config(object):
             file=sys.stderr,
         )
 
+    # SMTP connection pool shared by the jobs of a worker process
+    MAIL_POOL_ENABLED = True
+    MAIL_POOL_SIZE = int(os.environ.get("MAIL_POOL_SIZE", 2))
+    MAIL_POOL_IDLE_TIMEOUT = int(os.environ.get("MAIL_POOL_IDLE_TIMEOUT", 60))
+    MAIL_POOL_MAX_MESSAGES = int(os.environ.get("MAIL_POOL_MAX_MESSAGES", 100))
+    MAIL_POOL_HEALTHCHECK_AFTER = 5
+    # Rows fetched per round-trip when a job streams recipients
+    MAIL_RECIPIENT_BATCH_SIZE = 1000
+    # Events with more recipients than MAIL_CHUNK_SIZE are split into chunk
+    # jobs; at most MAIL_MAX_CHUNK_CONCURRENCY chunks of one event run at once
+    MAIL_CHUNK_SIZE = int(os.environ.get("MAIL_CHUNK_SIZE", 500))
+    MAIL_MAX_CHUNK_CONCURRENCY = int(os.environ.get("MAIL_MAX_CHUNK_CONCURRENCY", 4))
+    # Recipient delivery states are written in one UPDATE per this many sends
+    MAIL_STATUS_FLUSH_SIZE = int(os.environ.get("MAIL_STATUS_FLUSH_SIZE", 500))
+    # Relay quotas shared by all workers (0 disables a limit). A send that
+    # would wait longer than MAIL_RATE_LIMIT_MAX_WAIT seconds is rescheduled
+    MAIL_RATE_LIMIT_PER_MINUTE = int(os.environ.get("MAIL_RATE_LIMIT_PER_MINUTE", 0))
+    MAIL_RATE_LIMIT_PER_DAY = int(os.environ.get("MAIL_RATE_LIMIT_PER_DAY", 0))
+    MAIL_RATE_LIMIT_MAX_WAIT = int(os.environ.get("MAIL_RATE_LIMIT_MAX_WAIT", 30))
+    # Upper bound on the rendered messages a worker keeps for reuse
+    MAIL_MESSAGE_CACHE_BYTES = int(
+        os.environ.get("MAIL_MESSAGE_CACHE_BYTES", 64 * 1024 * 1024)
+    )
+    # Number of compiled personalization templates a worker keeps for reuse
+    PERSONALIZATION_CACHE_SIZE = int(os.environ.get("PERSONALIZATION_CACHE_SIZE", 256))
+    # Failed sends are retried after MAIL_RETRY_BACKOFF_BASE seconds, doubled
+    # per attempt up to MAIL_RETRY_BACKOFF_MAX and spread by +/- the jitter
+    # fraction. Only the listed SMTP codes (and connection errors) are retried;
+    # other failures and sends out of attempts go to the dead-letter queue
+    MAIL_RETRY_MAX_ATTEMPTS = int(os.environ.get("MAIL_RETRY_MAX_ATTEMPTS", 5))
+    MAIL_RETRY_BACKOFF_BASE = int(os.environ.get("MAIL_RETRY_BACKOFF_BASE", 30))
+    MAIL_RETRY_BACKOFF_MAX = int(os.environ.get("MAIL_RETRY_BACKOFF_MAX", 3600))
+    MAIL_RETRY_JITTER = float(os.environ.get("MAIL_RETRY_JITTER", 0.2))
+    MAIL_RETRY_SMTP_CODES = tuple(
+        int(code)
+        for code in os.environ.get(
+            "MAIL_RETRY_SMTP_CODES", "421,450,451,452,454"
+        ).split(",")
+    )
+
     REDIS_HOST = os.environ.get("REDIS_HOST", "redis")
     REDIS_PORT = os.environ.get("REDIS_PORT", 6379)
     RQ_REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}"
     RQ_ASYNC = True
     RQ_SCHEDULER_INTERVAL = 10
+    # `flask run-dispatcher` moves due jobs as soon as they are due instead of
+    # polling every RQ_SCHEDULER_INTERVAL seconds; it still checks at least
+    # every DISPATCHER_MAX_SLEEP seconds for jobs scheduled without a wakeup
+    DISPATCHER_BATCH_SIZE = int(os.environ.get("DISPATCHER_BATCH_SIZE", 500))
+    DISPATCHER_MAX_SLEEP = float(os.environ.get("DISPATCHER_MAX_SLEEP", 5))
+    # `flask run-scheduler` replicas elect a leader through a Redis lease; a
+    # standby takes over within about LEADER_LEASE_TTL * 4/3 seconds of the
+    # leader stopping. Node names default to host and process ID
+    LEADER_LEASE_TTL = float(os.environ.get("LEADER_LEASE_TTL", 15))
+    SCHEDULER_NODE_NAME = os.environ.get("SCHEDULER_NODE_NAME", "")
+    # `flask run-dispatcher --database` polls the events table every
+    # DB_DISPATCHER_INTERVAL seconds; a claimed event that is not done after
+    # DB_DISPATCHER_LEASE seconds is dispatched again
+    DB_DISPATCHER_INTERVAL = float(os.environ.get("DB_DISPATCHER_INTERVAL", 1))
+    DB_DISPATCHER_LEASE = float(os.environ.get("DB_DISPATCHER_LEASE", 900))
+    # `flask reconcile-schedule` checks pending events against the scheduled
+    # jobs this many at a time
+    RECONCILE_BATCH_SIZE = int(os.environ.get("RECONCILE_BATCH_SIZE", 1000))
+    # Recipients are inserted this many per statement; on Postgres with COPY
+    # unless RECIPIENT_COPY is false
+    RECIPIENT_INSERT_CHUNK = int(os.environ.get("RECIPIENT_INSERT_CHUNK", 10000))
+    RECIPIENT_COPY = os.environ.get("RECIPIENT_COPY", "true").lower() == "true"
+    # Recipient imports validate, dedupe and commit this many rows at a time
+    RECIPIENT_IMPORT_CHUNK = int(os.environ.get("RECIPIENT_IMPORT_CHUNK", 5000))
+    # `flask compact-bodies` keeps unreferenced email bodies this many seconds
+    # after they were last stored, see app.event.bodies
+    EMAIL_BODY_GC_GRACE = int(os.environ.get("EMAIL_BODY_GC_GRACE", 3600))
+    # Events per page of the web event list, and the most a page may ask for
+    EVENT_LIST_PAGE_SIZE = int(os.environ.get("EVENT_LIST_PAGE_SIZE", 50))
+    EVENT_LIST_MAX_PAGE_SIZE = int(os.environ.get("EVENT_LIST_MAX_PAGE_SIZE", 200))
+    # POST /api/events/bulk accepts at most this many events per request
+    BULK_EVENTS_MAX_ITEMS = int(os.environ.get("BULK_EVENTS_MAX_ITEMS", 100000))
+    # Sends due within MAIL_SEND_NOW_THRESHOLD seconds skip the scheduler and
+    # go straight to MAIL_SEND_NOW_QUEUE (the default queue when empty)
+    MAIL_SEND_NOW_THRESHOLD = float(os.environ.get("MAIL_SEND_NOW_THRESHOLD", 5))
+    MAIL_SEND_NOW_QUEUE = os.environ.get("MAIL_SEND_NOW_QUEUE", "")
+    # Jobs that gave up wait here to be re-driven; no worker listens on it
+    RQ_DEAD_LETTER_QUEUE = os.environ.get("RQ_DEAD_LETTER_QUEUE", "dead-letter")
+    # Run jobs in the worker process so pooled SMTP connections survive
+    # between jobs instead of dying with a forked work horse.
+    RQ_WORKER_CLASS = os.environ.get("RQ_WORKER_CLASS", "rq.worker.SimpleWorker")
 
 
 class ProductionConfig(Config):
@@ -213,6 +294,7 @@ class TestingConfig(Config):
     CSRF_ENABLED = False  # Disable for easier testing
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     RQ_ASYNC = False
+    MAIL_POOL_ENABLED = False
 
     # Override with test-specific values
     SECRET_KEY = "test-secret-key-for-testing-only"
@@ -10,10 +10,27 @@ def reset_database():
     # Import all models to ensure they're registered with SQLAlchemy
     # Import using direct imports to avoid circular references
     from app.database.models.user import User
-    from app.database.models_core import Event, Recipient
+    from app.database.models_core import (
+        EmailBody,
+        Event,
+        ListMember,
+        ListProgress,
+        MailingList,
+        Recipient,
+        RecipientImport,
+    )
 
     # Ensure models are registered (silence flake8 warnings)
-    models = [User, Event, Recipient]
+    models = [
+        User,
+        Event,
+        EmailBody,
+        Recipient,
+        RecipientImport,
+        MailingList,
+        ListMember,
+        ListProgress,
+    ]
     assert models  # Models imported for registration  # nosec B101
 
     db.drop_all()
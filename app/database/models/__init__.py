@@ -4,11 +4,33 @@
 from app.database.models.user import User
 
 # Import core models
-from app.database.models_core import Event, Recipient
+from app.database.models_core import (
+    DeliveryStatus,
+    EmailBody,
+    Event,
+    ImportStatus,
+    ListMember,
+    ListProgress,
+    MailingList,
+    Recipient,
+    RecipientImport,
+)
 
 # Define legacy compatibility for EventRecipient
 EventRecipient = Recipient
 
 # Define __all__ to control what's imported with
 # `from app.database.models import *`
-__all__ = ["User", "Event", "Recipient", "EventRecipient"]
+__all__ = [
+    "User",
+    "Event",
+    "EmailBody",
+    "Recipient",
+    "EventRecipient",
+    "DeliveryStatus",
+    "ImportStatus",
+    "RecipientImport",
+    "MailingList",
+    "ListMember",
+    "ListProgress",
+]
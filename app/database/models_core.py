@@ -1,14 +1,25 @@
 """Core data models for the application.
 
-This module contains the Event and Recipient models.
+This module contains the Event and Recipient models, the email body store,
+recipient imports and mailing lists.
 """
 
 from __future__ import annotations
 
 from datetime import UTC, datetime
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
 
 from app.database import db
+from app.utils.content import (
+    PREVIEW_LENGTH,
+    ContentParts,
+    classify_content,
+    make_preview,
+)
 
 if TYPE_CHECKING:
     pass
@@ -18,16 +29,53 @@ class Event(db.Model):  # type: ignore[name-defined]
     """Event model for scheduled emails."""
 
     __tablename__ = "events"
+    __table_args__ = (
+        # Due, pending events are found by (is_done, timestamp), see
+        # db_dispatcher
+        db.Index("ix_events_is_done_timestamp", "is_done", "timestamp"),
+        # Body garbage collection looks up the events using a body
+        db.Index("ix_events_content_hash", "content_hash"),
+        # Event listings page by (timestamp, id), optionally per owner, see
+        # EventService.get_page()
+        db.Index("ix_events_timestamp_id", "timestamp", "id"),
+        db.Index("ix_events_user_id_timestamp", "user_id", "timestamp", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     _email_subject = db.Column("email_subject", db.String, nullable=False)
-    _email_content = db.Column("email_content", db.String)
+    # The body is kept once in EmailBody, keyed by content_hash. Events
+    # stored before the body store keep theirs inline in these two columns
+    # until `flask compact-bodies` moves it. They are deferred so listings
+    # never load them.
+    _email_content = db.deferred(db.Column("email_content", db.String))
+    _content_text = db.deferred(db.Column("content_text", db.String, nullable=True))
+    # Derived from the content when it is set, see classify_content()
+    content_type = db.Column(db.String(16), nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True)
+    preview = db.Column(db.String(PREVIEW_LENGTH), nullable=True)
     timestamp = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(
         db.DateTime, nullable=False, default=lambda: datetime.now(UTC)
     )
     _is_done = db.Column("is_done", db.Boolean, nullable=False, default=False)
     done_at = db.Column(db.DateTime, nullable=True)
+    # Fan-out progress: number of recipient chunks and how many finished
+    chunks_total = db.Column(db.Integer, nullable=False, default=0)
+    chunks_done = db.Column(db.Integer, nullable=False, default=0)
+    # ID of the scheduled send_mail job, see send_job_id()
+    job_id = db.Column(db.String(64), nullable=True, unique=True)
+    # Lease taken by the database dispatcher that enqueued the send job
+    claimed_by = db.Column(db.String(64), nullable=True)
+    claim_expires_at = db.Column(db.DateTime, nullable=True)
+    # Events sent to a mailing list read its members at send time; the
+    # snapshot time is fixed by the first send_mail run, see send_mail()
+    mailing_list_id = db.Column(
+        db.Integer, db.ForeignKey("mailing_lists.id"), nullable=True
+    )
+    list_snapshot_at = db.Column(db.DateTime, nullable=True)
+    # User who scheduled the event, None for API and bulk submissions
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    user = db.relationship("User")
     recipients = db.relationship("Recipient", backref="event", lazy="dynamic")
 
     def __init__(
@@ -38,6 +86,7 @@ class Event(db.Model):  # type: ignore[name-defined]
         created_at: Optional[datetime] = None,
         is_done: bool = False,
         done_at: Optional[datetime] = None,
+        user_id: Optional[int] = None,
     ) -> None:
         """
         Initialize an Event instance.
@@ -49,6 +98,7 @@ class Event(db.Model):  # type: ignore[name-defined]
             created_at: When the event was created (defaults to now)
             is_done: Whether the email has been sent
             done_at: When the email was sent
+            user_id: ID of the user who scheduled the email
         """
         self.email_subject = email_subject
         self.email_content = email_content
@@ -57,6 +107,7 @@ class Event(db.Model):  # type: ignore[name-defined]
             self.created_at = created_at
         self.is_done = is_done
         self.done_at = done_at
+        self.user_id = user_id
 
     @property
     def email_subject(self) -> str:
@@ -70,13 +121,68 @@ class Event(db.Model):  # type: ignore[name-defined]
 
     @property
     def email_content(self) -> str:
-        """Get the email content."""
-        return str(self._email_content) if self._email_content else ""
+        """Get the email content, from the body store or stored inline."""
+        new_body = getattr(self, "_new_body", None)
+        if new_body is not None:
+            return str(new_body[0])
+        if self._email_content is not None:
+            return str(self._email_content)
+        body = self.body
+        return body.content if body is not None else ""
 
     @email_content.setter
     def email_content(self, value: str) -> None:
-        """Set the email content."""
-        self._email_content = value
+        """
+        Set the email content and classify it for sending.
+
+        The body is written to the body store when the session flushes,
+        see _store_new_bodies().
+        """
+        value = value or ""
+        parts = classify_content(value)
+        self._new_body: Optional[Tuple[str, ContentParts]] = (value, parts)
+        self._email_content = None
+        self._content_text = None
+        self.content_type = parts.content_type
+        self.content_hash = parts.content_hash
+        self.preview = make_preview(value, parts)
+
+    @property
+    def body(self) -> Optional[EmailBody]:
+        """Stored body of the event, None while it is inline or unsaved."""
+        if self.content_hash is None:
+            return None
+        return db.session.get(EmailBody, self.content_hash)
+
+    @property
+    def content_text(self) -> Optional[str]:
+        """Plain-text alternative of an HTML body, None for plain text."""
+        return self.content_parts().text
+
+    def content_parts(self) -> ContentParts:
+        """
+        Return the classification of the email content.
+
+        Inline bodies of events stored before the content was classified on
+        write are classified here once and updated in place.
+
+        Returns:
+            ContentParts of the current content
+        """
+        new_body = getattr(self, "_new_body", None)
+        if new_body is not None:
+            return new_body[1]
+        body = None
+        if self._email_content is None and self.content_hash is not None:
+            body = self.body
+        if body is not None:
+            return ContentParts(body.content_type, body.text, body.content_hash)
+        if self.content_type is None or self.content_hash is None:
+            parts = classify_content(self.email_content)
+            self.content_type = parts.content_type
+            self._content_text = parts.text
+            self.content_hash = parts.content_hash
+        return ContentParts(self.content_type, self._content_text, self.content_hash)
 
     @property
     def is_done(self) -> bool:
@@ -90,20 +196,232 @@ class Event(db.Model):  # type: ignore[name-defined]
         if value and not self.done_at:
             self.done_at = datetime.now(UTC)
 
+    def delivery_counts(self) -> Dict[str, int]:
+        """
+        Count recipients per delivery status.
+
+        Members of a mailing list that were sent on the first attempt have
+        no recipient row; they are counted from the event's ListProgress.
+        The counts are kept on the event until it is expired, so sent_count
+        and failed_count share them; see load_delivery_counts() to count
+        many events at once.
+
+        Returns:
+            Mapping of DeliveryStatus value to number of recipients
+        """
+        counts = self.__dict__.get("_delivery_counts")
+        if counts is None:
+            Event.load_delivery_counts([self])
+            counts = self.__dict__["_delivery_counts"]
+        return dict(counts)
+
+    @classmethod
+    def load_delivery_counts(cls, events: Iterable[Event]) -> None:
+        """
+        Count the recipients of many events per delivery status.
+
+        One grouped query over the recipient rows, plus one over the
+        ListProgress rows when some of the events go to a mailing list,
+        however many events are given.
+
+        Args:
+            events: Events to count, already flushed
+        """
+        by_id = {event.id: event for event in events}
+        if not by_id:
+            return
+        counts: Dict[int, Dict[str, int]] = {event_id: {} for event_id in by_id}
+        rows = db.session.execute(
+            db.select(Recipient.event_id, Recipient.status, db.func.count())
+            .where(Recipient.event_id.in_(by_id))
+            .group_by(Recipient.event_id, Recipient.status)
+        )
+        for event_id, status, count in rows:
+            counts[event_id][status] = count
+        list_ids = [
+            event_id
+            for event_id, event in by_id.items()
+            if event.mailing_list_id is not None
+        ]
+        if list_ids:
+            sent = db.session.execute(
+                db.select(ListProgress.event_id, db.func.sum(ListProgress.sent))
+                .where(ListProgress.event_id.in_(list_ids))
+                .group_by(ListProgress.event_id)
+            )
+            for event_id, total in sent:
+                if total:
+                    event_counts = counts[event_id]
+                    event_counts[DeliveryStatus.SENT] = (
+                        event_counts.get(DeliveryStatus.SENT, 0) + total
+                    )
+        for event_id, event in by_id.items():
+            event.__dict__["_delivery_counts"] = counts[event_id]
+
+    @property
+    def sent_count(self) -> int:
+        """Number of recipients the email was delivered to."""
+        return self.delivery_counts().get(DeliveryStatus.SENT, 0)
+
+    @property
+    def failed_count(self) -> int:
+        """Number of recipients whose delivery failed."""
+        return self.delivery_counts().get(DeliveryStatus.FAILED, 0)
+
+    @property
+    def is_sending(self) -> bool:
+        """Tell whether the event's recipient chunks are being sent."""
+        return bool(self.chunks_total) and (self.chunks_done or 0) < self.chunks_total
+
+    @property
+    def progress(self) -> float:
+        """Fraction of recipient chunks sent, 1.0 once the event is done."""
+        if self.is_done:
+            return 1.0
+        if not self.chunks_total:
+            return 0.0
+        return (self.chunks_done or 0) / self.chunks_total
+
     def __repr__(self) -> str:
         """String representation of the event."""
         return f"<Event {self.id}: {self.email_subject}>"
 
 
+class EmailBody(db.Model):  # type: ignore[name-defined]
+    """
+    An email body, stored once however many events send it.
+
+    Rows are keyed by the SHA-256 of the content and never change, except
+    for used_at, which every event storing the body again bumps. Bodies no
+    event refers to are removed by `flask compact-bodies`; used_at keeps it
+    away from bodies an event is being saved with right now.
+    """
+
+    __tablename__ = "email_bodies"
+
+    content_hash = db.Column(db.String(64), primary_key=True)
+    content = db.Column(db.String, nullable=False)
+    content_type = db.Column(db.String(16), nullable=False)
+    # Plain-text alternative of HTML bodies, see classify_content()
+    text = db.Column(db.String, nullable=True)
+    # Size of the content in bytes
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(
+        db.DateTime, nullable=False, default=lambda: datetime.now(UTC)
+    )
+    used_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(UTC))
+
+    @classmethod
+    def store(cls, connection: Any, bodies: Iterable[Tuple[str, ContentParts]]) -> None:
+        """
+        Insert bodies that are not stored yet and bump used_at of the rest.
+
+        One upsert (INSERT .. ON CONFLICT) per body on Postgres and SQLite,
+        so concurrent sessions storing the same body do not conflict.
+
+        Args:
+            connection: Connection of the transaction to write in
+            bodies: (content, classification) of the bodies
+        """
+        now = datetime.now(UTC)
+        rows = [
+            {
+                "content_hash": parts.content_hash,
+                "content": content,
+                "content_type": parts.content_type,
+                "text": parts.text,
+                "size": len(content.encode("utf-8")),
+                "created_at": now,
+                "used_at": now,
+            }
+            for content, parts in bodies
+        ]
+        if not rows:
+            return
+        dialect = connection.dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            statement = insert(cls.__table__)
+            statement = statement.on_conflict_do_update(
+                index_elements=["content_hash"],
+                set_={"used_at": statement.excluded.used_at},
+            )
+            connection.execute(statement, rows)
+            return
+        hashes = [row["content_hash"] for row in rows]
+        stored = set(
+            connection.scalars(
+                db.select(cls.content_hash).where(cls.content_hash.in_(hashes))
+            )
+        )
+        if stored:
+            connection.execute(
+                db.update(cls.__table__)
+                .where(cls.content_hash.in_(stored))
+                .values(used_at=now)
+            )
+        fresh = [row for row in rows if row["content_hash"] not in stored]
+        if fresh:
+            connection.execute(db.insert(cls.__table__), fresh)
+
+    def __repr__(self) -> str:
+        """String representation of the body."""
+        return f"<EmailBody {self.content_hash[:12]}: {self.size} bytes>"
+
+
+@sa_event.listens_for(Event, "expire")
+def _forget_delivery_counts(target: Event, attrs: Any) -> None:
+    """Count the recipients again once the event is expired."""
+    target.__dict__.pop("_delivery_counts", None)
+
+
+@sa_event.listens_for(Session, "before_flush")
+def _store_new_bodies(session: Session, flush_context: Any, instances: Any) -> None:
+    """Write the bodies set on new or edited events to the body store."""
+    events = [
+        obj
+        for obj in (*session.new, *session.dirty)
+        if isinstance(obj, Event) and getattr(obj, "_new_body", None) is not None
+    ]
+    if not events:
+        return
+    bodies = {event._new_body[1].content_hash: event._new_body for event in events}
+    EmailBody.store(session.connection(), bodies.values())
+    for event in events:
+        event._new_body = None
+
+
+class DeliveryStatus:
+    """Delivery states of a single recipient."""
+
+    QUEUED = "queued"
+    SENT = "sent"
+    # Refused with a transient reply; sent again when the job is retried
+    DEFERRED = "deferred"
+    FAILED = "failed"
+
+
 class Recipient(db.Model):  # type: ignore[name-defined]
     """Recipient model for event recipients."""
 
     __tablename__ = "recipients"
+    __table_args__ = (
+        db.Index("ix_recipients_event_status", "event_id", "status"),
+        # Imports look up already stored addresses of the event
+        db.Index("ix_recipients_event_email", "event_id", "email"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String, nullable=False)
     name = db.Column(db.String)
     event_id = db.Column(db.Integer, db.ForeignKey("events.id"), nullable=False)
+    # Set on the rows of list events, which only record failed and
+    # deferred members
+    member_id = db.Column(db.Integer, db.ForeignKey("list_members.id"), nullable=True)
+    status = db.Column(db.String(16), nullable=False, default=DeliveryStatus.QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
 
     def __init__(
         self,
@@ -129,3 +447,124 @@ class Recipient(db.Model):  # type: ignore[name-defined]
         if self.name:
             return f"<Recipient {self.id}: {self.name} ({self.email})>"
         return f"<Recipient {self.id}: {self.email}>"
+
+
+class ImportStatus:
+    """States of a recipient import."""
+
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class RecipientImport(db.Model):  # type: ignore[name-defined]
+    """Progress of a streaming recipient import, polled by the UI."""
+
+    __tablename__ = "recipient_imports"
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey("events.id"), nullable=False)
+    source = db.Column(db.String, nullable=True)
+    format = db.Column(db.String(16), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default=ImportStatus.RUNNING)
+    # Rows read so far, and what became of them
+    rows_read = db.Column(db.Integer, nullable=False, default=0)
+    imported = db.Column(db.Integer, nullable=False, default=0)
+    duplicates = db.Column(db.Integer, nullable=False, default=0)
+    invalid = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String, nullable=True)
+    started_at = db.Column(
+        db.DateTime, nullable=False, default=lambda: datetime.now(UTC)
+    )
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        """String representation of the import."""
+        return f"<RecipientImport {self.id}: event {self.event_id} {self.status}>"
+
+
+class MailingList(db.Model):  # type: ignore[name-defined]
+    """A named list of addresses that events can be sent to."""
+
+    __tablename__ = "mailing_lists"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False, unique=True)
+    created_at = db.Column(
+        db.DateTime, nullable=False, default=lambda: datetime.now(UTC)
+    )
+    members = db.relationship("ListMember", backref="mailing_list", lazy="dynamic")
+
+    def __repr__(self) -> str:
+        """String representation of the list."""
+        return f"<MailingList {self.id}: {self.name}>"
+
+
+class ListMember(db.Model):  # type: ignore[name-defined]
+    """
+    Membership of an address in a mailing list.
+
+    Rows are never updated except to set removed_at, so a send can read the
+    list as it was at any moment, see ListMember.active_at(). An address
+    added again after its removal gets a new row.
+    """
+
+    __tablename__ = "list_members"
+    __table_args__ = (
+        # Sends read members in ID order, additions check for present ones
+        db.Index("ix_list_members_list_id", "list_id", "id"),
+        db.Index("ix_list_members_list_email", "list_id", "email"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    list_id = db.Column(db.Integer, db.ForeignKey("mailing_lists.id"), nullable=False)
+    email = db.Column(db.String, nullable=False)
+    name = db.Column(db.String)
+    added_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(UTC))
+    removed_at = db.Column(db.DateTime, nullable=True)
+
+    @classmethod
+    def active_at(cls, list_id: int, moment: datetime) -> Any:
+        """
+        Build the condition selecting a list's members at a moment.
+
+        Args:
+            list_id: Mailing list ID
+            moment: Point in time to read the list at
+
+        Returns:
+            SQL expression for a WHERE clause
+        """
+        return db.and_(
+            cls.list_id == list_id,
+            cls.added_at <= moment,
+            db.or_(cls.removed_at.is_(None), cls.removed_at > moment),
+        )
+
+    def __repr__(self) -> str:
+        """String representation of the member."""
+        return f"<ListMember {self.id}: {self.email} in list {self.list_id}>"
+
+
+class ListProgress(db.Model):  # type: ignore[name-defined]
+    """
+    Checkpoint of sending an event to one chunk of a mailing list.
+
+    Members are sent in ID order; sent_through is the last member whose
+    outcome was written, so a retried chunk resumes after it.
+    """
+
+    __tablename__ = "list_progress"
+    __table_args__ = (db.UniqueConstraint("event_id", "first_id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey("events.id"), nullable=False)
+    # First member ID of the chunk, 0 when the event is sent in one piece
+    first_id = db.Column(db.Integer, nullable=False, default=0)
+    sent_through = db.Column(db.Integer, nullable=False, default=0)
+    # Members sent without a recipient row, see Event.delivery_counts()
+    sent = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        """String representation of the checkpoint."""
+        return f"<ListProgress event {self.event_id} from {self.first_id}>"
@@ -0,0 +1,133 @@
+"""Maintenance of the content-addressed email body store.
+
+Event bodies are kept once per distinct content in EmailBody, keyed by the
+content's SHA-256, and events refer to them by content_hash (see
+Event.email_content). Two jobs keep the store in shape:
+
+* move_inline_bodies() moves the bodies of events stored before the body
+  store out of the events table, a batch of events per transaction
+* collect_bodies() deletes bodies no event refers to any more, once they
+  have not been stored again for EMAIL_BODY_GC_GRACE seconds; the grace
+  period covers events that are being saved with a body in a transaction
+  that has not committed yet
+
+Both run from ``flask compact-bodies``, which can be scheduled with cron.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import Optional
+
+from flask import current_app
+
+from app.database import db
+from app.database.models import EmailBody, Event
+from app.utils import metrics
+from app.utils.content import classify_content, make_preview
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CompactionResult:
+    """Outcome of compacting the body store."""
+
+    moved: int = 0
+    collected: int = 0
+
+    def summary(self) -> str:
+        """Return a one-line summary for the CLI."""
+        return (
+            f"Moved {self.moved} inline body(ies) to the store, "
+            f"removed {self.collected} unreferenced body(ies)."
+        )
+
+
+def move_inline_bodies(batch_size: int = 500) -> int:
+    """
+    Move bodies stored inline on events into the body store.
+
+    Args:
+        batch_size: Events moved per transaction
+
+    Returns:
+        Number of events moved
+    """
+    moved = 0
+    while True:
+        rows = db.session.execute(
+            db.select(Event.id, Event._email_content)
+            .where(Event._email_content.is_not(None))
+            .order_by(Event.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        parts = {event_id: classify_content(content) for event_id, content in rows}
+        EmailBody.store(
+            db.session.connection(),
+            [(content, parts[event_id]) for event_id, content in rows],
+        )
+        db.session.execute(
+            db.update(Event),
+            [
+                {
+                    "id": event_id,
+                    "_email_content": None,
+                    "_content_text": None,
+                    "content_type": parts[event_id].content_type,
+                    "content_hash": parts[event_id].content_hash,
+                    "preview": make_preview(content, parts[event_id]),
+                }
+                for event_id, content in rows
+            ],
+        )
+        db.session.commit()
+        moved += len(rows)
+    if moved:
+        logger.info(f"Moved the bodies of {moved} event(s) to the body store")
+    return moved
+
+
+def collect_bodies(grace: Optional[float] = None) -> int:
+    """
+    Delete bodies that no event refers to.
+
+    Args:
+        grace: Seconds a body must have gone unused before it is deleted,
+            EMAIL_BODY_GC_GRACE by default
+
+    Returns:
+        Number of bodies deleted
+    """
+    if grace is None:
+        grace = current_app.config.get("EMAIL_BODY_GC_GRACE", 3600)
+    cutoff = datetime.now(UTC) - timedelta(seconds=grace)
+    referenced = db.select(Event.id).where(Event.content_hash == EmailBody.content_hash)
+    result = db.session.execute(
+        db.delete(EmailBody)
+        .where(EmailBody.used_at < cutoff, ~referenced.exists())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    collected = result.rowcount or 0
+    if collected:
+        logger.info(f"Removed {collected} unreferenced email body(ies)")
+    metrics.incr("bodies.collected", collected)
+    return collected
+
+
+def compact_bodies(grace: Optional[float] = None) -> CompactionResult:
+    """
+    Move inline bodies into the store, then collect unreferenced ones.
+
+    Args:
+        grace: See collect_bodies()
+
+    Returns:
+        What was moved and deleted
+    """
+    return CompactionResult(move_inline_bodies(), collect_bodies(grace))
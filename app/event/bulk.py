@@ -0,0 +1,261 @@
+"""Bulk creation and scheduling of email events.
+
+add_event() costs one transaction per event plus one per recipient list and
+a few Redis round trips per job. add_events() takes a whole batch instead:
+
+* every item is validated up front; invalid items are reported by index and
+  the rest go ahead, and the mailing lists they name are looked up with one
+  query
+* the distinct bodies are stored once, the valid events are inserted with
+  one multi-row INSERT .. RETURNING, their job IDs set with one executemany
+  UPDATE and their recipients inserted in chunks by insert_recipients(), all
+  in a single transaction
+* the send jobs are written to Redis in one pipeline: future jobs are stored
+  and added to the scheduled set, jobs due now go straight to
+  MAIL_SEND_NOW_QUEUE, and the dispatcher is woken once
+
+If Redis fails after the commit the events stay pending without a job;
+``flask reconcile-schedule`` schedules them again.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from datetime import UTC, datetime
+from typing import Any, Dict, List, Sequence, Set, Tuple
+
+from flask import current_app
+from rq.job import Job
+from rq_scheduler.utils import to_unix
+from sqlalchemy import insert, update
+
+from app.database import db
+from app.database.models import EmailBody, Event, MailingList
+from app.event.dispatcher import notify_dispatcher
+from app.event.jobs import (
+    SEND_MAIL_PAYLOAD_VERSION,
+    insert_recipients,
+    is_row_id,
+    send_job_id,
+    send_mail,
+    validate_event,
+)
+from app.extensions import rq
+from app.utils import metrics
+from app.utils.content import classify_content, make_preview
+
+logger = logging.getLogger(__name__)
+
+
+def parse_ndjson(text: str) -> List[Any]:
+    """
+    Parse newline-delimited JSON, one event per line.
+
+    Blank lines are skipped. A line that is not valid JSON becomes a
+    ValueError in its place, reported by validate_items() like any other
+    invalid item.
+
+    Args:
+        text: Request body
+
+    Returns:
+        Parsed items
+    """
+    items: List[Any] = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError as e:
+            items.append(ValueError(f"Line {number} is not valid JSON: {e}"))
+    return items
+
+
+def existing_lists(items: Sequence[Any]) -> Set[int]:
+    """
+    Find which of the mailing lists named by a batch exist.
+
+    Args:
+        items: Event payloads
+
+    Returns:
+        IDs of the existing lists among the items' mailing_list_id values
+    """
+    wanted = {
+        item["mailing_list_id"]
+        for item in items
+        if isinstance(item, dict) and is_row_id(item.get("mailing_list_id"))
+    }
+    if not wanted:
+        return set()
+    return set(
+        db.session.scalars(db.select(MailingList.id).where(MailingList.id.in_(wanted)))
+    )
+
+
+def validate_items(
+    items: Sequence[Any],
+) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+    """
+    Validate every item of a bulk request.
+
+    Args:
+        items: Event payloads as accepted by add_event()
+
+    Returns:
+        Tuple of (index, event fields) for the valid items and the error
+        results of the invalid ones
+    """
+    valid, errors = [], []
+    list_ids = existing_lists(items)
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, ValueError):
+                raise item
+            if not isinstance(item, dict):
+                raise ValueError("Item must be a JSON object")
+            subject, content, timestamp, recipients = validate_event(item, list_ids)
+            fields = {
+                "subject": subject,
+                "content": content,
+                "timestamp": timestamp,
+                "recipients": recipients,
+                "mailing_list_id": item.get("mailing_list_id"),
+            }
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        valid.append((index, fields))
+    return valid, errors
+
+
+def insert_events(fields: Sequence[Dict[str, Any]]) -> List[int]:
+    """
+    Store events, their bodies and their recipients in one transaction.
+
+    Events of a batch that share a body share its one EmailBody row.
+
+    Args:
+        fields: Validated event fields, see validate_items()
+
+    Returns:
+        IDs of the new events, in the order of fields
+    """
+    created_at = datetime.now(UTC)
+    rows = []
+    bodies = {}
+    for item in fields:
+        parts = classify_content(item["content"])
+        bodies[parts.content_hash] = (item["content"], parts)
+        rows.append(
+            {
+                "_email_subject": item["subject"],
+                "content_type": parts.content_type,
+                "content_hash": parts.content_hash,
+                "preview": make_preview(item["content"], parts),
+                "timestamp": item["timestamp"],
+                "created_at": created_at,
+                "_is_done": False,
+                "mailing_list_id": item["mailing_list_id"],
+            }
+        )
+    try:
+        EmailBody.store(db.session.connection(), bodies.values())
+        ids = list(
+            db.session.scalars(
+                insert(Event).returning(Event.id, sort_by_parameter_order=True), rows
+            )
+        )
+        db.session.execute(
+            update(Event),
+            [{"id": event_id, "job_id": send_job_id(event_id)} for event_id in ids],
+        )
+        insert_recipients(
+            (event_id, email, name)
+            for event_id, item in zip(ids, fields)
+            for email, name in item["recipients"]
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return ids
+
+
+def schedule_events(events: Sequence[Tuple[int, datetime]]) -> None:
+    """
+    Write the send jobs of new events to Redis in one pipeline.
+
+    Args:
+        events: (event ID, send time) of events that have no job yet
+    """
+    scheduler = rq.get_scheduler()
+    connection = scheduler.connection
+    queue = rq.get_queue(current_app.config.get("MAIL_SEND_NOW_QUEUE"))
+    threshold = current_app.config.get("MAIL_SEND_NOW_THRESHOLD", 0)
+    now = time.time()
+    pipe = connection.pipeline(transaction=False)
+    scheduled = []
+    for event_id, timestamp in events:
+        job_id = send_job_id(event_id)
+        job = Job.create(
+            send_mail,
+            args=(event_id, SEND_MAIL_PAYLOAD_VERSION),
+            connection=connection,
+            id=job_id,
+            origin=scheduler.queue_name,
+        )
+        due = to_unix(timestamp)
+        if due - now <= threshold:
+            job.origin = queue.name
+            queue.enqueue_job(job, pipeline=pipe)
+            continue
+        job.save(pipeline=pipe)
+        pipe.zadd(scheduler.scheduled_jobs_key, {job_id: due})
+        scheduled.append(timestamp)
+    pipe.execute()
+    metrics.incr("schedule.scheduled", len(scheduled))
+    metrics.incr("schedule.send_now", len(events) - len(scheduled))
+    if scheduled:
+        notify_dispatcher(connection, min(scheduled))
+
+
+def add_events(items: Sequence[Any]) -> List[Dict[str, Any]]:
+    """
+    Create and schedule a batch of email events.
+
+    Args:
+        items: Event payloads as accepted by add_event()
+
+    Returns:
+        One result per item in request order: ``index``, ``id`` and
+        ``job_id`` for created events, ``index`` and ``error`` for invalid
+        items
+    """
+    start = time.perf_counter()
+    valid, results = validate_items(items)
+    if valid:
+        ids = insert_events([fields for _, fields in valid])
+        schedule_events(
+            [
+                (event_id, fields["timestamp"])
+                for event_id, (_, fields) in zip(ids, valid)
+            ]
+        )
+        results.extend(
+            {"index": index, "id": event_id, "job_id": send_job_id(event_id)}
+            for event_id, (index, _) in zip(ids, valid)
+        )
+        results.sort(key=lambda result: result["index"])
+    elapsed = time.perf_counter() - start
+    metrics.incr("bulk.events_created", len(valid))
+    metrics.incr("bulk.events_rejected", len(items) - len(valid))
+    metrics.observe("bulk.seconds", elapsed)
+    logger.info(
+        f"Bulk request created {len(valid)} of {len(items)} event(s) "
+        f"in {elapsed:.3f}s"
+    )
+    return results
@@ -0,0 +1,269 @@
+"""Database-backed dispatcher for due send jobs.
+
+The Redis dispatcher and rq-scheduler only know what their sorted set
+knows: when Redis is flushed or restored from an old snapshot, pending
+events are never sent. This dispatcher treats the ``events`` table as the
+source of truth instead. It polls for due, pending events through the
+``(is_done, timestamp)`` index and claims a batch of them with one
+statement::
+
+    UPDATE events SET claimed_by = ..., claim_expires_at = now + lease
+    WHERE id IN (SELECT id FROM events WHERE NOT is_done AND timestamp <= now
+                 AND lease expired ORDER BY timestamp LIMIT batch
+                 FOR UPDATE SKIP LOCKED)
+    RETURNING id, job_id, timestamp
+
+SKIP LOCKED lets any number of dispatchers on different nodes claim
+concurrently without waiting for or double-claiming each other's rows.
+Databases without it (SQLite) get the same statement without the lock
+clause, which is only safe with a single dispatcher.
+
+MySQL rejects a LIMIT inside an ``IN`` subquery and has no
+``UPDATE ... RETURNING``, so there the batch is selected with
+``SELECT ... LIMIT ... FOR UPDATE SKIP LOCKED`` first and then updated by
+ID in the same transaction.
+
+A claimed event's send job is enqueued under its stored job ID unless that
+job is already queued, running or done, so events that are also in the Redis
+schedule are not sent twice. A job that is only scheduled is moved out of
+rq-scheduler's sorted set and enqueued, so this mode needs no rq-scheduler.
+The lease keeps the event from being dispatched again until
+DB_DISPATCHER_LEASE seconds have passed; if it is still not done by then
+(the job was lost), the next poll dispatches it again. Events whose
+recipient chunks are being sent are never claimed, however long the send
+takes: their chunk jobs own them until the last one marks the event done.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+from datetime import UTC, datetime, timedelta
+from typing import Any, Callable, List, Optional
+
+from flask import current_app
+from redis.exceptions import RedisError
+from rq.job import Job
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.database import db
+from app.database.models import Event
+from app.event.jobs import SEND_MAIL_PAYLOAD_VERSION, send_job_id, send_mail
+from app.event.reconcile import IN_FLIGHT_STATUSES
+from app.extensions import rq
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Dialects that support SELECT ... FOR UPDATE SKIP LOCKED
+SKIP_LOCKED_DIALECTS = ("postgresql", "mysql")
+# Dialects that claim with one UPDATE ... WHERE id IN (SELECT ... LIMIT)
+# RETURNING; the others select the batch first
+ONE_STATEMENT_DIALECTS = ("postgresql", "sqlite")
+
+
+def utcnow() -> datetime:
+    """Return the current time as a naive UTC datetime, like Event.timestamp."""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+class DatabaseDispatcher:
+    """
+    Claims due events from the database and enqueues their send jobs.
+
+    Example:
+        >>> DatabaseDispatcher(batch_size=500, lease=900).run()
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        lease: float = 900,
+        interval: float = 1.0,
+        queue_name: Optional[str] = None,
+        name: Optional[str] = None,
+        clock: Callable[[], datetime] = utcnow,
+    ) -> None:
+        """
+        Initialize the dispatcher.
+
+        Args:
+            batch_size: Events claimed per statement
+            lease: Seconds before a claimed event that is not done is
+                dispatched again
+            interval: Seconds between polls when nothing is due
+            queue_name: Queue to enqueue send jobs on, the default queue
+                when empty
+            name: Recorded as claimed_by, defaults to host and process ID
+            clock: Source of the current time as naive UTC
+        """
+        self.batch_size = max(1, batch_size)
+        self.lease = timedelta(seconds=lease)
+        self.interval = interval
+        self.queue_name = queue_name
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.clock = clock
+        self.dispatched = 0
+        self.skip_locked = db.engine.dialect.name in SKIP_LOCKED_DIALECTS
+        self.one_statement = db.engine.dialect.name in ONE_STATEMENT_DIALECTS
+        self._stop = threading.Event()
+        if not self.skip_locked:
+            logger.warning(
+                f"{db.engine.dialect.name} has no SKIP LOCKED, "
+                "run a single database dispatcher only"
+            )
+
+    def due_statement(self, now: datetime, *columns: Any) -> Any:
+        """
+        Build the statement selecting one batch of events due at ``now``.
+
+        Args:
+            now: Current time as naive UTC
+            *columns: Columns to select
+
+        Returns:
+            SELECT ... LIMIT batch_size, locking the rows where supported
+        """
+        due = (
+            select(*columns)
+            .where(
+                Event._is_done.is_(False),
+                Event.timestamp <= now,
+                or_(Event.claim_expires_at.is_(None), Event.claim_expires_at <= now),
+                # Not while chunks are being sent, see Event.is_sending
+                Event.chunks_done >= Event.chunks_total,
+            )
+            .order_by(Event.timestamp)
+            .limit(self.batch_size)
+        )
+        if self.skip_locked:
+            due = due.with_for_update(skip_locked=True)
+        return due
+
+    def claim_statement(self, now: datetime, ids: Optional[List[int]] = None) -> Any:
+        """
+        Build the statement claiming one batch of events due at ``now``.
+
+        Args:
+            now: Current time as naive UTC
+            ids: IDs of the events to claim, selected by due_statement();
+                the batch is selected in a subquery when not given
+
+        Returns:
+            UPDATE ... RETURNING id, job_id, timestamp, or a plain UPDATE
+            when ids are given
+        """
+        statement = (
+            update(Event)
+            .values(claimed_by=self.name, claim_expires_at=now + self.lease)
+            .execution_options(synchronize_session=False)
+        )
+        if ids is not None:
+            return statement.where(Event.id.in_(ids))
+        return statement.where(
+            Event.id.in_(self.due_statement(now, Event.id))
+        ).returning(Event.id, Event.job_id, Event.timestamp)
+
+    def claim(self) -> List[Any]:
+        """
+        Claim one batch of due events.
+
+        Returns:
+            Rows of (id, job_id, timestamp) for the claimed events
+        """
+        now = self.clock()
+        if self.one_statement:
+            claimed = db.session.execute(self.claim_statement(now)).all()
+        else:
+            claimed = db.session.execute(
+                self.due_statement(now, Event.id, Event.job_id, Event.timestamp)
+            ).all()
+            if claimed:
+                ids = [row.id for row in claimed]
+                db.session.execute(self.claim_statement(now, ids))
+        db.session.commit()
+        return list(claimed)
+
+    def enqueue(self, event_id: int, job_id: Optional[str]) -> bool:
+        """
+        Enqueue an event's send job unless it is queued, running or ran.
+
+        A job that is only scheduled is taken out of rq-scheduler's sorted
+        set and enqueued right away: this dispatcher may be the only process
+        moving due jobs, and removing it first keeps rq-scheduler from
+        enqueueing it a second time.
+
+        Args:
+            event_id: Event ID
+            job_id: Stored job ID, None for events that predate job IDs
+
+        Returns:
+            True if a job was enqueued
+        """
+        job_id = job_id or send_job_id(event_id)
+        scheduler = rq.get_scheduler()
+        connection = scheduler.connection
+        if connection.hget(Job.key_for(job_id), "status") in IN_FLIGHT_STATUSES:
+            return False
+        connection.zrem(scheduler.scheduled_jobs_key, job_id)
+        rq.get_queue(self.queue_name).enqueue_call(
+            send_mail, args=(event_id, SEND_MAIL_PAYLOAD_VERSION), job_id=job_id
+        )
+        return True
+
+    def dispatch(self) -> int:
+        """
+        Claim and enqueue every due event, a batch at a time.
+
+        Returns:
+            Number of send jobs enqueued
+        """
+        enqueued = 0
+        while True:
+            claimed = self.claim()
+            for row in claimed:
+                enqueued += self.enqueue(row.id, row.job_id)
+            if claimed:
+                lag = self.clock() - min(row.timestamp for row in claimed)
+                metrics.observe("db_dispatcher.lag_seconds", lag.total_seconds())
+            if len(claimed) < self.batch_size:
+                break
+        if enqueued:
+            self.dispatched += enqueued
+            metrics.incr("db_dispatcher.dispatched", enqueued)
+        return enqueued
+
+    def stop(self) -> None:
+        """Make run() return after the current poll."""
+        self._stop.set()
+
+    def run(self) -> None:
+        """Dispatch due events until stop() is called."""
+        logger.info(f"Dispatching due events from the database as {self.name}")
+        while not self._stop.is_set():
+            try:
+                self.dispatch()
+            except (SQLAlchemyError, RedisError, OSError) as e:
+                db.session.rollback()
+                logger.warning(f"Database dispatcher failed, retrying: {e}")
+            self._stop.wait(self.interval)
+
+
+def get_db_dispatcher() -> DatabaseDispatcher:
+    """
+    Build a database dispatcher from the current application's config.
+
+    Returns:
+        Dispatcher configured from DISPATCHER_BATCH_SIZE, DB_DISPATCHER_LEASE,
+        DB_DISPATCHER_INTERVAL and MAIL_SEND_NOW_QUEUE
+    """
+    config = current_app.config
+    return DatabaseDispatcher(
+        batch_size=config.get("DISPATCHER_BATCH_SIZE", 500),
+        lease=config.get("DB_DISPATCHER_LEASE", 900),
+        interval=config.get("DB_DISPATCHER_INTERVAL", 1.0),
+        queue_name=config.get("MAIL_SEND_NOW_QUEUE"),
+    )
@@ -0,0 +1,271 @@
+"""Per-recipient delivery bookkeeping.
+
+Sending a large event touches every recipient row. Writing each outcome as
+it happens would cost one UPDATE and one round trip per recipient, so the
+outcomes are buffered here and written with one ``UPDATE ... WHERE id IN``
+statement per status every ``flush_size`` recipients.
+
+Each flush is also a checkpoint: a send that is interrupted and run again
+skips the recipients already recorded as sent or permanently failed.
+
+Events sent to a mailing list have no recipient rows to update. Their
+ListDeliveryBuffer writes a recipient row only for failed and deferred
+members and otherwise just moves the ListProgress watermark, so a
+successful send to a list costs one small UPDATE per flush.
+
+Since every flush commits, the rows being sent must not be read through a
+cursor that stays open across flushes: on PostgreSQL ``yield_per`` uses a
+server-side cursor and the commit closes it. Recipients and members are
+read with iter_keyset() instead, one fully fetched ``LIMIT`` query per
+batch.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from collections import defaultdict
+from datetime import UTC, datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.database import db
+from app.database.models import DeliveryStatus, ListMember, ListProgress, Recipient
+
+# Longest error message stored on a recipient row.
+MAX_ERROR_LENGTH = 500
+# Message-ID domain used when no sender domain is configured.
+DEFAULT_MESSAGE_ID_DOMAIN = "mail-scheduler.local"
+
+
+def message_id(event_id: int, email: str, sender: Optional[str] = None) -> str:
+    """
+    Build the Message-ID of the email sent to one recipient of an event.
+
+    The ID only depends on the event and the address, so a message sent
+    again after a worker crash carries the same Message-ID as the first
+    attempt and the relay (or the recipient's client) can drop the copy.
+
+    Args:
+        event_id: Event being sent
+        email: Recipient address
+        sender: Sender address whose domain is used for the ID
+
+    Returns:
+        Message-ID header value, including the angle brackets
+    """
+    digest = hashlib.sha1(f"{event_id}:{email.lower()}".encode()).hexdigest()[:20]
+    domain = DEFAULT_MESSAGE_ID_DOMAIN
+    if sender and "@" in sender:
+        domain = sender.rsplit("@", 1)[1].strip(" >") or domain
+    return f"<event-{event_id}.{digest}@{domain}>"
+
+
+def iter_keyset(query: Any, column: Any, batch_size: int) -> Iterator[Any]:
+    """
+    Stream the rows of a query in batches keyed on an ascending column.
+
+    Each batch is its own ``column > last LIMIT batch_size`` query, fetched
+    completely before its rows are yielded, so the caller may commit between
+    rows without closing the cursor the rest of the rows come from.
+
+    Args:
+        query: Select whose first column is ``column``, without ORDER BY
+            or LIMIT
+        column: Unique column to order and resume by
+        batch_size: Rows per query
+
+    Yields:
+        The rows of the query in ``column`` order
+    """
+    query = query.order_by(column).limit(batch_size)
+    batch = query
+    while True:
+        rows = db.session.execute(batch).all()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        batch = query.where(column > rows[-1][0])
+
+
+class DeliveryStatusBuffer:
+    """
+    Collects delivery outcomes and writes them in bulk.
+
+    Example:
+        >>> with DeliveryStatusBuffer(flush_size=500) as statuses:
+        ...     statuses.mark_sent(recipient_id)
+    """
+
+    def __init__(self, flush_size: int = 500) -> None:
+        """
+        Initialize the buffer.
+
+        Args:
+            flush_size: Number of buffered outcomes that triggers a flush
+        """
+        self.flush_size = max(1, flush_size)
+        self.flushes = 0
+        self._sent: List[int] = []
+        self._failed: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+        self._pending = 0
+
+    def __len__(self) -> int:
+        """Return the number of outcomes not yet written."""
+        return self._pending
+
+    def mark_sent(self, recipient_id: int) -> None:
+        """
+        Record a successful delivery.
+
+        Args:
+            recipient_id: ID of the recipient the message was accepted for
+        """
+        self._sent.append(recipient_id)
+        self._added()
+
+    def mark_failed(self, recipient_id: int, error: Any) -> None:
+        """
+        Record a failed delivery.
+
+        Args:
+            recipient_id: ID of the recipient the message was rejected for
+            error: Exception or message describing the failure
+        """
+        self._add_failure(DeliveryStatus.FAILED, recipient_id, error)
+
+    def mark_deferred(self, recipient_id: int, error: Any) -> None:
+        """
+        Record a delivery the relay refused for now.
+
+        Args:
+            recipient_id: ID of the recipient the message was deferred for
+            error: Exception or message describing the transient failure
+        """
+        self._add_failure(DeliveryStatus.DEFERRED, recipient_id, error)
+
+    def _add_failure(self, status: str, recipient_id: int, error: Any) -> None:
+        """Buffer a failure, grouped by status and error message."""
+        self._failed[(status, str(error)[:MAX_ERROR_LENGTH])].append(recipient_id)
+        self._added()
+
+    def _added(self) -> None:
+        """Flush once enough outcomes are buffered."""
+        self._pending += 1
+        if self._pending >= self.flush_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered outcomes and commit them."""
+        if not self._pending:
+            return
+        self._write()
+        db.session.commit()
+        self._sent = []
+        self._failed = defaultdict(list)
+        self._pending = 0
+        self.flushes += 1
+
+    def _write(self) -> None:
+        """Issue the statements recording the buffered outcomes."""
+        if self._sent:
+            _update(self._sent, DeliveryStatus.SENT, None, sent_at=datetime.now(UTC))
+        for (status, error), ids in self._failed.items():
+            _update(ids, status, error)
+
+    def __enter__(self) -> "DeliveryStatusBuffer":
+        """Return the buffer for use in a with block."""
+        return self
+
+    def __exit__(self, exc_type: Optional[type], *exc_info: object) -> None:
+        """
+        Write what is left when the block ends.
+
+        Outcomes are also written when the block raises an Exception, since
+        those messages did reach the relay. Interpreter exits are left alone.
+        """
+        if exc_type is None or issubclass(exc_type, Exception):
+            self.flush()
+
+
+def _update(
+    ids: List[int],
+    status: str,
+    error: Optional[str],
+    sent_at: Optional[datetime] = None,
+) -> None:
+    """Set the status of many recipients with a single statement."""
+    values: Dict[str, Any] = {
+        "status": status,
+        "attempts": Recipient.attempts + 1,
+        "last_error": error,
+    }
+    if sent_at is not None:
+        values["sent_at"] = sent_at
+    db.session.execute(
+        db.update(Recipient)
+        .where(Recipient.id.in_(ids))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+class ListDeliveryBuffer(DeliveryStatusBuffer):
+    """
+    Collects delivery outcomes for members of a mailing list.
+
+    The mark_* methods take member IDs. Members must be marked in ascending
+    ID order, since every flush moves the progress watermark to the highest
+    member written.
+    """
+
+    def __init__(self, progress: ListProgress, flush_size: int = 500) -> None:
+        """
+        Initialize the buffer.
+
+        Args:
+            progress: Checkpoint of the chunk being sent
+            flush_size: Number of buffered outcomes that triggers a flush
+        """
+        super().__init__(flush_size)
+        self.progress = progress
+
+    def _write(self) -> None:
+        """Add rows for failed members and advance the watermark."""
+        last = max(self._sent, default=0)
+        for (status, error), ids in self._failed.items():
+            _insert_failures(self.progress.event_id, ids, status, error)
+            last = max(last, *ids)
+        db.session.execute(
+            db.update(ListProgress)
+            .where(ListProgress.id == self.progress.id)
+            .values(sent_through=last, sent=ListProgress.sent + len(self._sent))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _insert_failures(
+    event_id: int, member_ids: List[int], status: str, error: str
+) -> None:
+    """Copy failed members into recipient rows of the event."""
+    members = db.select(
+        db.literal(event_id),
+        ListMember.email,
+        ListMember.name,
+        ListMember.id,
+        db.literal(status),
+        db.literal(1),
+        db.literal(error),
+    ).where(ListMember.id.in_(member_ids))
+    db.session.execute(
+        db.insert(Recipient).from_select(
+            [
+                "event_id",
+                "email",
+                "name",
+                "member_id",
+                "status",
+                "attempts",
+                "last_error",
+            ],
+            members,
+        )
+    )
@@ -0,0 +1,249 @@
+"""Precise dispatcher for scheduled jobs.
+
+rq-scheduler polls its sorted set of scheduled jobs every
+RQ_SCHEDULER_INTERVAL seconds, so a job goes out up to one interval late and
+every tick costs a full round of Redis calls even when nothing is due. The
+dispatcher works on the same sorted set (so enqueue_at, cancel_mail and
+retime_mail are unchanged) but sleeps exactly until the earliest due time.
+Scheduling something earlier publishes a wakeup on a pub/sub channel, which
+cuts the sleep short.
+
+Due jobs are moved to their queue by one Lua script per batch of
+DISPATCHER_BATCH_SIZE jobs: it pops them from the sorted set, marks them
+queued and pushes them onto their queue in a single round trip, and returns
+the next due time.
+
+The dispatcher only moves one-off jobs. rq-scheduler's repeating jobs
+(``schedule``/``cron``) still need ``rqscheduler``.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import UTC, datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+from flask import current_app
+from redis.exceptions import RedisError
+from rq.job import Job
+from rq.queue import Queue
+from rq.utils import utcformat
+
+from app.extensions import rq
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+WAKEUP_CHANNEL = "mail_scheduler:dispatcher:wakeup"
+
+# KEYS[1]: scheduled jobs sorted set, KEYS[2]: leader lease.
+# ARGV: now (unix time), batch size, enqueued_at string, queue key prefix,
+# job key prefix, set of known queues, expected lease value ("" when the
+# dispatcher is not fenced).
+# Moves up to batch size due jobs to the queue named by their origin and
+# returns {scores of the moved jobs..., next due score or ""}, as strings
+# since Lua numbers are truncated to integers on the way out. Returns nil
+# without moving anything when the lease is held by someone else.
+MOVE_DUE_SCRIPT = """
+if ARGV[7] ~= '' and redis.call('GET', KEYS[2]) ~= ARGV[7] then
+    return nil
+end
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1],
+                       'WITHSCORES', 'LIMIT', 0, tonumber(ARGV[2]))
+local moved = {}
+for i = 1, #due, 2 do
+    local id = due[i]
+    redis.call('ZREM', KEYS[1], id)
+    local job_key = ARGV[5] .. id
+    local origin = redis.call('HGET', job_key, 'origin')
+    if origin then
+        local queue_key = ARGV[4] .. origin
+        redis.call('HSET', job_key, 'status', 'queued', 'enqueued_at', ARGV[3])
+        redis.call('SADD', ARGV[6], queue_key)
+        redis.call('RPUSH', queue_key, id)
+        moved[#moved + 1] = due[i + 1]
+    end
+end
+local nxt = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+moved[#moved + 1] = nxt[2] or ''
+return moved
+"""
+
+
+class LeadershipLost(Exception):
+    """Raised when a fenced dispatcher no longer holds the leader lease."""
+
+
+def notify_dispatcher(connection: Any, when: datetime) -> None:
+    """
+    Wake the dispatcher up for a job scheduled at ``when``.
+
+    Failing to publish only delays the job by up to DISPATCHER_MAX_SLEEP,
+    so errors are logged and swallowed.
+
+    Args:
+        connection: Redis connection
+        when: Time the job is due (naive UTC or aware)
+    """
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=UTC)
+    try:
+        connection.publish(WAKEUP_CHANNEL, when.timestamp())
+    except (RedisError, OSError) as e:
+        logger.debug(f"Could not wake the dispatcher: {e}")
+
+
+class Dispatcher:
+    """
+    Moves scheduled jobs to their queues when they are due.
+
+    Example:
+        >>> Dispatcher(redis, "rq:scheduler:scheduled_jobs").run()
+    """
+
+    def __init__(
+        self,
+        connection: Any,
+        scheduled_jobs_key: str,
+        batch_size: int = 500,
+        max_sleep: float = 5.0,
+        clock: Callable[[], float] = time.time,
+        fence: Optional[Tuple[str, str]] = None,
+    ) -> None:
+        """
+        Initialize the dispatcher.
+
+        Args:
+            connection: Redis connection
+            scheduled_jobs_key: Sorted set of job IDs scored by due time
+            batch_size: Jobs moved per script call
+            max_sleep: Longest sleep between checks, a fallback for jobs
+                scheduled without a wakeup
+            clock: Source of the current unix time
+            fence: Leader lease key and the value it must hold for jobs to
+                be moved, see app.event.leader
+        """
+        self.connection = connection
+        self.scheduled_jobs_key = scheduled_jobs_key
+        self.batch_size = max(1, batch_size)
+        self.max_sleep = max_sleep
+        self.clock = clock
+        self.fence = fence
+        self.dispatched = 0
+        self._script = connection.register_script(MOVE_DUE_SCRIPT)
+        self._stop = threading.Event()
+
+    def move_due(self) -> Tuple[List[float], Optional[float]]:
+        """
+        Move one batch of due jobs to their queues.
+
+        Returns:
+            Due times of the moved jobs and the next due time, if any
+
+        Raises:
+            LeadershipLost: The dispatcher is fenced and the lease moved on
+        """
+        now = self.clock()
+        fence_key, fence_value = self.fence or (self.scheduled_jobs_key, "")
+        result = self._script(
+            keys=[self.scheduled_jobs_key, fence_key],
+            args=[
+                now,
+                self.batch_size,
+                utcformat(datetime.fromtimestamp(now, UTC).replace(tzinfo=None)),
+                Queue.redis_queue_namespace_prefix,
+                Job.redis_job_namespace_prefix,
+                Queue.redis_queues_keys,
+                fence_value,
+            ],
+        )
+        if result is None:
+            raise LeadershipLost(f"Lease {fence_key} is no longer {fence_value}")
+        *moved, next_due = result
+        return [float(score) for score in moved], float(next_due) if next_due else None
+
+    def dispatch(self) -> Optional[float]:
+        """
+        Move every due job, a batch at a time.
+
+        Returns:
+            The next due time, None when nothing is scheduled
+        """
+        while True:
+            moved, next_due = self.move_due()
+            if moved:
+                self.dispatched += len(moved)
+                now = self.clock()
+                metrics.incr("dispatcher.dispatched", len(moved))
+                metrics.observe("dispatcher.lag_seconds", now - min(moved))
+            if len(moved) < self.batch_size:
+                return next_due
+
+    def stop(self) -> None:
+        """Make run() return after the current iteration."""
+        self._stop.set()
+        try:
+            self.connection.publish(WAKEUP_CHANNEL, 0)
+        except (RedisError, OSError):
+            pass
+
+    def wait(self, pubsub: Any, next_due: Optional[float]) -> None:
+        """
+        Sleep until the next due time or an earlier wakeup.
+
+        Args:
+            pubsub: PubSub subscribed to the wakeup channel
+            next_due: Next due time, None when nothing is scheduled
+        """
+        deadline = self.clock() + self.max_sleep
+        if next_due is not None:
+            deadline = min(deadline, next_due)
+        while not self._stop.is_set():
+            timeout = deadline - self.clock()
+            if timeout <= 0:
+                return
+            message = pubsub.get_message(timeout=timeout)
+            if message is None:
+                continue
+            try:
+                when = float(message["data"])
+            except (TypeError, ValueError):
+                return
+            # Jobs due after the current deadline do not need a wakeup
+            if when < deadline:
+                return
+
+    def run(self) -> None:
+        """Dispatch due jobs until stop() is called."""
+        pubsub = self.connection.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(WAKEUP_CHANNEL)
+        logger.info(f"Dispatching jobs from {self.scheduled_jobs_key}")
+        try:
+            while not self._stop.is_set():
+                try:
+                    next_due = self.dispatch()
+                    self.wait(pubsub, next_due)
+                except (RedisError, OSError) as e:
+                    logger.warning(f"Dispatcher lost Redis, retrying: {e}")
+                    self._stop.wait(1)
+        finally:
+            pubsub.close()
+
+
+def get_dispatcher() -> Dispatcher:
+    """
+    Build a dispatcher for the current application's scheduler.
+
+    Returns:
+        Dispatcher configured from DISPATCHER_BATCH_SIZE and
+        DISPATCHER_MAX_SLEEP
+    """
+    scheduler = rq.get_scheduler()
+    return Dispatcher(
+        scheduler.connection,
+        scheduler.scheduled_jobs_key,
+        batch_size=current_app.config.get("DISPATCHER_BATCH_SIZE", 500),
+        max_sleep=current_app.config.get("DISPATCHER_MAX_SLEEP", 5),
+    )
@@ -2,174 +2,851 @@
 
 from __future__ import annotations
 
-from datetime import UTC, datetime
-from typing import Any, Dict, List, Union, cast
-
-import dateutil.parser
-import pytz
-from bs4 import BeautifulSoup
-from flask_mail import Message
-from tzlocal import get_localzone
+import io
+import logging
+import math
+import smtplib
+import time
+from datetime import UTC, datetime, timedelta
+from itertools import islice
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
+
+from flask import current_app
+from rq import get_current_job
+from rq.exceptions import NoSuchJobError
+from rq.job import Dependency, Job, JobStatus
+from rq_scheduler.utils import to_unix
 
 from app.database import db
-from app.database.models import Event, Recipient
+from app.database.models import (
+    DeliveryStatus,
+    Event,
+    ListMember,
+    MailingList,
+    Recipient,
+)
+from app.event.addresses import parse_addresses
+from app.event.delivery import (
+    DeliveryStatusBuffer,
+    ListDeliveryBuffer,
+    iter_keyset,
+    message_id,
+)
+from app.event.dispatcher import notify_dispatcher
+from app.event.lists import iter_members, list_progress
+from app.event.message_cache import get_message_cache
+from app.event.personalize import compile_template
+from app.event.rate_limit import RateLimited, get_rate_limiter
+from app.event.retry import DeliveryDeferred, RetryPolicy, retrying
+from app.event.smtp_pool import get_smtp_pool
 from app.extensions import mail, rq
+from app.utils import metrics
+from app.utils.timestamps import dt_utc
+
+logger = logging.getLogger(__name__)
+
+# Version of the send_mail job payload. Version 1 jobs were enqueued as
+# send_mail(event_id, recipients); version 2 jobs carry only the event id and
+# resolve recipients from the database when they run.
+SEND_MAIL_PAYLOAD_VERSION = 2
+
+
+class SendInProgress(Exception):
+    """Raised when re-timing an event whose chunks are being sent."""
+
+    def __init__(self, event_id: int) -> None:
+        """
+        Initialize the error.
+
+        Args:
+            event_id: Event being sent
+        """
+        super().__init__(f"Event {event_id} is being sent and cannot be re-timed")
+        self.event_id = event_id
+
+
+def parse_recipients(data: Union[str, List[str]]) -> List[Tuple[str, Optional[str]]]:
+    """
+    Split a recipient list into normalized, unique addresses and names.
+
+    Args:
+        data: Email addresses separated by commas, semicolons or line
+            breaks, or a list of them, optionally as
+            "Name <email@example.com>"
+
+    Returns:
+        List of (email, name) pairs, name None when not given
+
+    Raises:
+        ValueError: If an entry is not a valid address
+    """
+    parsed = parse_addresses(data)
+    if parsed.invalid:
+        shown = ", ".join(parsed.invalid[:5])
+        more = len(parsed.invalid) - 5
+        raise ValueError(
+            f"Invalid recipient address(es): {shown}"
+            + (f" and {more} more" if more > 0 else "")
+        )
+    return [(address.email, address.name) for address in parsed.addresses]
+
+
+# Columns written by insert_recipients(). COPY bypasses the Python-side
+# column defaults, so status and attempts are always given.
+RECIPIENT_COLUMNS = ("event_id", "email", "name", "status", "attempts")
+
+
+def _copy_value(value: Any) -> str:
+    """Format one value for COPY's text format."""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_recipients(rows: List[Tuple[int, str, Optional[str]]]) -> None:
+    """
+    Write recipients with Postgres COPY in the session's transaction.
+
+    Args:
+        rows: (event ID, email, name) of the recipients
+    """
+    buffer = io.StringIO()
+    for event_id, email, name in rows:
+        values = (event_id, email, name, DeliveryStatus.QUEUED, 0)
+        buffer.write("\t".join(_copy_value(v) for v in values) + "\n")
+    buffer.seek(0)
+    connection = db.session.connection().connection.dbapi_connection
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {Recipient.__tablename__} ({', '.join(RECIPIENT_COLUMNS)}) "
+            "FROM STDIN",
+            buffer,
+        )
+
+
+def insert_recipients(
+    rows: Iterable[Tuple[int, str, Optional[str]]], chunk_size: int = 0
+) -> int:
+    """
+    Insert recipients in chunks without building ORM objects.
+
+    Each chunk is one executemany of a Core INSERT, or one COPY on
+    Postgres when RECIPIENT_COPY is enabled. The caller commits.
+
+    Args:
+        rows: (event ID, email, name) of the recipients
+        chunk_size: Rows per statement, RECIPIENT_INSERT_CHUNK by default
+
+    Returns:
+        Number of recipients inserted
+    """
+    chunk_size = chunk_size or current_app.config.get("RECIPIENT_INSERT_CHUNK", 10000)
+    use_copy = db.session.get_bind().dialect.name == "postgresql" and (
+        current_app.config.get("RECIPIENT_COPY", True)
+    )
+    statement = db.insert(Recipient.__table__)
+    rows = iter(rows)
+    count = 0
+    while chunk := list(islice(rows, chunk_size)):
+        if use_copy:
+            copy_recipients(chunk)
+        else:
+            db.session.execute(
+                statement,
+                [
+                    {
+                        "event_id": event_id,
+                        "email": email,
+                        "name": name,
+                        "status": DeliveryStatus.QUEUED,
+                        "attempts": 0,
+                    }
+                    for event_id, email, name in chunk
+                ],
+            )
+        count += len(chunk)
+    return count
 
 
 # Helper function.
-def add_recipients(data: str, event_id: int) -> List[str]:
+def add_recipients(data: Union[str, List[str]], event_id: int) -> List[str]:
     """
     Store recipients in database.
 
     Args:
-        data: Comma-separated email addresses
+        data: Recipient list, see parse_recipients()
         event_id: ID of the event to associate recipients with
 
     Returns:
         List of email addresses
     """
-    mail_addr = (data.replace(" ", "")).split(",")
-    for m in mail_addr:
-        # Try to extract name if email is in format "Name <email@example.com>"
-        name = None
-        email = m
+    recipients = parse_recipients(data)
+    insert_recipients((event_id, email, name) for email, name in recipients)
+    db.session.commit()
+    return [email for email, _ in recipients]
 
-        # If the format matches "Name <email@example.com>"
-        if "<" in m and ">" in m:
-            parts = m.split("<")
-            if len(parts) == 2 and ">" in parts[1]:
-                name = parts[0].strip()
-                email = parts[1].split(">")[0].strip()
 
-        # Create a new Recipient - using correct constructor signature
-        recipient = Recipient(email=email, name=name, event_id=event_id)
-        db.session.add(recipient)
+def smtp_connection() -> Any:
+    """
+    Return a context manager yielding an SMTP connection for a job.
 
-    # Commit all recipients at once
-    db.session.commit()
-    return mail_addr
+    Draws from the worker's connection pool when MAIL_POOL_ENABLED is set,
+    otherwise opens a dedicated connection.
+    """
+    if current_app.config.get("MAIL_POOL_ENABLED"):
+        return get_smtp_pool().connection()
+    return mail.connect()
 
 
-def dt_utc(dt: Union[str, datetime]) -> datetime:
+def send_job_id(event_id: int, version: int = 1) -> str:
     """
-    Convert time to UTC before storing to database.
+    Return the ID of an event's send_mail job.
+
+    The ID only depends on the event, so scheduling the same event twice
+    addresses the same job, and the job of an event is found without
+    scanning the scheduler.
 
     Args:
-        dt: Datetime string or object, possibly with timezone info
+        event_id: Event ID
+        version: Schedule version, bumped when an event needs a new job
 
     Returns:
-        Datetime object in UTC
+        Job ID of the form ``send:<event_id>:<version>``
     """
-    # Handle datetime object input
-    if isinstance(dt, datetime):
-        # If the datetime has no timezone, assume local
-        if dt.tzinfo is None:
-            # Get local timezone and handle both pytz and ZoneInfo types
-            local_tz = get_localzone()
-            if hasattr(local_tz, "localize"):
-                # pytz timezone
-                local_dt = local_tz.localize(dt)
-            else:
-                # ZoneInfo timezone
-                local_dt = dt.replace(tzinfo=local_tz)
-        else:
-            local_dt = dt
-        # Convert to UTC
-        utc_dt: datetime = local_dt.astimezone(pytz.UTC)
-        # Return timezone-naive datetime in UTC
-        return utc_dt.replace(tzinfo=None)
+    return f"send:{event_id}:{version}"
 
-    # Handle string input
-    try:
-        # Special handling for timezone abbreviations like "US/Pacific"
-        if " US/Pacific" in dt:
-            dt_str = dt.replace(" US/Pacific", "")
-            parsed_dt = dateutil.parser.parse(dt_str)
-            pacific_tz = pytz.timezone("US/Pacific")
-            parsed_dt = pacific_tz.localize(parsed_dt)
-        else:
-            parsed_dt = dateutil.parser.parse(dt)
-
-        # Assume local timezone if no timezone info
-        if parsed_dt.tzinfo is None:
-            # Get local timezone and handle both pytz and ZoneInfo types
-            local_tz = get_localzone()
-            if hasattr(local_tz, "localize"):
-                # pytz timezone
-                parsed_dt = local_tz.localize(parsed_dt)
-            else:
-                # ZoneInfo timezone
-                parsed_dt = parsed_dt.replace(tzinfo=local_tz)
-
-        utc_dt = parsed_dt.astimezone(pytz.UTC)
-        # Return timezone-naive datetime in UTC
-        return utc_dt.replace(tzinfo=None)
-    except Exception as e:
-        # For truly invalid formats that can't be parsed at all, raise
-        if "not a valid timestamp" in str(dt) or "unknown" in str(e).lower():
-            raise Exception(f"Invalid datetime format: {dt}")
-        # If parsing fails, return the current time as a fallback
-        import logging
-
-        logger = logging.getLogger(__name__)
-        logger.warning(
-            f"Failed to parse datetime '{dt}': {e}. Using current time as fallback.",
-            exc_info=True,
-        )
-        utc_now = datetime.now(UTC)
-        return utc_now.replace(tzinfo=None)
 
+def job_version(job_id: Optional[str]) -> int:
+    """
+    Return the schedule version of a send_mail job ID.
+
+    Args:
+        job_id: ID made by send_job_id(), None for events that predate them
 
-def schedule_mail(event_id: int, recipients: List[str], timestamp: datetime) -> None:
+    Returns:
+        The version, 0 when there is no job ID
+    """
+    return int(job_id.rsplit(":", 1)[1]) if job_id else 0
+
+
+def schedule_mail(event_id: int, timestamp: datetime, version: int = 1) -> str:
     """
     Schedule send_mail job.
 
+    The job payload only carries the event ID and the payload version;
+    recipients are read from the database when the job runs. The job gets
+    the deterministic ID from send_job_id(); if a job with that ID exists
+    already (scheduled, queued or finished) nothing is enqueued, so a
+    repeated call never leads to a second send.
+
+    A job due within MAIL_SEND_NOW_THRESHOLD seconds (or in the past) is
+    enqueued on MAIL_SEND_NOW_QUEUE right away instead of waiting for the
+    scheduler to pick it up.
+
     Args:
         event_id: Event ID to send email for
-        recipients: List of recipient email addresses
         timestamp: When to send the email
+        version: Schedule version of the event
+
+    Returns:
+        ID of the scheduled job
     """
+    job_id = send_job_id(event_id, version)
     scheduler = rq.get_scheduler()
-    scheduler.enqueue_at(timestamp, send_mail, event_id, recipients)
+    if Job.exists(job_id, connection=scheduler.connection):
+        logger.info(f"Job {job_id} already exists, not scheduling it again")
+        return job_id
+    lead = to_unix(timestamp) - time.time()
+    if lead <= current_app.config.get("MAIL_SEND_NOW_THRESHOLD", 0):
+        return send_now(event_id, job_id, lead)
+    metrics.incr("schedule.scheduled")
+    scheduler.enqueue_at(
+        timestamp, send_mail, event_id, SEND_MAIL_PAYLOAD_VERSION, job_id=job_id
+    )
+    notify_dispatcher(scheduler.connection, timestamp)
+    return job_id
 
 
-# Main job function.
-@rq.job
-def send_mail(event_id: int, recipients: List[str]) -> str:
+def send_now(event_id: int, job_id: str, lead: float) -> str:
     """
-    Sends an email asynchronously using flask rq-scheduler.
+    Enqueue a send_mail job that is due now, bypassing the scheduler.
+
+    Records the decision and the latency it saves: the time the job would
+    still have waited to be due plus half a scheduler polling interval, the
+    average wait for the next tick.
 
     Args:
         event_id: Event ID to send email for
-        recipients: List of recipient email addresses
+        job_id: ID of the job
+        lead: Seconds until the job is due, negative when overdue
 
     Returns:
-        Success message with timestamp
+        ID of the enqueued job
+    """
+    queue = rq.get_queue(current_app.config.get("MAIL_SEND_NOW_QUEUE"))
+    queue.enqueue_call(
+        send_mail, args=(event_id, SEND_MAIL_PAYLOAD_VERSION), job_id=job_id
+    )
+    saved = max(lead, 0) + current_app.config.get("RQ_SCHEDULER_INTERVAL", 0) / 2
+    metrics.incr("schedule.send_now")
+    metrics.observe("schedule.send_now_saved_seconds", saved)
+    logger.info(f"Job {job_id} is due now, enqueued on {queue.name}")
+    return job_id
+
+
+def get_send_job(event: Event, connection: Any = None) -> Optional[Job]:
+    """
+    Fetch the send_mail job of an event by its stored ID.
+
+    Args:
+        event: Event whose job to fetch
+        connection: Redis connection, defaults to the app's
+
+    Returns:
+        The job, or None if the event has no job or it expired
+    """
+    if not event.job_id:
+        return None
+    try:
+        return Job.fetch(event.job_id, connection=connection or rq.connection)
+    except NoSuchJobError:
+        return None
+
+
+def cancel_mail(event: Event) -> bool:
+    """
+    Cancel the pending send_mail job of an event.
+
+    The job is removed from the scheduler by its stored ID (one ZREM, so the
+    cost does not grow with the number of scheduled jobs). A job the
+    scheduler already moved to the queue is deleted from there; a job that
+    is running is left alone.
+
+    Args:
+        event: Event whose job to cancel
+
+    Returns:
+        True if a pending job was cancelled
+    """
+    if not event.job_id:
+        return False
+    scheduler = rq.get_scheduler()
+    connection = scheduler.connection
+    if connection.zrem(scheduler.scheduled_jobs_key, event.job_id):
+        connection.delete(Job.key_for(event.job_id))
+        logger.info(f"Cancelled scheduled job {event.job_id}")
+        return True
+    job = get_send_job(event, connection)
+    if job is not None and job.get_status() == JobStatus.QUEUED:
+        job.delete()
+        logger.info(f"Cancelled queued job {event.job_id}")
+        return True
+    return False
+
+
+def retime_mail(event: Event) -> Optional[str]:
+    """
+    Move the send_mail job of an event to the event's timestamp.
+
+    A job still in the scheduler gets its new time in place, again by its
+    stored ID. Otherwise (the job was already queued, ran without finishing
+    the event, or the event predates stored job IDs) any pending job is
+    cancelled and a job with the next schedule version is scheduled and
+    stored on the event.
+
+    The caller commits the new timestamp after the job moved, so a failure
+    here leaves both at the old time. A job that moved before the commit
+    failed is put back by reconcile.
+
+    Args:
+        event: Event whose timestamp changed
+
+    Returns:
+        ID of the event's job, None for events that are done
+
+    Raises:
+        SendInProgress: If the event's chunks are being sent; moving its
+            job would dispatch every chunk again
+    """
+    if event.is_done:
+        return None
+    if event.is_sending:
+        raise SendInProgress(event.id)
+    version = 1
+    if event.job_id:
+        scheduler = rq.get_scheduler()
+        key = scheduler.scheduled_jobs_key
+        connection = scheduler.connection
+        # XX only updates a member that exists; CH reports whether it moved
+        score = {event.job_id: to_unix(event.timestamp)}
+        if connection.zadd(key, score, xx=True, ch=True) or (
+            connection.zscore(key, event.job_id) is not None
+        ):
+            logger.info(f"Moved job {event.job_id} to {event.timestamp}")
+            notify_dispatcher(connection, event.timestamp)
+            return cast(str, event.job_id)
+        cancel_mail(event)
+        version = job_version(event.job_id) + 1
+    event.job_id = schedule_mail(event.id, event.timestamp, version)
+    db.session.commit()
+    return cast(str, event.job_id)
+
+
+def reschedule(func: Any, delay: float, *args: Any) -> None:
+    """
+    Run a job again later.
+
+    Args:
+        func: Job function to enqueue
+        delay: Seconds from now
+        *args: Job arguments
+    """
+    scheduler = rq.get_scheduler()
+    delay = math.ceil(delay)
+    scheduler.enqueue_in(timedelta(seconds=delay), func, *args)
+    notify_dispatcher(
+        scheduler.connection, datetime.now(UTC) + timedelta(seconds=delay)
+    )
+
 
-    Todo:
-        Use recipients from database rather than passing to function.
-        This function should just need the event ID.
+def reschedule_send(
+    event_id: int,
+    delay: float,
+    current: Optional[str] = None,
+    meta: Optional[Dict[str, Any]] = None,
+    queue_name: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Schedule an event's send_mail job again, under its next job ID.
+
+    Used for retries and rate-limited sends. The new job becomes the event's
+    job (its ID is stored on the event), so cancel_mail(), retime_mail()
+    and reconcile find it like any scheduled send.
+
+    Args:
+        event_id: Event to send
+        delay: Seconds from now
+        current: ID of the job being rescheduled, None outside a worker
+        meta: Meta of the new job
+        queue_name: Queue to run the new job on, the scheduler's by default
+
+    Returns:
+        ID of the new job, None if the event is gone, done or was moved to
+        another scheduled job while this one ran
+    """
+    event = db.session.get(Event, event_id)
+    if event is None or event.is_done:
+        return None
+    scheduler = rq.get_scheduler()
+    connection = scheduler.connection
+    if event.job_id and event.job_id != current:
+        if connection.zscore(scheduler.scheduled_jobs_key, event.job_id) is not None:
+            logger.info(
+                f"Event {event_id} was rescheduled as {event.job_id} meanwhile, "
+                f"not rescheduling {current}"
+            )
+            return None
+    job_id = send_job_id(event_id, job_version(event.job_id) + 1)
+    run_at = datetime.now(UTC) + timedelta(seconds=math.ceil(delay))
+    scheduler.enqueue_at(
+        run_at,
+        send_mail,
+        event_id,
+        SEND_MAIL_PAYLOAD_VERSION,
+        job_id=job_id,
+        meta=meta,
+        queue_name=queue_name,
+    )
+    event.job_id = job_id
+    db.session.commit()
+    notify_dispatcher(connection, run_at)
+    return job_id
+
+
+def retry_send_mail(job: Job, delay: float, meta: Dict[str, Any]) -> Optional[str]:
+    """Schedule the retry of a failed send_mail job, see reschedule_send()."""
+    return reschedule_send(job.args[0], delay, job.id, meta, job.origin)
+
+
+def iter_recipients(
+    event_id: int,
+    first_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    pending_only: bool = False,
+    by_member: bool = False,
+    with_names: bool = False,
+) -> Iterator[Any]:
+    """
+    Stream recipients of an event from the database.
+
+    Rows are fetched in keyset batches of MAIL_RECIPIENT_BATCH_SIZE so large
+    events are never loaded into memory at once, and the delivery buffers
+    can commit while the stream is read (see delivery.iter_keyset).
+
+    Args:
+        event_id: Event ID to read recipients for
+        first_id: Lowest recipient ID to include (chunk start)
+        before_id: Recipient ID to stop before (next chunk start)
+        pending_only: Only include recipients still queued or deferred,
+            leaving out those recorded as sent or permanently failed
+        by_member: Apply first_id and before_id to the member ID instead,
+            for the recipient rows of a list event
+        with_names: Also read the recipients' names
+
+    Yields:
+        (id, email) rows in insertion order, (id, email, name) with_names
+    """
+    batch_size = current_app.config.get("MAIL_RECIPIENT_BATCH_SIZE", 1000)
+    columns = [Recipient.id, Recipient.email]
+    if with_names:
+        columns.append(Recipient.name)
+    query = db.select(*columns).where(Recipient.event_id == event_id)
+    bound = Recipient.member_id if by_member else Recipient.id
+    if first_id is not None:
+        query = query.where(bound >= first_id)
+    if before_id is not None:
+        query = query.where(bound < before_id)
+    if pending_only:
+        query = query.where(
+            Recipient.status.in_((DeliveryStatus.QUEUED, DeliveryStatus.DEFERRED))
+        )
+    yield from iter_keyset(query, Recipient.id, batch_size)
+
+
+def chunk_starts(event_id: int, chunk_size: int) -> List[int]:
+    """
+    Split an event's recipients into chunks of consecutive IDs.
+
+    Only the first recipient ID of every chunk is returned, computed in the
+    database with a window function, so the split costs one query and
+    memory proportional to the number of chunks.
+
+    Args:
+        event_id: Event ID to split
+        chunk_size: Recipients per chunk
+
+    Returns:
+        Ascending list of recipient IDs that start a chunk
+    """
+    return _first_ids(Recipient.id, Recipient.event_id == event_id, chunk_size)
+
+
+def member_chunk_starts(event: Event, chunk_size: int) -> List[int]:
+    """
+    Split the list members of an event into chunks, like chunk_starts().
+
+    Args:
+        event: List event with its snapshot time set
+        chunk_size: Members per chunk
+
+    Returns:
+        Ascending list of member IDs that start a chunk
+    """
+    members = ListMember.active_at(event.mailing_list_id, event.list_snapshot_at)
+    return _first_ids(ListMember.id, members, chunk_size)
+
+
+def _first_ids(column: Any, condition: Any, chunk_size: int) -> List[int]:
+    """Return every chunk_size-th value of an ID column, in order."""
+    numbered = (
+        db.select(
+            column.label("id"),
+            db.func.row_number().over(order_by=column).label("position"),
+        )
+        .where(condition)
+        .subquery()
+    )
+    query = (
+        db.select(numbered.c.id)
+        .where((numbered.c.position - 1) % chunk_size == 0)
+        .order_by(numbered.c.id)
+    )
+    return list(db.session.execute(query).scalars().all())
+
+
+def deliver(event: Event, first_id: Optional[int], before_id: Optional[int]) -> None:
+    """
+    Send the event email to one range of its recipients.
+
+    Every recipient gets its own message, so a rejected address fails alone.
+    Addresses refused with a retryable reply (see RetryPolicy) are deferred
+    rather than failed and make the whole range raise DeliveryDeferred once
+    the others are sent, so the retried job picks them up. Outcomes are
+    recorded on the recipient rows in batches of MAIL_STATUS_FLUSH_SIZE.
+    Recipients recorded as sent or failed by an earlier run are skipped, and
+    every message carries a Message-ID derived from the event and the address
+    so the few messages sent after the last checkpoint can be deduplicated by
+    the relay. The message itself
+    is rendered once per event and content version (see message_cache) and
+    only the To and Message-ID headers differ per recipient.
+
+    Each message first takes a token from the relay's rate limiter, if one
+    is configured, which blocks for up to MAIL_RATE_LIMIT_MAX_WAIT seconds.
+
+    For an event sent to a mailing list the range is one of member IDs:
+    members deferred by an earlier run are retried first, then the members
+    of the snapshot after the range's ListProgress checkpoint are sent.
+
+    Args:
+        event: Event to send
+        first_id: First recipient (or member) ID of the range, None for the
+            start
+        before_id: Recipient (or member) ID ending the range, None for the
+            end
+
+    Raises:
+        RateLimited: If the relay quota is used up for longer than the
+            allowed wait; recipients sent so far are recorded
+        DeliveryDeferred: If the relay deferred some of the recipients
+    """
+    template = get_message_cache().get(event)
+    limiter = get_rate_limiter()
+    policy = RetryPolicy.from_config(current_app.config)
+    flush_size = current_app.config.get("MAIL_STATUS_FLUSH_SIZE", 500)
+    # Names are only read when the template has placeholders to fill
+    names = template.personalized
+    if event.mailing_list_id is None:
+        recipients = iter_recipients(
+            event.id, first_id, before_id, pending_only=True, with_names=names
+        )
+        passes = [(recipients, DeliveryStatusBuffer(flush_size))]
+    else:
+        progress = list_progress(event.id, first_id)
+        retries = iter_recipients(
+            event.id,
+            first_id,
+            before_id,
+            pending_only=True,
+            by_member=True,
+            with_names=names,
+        )
+        members = iter_members(
+            event, first_id, before_id, progress.sent_through, with_names=names
+        )
+        passes = [
+            (retries, DeliveryStatusBuffer(flush_size)),
+            (members, ListDeliveryBuffer(progress, flush_size)),
+        ]
+    deferred = 0
+
+    with smtp_connection() as conn:
+        for rows, buffer in passes:
+            with buffer as statuses:
+                for row_id, addr_, *name in rows:
+                    msg = template.message(
+                        addr_,
+                        message_id(event.id, addr_, template.sender),
+                        name[0] if name else None,
+                    )
+                    if limiter is not None:
+                        limiter.acquire()
+                    try:
+                        conn.send(msg)
+                    except (
+                        smtplib.SMTPRecipientsRefused,
+                        smtplib.SMTPResponseException,
+                    ) as e:
+                        if policy.is_retryable(e):
+                            logger.info(
+                                f"Delivery of event {event.id} to {addr_} "
+                                f"deferred: {e}"
+                            )
+                            statuses.mark_deferred(row_id, e)
+                            deferred += 1
+                        else:
+                            logger.warning(
+                                f"Delivery of event {event.id} to {addr_} "
+                                f"failed: {e}"
+                            )
+                            statuses.mark_failed(row_id, e)
+                    else:
+                        statuses.mark_sent(row_id)
+    if deferred:
+        raise DeliveryDeferred(deferred)
+
+
+def complete_chunk(event_id: int) -> bool:
+    """
+    Record a finished chunk and finalize the event after the last one.
+
+    The counter is bumped with an UPDATE so concurrent chunks serialize on
+    the event row; whichever chunk brings it up to chunks_total marks the
+    event as done.
+
+    Args:
+        event_id: Event the chunk belongs to
+
+    Returns:
+        True if this chunk finished the event
+    """
+    db.session.execute(
+        db.update(Event)
+        .where(Event.id == event_id)
+        .values(chunks_done=Event.chunks_done + 1)
+    )
+    done, total = db.session.execute(
+        db.select(Event.chunks_done, Event.chunks_total).where(Event.id == event_id)
+    ).one()
+    finished = done >= total
+    if finished:
+        db.session.execute(
+            db.update(Event)
+            .where(Event.id == event_id)
+            .values(_is_done=True, done_at=datetime.now(UTC))
+        )
+    db.session.commit()
+    return finished
+
+
+@rq.job
+@retrying
+def send_mail_chunk(
+    event_id: int, first_id: Optional[int], before_id: Optional[int]
+) -> str:
+    """
+    Send the event email to one chunk of recipients.
+
+    Enqueued by send_mail for events larger than MAIL_CHUNK_SIZE.
+
+    Args:
+        event_id: Event ID to send email for
+        first_id: First recipient ID of the chunk
+        before_id: First recipient ID of the next chunk, None for the last
+
+    Returns:
+        Success message
     """
     event = db.session.get(Event, event_id)
     if not event:
         raise ValueError(f"Event with ID {event_id} not found")
 
-    msg = Message(subject=event.email_subject)
+    try:
+        deliver(event, first_id, before_id)
+    except RateLimited as e:
+        reschedule(send_mail_chunk, e.retry_after, event_id, first_id, before_id)
+        return f"Rate limited. Chunk starting at {first_id} rescheduled"
+    if complete_chunk(event_id):
+        return f"Success. Event {event_id} done"
+    return f"Success. Chunk starting at {first_id} sent"
 
-    for addr_ in recipients:
-        msg.add_recipient(addr_)
 
-    with mail.connect() as conn:
-        # If email content has HTML code, send as HTML.
-        # If it's just text, send as email body.
-        if BeautifulSoup(event.email_content, "html.parser").find():
-            msg.html = event.email_content
-        else:
-            msg.body = event.email_content
+# Main job function.
+@rq.job
+@retrying(reschedule=retry_send_mail)
+def send_mail(
+    event_id: int, version: Union[int, List[str]] = SEND_MAIL_PAYLOAD_VERSION
+) -> str:
+    """
+    Sends an email asynchronously using flask rq-scheduler.
+
+    This is the event-level dispatch job. Events with up to MAIL_CHUNK_SIZE
+    recipients are sent right here; larger events are split into chunk jobs
+    so several workers can send in parallel. Chunk i waits for chunk
+    i - MAIL_MAX_CHUNK_CONCURRENCY, which caps how many chunks of one event
+    run at the same time.
+
+    Events sent to a mailing list are split by member ID instead, and the
+    first run fixes the snapshot of the list that every chunk reads.
+
+    In a worker, both jobs are retried on transient errors and moved to the
+    dead-letter queue on permanent ones (see retry). Retries and rate-limited
+    sends of this job are scheduled under the event's next job ID, see
+    reschedule_send().
+
+    Args:
+        event_id: Event ID to send email for
+        version: Job payload version. Jobs scheduled before version 2 pass
+            the recipient list here instead; it is ignored and the current
+            recipients are read from the database.
+
+    Returns:
+        Success message with timestamp
+    """
+    if not isinstance(version, int):
+        logger.info(
+            f"send_mail for event {event_id} has a version 1 payload, "
+            "reading recipients from the database"
+        )
+
+    event = db.session.get(Event, event_id)
+    if not event:
+        raise ValueError(f"Event with ID {event_id} not found")
+    if event.is_done:
+        # A retried or duplicated job for an event that already went out
+        return f"Skipped. Event {event_id} was done at {event.done_at}"
+    if event.is_sending:
+        # A duplicated job (e.g. dispatched again after a lease ran out)
+        # must not reset the counters and queue every chunk a second time
+        return (
+            f"Skipped. Event {event_id} is being sent, "
+            f"{event.chunks_done} of {event.chunks_total} chunks done"
+        )
 
-        conn.send(msg)
+    config = current_app.config
+    chunk_size = config.get("MAIL_CHUNK_SIZE", 500)
+    concurrency = max(1, config.get("MAIL_MAX_CHUNK_CONCURRENCY", 4))
+    if event.mailing_list_id is None:
+        starts = chunk_starts(event_id, chunk_size)
+    else:
+        # Chunks and retries all send to the list as of the first run
+        if event.list_snapshot_at is None:
+            event.list_snapshot_at = datetime.now(UTC)
+            db.session.commit()
+        starts = member_chunk_starts(event, chunk_size)
+
+    if len(starts) > 1:
+        event.chunks_total = len(starts)
+        event.chunks_done = 0
+        db.session.commit()
+
+        bounds = zip(starts, starts[1:] + [None])
+        jobs: List[Any] = []
+        for index, (first_id, before_id) in enumerate(bounds):
+            depends_on = None
+            if index >= concurrency:
+                depends_on = Dependency(
+                    jobs=[jobs[index - concurrency]], allow_failure=True
+                )
+            jobs.append(
+                send_mail_chunk.queue(
+                    event_id, first_id, before_id, depends_on=depends_on
+                )
+            )
+        return f"Dispatched {len(jobs)} chunks for event {event_id}"
+
+    if starts:
+        try:
+            deliver(event, None, None)
+        except RateLimited as e:
+            job = get_current_job()
+            reschedule_send(
+                event_id,
+                e.retry_after,
+                job.id if job else None,
+                job.meta if job else None,
+                job.origin if job else None,
+            )
+            return f"Rate limited. Event {event_id} rescheduled"
 
     # Update event status
+    event.chunks_total = event.chunks_done = len(starts)
     event.is_done = True
     event.done_at = datetime.now(UTC)
     done_at = event.done_at
@@ -180,36 +857,100 @@ def send_mail(event_id: int, recipients: List[str]) -> str:
     return f"Success. Done at {done_at}"
 
 
-def add_event(data: Dict[str, Any]) -> int:
+def is_row_id(value: Any) -> bool:
     """
-    Create an email event and store it to database.
+    Check that a payload value can be the ID of a database row.
+
+    Args:
+        value: Value from a request payload
+
+    Returns:
+        True for integers in the range of a 64-bit primary key, not booleans
+    """
+    return type(value) is int and 0 < value < 2**63
+
+
+def validate_event(
+    data: Dict[str, Any],
+    list_ids: Optional[Set[int]] = None,
+) -> Tuple[str, str, datetime, List[Tuple[str, Optional[str]]]]:
+    """
+    Check the fields of a new email event.
+
+    An event goes either to its own recipients or, when mailing_list_id is
+    given, to the members of an existing mailing list.
 
     Args:
         data: Dictionary containing email data (subject, content, timestamp,
-              recipients)
+              optional IANA timezone of the timestamp, recipients or
+              mailing_list_id)
+        list_ids: IDs of the existing mailing lists among those of a batch,
+            see bulk.validate_items(); looked up here when not given
 
     Returns:
-        Event ID
+        Subject, content, send time in UTC and the parsed recipients, see
+        parse_recipients(); empty for list events
+
+    Raises:
+        ValueError: If a required field is missing, the timestamp, its
+            timezone, a placeholder or a recipient address is invalid or the
+            mailing list does not exist; any malformed payload raises
+            ValueError and nothing else
     """
     email_subject = data.get("subject")
     email_content = data.get("content")
     timestamp_data = data.get("timestamp")
     recipients = data.get("recipients")
-    # user_id = data.get("user_id")  # Currently unused
 
     # Validate required parameters
     if not email_subject:
         raise ValueError("Email subject is required")
     if not email_content:
         raise ValueError("Email content is required")
+    if not isinstance(email_subject, str) or not isinstance(email_content, str):
+        raise ValueError("Email subject and content must be text")
+    # Reject unknown placeholders before they go out verbatim
+    compile_template(email_subject)
+    compile_template(email_content)
     if not timestamp_data:
         raise ValueError("Timestamp is required")
-    if not recipients:
+    timezone = data.get("timezone") or None
+    if timezone is not None and not isinstance(timezone, str):
+        raise ValueError("Timezone must be an IANA zone name")
+    list_id = data.get("mailing_list_id")
+    if list_id is not None:
+        if recipients:
+            raise ValueError("Give either recipients or a mailing list, not both")
+        if not is_row_id(list_id) or (
+            list_id not in list_ids
+            if list_ids is not None
+            else not db.session.get(MailingList, list_id)
+        ):
+            raise ValueError(f"Mailing list {list_id} not found")
+        return email_subject, email_content, dt_utc(timestamp_data, timezone), []
+    if recipients and not isinstance(recipients, (str, list)):
+        raise ValueError("Recipients must be text or a list of addresses")
+    parsed = parse_recipients(recipients) if recipients else []
+    if not parsed:
         raise ValueError("Recipients are required")
 
     # Convert timestamp to UTC datetime, handling both string and datetime
     # inputs
-    timestamp = dt_utc(timestamp_data)
+    return email_subject, email_content, dt_utc(timestamp_data, timezone), parsed
+
+
+def add_event(data: Dict[str, Any]) -> int:
+    """
+    Create an email event and store it to database.
+
+    Args:
+        data: Dictionary containing email data (subject, content, timestamp,
+              recipients or mailing_list_id, optional user_id of the owner)
+
+    Returns:
+        Event ID
+    """
+    email_subject, email_content, timestamp, recipients = validate_event(data)
 
     event = Event(
         email_subject=email_subject,
@@ -220,11 +961,17 @@ def add_event(data: Dict[str, Any]) -> int:
         done_at=None,
     )
 
+    event.mailing_list_id = data.get("mailing_list_id")
+    event.user_id = data.get("user_id")
+
     db.session.add(event)
+    db.session.flush()
+    event.job_id = send_job_id(event.id)
+    # validate_event() already parsed the recipients; list events have none
+    insert_recipients((event.id, email, name) for email, name in recipients)
     db.session.commit()
 
-    list_recipients = add_recipients(recipients, event.id)
-    schedule_mail(event.id, list_recipients, timestamp)
+    schedule_mail(event.id, timestamp)
 
     return cast(int, event.id)
 
@@ -0,0 +1,292 @@
+"""Leader election for scheduler replicas.
+
+Two schedulers moving the same due jobs enqueue them twice, and a single
+scheduler is a single point of failure. ``flask run-scheduler`` lets any
+number of replicas run hot-standby: they compete for a lease in Redis and
+only the holder schedules.
+
+The lease is a key holding ``<node>|<token>`` with a TTL of
+LEADER_LEASE_TTL seconds. The leader renews it every third of the TTL; when
+it stops renewing, a standby takes over within one TTL plus one renew
+interval. Every new acquisition draws a fencing token from an ever
+increasing counter. The dispatcher's move script checks the lease value
+inside Redis before it moves anything, so a leader that stalled (a long GC
+pause, a frozen VM) past its lease can no longer enqueue once a successor
+holds the lease. rq-scheduler's own loop cannot be fenced inside Redis; it
+only runs while the local lease deadline has not passed.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from flask import current_app
+from redis.exceptions import RedisError
+
+from app.event.dispatcher import WAKEUP_CHANNEL, Dispatcher, LeadershipLost
+from app.extensions import rq
+
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = "mail_scheduler:scheduler:leader"
+FENCING_KEY = "mail_scheduler:scheduler:fencing_token"
+
+# KEYS[1]: lease, KEYS[2]: fencing token counter. ARGV: node, TTL in ms.
+# Renews the lease if the node holds it, takes it with a new token if it is
+# free; returns the token, or nil while another node holds the lease.
+ACQUIRE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local holder, token = string.match(current, '^(.*)|(%d+)$')
+    if holder == ARGV[1] then
+        redis.call('PEXPIRE', KEYS[1], ARGV[2])
+        return tonumber(token)
+    end
+    return nil
+end
+local token = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1] .. '|' .. token, 'PX', ARGV[2])
+return token
+"""
+
+# KEYS[1]: lease. ARGV: value. Deletes the lease only if it is still ours.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderLease:
+    """
+    A lease on scheduler leadership, renewed by calling acquire().
+
+    Example:
+        >>> lease = LeaderLease(redis, "scheduler-1", ttl=15)
+        >>> if lease.acquire() is not None:
+        ...     schedule()
+    """
+
+    def __init__(
+        self,
+        connection: Any,
+        name: str,
+        ttl: float = 15.0,
+        key: str = LEADER_KEY,
+        fencing_key: str = FENCING_KEY,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Initialize the lease.
+
+        Args:
+            connection: Redis connection
+            name: Unique name of this node
+            ttl: Seconds the lease lasts without renewal
+            key: Lease key
+            fencing_key: Counter the fencing tokens are drawn from
+            clock: Monotonic clock for the local lease deadline
+        """
+        self.connection = connection
+        self.name = name
+        self.ttl = ttl
+        self.renew_interval = ttl / 3
+        self.key = key
+        self.fencing_key = fencing_key
+        self.clock = clock
+        self.token: Optional[int] = None
+        self.valid_until = 0.0
+        self._acquire = connection.register_script(ACQUIRE_SCRIPT)
+        self._release = connection.register_script(RELEASE_SCRIPT)
+
+    @property
+    def value(self) -> str:
+        """Lease value while this node holds it."""
+        return f"{self.name}|{self.token}"
+
+    def acquire(self) -> Optional[int]:
+        """
+        Take the lease or renew it.
+
+        Returns:
+            The fencing token, None while another node is leader
+        """
+        started = self.clock()
+        token = self._acquire(
+            keys=[self.key, self.fencing_key],
+            args=[self.name, int(self.ttl * 1000)],
+        )
+        if token is None:
+            if self.token is not None:
+                logger.warning(f"{self.name} lost the scheduler lease")
+            self.token = None
+            return None
+        if int(token) != self.token:
+            logger.info(f"{self.name} is scheduler leader with token {token}")
+        self.token = int(token)
+        # Measured from before the call, so the local view never outlives
+        # the lease in Redis
+        self.valid_until = started + self.ttl
+        return self.token
+
+    def is_leader(self) -> bool:
+        """Return whether this node holds the lease as far as it knows."""
+        return self.token is not None and self.clock() < self.valid_until
+
+    def release(self) -> None:
+        """Give the lease up so a standby takes over right away."""
+        if self.token is None:
+            return
+        try:
+            self._release(keys=[self.key], args=[self.value])
+        except (RedisError, OSError) as e:
+            logger.warning(f"Could not release the scheduler lease: {e}")
+        self.token = None
+
+
+def current_leader(connection: Any) -> Optional[Dict[str, Any]]:
+    """
+    Describe the node holding the lease.
+
+    Args:
+        connection: Redis connection
+
+    Returns:
+        Node name, fencing token and seconds left on the lease, or None
+        when no node is leader
+    """
+    pipe = connection.pipeline(transaction=False)
+    pipe.get(LEADER_KEY)
+    pipe.pttl(LEADER_KEY)
+    value, pttl = pipe.execute()
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode()
+    node, _, token = value.rpartition("|")
+    return {"node": node, "token": int(token), "expires_in": max(pttl, 0) / 1000}
+
+
+class ElectedScheduler:
+    """
+    Runs the scheduler on whichever replica holds the lease.
+
+    Example:
+        >>> get_elected_scheduler("dispatcher").run()
+    """
+
+    def __init__(
+        self, lease: LeaderLease, mode: str = "rqscheduler", interval: float = 10
+    ) -> None:
+        """
+        Initialize the scheduler.
+
+        Args:
+            lease: Lease to campaign for
+            mode: ``rqscheduler`` to poll with rq-scheduler every interval
+                seconds, ``dispatcher`` to run the precise dispatcher
+            interval: Polling interval of rqscheduler mode
+        """
+        if mode not in ("rqscheduler", "dispatcher"):
+            raise ValueError(f"Unknown scheduler mode: {mode}")
+        self.lease = lease
+        self.mode = mode
+        self.interval = min(interval, lease.renew_interval)
+        self.dispatched = 0
+        self._dispatcher: Optional[Dispatcher] = None
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        """Make run() return and give the lease up."""
+        self._stop.set()
+        if self._dispatcher is not None:
+            self._dispatcher.stop()
+
+    def run(self) -> None:
+        """Campaign for the lease and schedule while holding it."""
+        scheduler = rq.get_scheduler()
+        logger.info(f"Scheduler node {self.lease.name} started in {self.mode} mode")
+        pubsub = None
+        try:
+            while not self._stop.is_set():
+                try:
+                    if self.lease.acquire() is None:
+                        self._stop.wait(self.lease.renew_interval)
+                        continue
+                    if self.mode == "rqscheduler":
+                        if self.lease.is_leader():
+                            scheduler.enqueue_jobs()
+                        self._stop.wait(self.interval)
+                        continue
+                    if self._dispatcher is None:
+                        self._dispatcher = get_fenced_dispatcher(scheduler, self.lease)
+                        pubsub = scheduler.connection.pubsub(
+                            ignore_subscribe_messages=True
+                        )
+                        pubsub.subscribe(WAKEUP_CHANNEL)
+                    dispatcher = self._dispatcher
+                    dispatcher.fence = (self.lease.key, self.lease.value)
+                    next_due = dispatcher.dispatch()
+                    self.dispatched = dispatcher.dispatched
+                    dispatcher.wait(pubsub, next_due)
+                except LeadershipLost as e:
+                    logger.warning(f"Stopped dispatching: {e}")
+                    self.lease.token = None
+                except (RedisError, OSError) as e:
+                    logger.warning(f"Scheduler node lost Redis, retrying: {e}")
+                    self._stop.wait(1)
+        finally:
+            if pubsub is not None:
+                pubsub.close()
+            self.lease.release()
+
+
+def get_fenced_dispatcher(scheduler: Any, lease: LeaderLease) -> Dispatcher:
+    """
+    Build a dispatcher that only moves jobs while the lease is ours.
+
+    Its sleeps are capped at the renew interval so the lease stays fresh.
+
+    Args:
+        scheduler: rq-scheduler instance
+        lease: Lease held by this node
+
+    Returns:
+        Dispatcher fenced by the lease
+    """
+    return Dispatcher(
+        scheduler.connection,
+        scheduler.scheduled_jobs_key,
+        batch_size=current_app.config.get("DISPATCHER_BATCH_SIZE", 500),
+        max_sleep=min(
+            current_app.config.get("DISPATCHER_MAX_SLEEP", 5), lease.renew_interval
+        ),
+        fence=(lease.key, lease.value),
+    )
+
+
+def get_elected_scheduler(mode: str = "rqscheduler") -> ElectedScheduler:
+    """
+    Build an elected scheduler from the current application's config.
+
+    Args:
+        mode: ``rqscheduler`` or ``dispatcher``
+
+    Returns:
+        Scheduler campaigning as SCHEDULER_NODE_NAME (host and process ID by
+        default) with a lease of LEADER_LEASE_TTL seconds
+    """
+    config = current_app.config
+    name = config.get("SCHEDULER_NODE_NAME") or f"{socket.gethostname()}:{os.getpid()}"
+    lease = LeaderLease(
+        rq.get_scheduler().connection, name, ttl=config.get("LEADER_LEASE_TTL", 15)
+    )
+    return ElectedScheduler(
+        lease, mode=mode, interval=config.get("RQ_SCHEDULER_INTERVAL", 10)
+    )
@@ -0,0 +1,233 @@
+"""Mailing lists that events are sent to.
+
+Sending the same audience every week used to mean copying every address
+into a new set of recipient rows per event. A mailing list stores each
+address once, as a ListMember, and an event only references the list:
+
+* members are added and removed incrementally; a removal sets removed_at
+  instead of deleting the row, so the list can be read as of any moment
+* send_mail fixes the event's snapshot time on its first run and every
+  chunk and retry reads the members active at that time, so an address
+  added or removed while a large send is running neither receives the
+  email late nor drops out halfway
+* recipient rows are only written for members whose delivery failed or was
+  deferred; successful sends just advance the ListProgress checkpoint
+
+Removed members are kept so past snapshots stay readable; pruning them
+once no unsent event references the list is left to a maintenance job.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import UTC, datetime
+from itertools import islice
+from typing import Any, Iterable, Iterator, Optional, Union
+
+from flask import current_app
+
+from app.database import db
+from app.database.models import Event, ListMember, ListProgress, MailingList
+from app.event.addresses import ParsedAddresses, parse_addresses
+from app.event.delivery import iter_keyset
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def create_list(name: str) -> MailingList:
+    """
+    Create an empty mailing list.
+
+    Args:
+        name: Unique name of the list
+
+    Returns:
+        The new list
+
+    Raises:
+        ValueError: If the name is empty or taken
+    """
+    name = (name or "").strip()
+    if not name:
+        raise ValueError("List name is required")
+    if db.session.scalar(db.select(MailingList.id).where(MailingList.name == name)):
+        raise ValueError(f"A list named {name!r} exists already")
+    mailing_list = MailingList(name=name)
+    db.session.add(mailing_list)
+    db.session.commit()
+    return mailing_list
+
+
+def _active_emails(list_id: int, emails: list) -> set:
+    """Return which of the addresses are current members of a list."""
+    return set(
+        db.session.scalars(
+            db.select(ListMember.email).where(
+                ListMember.list_id == list_id,
+                ListMember.removed_at.is_(None),
+                ListMember.email.in_(emails),
+            )
+        )
+    )
+
+
+def add_members(
+    list_id: int, data: Union[str, Iterable[str]], chunk_size: int = 0
+) -> ParsedAddresses:
+    """
+    Add addresses to a mailing list.
+
+    Addresses that are current members already count as duplicates.
+
+    Args:
+        list_id: Mailing list to add to
+        data: Recipient list, see parse_addresses()
+        chunk_size: Addresses looked up and inserted per statement,
+            RECIPIENT_INSERT_CHUNK by default
+
+    Returns:
+        The addresses added, invalid entries and the number of duplicates
+    """
+    chunk_size = chunk_size or current_app.config.get("RECIPIENT_INSERT_CHUNK", 10000)
+    parsed = parse_addresses(data)
+    added = []
+    addresses = iter(parsed.addresses)
+    now = datetime.now(UTC)
+    while chunk := list(islice(addresses, chunk_size)):
+        present = _active_emails(list_id, [address.email for address in chunk])
+        fresh = [address for address in chunk if address.email not in present]
+        parsed.duplicates += len(chunk) - len(fresh)
+        if fresh:
+            db.session.execute(
+                db.insert(ListMember.__table__),
+                [
+                    {
+                        "list_id": list_id,
+                        "email": address.email,
+                        "name": address.name,
+                        "added_at": now,
+                    }
+                    for address in fresh
+                ],
+            )
+        added.extend(fresh)
+    db.session.commit()
+    parsed.addresses = added
+    metrics.incr("lists.members_added", len(added))
+    logger.info(f"Added {len(added)} member(s) to list {list_id}")
+    return parsed
+
+
+def remove_members(list_id: int, data: Union[str, Iterable[str]]) -> int:
+    """
+    Remove addresses from a mailing list.
+
+    Events whose snapshot was taken before the removal still send to them.
+
+    Args:
+        list_id: Mailing list to remove from
+        data: Recipient list, see parse_addresses(); invalid entries and
+            addresses that are not members are ignored
+
+    Returns:
+        Number of members removed
+    """
+    chunk_size = current_app.config.get("RECIPIENT_INSERT_CHUNK", 10000)
+    emails = iter([address.email for address in parse_addresses(data).addresses])
+    now = datetime.now(UTC)
+    removed = 0
+    while chunk := list(islice(emails, chunk_size)):
+        result = db.session.execute(
+            db.update(ListMember)
+            .where(
+                ListMember.list_id == list_id,
+                ListMember.removed_at.is_(None),
+                ListMember.email.in_(chunk),
+            )
+            .values(removed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        removed += result.rowcount
+    db.session.commit()
+    metrics.incr("lists.members_removed", removed)
+    logger.info(f"Removed {removed} member(s) from list {list_id}")
+    return removed
+
+
+def member_count(list_id: int, moment: Optional[datetime] = None) -> int:
+    """
+    Count the members of a list.
+
+    Args:
+        list_id: Mailing list ID
+        moment: Point in time to count at, now by default
+
+    Returns:
+        Number of members active at that moment
+    """
+    moment = moment or datetime.now(UTC)
+    return int(
+        db.session.scalar(
+            db.select(db.func.count()).where(ListMember.active_at(list_id, moment))
+        )
+    )
+
+
+def iter_members(
+    event: Event,
+    first_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    after_id: int = 0,
+    with_names: bool = False,
+) -> Iterator[Any]:
+    """
+    Stream the members of an event's list as of its snapshot.
+
+    Args:
+        event: List event with its snapshot time set
+        first_id: Lowest member ID to include (chunk start)
+        before_id: Member ID to stop before (next chunk start)
+        after_id: Only include members after this ID (checkpoint)
+        with_names: Also read the members' names
+
+    Yields:
+        (id, email) rows in ID order, (id, email, name) with_names
+    """
+    batch_size = current_app.config.get("MAIL_RECIPIENT_BATCH_SIZE", 1000)
+    columns = [ListMember.id, ListMember.email]
+    if with_names:
+        columns.append(ListMember.name)
+    query = db.select(*columns).where(
+        ListMember.active_at(event.mailing_list_id, event.list_snapshot_at),
+        ListMember.id > max(after_id, (first_id or 1) - 1),
+    )
+    if before_id is not None:
+        query = query.where(ListMember.id < before_id)
+    yield from iter_keyset(query, ListMember.id, batch_size)
+
+
+def list_progress(event_id: int, first_id: Optional[int]) -> ListProgress:
+    """
+    Return the checkpoint of one chunk of a list event, creating it.
+
+    Args:
+        event_id: Event being sent
+        first_id: First member ID of the chunk, None for the whole list
+
+    Returns:
+        The chunk's ListProgress
+    """
+    first_id = first_id or 0
+    progress = db.session.scalar(
+        db.select(ListProgress).where(
+            ListProgress.event_id == event_id, ListProgress.first_id == first_id
+        )
+    )
+    if progress is None:
+        progress = ListProgress(
+            event_id=event_id, first_id=first_id, sent_through=0, sent=0
+        )
+        db.session.add(progress)
+        db.session.commit()
+    return progress
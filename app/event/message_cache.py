@@ -0,0 +1,419 @@
+"""Cache of rendered email messages.
+
+Every recipient of an event gets the same message apart from its To,
+Message-ID and Date headers. Rendering a flask_mail.Message (encoding the
+headers and the body parts and serializing the MIME tree) is done once per
+event and content version; the resulting bytes are kept here and each send
+only prepends those three headers, the Date being the time of the send.
+
+The rendered body (its MIME parts, the bulk of the message) only depends on
+the content, so it is kept once per content hash and shared by every event
+sending that body; each event only adds its Subject and From headers.
+Recurring campaigns with the same large body therefore render and cache it
+once.
+
+Subjects and bodies with placeholders (see app.event.personalize) differ per
+recipient. Their body is rendered once per content hash into a BodyTemplate
+kept in the TemplateCache, and each message is put together from it and the
+recipient's values without building a MIME tree.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email import policy as email_policy
+from email.message import Message as MIMEHeaders
+from email.utils import formatdate
+from functools import lru_cache
+from typing import Dict, Optional, Set, Tuple
+
+from flask import current_app
+from flask_mail import Message, sanitize_address
+
+from app.database.models import Event
+from app.event.personalize import (
+    BodyTemplate,
+    CompiledTemplate,
+    compile_template,
+    get_template_cache,
+    has_placeholders,
+    mark_slots,
+    recipient_values,
+    split_marked,
+    subject_values,
+)
+
+# Address the template is rendered for; its To header is dropped again.
+_PLACEHOLDER_RECIPIENT = "recipient@invalid"
+
+CacheKey = Tuple[int, str]
+
+
+# Headers rendered per event; the rest of the message is the shared body.
+_EVENT_HEADERS = ("Subject", "From")
+_RECIPIENT_HEADERS = ("To", "Message-ID", "Date")
+
+
+@dataclass(frozen=True)
+class MessageTemplate:
+    """Rendered message without its per-recipient headers."""
+
+    subject: str
+    sender: str
+    headers: bytes
+    # Content headers and MIME parts, shared by events with the same body
+    body: bytes
+    # Set when the subject has placeholders; headers then leave it out
+    subject_template: Optional[CompiledTemplate] = None
+    # Set when the body has placeholders; body is then empty
+    body_template: Optional[BodyTemplate] = None
+
+    @property
+    def personalized(self) -> bool:
+        """Tell whether messages differ per recipient beyond To."""
+        return self.subject_template is not None or self.body_template is not None
+
+    @property
+    def data(self) -> bytes:
+        """Return the whole message without its per-recipient headers."""
+        return self.headers + self.body
+
+    def render(
+        self, recipient: str, message_id: str, name: Optional[str] = None
+    ) -> bytes:
+        """
+        Produce the message for one recipient.
+
+        Args:
+            recipient: Address for the To header
+            message_id: Value of the Message-ID header
+            name: Display name of the recipient for personalized templates
+
+        Returns:
+            Complete message, ready for SMTP DATA
+        """
+        to = sanitize_address(recipient).encode("utf-8")
+        head = (
+            b"To: "
+            + to
+            + b"\nMessage-ID: "
+            + message_id.encode()
+            + b"\n"
+            + _date_header(int(time.time()))
+        )
+        if not self.personalized:
+            return head + self.headers + self.body
+        values = recipient_values(recipient, name)
+        if self.subject_template is not None:
+            subject = self.subject_template.render(subject_values(values))
+            head += _subject_header(subject)
+        body = self.body
+        if self.body_template is not None:
+            body = self.body_template.render(values)
+        return head + self.headers + body
+
+    def message(
+        self, recipient: str, message_id: str, name: Optional[str] = None
+    ) -> "PreparedMessage":
+        """Wrap the template in a message object for one recipient."""
+        return PreparedMessage(self, recipient, message_id, name)
+
+
+class PreparedMessage(Message):
+    """
+    A flask_mail.Message backed by a rendered template.
+
+    It can be handed to ``Connection.send`` like any other message but
+    serializes by splicing its recipient into the template.
+    """
+
+    def __init__(
+        self,
+        template: MessageTemplate,
+        recipient: str,
+        message_id: str,
+        name: Optional[str] = None,
+    ) -> None:
+        """
+        Initialize the message without building a MIME tree.
+
+        Args:
+            template: Rendered message shared by all recipients
+            recipient: The single recipient of this message
+            message_id: Message-ID header value
+            name: Display name of the recipient for personalized templates
+        """
+        # Message.__init__ is skipped on purpose: it generates a Message-ID,
+        # which costs a hostname lookup per message.
+        self.template = template
+        self.name = name
+        self.subject = template.subject
+        self.sender = template.sender
+        self.recipients = [recipient]
+        self.msgId = message_id
+        self.reply_to = None
+        self.cc = []
+        self.bcc = []
+        self.body = None
+        self.html = None
+        self.date = 0
+        self.charset = None
+        self.extra_headers = None
+        self.mail_options = []
+        self.rcpt_options = []
+        self.attachments = []
+
+    def as_bytes(self) -> bytes:
+        """Return the message with this recipient's headers spliced in."""
+        return self.template.render(self.recipients[0], self.msgId, self.name)
+
+    def as_string(self) -> str:
+        """Return the message as text."""
+        return self.as_bytes().decode("utf-8", "replace")
+
+
+@lru_cache(maxsize=1)
+def _date_header(second: int) -> bytes:
+    """Format the Date header of messages sent in the given second."""
+    return b"Date: " + formatdate(second, localtime=True).encode() + b"\n"
+
+
+def _subject_header(subject: str) -> bytes:
+    """Encode a Subject header the way flask_mail does."""
+    policy = email_policy.SMTP
+    return policy.fold_binary(
+        "Subject", policy.header_store_parse("Subject", subject)[1]
+    )
+
+
+def render_body(event: Event) -> bytes:
+    """
+    Render the content headers and MIME parts of an event's email.
+
+    Args:
+        event: Event whose content is rendered
+
+    Returns:
+        The message without its Subject, From, To, Message-ID and Date
+        headers
+    """
+    return _render_mime(*_body_sources(event))
+
+
+def compile_body(event: Event) -> Optional[BodyTemplate]:
+    """
+    Return the compiled body of an event with placeholders.
+
+    Bodies are compiled once per content hash and kept in the worker's
+    TemplateCache, so the content is only loaded on a miss.
+
+    Args:
+        event: Event whose content is compiled
+
+    Returns:
+        The body template, None when the body has no placeholders
+    """
+    key = ("body", event.content_parts().content_hash)
+    return get_template_cache().get(key, lambda: _compile_body(event))
+
+
+def _body_sources(event: Event) -> Tuple[str, Optional[str]]:
+    """Return the plain-text and HTML versions of an event's body."""
+    parts = event.content_parts()
+    # HTML content goes out as multipart/alternative with the plain-text
+    # version computed when the content was stored; text goes out as is.
+    if parts.is_html:
+        return parts.text, event.email_content
+    return event.email_content, None
+
+
+def _render_mime(text: str, html: Optional[str]) -> bytes:
+    """Render body parts without the event and recipient headers."""
+    msg = Message(recipients=[_PLACEHOLDER_RECIPIENT], body=text, html=html)
+    mime = msg._message()
+    for name in _EVENT_HEADERS + _RECIPIENT_HEADERS:
+        del mime[name]
+    return mime.as_bytes()
+
+
+def _compile_body(event: Event) -> Optional[BodyTemplate]:
+    """Render an event's body with its slots marked and split it."""
+    text, html = _body_sources(event)
+    if not has_placeholders(text) and not (html and has_placeholders(html)):
+        return None
+    slots: list = []
+    text = mark_slots(compile_template(text, strict=False), False, slots)
+    if html is not None:
+        html = mark_slots(compile_template(html, strict=False), True, slots)
+    return split_marked(_render_mime(text, html), slots)
+
+
+def render_template(event: Event, body: Optional[bytes] = None) -> MessageTemplate:
+    """
+    Render the parts of an event's email shared by all recipients.
+
+    Args:
+        event: Event whose subject and content are rendered
+        body: The event's body rendered by render_body(), rendered here
+            when not given and the body has no placeholders
+
+    Returns:
+        MessageTemplate of the event
+    """
+    subject_template = None
+    if has_placeholders(event.email_subject):
+        subject_template = compile_template(event.email_subject, strict=False)
+    msg = Message(
+        subject=event.email_subject, recipients=[_PLACEHOLDER_RECIPIENT], body=""
+    )
+    mime = msg._message()
+    headers = MIMEHeaders(policy=mime.policy)
+    for name in _EVENT_HEADERS:
+        if name == "Subject" and subject_template is not None:
+            continue
+        for value in mime.get_all(name, ()):
+            headers[name] = value
+    # Drop the blank line ending the header block; the body's headers follow
+    data = headers.as_bytes()[: -len(mime.policy.linesep)]
+    body_template = compile_body(event)
+    if body_template is not None:
+        body = b""
+    elif body is None:
+        body = render_body(event)
+    return MessageTemplate(
+        msg.subject, msg.sender, data, body, subject_template, body_template
+    )
+
+
+class MessageCache:
+    """
+    LRU cache of message templates bounded by their total size.
+
+    Entries are keyed by event ID and content hash, so new content never
+    reuses an old template. The subject is checked on lookup, since an
+    edit in another process cannot invalidate this process' cache.
+
+    Rendered bodies are kept once per content hash for as long as a cached
+    template uses them and count once towards max_bytes. Bodies with
+    placeholders are kept in the TemplateCache instead.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Upper bound on the summed size of cached templates
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # Misses that found the body rendered for another event
+        self.body_hits = 0
+        self._entries: "OrderedDict[CacheKey, MessageTemplate]" = OrderedDict()
+        self._by_event: Dict[int, Set[CacheKey]] = {}
+        self._bodies: Dict[str, bytes] = {}
+        self._body_users: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of cached templates."""
+        return len(self._entries)
+
+    def get(self, event: Event) -> MessageTemplate:
+        """
+        Return the template of an event, rendering it on a miss.
+
+        Args:
+            event: Event to send
+
+        Returns:
+            MessageTemplate for the event's current subject and content
+        """
+        key = (event.id, event.content_parts().content_hash)
+        with self._lock:
+            template = self._entries.get(key)
+            if template is not None and template.subject == event.email_subject:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return template
+            body = self._bodies.get(key[1])
+        self.misses += 1
+        if body is not None:
+            self.body_hits += 1
+        template = render_template(event, body)
+        self._put(key, template)
+        return template
+
+    def _put(self, key: CacheKey, template: MessageTemplate) -> None:
+        """Store a template and evict the least recently used ones."""
+        if len(template.headers) + len(template.body) > self.max_bytes:
+            return
+        content_hash = key[1]
+        with self._lock:
+            self._discard(key)
+            if content_hash not in self._bodies:
+                self._bodies[content_hash] = template.body
+                self._body_users[content_hash] = 0
+                self.size += len(template.body)
+            self._body_users[content_hash] += 1
+            self._entries[key] = template
+            self._by_event.setdefault(key[0], set()).add(key)
+            self.size += len(template.headers)
+            while self.size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key: CacheKey) -> None:
+        """Drop one entry and its body once unused; the lock must be held."""
+        template = self._entries.pop(key, None)
+        if template is None:
+            return
+        self.size -= len(template.headers)
+        self._body_users[key[1]] -= 1
+        if not self._body_users[key[1]]:
+            del self._body_users[key[1]]
+            self.size -= len(self._bodies.pop(key[1]))
+        keys = self._by_event.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_event[key[0]]
+
+    def invalidate(self, event_id: int) -> None:
+        """
+        Drop every cached template of an event.
+
+        Args:
+            event_id: Event whose subject or content changed
+        """
+        with self._lock:
+            for key in list(self._by_event.get(event_id, ())):
+                self._discard(key)
+
+    def clear(self) -> None:
+        """Drop every cached template."""
+        with self._lock:
+            self._entries.clear()
+            self._by_event.clear()
+            self._bodies.clear()
+            self._body_users.clear()
+            self.size = 0
+
+
+def get_message_cache() -> MessageCache:
+    """
+    Return the message cache of the current application.
+
+    Returns:
+        The MessageCache sized from MAIL_MESSAGE_CACHE_BYTES
+    """
+    app = current_app._get_current_object()  # type: ignore[attr-defined]
+    cache: Optional[MessageCache] = app.extensions.get("message_cache")
+    if cache is None:
+        cache = MessageCache(app.config.get("MAIL_MESSAGE_CACHE_BYTES", 64 << 20))
+        app.extensions["message_cache"] = cache
+    return cache
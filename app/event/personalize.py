@@ -0,0 +1,283 @@
+"""Per-recipient personalization of subjects and bodies.
+
+Subjects and bodies may contain placeholders filled in for every recipient:
+
+* ``{{ name }}``: the recipient's display name
+* ``{{ first_name }}``: the first word of the display name
+* ``{{ email }}``: the recipient's address
+
+``{{ name | default("there") }}`` gives the text used when the recipient has
+no name. Values are HTML-escaped in HTML bodies and stripped of line breaks
+in subjects. Any other ``{{ identifier }}`` is rejected when the event is
+created, so a typo does not go out verbatim.
+
+A template is compiled once into its literal text and placeholder slots.
+For bodies, the MIME message is rendered once with a marker in every slot
+and split on the markers into a BodyTemplate, so rendering the message of a
+recipient is one join of bytes. Compiled templates are kept in a
+TemplateCache, an LRU of PERSONALIZATION_CACHE_SIZE entries per worker keyed
+by content hash, shared by every job of the worker sending the same body.
+"""
+
+from __future__ import annotations
+
+import html
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, TypeVar, Union
+
+from flask import current_app
+
+FIELDS = ("name", "first_name", "email")
+
+_PLACEHOLDER = re.compile(
+    r"\{\{\s*([A-Za-z_]\w*)\s*" r'(?:\|\s*default\(\s*"((?:[^"\\]|\\.)*)"\s*\)\s*)?\}\}'
+)
+_LINE_BREAKS = re.compile(r"[\r\n]+")
+# Stands in for a slot while the MIME message is rendered. Being non-ASCII,
+# it also makes the part 8bit, which any value can be spliced into.
+_MARK = "\u2063"
+_MARKED = re.compile(("%s(\\d+)%s" % (_MARK, _MARK)).encode())
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class Field:
+    """A placeholder slot of a compiled template."""
+
+    name: str
+    default: str = ""
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """A template split into literal text and placeholder slots."""
+
+    parts: Tuple[Union[str, Field], ...]
+
+    @property
+    def is_static(self) -> bool:
+        """Tell whether the template has no placeholders."""
+        return all(isinstance(part, str) for part in self.parts)
+
+    def render(self, values: Dict[str, str], escape: bool = False) -> str:
+        """
+        Fill in the placeholders.
+
+        Args:
+            values: Value of every field, see recipient_values()
+            escape: HTML-escape the values
+
+        Returns:
+            The rendered text
+        """
+        out = []
+        for part in self.parts:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            value = values.get(part.name) or part.default
+            out.append(html.escape(value) if escape else value)
+        return "".join(out)
+
+
+def has_placeholders(text: str) -> bool:
+    """Tell whether a text contains a placeholder of a known field."""
+    if "{{" not in text:
+        return False
+    return any(match.group(1) in FIELDS for match in _PLACEHOLDER.finditer(text))
+
+
+def compile_template(source: str, strict: bool = True) -> CompiledTemplate:
+    """
+    Compile a subject or body into literal text and placeholder slots.
+
+    Args:
+        source: Text containing ``{{ field }}`` placeholders
+        strict: Reject unknown placeholders; otherwise they are kept as
+            literal text, as for events stored before personalization
+
+    Returns:
+        The compiled template
+
+    Raises:
+        ValueError: If strict and a placeholder names an unknown field
+    """
+    parts: list = []
+    position = 0
+    for match in _PLACEHOLDER.finditer(source):
+        name, default = match.group(1), match.group(2)
+        if name not in FIELDS:
+            if not strict:
+                continue
+            raise ValueError(
+                f"Unknown placeholder {{{{ {name} }}}}, use one of: "
+                + ", ".join(FIELDS)
+            )
+        start = match.start()
+        if start > position:
+            parts.append(source[position:start])
+        parts.append(Field(name, re.sub(r"\\(.)", r"\1", default or "")))
+        position = match.end()
+    if position < len(source):
+        parts.append(source[position:])
+    return CompiledTemplate(tuple(parts))
+
+
+def recipient_values(email: str, name: Optional[str]) -> Dict[str, str]:
+    """
+    Return the placeholder values of a recipient.
+
+    Args:
+        email: Recipient address
+        name: Display name, None when unknown
+
+    Returns:
+        Mapping of field name to value; empty strings for a missing name
+    """
+    name = (name or "").strip()
+    return {"name": name, "first_name": name.split(" ", 1)[0], "email": email}
+
+
+def subject_values(values: Dict[str, str]) -> Dict[str, str]:
+    """Return values safe to put into a header."""
+    return {key: _LINE_BREAKS.sub(" ", value) for key, value in values.items()}
+
+
+Slot = Tuple[Field, bool]
+
+
+@dataclass(frozen=True)
+class BodyTemplate:
+    """A rendered message body split around its placeholder slots."""
+
+    # Literal bytes; one more than there are slots
+    segments: Tuple[bytes, ...]
+    # Field and whether its value is HTML-escaped, per slot
+    slots: Tuple[Slot, ...]
+
+    def render(self, values: Dict[str, str]) -> bytes:
+        """
+        Fill in the slots.
+
+        Args:
+            values: Value of every field, see recipient_values()
+
+        Returns:
+            The body for one recipient
+        """
+        out = [self.segments[0]]
+        for (field, escape), segment in zip(self.slots, self.segments[1:]):
+            value = values.get(field.name) or field.default
+            out.append((html.escape(value) if escape else value).encode("utf-8"))
+            out.append(segment)
+        return b"".join(out)
+
+
+def mark_slots(template: CompiledTemplate, escape: bool, slots: List[Slot]) -> str:
+    """
+    Replace the placeholders of a template by numbered markers.
+
+    Args:
+        template: Compiled body part
+        escape: Whether the part's values are HTML-escaped
+        slots: Slots marked so far; the template's slots are appended
+
+    Returns:
+        The part's text with a marker in every slot
+    """
+    out = []
+    for part in template.parts:
+        if isinstance(part, str):
+            out.append(part)
+        else:
+            out.append(f"{_MARK}{len(slots)}{_MARK}")
+            slots.append((part, escape))
+    return "".join(out)
+
+
+def split_marked(data: bytes, slots: List[Slot]) -> BodyTemplate:
+    """
+    Split a body rendered from marked parts into a BodyTemplate.
+
+    Args:
+        data: Rendered body containing the markers of mark_slots()
+        slots: The slots the markers number
+
+    Returns:
+        The body template
+    """
+    pieces = _MARKED.split(data)
+    return BodyTemplate(
+        tuple(pieces[0::2]), tuple(slots[int(index)] for index in pieces[1::2])
+    )
+
+
+class TemplateCache:
+    """LRU cache of compiled templates, bounded by their number."""
+
+    def __init__(self, max_entries: int = 256) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Number of compiled templates kept
+        """
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of cached templates."""
+        return len(self._entries)
+
+    def get(self, key: Hashable, build: Callable[[], T]) -> T:
+        """
+        Return a compiled template, compiling it on a miss.
+
+        Args:
+            key: Identifies the source, e.g. a content hash
+            build: Compiles the template; only called on a miss, so the
+                source need not be loaded on a hit
+
+        Returns:
+            The compiled template; None is cached like any other result
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        self.misses += 1
+        template = build()
+        with self._lock:
+            self._entries[key] = template
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return template
+
+    def clear(self) -> None:
+        """Drop every compiled template."""
+        with self._lock:
+            self._entries.clear()
+
+
+def get_template_cache() -> TemplateCache:
+    """
+    Return the compiled template cache of the current application.
+
+    Returns:
+        The TemplateCache sized from PERSONALIZATION_CACHE_SIZE
+    """
+    app = current_app._get_current_object()  # type: ignore[attr-defined]
+    cache: Optional[TemplateCache] = app.extensions.get("template_cache")
+    if cache is None:
+        cache = TemplateCache(app.config.get("PERSONALIZATION_CACHE_SIZE", 256))
+        app.extensions["template_cache"] = cache
+    return cache
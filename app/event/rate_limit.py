@@ -0,0 +1,179 @@
+"""Distributed send rate limiting per SMTP relay.
+
+Relays enforce per-minute and per-day quotas per account and answer a burst
+above them with 421/454 deferrals. Every worker takes a token from a shared
+bucket in Redis before each SMTP transaction, so all workers together stay
+under the quota. The buckets are checked and drained by one Lua script,
+which makes acquiring atomic across workers.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+
+from flask import current_app
+
+from app.extensions import rq
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# KEYS: one bucket hash per limit.
+# ARGV: tokens requested, then capacity and period in seconds per limit.
+# Returns "0" after taking the tokens from every bucket, otherwise the
+# seconds until all buckets hold enough tokens (as a string, since Lua
+# numbers are truncated to integers on the way out).
+TOKEN_BUCKET_SCRIPT = """
+redis.replicate_commands()
+local requested = tonumber(ARGV[1])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local wait = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = capacity / tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local last = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - last) * rate)
+    levels[i] = tokens
+    if tokens < requested then
+        wait = math.max(wait, (requested - tokens) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HSET', key, 'tokens', levels[i] - requested, 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(tonumber(ARGV[i * 2 + 1]) * 2))
+end
+return '0'
+"""
+
+MINUTE = 60
+DAY = 24 * 60 * 60
+
+
+class RateLimited(Exception):
+    """Raised when a send would have to wait longer than allowed."""
+
+    def __init__(self, retry_after: float) -> None:
+        """
+        Initialize the error.
+
+        Args:
+            retry_after: Seconds until the buckets have a token again
+        """
+        super().__init__(f"Send rate limit reached, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class SendRateLimiter:
+    """
+    Token buckets shared by every worker sending through one relay account.
+
+    Example:
+        >>> limiter = SendRateLimiter(redis, "smtp.example.com:user",
+        ...                           [(100, MINUTE), (10000, DAY)])
+        >>> limiter.acquire()
+    """
+
+    def __init__(
+        self,
+        connection: Any,
+        name: str,
+        limits: Sequence[Tuple[int, float]],
+        max_wait: float = 30,
+    ) -> None:
+        """
+        Initialize the limiter.
+
+        Args:
+            connection: Redis connection
+            name: Relay account the buckets belong to
+            limits: (capacity, period in seconds) of every bucket
+            max_wait: Longest a caller is blocked before RateLimited is raised
+        """
+        self.name = name
+        self.limits = list(limits)
+        self.max_wait = max_wait
+        self.keys = [
+            f"mail_scheduler:ratelimit:{name}:{int(period)}" for _, period in limits
+        ]
+        self._script = connection.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def try_acquire(self, tokens: int = 1) -> float:
+        """
+        Take tokens if every bucket has enough.
+
+        Args:
+            tokens: Number of tokens to take
+
+        Returns:
+            0.0 if the tokens were taken, otherwise seconds to wait
+        """
+        args: List[float] = [tokens]
+        for capacity, period in self.limits:
+            args.extend((capacity, period))
+        return float(self._script(keys=self.keys, args=args))
+
+    def acquire(self, tokens: int = 1) -> float:
+        """
+        Take tokens, blocking until the buckets refill.
+
+        Args:
+            tokens: Number of tokens to take
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            RateLimited: If the tokens are not available within max_wait
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                break
+            if waited + wait > self.max_wait:
+                metrics.incr("rate_limit.rescheduled")
+                raise RateLimited(wait)
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            metrics.incr("rate_limit.throttled_sends")
+            metrics.observe("rate_limit.wait_seconds", waited)
+        return waited
+
+
+def get_rate_limiter() -> Optional[SendRateLimiter]:
+    """
+    Return the limiter for the configured relay account.
+
+    Returns:
+        SendRateLimiter keyed by MAIL_SERVER and MAIL_USERNAME, or None
+        when neither MAIL_RATE_LIMIT_PER_MINUTE nor MAIL_RATE_LIMIT_PER_DAY
+        is set
+    """
+    config = current_app.config
+    limits = [
+        (capacity, period)
+        for capacity, period in (
+            (config.get("MAIL_RATE_LIMIT_PER_MINUTE", 0), MINUTE),
+            (config.get("MAIL_RATE_LIMIT_PER_DAY", 0), DAY),
+        )
+        if capacity
+    ]
+    if not limits:
+        return None
+    name = f"{config.get('MAIL_SERVER')}:{config.get('MAIL_USERNAME') or ''}"
+    return SendRateLimiter(
+        rq.connection,
+        name,
+        limits,
+        max_wait=config.get("MAIL_RATE_LIMIT_MAX_WAIT", 30),
+    )
@@ -0,0 +1,353 @@
+"""Reconciliation of pending events with the scheduled job set.
+
+The events table and rq-scheduler's sorted set can drift apart: jobs get
+lost when Redis is flushed or restored, jobs of deleted events stay behind,
+and an edit that failed half-way leaves a job at the old time. reconcile()
+finds and repairs those differences:
+
+* missing: a pending event whose job is neither scheduled nor in a queue
+  (or whose job record is gone) is scheduled again under its job ID
+* stale: a scheduled job whose time differs from the event's is moved,
+  unless it is due later and the send already ran: that is a retry or a
+  rate-limited send waiting for its turn (see jobs.reschedule_send)
+* orphaned: a scheduled send job whose event was deleted, is done or has
+  moved on to a newer job version is removed
+
+Pending events are streamed with ``yield_per`` and checked against Redis one
+pipeline per batch; the sorted set is walked with ZSCAN in batches of the
+same size. Repairs are written in one pipeline per batch, so memory stays
+bounded by RECONCILE_BATCH_SIZE no matter how many events there are.
+
+An event with no job whose recipients already have send attempts is only
+reported as ``started``: its send ran and gave up or is waiting for a retry,
+which the retry and dead-letter handling own.
+
+An event with a chunk job in the dead-letter queue is reported as ``stuck``:
+its send stays unfinished, and no dispatcher touches it, until the letter is
+re-driven (``flask dead-letters redrive``).
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from flask import current_app
+from rq.job import Job
+from rq_scheduler.utils import to_unix
+from sqlalchemy import select
+
+from app.database import db
+from app.database.models import Event, Recipient
+from app.event.dispatcher import notify_dispatcher
+from app.event.jobs import (
+    SEND_MAIL_PAYLOAD_VERSION,
+    send_job_id,
+    send_mail,
+    send_mail_chunk,
+)
+from app.event.retry import get_dead_letter_queue
+from app.extensions import rq
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_JOB_ID = "reconcile-schedule"
+
+# Scheduled members created by schedule_mail(), see send_job_id()
+SEND_JOB_PATTERN = re.compile(r"^send:(\d+):\d+$")
+
+# Job IDs kept per kind of difference for the report
+SAMPLE_SIZE = 10
+
+# Job function name of chunk jobs, as RQ stores it
+CHUNK_JOB_NAME = f"{send_mail_chunk.__module__}.{send_mail_chunk.__qualname__}"
+
+# Job statuses of a job that is not scheduled but will still run or ran;
+# rq-scheduler does not set a status on the jobs it schedules
+IN_FLIGHT_STATUSES = (b"queued", b"started", b"deferred", b"finished", b"failed")
+
+
+@dataclass
+class ReconcileReport:
+    """Differences found by reconcile(), repaired unless dry_run is set."""
+
+    dry_run: bool = False
+    checked: int = 0
+    in_sync: int = 0
+    in_flight: int = 0
+    started: int = 0
+    stuck: int = 0
+    missing: int = 0
+    stale: int = 0
+    orphaned: int = 0
+    samples: Dict[str, List[str]] = field(default_factory=dict)
+
+    @property
+    def drift(self) -> int:
+        """Number of differences that are (or would be) repaired."""
+        return self.missing + self.stale + self.orphaned
+
+    def sample(self, kind: str, job_id: str) -> None:
+        """Keep the first SAMPLE_SIZE job IDs of a kind of difference."""
+        job_ids = self.samples.setdefault(kind, [])
+        if len(job_ids) < SAMPLE_SIZE:
+            job_ids.append(job_id)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the report as a plain dictionary."""
+        return {**asdict(self), "drift": self.drift}
+
+    def summary(self) -> str:
+        """Return a human-readable report."""
+        action = "would repair" if self.dry_run else "repaired"
+        lines = [
+            f"Checked {self.checked} pending event(s): {self.in_sync} in sync, "
+            f"{self.in_flight} in flight, {self.started} started without a job, "
+            f"{self.stuck} stuck on a dead-lettered chunk",
+            f"{action}: {self.missing} missing, {self.stale} stale, "
+            f"{self.orphaned} orphaned job(s)",
+        ]
+        for kind, job_ids in self.samples.items():
+            lines.append(f"  {kind}: {', '.join(job_ids)}")
+        return "\n".join(lines)
+
+
+def decode(value: Any) -> str:
+    """Return a Redis reply as str."""
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def send_started(event_ids: Set[int]) -> Set[int]:
+    """
+    Find the events among event_ids whose send already ran.
+
+    Args:
+        event_ids: Event IDs
+
+    Returns:
+        IDs of the events with at least one recipient send attempt
+    """
+    return set(
+        db.session.scalars(
+            select(Recipient.event_id)
+            .where(Recipient.event_id.in_(event_ids), Recipient.attempts > 0)
+            .distinct()
+        )
+    )
+
+
+def stuck_events() -> Set[int]:
+    """
+    Find the events with a chunk job in the dead-letter queue.
+
+    Returns:
+        IDs of the events, see Event.is_sending
+    """
+    return {
+        letter.args[0]
+        for letter in get_dead_letter_queue().get_jobs()
+        if letter.func_name == CHUNK_JOB_NAME
+    }
+
+
+def check_events(
+    scheduler: Any,
+    rows: Sequence[Any],
+    report: ReconcileReport,
+    stuck: Optional[Set[int]] = None,
+) -> None:
+    """
+    Compare one batch of pending events with Redis and repair differences.
+
+    Args:
+        scheduler: rq-scheduler instance
+        rows: Rows of (id, job_id, timestamp)
+        report: Report to add the findings to
+        stuck: IDs of the events with a dead-lettered chunk, see
+            stuck_events(); reported, never repaired
+    """
+    connection = scheduler.connection
+    key = scheduler.scheduled_jobs_key
+    job_ids = [row.job_id or send_job_id(row.id) for row in rows]
+
+    pipe = connection.pipeline(transaction=False)
+    for job_id in job_ids:
+        pipe.zscore(key, job_id)
+        # created_at is set on every stored job, status not on scheduled ones
+        pipe.hmget(Job.key_for(job_id), "status", "created_at")
+    replies = pipe.execute()
+
+    lost: List[Tuple[Any, str]] = []
+    late: List[Tuple[Any, str]] = []
+    stale: Dict[str, int] = {}
+    for row, job_id, score, (status, created_at) in zip(
+        rows, job_ids, replies[::2], replies[1::2]
+    ):
+        report.checked += 1
+        due = to_unix(row.timestamp)
+        if stuck and row.id in stuck:
+            report.stuck += 1
+            report.sample("stuck", job_id)
+        elif score is None and status in IN_FLIGHT_STATUSES:
+            report.in_flight += 1
+        elif score is None or created_at is None:
+            lost.append((row, job_id))
+        elif int(score) > due:
+            late.append((row, job_id))
+        elif int(score) != due:
+            stale[job_id] = due
+            report.stale += 1
+            report.sample("stale", job_id)
+        else:
+            report.in_sync += 1
+
+    waiting = lost + late
+    started = send_started({row.id for row, _ in waiting}) if waiting else set()
+    for row, job_id in late:
+        if row.id in started:
+            report.in_flight += 1
+        else:
+            stale[job_id] = to_unix(row.timestamp)
+            report.stale += 1
+            report.sample("stale", job_id)
+    missing = []
+    for row, job_id in lost:
+        if row.id in started:
+            report.started += 1
+            report.sample("started", job_id)
+        else:
+            missing.append((row, job_id))
+            report.missing += 1
+            report.sample("missing", job_id)
+
+    if report.dry_run or not (missing or stale):
+        return
+    pipe = connection.pipeline(transaction=False)
+    for row, job_id in missing:
+        job = Job.create(
+            send_mail,
+            args=(row.id, SEND_MAIL_PAYLOAD_VERSION),
+            connection=connection,
+            id=job_id,
+            origin=scheduler.queue_name,
+        )
+        job.save(pipeline=pipe)
+        pipe.zadd(key, {job_id: to_unix(row.timestamp)})
+    if stale:
+        pipe.zadd(key, stale, xx=True)
+    pipe.execute()
+    earliest = min([row.timestamp for row, _ in missing] or [datetime.now(UTC)])
+    notify_dispatcher(connection, earliest)
+
+
+def remove_orphans(scheduler: Any, batch_size: int, report: ReconcileReport) -> None:
+    """
+    Walk the scheduled set and remove send jobs no pending event owns.
+
+    Args:
+        scheduler: rq-scheduler instance
+        batch_size: Members per ZSCAN call
+        report: Report to add the findings to
+    """
+    connection = scheduler.connection
+    key = scheduler.scheduled_jobs_key
+    cursor = 0
+    while True:
+        cursor, members = connection.zscan(key, cursor, count=batch_size)
+        by_event: Dict[int, List[str]] = {}
+        for member, _ in members:
+            job_id = decode(member)
+            match = SEND_JOB_PATTERN.match(job_id)
+            if match:
+                by_event.setdefault(int(match.group(1)), []).append(job_id)
+        if by_event:
+            owned = {
+                row.id: row.job_id or send_job_id(row.id)
+                for row in db.session.execute(
+                    select(Event.id, Event.job_id).where(
+                        Event.id.in_(by_event), Event._is_done.is_(False)
+                    )
+                )
+            }
+            orphans = [
+                job_id
+                for event_id, job_ids in by_event.items()
+                for job_id in job_ids
+                if owned.get(event_id) != job_id
+            ]
+            for job_id in orphans:
+                report.orphaned += 1
+                report.sample("orphaned", job_id)
+            if orphans and not report.dry_run:
+                pipe = connection.pipeline(transaction=False)
+                pipe.zrem(key, *orphans)
+                pipe.delete(*(Job.key_for(job_id) for job_id in orphans))
+                pipe.execute()
+        if not cursor:
+            return
+
+
+def reconcile(dry_run: bool = False, batch_size: int = 0) -> ReconcileReport:
+    """
+    Find and repair drift between pending events and scheduled jobs.
+
+    Args:
+        dry_run: Only report the differences
+        batch_size: Events and scheduled jobs per batch, defaults to
+            RECONCILE_BATCH_SIZE
+
+    Returns:
+        Report of the differences
+    """
+    batch_size = batch_size or current_app.config.get("RECONCILE_BATCH_SIZE", 1000)
+    scheduler = rq.get_scheduler()
+    report = ReconcileReport(dry_run=dry_run)
+
+    pending = db.session.execute(
+        select(Event.id, Event.job_id, Event.timestamp)
+        .where(Event._is_done.is_(False))
+        .order_by(Event.id)
+        .execution_options(yield_per=batch_size)
+    )
+    stuck = stuck_events()
+    for rows in pending.partitions():
+        check_events(scheduler, rows, report, stuck)
+    remove_orphans(scheduler, batch_size, report)
+
+    if report.drift and not dry_run:
+        metrics.incr("reconcile.repaired", report.drift)
+    logger.info(report.summary())
+    return report
+
+
+@rq.job(timeout=3600)
+def reconcile_schedule_job() -> str:
+    """Periodic job running reconcile(), see schedule_reconcile()."""
+    return reconcile().summary()
+
+
+def schedule_reconcile(interval: int) -> None:
+    """
+    Run reconcile() every ``interval`` seconds, starting now.
+
+    Repeating jobs are run by rq-scheduler (``flask rq scheduler``), not by
+    the dispatchers.
+
+    Args:
+        interval: Seconds between runs; 0 removes the periodic job
+    """
+    scheduler = rq.get_scheduler()
+    scheduler.cancel(RECONCILE_JOB_ID)
+    if interval > 0:
+        scheduler.schedule(
+            datetime.now(UTC),
+            reconcile_schedule_job,
+            interval=interval,
+            repeat=None,
+            id=RECONCILE_JOB_ID,
+            timeout=3600,
+        )
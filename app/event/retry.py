@@ -0,0 +1,394 @@
+"""Retries and dead letters for send jobs.
+
+A send job that fails on a transient error (a dropped SMTP connection, a 4xx
+reply, a database or Redis hiccup) is enqueued again with exponential
+backoff and jitter instead of landing in RQ's failed registry. Permanent
+errors (5xx replies, a missing event) and jobs out of attempts are moved to
+a dead-letter queue together with the failure reason, from where they can be
+re-driven once the cause is fixed.
+
+A retried or re-driven send skips recipients already recorded as sent (see
+delivery), so nobody gets the email twice.
+
+Jobs can bring their own way of scheduling the retry (see Rescheduler):
+send_mail retries and is re-driven under the event's next job ID, so
+cancelling, re-timing or reconciling the event finds its pending retry like
+any scheduled send.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import random
+import smtplib
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, cast
+
+from flask import current_app
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+from rq import get_current_job
+from rq.job import Job
+from rq.queue import Queue
+from sqlalchemy.exc import DisconnectionError, OperationalError, SQLAlchemyError
+
+from app.database import db
+from app.event.dispatcher import notify_dispatcher
+from app.extensions import rq
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Replies a relay uses for failures that may succeed later: service not
+# available, mailbox busy, local error, insufficient storage, TLS or auth
+# temporarily unavailable.
+RETRYABLE_SMTP_CODES = (421, 450, 451, 452, 454)
+
+# Errors outside SMTP that are worth another attempt.
+TRANSIENT_ERRORS = (
+    smtplib.SMTPServerDisconnected,
+    OSError,
+    OperationalError,
+    DisconnectionError,
+    RedisConnectionError,
+    RedisTimeoutError,
+)
+
+DEAD_LETTER_QUEUE = "dead-letter"
+
+# Schedules the retry of a job after a delay in seconds with the given meta
+# and returns the ID of the retry, or None when there is nothing to retry
+Rescheduler = Callable[[Job, float, Dict[str, Any]], Optional[str]]
+
+# Reschedulers of the job functions decorated with retrying(reschedule=...),
+# by function name as RQ stores it; redrive() re-drives their letters too
+RESCHEDULERS: Dict[str, Rescheduler] = {}
+
+
+class DeliveryDeferred(Exception):
+    """Raised after a send when the relay deferred some recipients."""
+
+    def __init__(self, count: int) -> None:
+        """
+        Initialize the error.
+
+        Args:
+            count: Number of recipients refused with a transient reply
+        """
+        super().__init__(f"{count} recipient(s) temporarily refused")
+        self.count = count
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    When and how often a failed job is tried again.
+
+    Attributes:
+        max_attempts: Runs of a job including the first one
+        backoff_base: Seconds before the first retry; doubled for every
+            further retry
+        backoff_max: Upper bound on the delay before a retry
+        jitter: Fraction of the delay added or removed at random, so jobs
+            failing together do not retry together
+        retryable_codes: SMTP reply codes treated as transient
+    """
+
+    max_attempts: int = 5
+    backoff_base: float = 30.0
+    backoff_max: float = 3600.0
+    jitter: float = 0.2
+    retryable_codes: FrozenSet[int] = field(
+        default_factory=lambda: frozenset(RETRYABLE_SMTP_CODES)
+    )
+
+    @classmethod
+    def from_config(cls, config: Any) -> "RetryPolicy":
+        """
+        Build the policy from MAIL_RETRY_* settings.
+
+        Args:
+            config: Flask config mapping
+
+        Returns:
+            RetryPolicy with the defaults for unset values
+        """
+        return cls(
+            max_attempts=max(1, config.get("MAIL_RETRY_MAX_ATTEMPTS", 5)),
+            backoff_base=config.get("MAIL_RETRY_BACKOFF_BASE", 30),
+            backoff_max=config.get("MAIL_RETRY_BACKOFF_MAX", 3600),
+            jitter=config.get("MAIL_RETRY_JITTER", 0.2),
+            retryable_codes=frozenset(
+                config.get("MAIL_RETRY_SMTP_CODES", RETRYABLE_SMTP_CODES)
+            ),
+        )
+
+    def is_retryable_code(self, code: int) -> bool:
+        """Return whether an SMTP reply code is worth another attempt."""
+        return code in self.retryable_codes
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """
+        Classify an error raised by a job.
+
+        Args:
+            error: The exception
+
+        Returns:
+            True for transient errors, False for permanent ones
+        """
+        if isinstance(error, DeliveryDeferred):
+            return True
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return all(
+                self.is_retryable_code(code) for code, _ in error.recipients.values()
+            )
+        if isinstance(error, smtplib.SMTPResponseException):
+            return self.is_retryable_code(error.smtp_code)
+        if isinstance(error, smtplib.SMTPException):
+            # SMTPException subclasses OSError; only a dropped connection
+            # is transient
+            return isinstance(error, smtplib.SMTPServerDisconnected)
+        return isinstance(error, TRANSIENT_ERRORS)
+
+    def delay(self, attempt: int) -> float:
+        """
+        Seconds to wait after a failed attempt.
+
+        Args:
+            attempt: Number of the attempt that failed, starting at 1
+
+        Returns:
+            Backoff delay with jitter applied
+        """
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        spread = delay * self.jitter
+        return max(0.0, delay + random.uniform(-spread, spread))  # nosec B311
+
+
+def retrying(
+    func: Optional[Callable[..., str]] = None,
+    *,
+    reschedule: Optional[Rescheduler] = None,
+) -> Any:
+    """
+    Apply the configured retry policy to a job function.
+
+    Goes below ``@rq.job`` so the function enqueued by name is the wrapper.
+    Called outside of a worker the function raises as before.
+
+    Args:
+        func: Job function
+        reschedule: Schedules retries instead of enqueue_in(), see
+            handle_failure()
+
+    Example:
+        >>> @rq.job
+        ... @retrying
+        ... def send_mail(event_id): ...
+    """
+    if func is None:
+        return functools.partial(retrying, reschedule=reschedule)
+    if reschedule is not None:
+        RESCHEDULERS[f"{func.__module__}.{func.__qualname__}"] = reschedule
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> str:
+        try:
+            return cast(Callable[..., str], func)(*args, **kwargs)
+        except Exception as e:
+            job = get_current_job()
+            if job is None:
+                raise
+            return handle_failure(job, e, reschedule)
+
+    return wrapper
+
+
+def handle_failure(
+    job: Job, error: Exception, reschedule: Optional[Rescheduler] = None
+) -> str:
+    """
+    Retry a failed job or move it to the dead-letter queue.
+
+    Args:
+        job: The job that raised
+        error: What it raised
+        reschedule: Schedules the retry; by default a copy of the job with a
+            new ID is scheduled with enqueue_in()
+
+    Returns:
+        Job result describing what happened to the job
+    """
+    policy = RetryPolicy.from_config(current_app.config)
+    attempt = int(job.meta.get("attempt", 1))
+    reason = f"{type(error).__name__}: {error}"
+
+    if policy.is_retryable(error) and attempt < policy.max_attempts:
+        delay = policy.delay(attempt)
+        logger.warning(
+            f"Job {job.description} failed on attempt {attempt} of "
+            f"{policy.max_attempts}, retrying in {delay:.0f}s: {reason}"
+        )
+        meta = {"attempt": attempt + 1}
+        if reschedule is not None:
+            if isinstance(error, SQLAlchemyError):
+                # Leave the failed transaction before the hook reads the event
+                db.session.rollback()
+            if reschedule(job, delay, meta) is None:
+                return f"Failed, nothing left to retry: {reason}"
+        else:
+            scheduler = rq.get_scheduler()
+            scheduler.enqueue_in(
+                timedelta(seconds=delay),
+                job.func_name,
+                *job.args,
+                meta=meta,
+                queue_name=job.origin,
+                **job.kwargs,
+            )
+            notify_dispatcher(
+                scheduler.connection, datetime.now(UTC) + timedelta(seconds=delay)
+            )
+        metrics.incr("retry.scheduled")
+        return f"Failed, retry {attempt} scheduled in {delay:.0f}s: {reason}"
+
+    logger.error(
+        f"Job {job.description} failed on attempt {attempt}, "
+        f"moving it to the dead-letter queue: {reason}",
+        exc_info=error,
+    )
+    dead_letter(job, reason, attempt)
+    metrics.incr("retry.dead_lettered")
+    return f"Dead-lettered: {reason}"
+
+
+def get_dead_letter_queue() -> Queue:
+    """
+    Return the queue holding dead letters.
+
+    No worker should listen on it; its jobs only run when re-driven.
+
+    Returns:
+        The queue named by RQ_DEAD_LETTER_QUEUE
+    """
+    return rq.get_queue(
+        current_app.config.get("RQ_DEAD_LETTER_QUEUE", DEAD_LETTER_QUEUE)
+    )
+
+
+def dead_letter(job: Job, reason: str, attempts: int) -> Job:
+    """
+    Park a copy of a failed job in the dead-letter queue.
+
+    The copy is pushed directly instead of enqueued, so it is stored even
+    when the queues run synchronously.
+
+    Args:
+        job: The job that gave up
+        reason: Failure reason of the last attempt
+        attempts: Number of attempts made
+
+    Returns:
+        The dead letter
+    """
+    queue = get_dead_letter_queue()
+    letter = Job.create(
+        job.func_name,
+        args=job.args,
+        kwargs=job.kwargs,
+        connection=queue.connection,
+        description=job.description,
+        origin=queue.name,
+        meta={
+            "reason": reason,
+            "attempts": attempts,
+            "failed_at": datetime.now(UTC).isoformat(),
+            "queue": job.origin,
+            "job_id": job.id,
+        },
+    )
+    letter.save()
+    queue.push_job_id(letter.id)
+    return letter
+
+
+def list_dead_letters() -> List[Dict[str, Any]]:
+    """
+    Describe every dead letter.
+
+    Returns:
+        One dict per dead letter, oldest first
+    """
+    return [
+        {
+            "id": letter.id,
+            "description": letter.description,
+            "reason": letter.meta.get("reason"),
+            "attempts": letter.meta.get("attempts"),
+            "failed_at": letter.meta.get("failed_at"),
+        }
+        for letter in get_dead_letter_queue().get_jobs()
+    ]
+
+
+def redrive(job_ids: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    Enqueue dead letters again with a fresh set of attempts.
+
+    Letters of a job function with a Rescheduler are re-driven through it,
+    as the failed job they stand for (its ID and queue are in their meta),
+    so send_mail runs again under the event's next job ID. A letter the
+    Rescheduler finds nothing left to do for (the event is gone, done or
+    scheduled anew) is dropped instead.
+
+    Args:
+        job_ids: IDs of the dead letters to re-drive, None for all of them
+
+    Returns:
+        IDs of the dead letters that were re-driven
+    """
+    queue = get_dead_letter_queue()
+    if job_ids is None:
+        letters = queue.get_jobs()
+    else:
+        letters = [
+            letter
+            for letter in Job.fetch_many(list(job_ids), connection=queue.connection)
+            if letter is not None and letter.origin == queue.name
+        ]
+
+    redriven = []
+    for letter in letters:
+        reschedule = RESCHEDULERS.get(letter.func_name)
+        if reschedule is None:
+            target = rq.get_queue(letter.meta.get("queue"))
+            target.enqueue_job(
+                target.create_job(
+                    letter.func_name,
+                    args=letter.args,
+                    kwargs=letter.kwargs,
+                    description=letter.description,
+                    meta={"attempt": 1},
+                )
+            )
+        else:
+            failed = Job.create(
+                letter.func_name,
+                args=letter.args,
+                kwargs=letter.kwargs,
+                connection=queue.connection,
+                id=letter.meta.get("job_id"),
+                origin=letter.meta.get("queue"),
+            )
+            if reschedule(failed, 0, {"attempt": 1}) is None:
+                logger.info(f"Dead letter {letter.id} has nothing left to send")
+                letter.delete()
+                continue
+        letter.delete()
+        redriven.append(letter.id)
+    if redriven:
+        logger.info(f"Re-drove {len(redriven)} dead letter(s)")
+    return redriven
@@ -0,0 +1,261 @@
+"""Worker-scoped SMTP connection pool.
+
+Opening an SMTP session (TCP connect, STARTTLS and AUTH) costs several round
+trips and relays throttle clients that churn connections. This module keeps a
+small pool of authenticated Flask-Mail connections per worker process and
+hands them out to jobs that need to send mail.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional
+
+from flask import current_app
+from flask_mail import Connection, Mail
+
+from app.extensions import mail
+
+logger = logging.getLogger(__name__)
+
+# SMTP reply code a server uses when it is closing the transmission channel.
+SERVICE_NOT_AVAILABLE = 421
+
+
+class PooledConnection:
+    """A Flask-Mail connection that remembers its age and usage."""
+
+    def __init__(self, pool: "SMTPConnectionPool") -> None:
+        """
+        Open a new SMTP session for the pool.
+
+        Args:
+            pool: The pool this connection belongs to
+        """
+        self.pool = pool
+        self.connection: Connection = pool.mail.connect()
+        self.connection.__enter__()
+        self.num_messages = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def host(self) -> Optional[smtplib.SMTP]:
+        """Return the underlying SMTP client, None when sending is suppressed."""
+        return self.connection.host
+
+    def is_expired(self, now: float) -> bool:
+        """Check whether the connection sat idle for longer than allowed."""
+        return now - self.last_used > self.pool.idle_timeout
+
+    def is_exhausted(self) -> bool:
+        """Check whether the connection sent its message quota."""
+        return bool(self.pool.max_messages) and (
+            self.num_messages >= self.pool.max_messages
+        )
+
+    def is_healthy(self) -> bool:
+        """
+        Check the session with a NOOP command.
+
+        Returns:
+            True if the server answered NOOP with 250, False otherwise
+        """
+        if self.host is None:
+            return True
+        try:
+            code, _ = self.host.noop()
+        except (smtplib.SMTPException, OSError):
+            return False
+        return code == 250
+
+    def reconnect(self) -> None:
+        """Drop the current session and open a fresh one."""
+        self.close()
+        self.connection = self.pool.mail.connect()
+        self.connection.__enter__()
+        self.num_messages = 0
+
+    def send(self, message: Any, envelope_from: Optional[str] = None) -> None:
+        """
+        Send a message, reconnecting once if the server dropped the session.
+
+        A session that sent max_messages already is replaced first, so a job
+        sending a whole chunk on one checkout stays within the quota too.
+
+        Args:
+            message: flask_mail.Message instance
+            envelope_from: Optional address for the MAIL FROM command
+        """
+        if self.is_exhausted():
+            self.reconnect()
+        try:
+            self.connection.send(message, envelope_from)
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException) as e:
+            if not _is_disconnect(e):
+                raise
+            logger.info(f"SMTP session dropped ({e}), reconnecting")
+            self.reconnect()
+            self.connection.send(message, envelope_from)
+        self.num_messages += 1
+        self.last_used = time.monotonic()
+
+    def close(self) -> None:
+        """Quit the SMTP session, ignoring errors from a dead socket."""
+        try:
+            self.connection.__exit__(None, None, None)
+        except (smtplib.SMTPException, OSError):
+            host = self.connection.host
+            if host is not None:
+                host.close()
+
+
+def _is_disconnect(error: Exception) -> bool:
+    """Tell whether an SMTP error means the session is gone."""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return getattr(error, "smtp_code", None) == SERVICE_NOT_AVAILABLE
+
+
+class SMTPConnectionPool:
+    """
+    Thread-safe pool of reusable SMTP connections.
+
+    Connections are handed out LIFO so the most recently used (and therefore
+    most likely still alive) session is reused first. A connection is closed
+    instead of being reused once it has been idle for ``idle_timeout``
+    seconds or has sent ``max_messages`` messages.
+    """
+
+    def __init__(
+        self,
+        mail: Mail,
+        size: int = 2,
+        idle_timeout: float = 60,
+        max_messages: int = 100,
+        healthcheck_after: float = 5,
+    ) -> None:
+        """
+        Initialize the pool.
+
+        Args:
+            mail: Flask-Mail extension used to open connections
+            size: Maximum number of open connections
+            idle_timeout: Seconds after which an idle connection is closed
+            max_messages: Messages sent before a connection is recycled,
+                0 for no limit
+            healthcheck_after: Idle seconds after which a connection is
+                checked with NOOP before being handed out
+        """
+        self.mail = mail
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self.healthcheck_after = healthcheck_after
+        self._idle: List[PooledConnection] = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> PooledConnection:
+        """
+        Take a connection from the pool, opening one if needed.
+
+        Blocks while ``size`` connections are already checked out.
+
+        Returns:
+            A ready to use PooledConnection
+        """
+        with self._cond:
+            while not self._idle and self._in_use >= self.size:
+                self._cond.wait()
+            self._in_use += 1
+            conn = self._idle.pop() if self._idle else None
+
+        try:
+            while conn is not None:
+                now = time.monotonic()
+                if conn.is_expired(now):
+                    conn.close()
+                elif now - conn.last_used < self.healthcheck_after or conn.is_healthy():
+                    return conn
+                else:
+                    conn.close()
+                with self._cond:
+                    conn = self._idle.pop() if self._idle else None
+            return PooledConnection(self)
+        except BaseException:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn: PooledConnection, discard: bool = False) -> None:
+        """
+        Return a connection to the pool.
+
+        Args:
+            conn: Connection obtained from acquire()
+            discard: Close the connection instead of keeping it
+        """
+        if discard or conn.is_exhausted():
+            conn.close()
+            conn = None  # type: ignore[assignment]
+        with self._cond:
+            self._in_use -= 1
+            if conn is not None:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        """
+        Check out a connection for the duration of a with block.
+
+        A connection is discarded when the block raises, since the SMTP
+        session may be left in the middle of a transaction.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        self.release(conn)
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    """
+    Return the SMTP pool of the current worker process.
+
+    The pool is stored on the application and recreated after a fork, so a
+    forked work horse never shares sockets with its parent.
+
+    Returns:
+        The SMTPConnectionPool configured from the app config
+    """
+    app = current_app._get_current_object()  # type: ignore[attr-defined]
+    state = app.extensions.get("smtp_pool")
+    if state is None or state[0] != os.getpid():
+        config = app.config
+        pool = SMTPConnectionPool(
+            mail,
+            size=config.get("MAIL_POOL_SIZE", 2),
+            idle_timeout=config.get("MAIL_POOL_IDLE_TIMEOUT", 60),
+            max_messages=config.get("MAIL_POOL_MAX_MESSAGES", 100),
+            healthcheck_after=config.get("MAIL_POOL_HEALTHCHECK_AFTER", 5),
+        )
+        atexit.register(pool.close)
+        app.extensions["smtp_pool"] = state = (os.getpid(), pool)
+    return state[1]
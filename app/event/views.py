@@ -1,6 +1,14 @@
 """View controllers for the event module."""
 
-from flask import Blueprint, flash, redirect, render_template, request, url_for
+from flask import (
+    Blueprint,
+    current_app,
+    flash,
+    redirect,
+    render_template,
+    request,
+    url_for,
+)
 from flask.views import MethodView
 from flask_login import current_user, login_required
 from markupsafe import Markup
@@ -8,8 +16,8 @@ from markupsafe import Markup
 from app.database import db
 from app.event.forms import EditItemsForm, ItemsForm
 from app.event.jobs import add_event as schedule_mail_event
-from app.services.event_service import EventService
-from app.utils.security import safe_error_message
+from app.services.event_service import EVENT_STATUSES, EventFilters, EventService
+from app.utils.timestamps import to_local
 
 # CONFIG
 blueprint = Blueprint("items", __name__, template_folder="templates")
@@ -17,14 +25,31 @@ blueprint = Blueprint("items", __name__, template_folder="templates")
 
 # ROUTES
 class EventListView(MethodView):
-    """Class-based view for listing all events."""
+    """Class-based view for listing events a page at a time."""
 
     decorators = [login_required]
 
     def get(self):
-        """GET method to display all events."""
-        events = EventService.get_all_events()
-        return render_template("all_events.html", items=events)
+        """GET method to display one filtered page of events."""
+        config = current_app.config
+        per_page = request.args.get(
+            "per_page", config.get("EVENT_LIST_PAGE_SIZE", 50), type=int
+        )
+        per_page = max(1, min(per_page, config.get("EVENT_LIST_MAX_PAGE_SIZE", 200)))
+        try:
+            filters = EventFilters.from_args(request.args)
+            page = EventService.get_page(
+                filters,
+                after=request.args.get("after"),
+                before=request.args.get("before"),
+                per_page=per_page,
+            )
+        except ValueError as e:
+            flash(str(e), "warning")
+            page = EventService.get_page(per_page=per_page)
+        return render_template(
+            "all_events.html", page=page, items=page.events, statuses=EVENT_STATUSES
+        )
 
 
 class EventAddView(MethodView):
@@ -85,7 +110,8 @@ class EventEditView(MethodView):
             flash(message, "danger")
             return redirect(url_for("items.all_events"))
 
-        form = EditItemsForm()
+        # The form shows and posts back local time, like the add form
+        form = EditItemsForm(schedule_time=to_local(event.timestamp))
         return render_template("edit_event.html", event=event, form=form)
 
     def post(self, event_id):
@@ -102,20 +128,28 @@ class EventEditView(MethodView):
             try:
                 # Only allow editing if email has not been sent yet
                 if not event.is_done:
-                    # Update the event in the database
-                    event.email_subject = form.name.data or ""
-                    event.email_content = form.notes.data or ""
-                    event.timestamp = form.schedule_time.data
+                    data = {
+                        "name": form.name.data or "",
+                        "notes": form.notes.data or "",
+                    }
+                    # The form has minutes only: an untouched time is not a
+                    # new one, even if the stored one has seconds
+                    shown = to_local(event.timestamp).replace(second=0, microsecond=0)
+                    if form.schedule_time.data != shown:
+                        data["timestamp"] = form.schedule_time.data
+                    # Update the event and move its scheduled job if re-timed
+                    result = EventService.update(event_id, data)
 
                     # Update recipients (would require more logic to properly
                     # implement)
                     # This is a simplification - in a real app you would need
                     # to update recipients in the database
 
-                    db.session.commit()
-
-                    message = Markup("Scheduled email updated successfully!")
-                    flash(message, "success")
+                    if result is True:
+                        message = Markup("Scheduled email updated successfully!")
+                        flash(message, "success")
+                    else:
+                        flash(result, "danger")
                 else:
                     message = Markup("Cannot edit an email that has already been sent.")
                     flash(message, "warning")
@@ -151,17 +185,13 @@ class EventDeleteView(MethodView):
             flash(message, "danger")
             return redirect(url_for("items.all_events"))
 
-        try:
-            # Delete the event from the database
-            db.session.delete(event)
-            db.session.commit()
-
+        # Delete the event and cancel its scheduled job
+        result = EventService.delete(event_id)
+        if result is True:
             message = Markup("<strong>Done.</strong> Scheduled email has been deleted.")
             flash(message, "success")
-        except Exception as e:
-            db.session.rollback()
-            message = safe_error_message(e)
-            flash(message, "danger")
+        else:
+            flash(result, "danger")
 
         return redirect(url_for("items.all_events"))
 
@@ -2,16 +2,107 @@
 
 from __future__ import annotations
 
-from datetime import UTC, datetime
-from typing import Any, Dict, List, Optional, Union, cast
+import base64
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime, timedelta
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union, cast
 
 from markupsafe import Markup
 
 from app.database import db
-from app.database.models import Event
+from app.database.models import Event, Recipient, User
+from app.event.jobs import cancel_mail, dt_utc, retime_mail
+from app.event.message_cache import get_message_cache
 from app.services.base import BaseService
 from app.utils.security import safe_error_message
 
+# Values of the status filter of event listings
+EVENT_STATUSES = ("pending", "sent")
+
+PageKey = Tuple[datetime, int]
+
+
+def encode_cursor(key: PageKey) -> str:
+    """Encode the (timestamp, id) of a listed event as an opaque cursor."""
+    raw = f"{key[0].isoformat()}|{key[1]}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> PageKey:
+    """
+    Decode a cursor made by encode_cursor().
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, event_id = raw.decode().split("|")
+        return datetime.fromisoformat(timestamp), int(event_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid page cursor") from e
+
+
+@dataclass(frozen=True)
+class EventFilters:
+    """Server-side filters of the event listing."""
+
+    status: Optional[str] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
+    owner: Optional[str] = None
+
+    @classmethod
+    def from_args(cls, args: Mapping[str, str]) -> "EventFilters":
+        """
+        Read the filters from query string arguments.
+
+        Args:
+            args: Request arguments with optional status, start, end (ISO
+                dates, inclusive) and owner (username)
+
+        Returns:
+            The filters
+
+        Raises:
+            ValueError: If a status or date is invalid
+        """
+        status = args.get("status") or None
+        if status is not None and status not in EVENT_STATUSES:
+            raise ValueError(f"Unknown status: {status}")
+        try:
+            start = date.fromisoformat(args["start"]) if args.get("start") else None
+            end = date.fromisoformat(args["end"]) if args.get("end") else None
+        except ValueError as e:
+            raise ValueError("Dates must be given as YYYY-MM-DD") from e
+        owner = (args.get("owner") or "").strip() or None
+        return cls(status, start, end, owner)
+
+    @property
+    def args(self) -> Dict[str, str]:
+        """Return the filters as query string arguments."""
+        values = {
+            "status": self.status,
+            "start": self.start.isoformat() if self.start else None,
+            "end": self.end.isoformat() if self.end else None,
+            "owner": self.owner,
+        }
+        return {key: value for key, value in values.items() if value}
+
+
+@dataclass
+class EventPage:
+    """One page of the event listing."""
+
+    events: List[Event]
+    filters: EventFilters
+    per_page: int
+    # Cursors of the neighbouring pages, None at either end
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    # Set when the owner filter names no user
+    unknown_owner: bool = field(default=False)
+
 
 class EventService(BaseService[Event]):
     """Service class for managing events."""
@@ -33,6 +124,90 @@ class EventService(BaseService[Event]):
             )
         return cast(List[Event], Event.query.all())
 
+    @classmethod
+    def get_page(
+        cls,
+        filters: Optional[EventFilters] = None,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        per_page: int = 50,
+    ) -> EventPage:
+        """
+        Get one page of events, latest send time first.
+
+        Pages are found by their (timestamp, id) bounds instead of an
+        offset, so every page costs one index range scan of per_page + 1
+        rows whatever the size of the table. Only the listed columns are
+        loaded; bodies are never read.
+
+        Args:
+            filters: Status, send date range and owner to list
+            after: Cursor of the last event of the previous page
+            before: Cursor of the first event of the next page, to page back
+            per_page: Events per page
+
+        Returns:
+            The page with the cursors of its neighbours
+
+        Raises:
+            ValueError: If a cursor is malformed
+        """
+        filters = filters or EventFilters()
+        page = EventPage([], filters, per_page)
+        query = db.select(Event).options(
+            db.load_only(
+                Event.id,
+                Event._email_subject,
+                Event.preview,
+                Event.timestamp,
+                Event._is_done,
+                Event.user_id,
+            ),
+            db.joinedload(Event.user).load_only(User.username),
+        )
+        if filters.status is not None:
+            query = query.where(Event._is_done.is_(filters.status == "sent"))
+        if filters.start is not None:
+            query = query.where(Event.timestamp >= filters.start)
+        if filters.end is not None:
+            query = query.where(Event.timestamp < filters.end + timedelta(days=1))
+        if filters.owner is not None:
+            user_id = db.session.scalar(
+                db.select(User.id).where(User.username == filters.owner)
+            )
+            if user_id is None:
+                page.unknown_owner = True
+                return page
+            query = query.where(Event.user_id == user_id)
+
+        key = db.tuple_(Event.timestamp, Event.id)
+        backwards = before is not None
+        if backwards:
+            query = query.where(key > decode_cursor(before)).order_by(
+                Event.timestamp, Event.id
+            )
+        else:
+            if after is not None:
+                query = query.where(key < decode_cursor(after))
+            query = query.order_by(Event.timestamp.desc(), Event.id.desc())
+        events = list(db.session.scalars(query.limit(per_page + 1)).unique())
+        more = len(events) > per_page
+        events = events[:per_page]
+        if backwards:
+            events.reverse()
+        page.events = events
+        if not events:
+            return page
+        # Paging back always came from a later page; paging on from an
+        # earlier one
+        has_next = backwards or more
+        has_prev = more if backwards else after is not None
+        if has_next:
+            page.next_cursor = encode_cursor((events[-1].timestamp, events[-1].id))
+        if has_prev:
+            page.prev_cursor = encode_cursor((events[0].timestamp, events[0].id))
+        return page
+
     # Legacy adapter for backward compatibility
     @classmethod
     def get_all_events(cls) -> List[Event]:
@@ -50,7 +225,7 @@ class EventService(BaseService[Event]):
         Returns:
             Event object if found, None otherwise
         """
-        return cast(Optional[Event], Event.query.get(item_id))
+        return cast(Optional[Event], db.session.get(Event, item_id))
 
     # Legacy adapter for backward compatibility
     @classmethod
@@ -101,6 +276,11 @@ class EventService(BaseService[Event]):
         """
         Update an existing event.
 
+        A new ``timestamp`` moves the event's scheduled send job to it
+        before the change is saved; a ``timezone`` gives the IANA zone of a
+        timestamp without offset. Events whose chunks are being sent cannot
+        be re-timed.
+
         Args:
             item_id: ID of the event to update
             data: Dictionary containing updated event data
@@ -109,16 +289,25 @@ class EventService(BaseService[Event]):
             True if successful, error message if not
         """
         try:
-            event = Event.query.get(item_id)
+            event = db.session.get(Event, item_id)
             if not event:
                 return Markup("<strong>Error!</strong> Event does not exist.")
 
             # Update event attributes
             event.email_subject = data.get("name", event.email_subject)
             event.email_content = data.get("notes", event.email_content)
+            timestamp = data.get("timestamp")
+            if timestamp is not None:
+                timestamp = dt_utc(timestamp, data.get("timezone"))
+                if timestamp != event.timestamp:
+                    event.timestamp = timestamp
+                    # Move the job first: if Redis fails, nothing is saved
+                    retime_mail(event)
 
             # Save changes
             db.session.commit()
+            # Drop the rendered message of the old subject and content
+            get_message_cache().invalidate(item_id)
             return True
         except Exception as e:
             db.session.rollback()
@@ -133,7 +322,7 @@ class EventService(BaseService[Event]):
     @classmethod
     def delete(cls, item_id: int) -> Union[bool, Markup]:
         """
-        Delete an event.
+        Delete an event and cancel its scheduled send job.
 
         Args:
             item_id: ID of the event to delete
@@ -142,11 +331,16 @@ class EventService(BaseService[Event]):
             True if successful, error message if not
         """
         try:
-            event = Event.query.get(item_id)
+            event = db.session.get(Event, item_id)
             if not event:
                 return Markup("<strong>Error!</strong> Event does not exist.")
 
-            # Delete the event
+            # Cancel first, so an unreachable scheduler leaves the event as is
+            cancel_mail(event)
+            # One statement instead of loading every recipient to orphan it
+            db.session.execute(
+                db.delete(Recipient).where(Recipient.event_id == item_id)
+            )
             db.session.delete(event)
             db.session.commit()
             return True
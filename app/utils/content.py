@@ -0,0 +1,145 @@
+"""Email content classification.
+
+Deciding whether an email body is HTML takes a full parse of the body. It is
+done once, when the content is stored, and the result is kept on the event
+together with a plain-text alternative and a hash of the content, so sending
+only has to assemble the stored parts. A one-line preview is kept as well, so
+event listings never load the body.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+
+CONTENT_TYPE_TEXT = "text/plain"
+CONTENT_TYPE_HTML = "text/html"
+# Characters of the body shown in event listings, see make_preview()
+PREVIEW_LENGTH = 120
+
+# Elements whose text never belongs in the plain-text alternative.
+_INVISIBLE_TAGS = frozenset(("script", "style", "head", "title", "template"))
+# Elements that end a line of the plain-text alternative.
+_BLOCK_TAGS = frozenset(
+    (
+        "address article blockquote br dd div dl dt footer h1 h2 h3 h4 h5 h6 "
+        "header hr li ol p pre section table td th tr ul"
+    ).split()
+)
+_WHITESPACE = re.compile(r"\s+")
+
+_Attrs = List[Tuple[str, Optional[str]]]
+
+
+@dataclass(frozen=True)
+class ContentParts:
+    """Result of classifying an email body."""
+
+    content_type: str
+    text: Optional[str]
+    content_hash: str
+
+    @property
+    def is_html(self) -> bool:
+        """Tell whether the body is sent as HTML."""
+        return self.content_type == CONTENT_TYPE_HTML
+
+
+class _TextExtractor(HTMLParser):
+    """Single pass over a body noting whether it has tags and its text."""
+
+    def __init__(self) -> None:
+        """Initialize an empty extractor."""
+        super().__init__(convert_charrefs=True)
+        self.has_tags = False
+        self.parts: List[str] = []
+        self._hidden = 0
+
+    def handle_starttag(self, tag: str, attrs: _Attrs) -> None:
+        """Enter an element, hiding the text of invisible ones."""
+        self.has_tags = True
+        if tag in _INVISIBLE_TAGS:
+            self._hidden += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_startendtag(self, tag: str, attrs: _Attrs) -> None:
+        """Handle a self-closing element such as ``<br/>``."""
+        self.has_tags = True
+        if tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        """Leave an element."""
+        if tag in _INVISIBLE_TAGS:
+            self._hidden = max(0, self._hidden - 1)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data: str) -> None:
+        """Collect visible text with whitespace collapsed as browsers do."""
+        if not self._hidden:
+            self.parts.append(_WHITESPACE.sub(" ", data))
+
+    def text(self) -> str:
+        """Return the visible text, one block per line."""
+        lines = (line.strip() for line in "".join(self.parts).splitlines())
+        return "\n".join(line for line in lines if line)
+
+
+def content_hash(content: str) -> str:
+    """
+    Hash an email body.
+
+    Args:
+        content: Email body
+
+    Returns:
+        Hex encoded SHA-256 digest of the UTF-8 encoded body
+    """
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def classify_content(content: str) -> ContentParts:
+    """
+    Classify an email body as HTML or plain text.
+
+    A body containing at least one element is HTML. Its plain-text
+    alternative keeps the visible text with one block element per line.
+
+    Args:
+        content: Email body as entered by the user
+
+    Returns:
+        ContentParts with the content type, a plain-text alternative for
+        HTML bodies (None for plain text) and the content hash
+    """
+    parser = _TextExtractor()
+    parser.feed(content)
+    parser.close()
+    if parser.has_tags:
+        return ContentParts(CONTENT_TYPE_HTML, parser.text(), content_hash(content))
+    return ContentParts(CONTENT_TYPE_TEXT, None, content_hash(content))
+
+
+def make_preview(content: str, parts: ContentParts) -> str:
+    """
+    Summarize an email body for listings.
+
+    Args:
+        content: Email body
+        parts: Its classification, see classify_content()
+
+    Returns:
+        The start of the visible text on one line, at most PREVIEW_LENGTH
+        characters long
+    """
+    text = parts.text if parts.is_html else content
+    text = _WHITESPACE.sub(" ", text or "").strip()
+    if len(text) <= PREVIEW_LENGTH:
+        return text
+    end = PREVIEW_LENGTH - 3
+    return text[:end].rstrip() + "..."
@@ -0,0 +1,70 @@
+"""Lightweight counters shared by all processes.
+
+Metrics are kept as fields of one Redis hash so every worker adds to the
+same numbers and the API can report them without a metrics backend.
+Recording never fails the caller: when Redis is unavailable the value is
+dropped and a debug message is logged.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Dict
+
+from redis.exceptions import RedisError
+
+from app.extensions import rq
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY = "mail_scheduler:metrics"
+
+
+def incr(name: str, amount: float = 1) -> None:
+    """
+    Add to a counter.
+
+    Args:
+        name: Metric name, e.g. ``rate_limit.throttled_sends``
+        amount: Value to add
+    """
+    try:
+        rq.connection.hincrbyfloat(METRICS_KEY, name, amount)
+    except (RedisError, OSError) as e:
+        logger.debug(f"Dropped metric {name}: {e}")
+
+
+def observe(name: str, value: float) -> None:
+    """
+    Record one observation of a value, e.g. a duration in seconds.
+
+    Keeps ``<name>.count`` and ``<name>.sum`` so averages can be derived.
+
+    Args:
+        name: Metric name
+        value: Observed value
+    """
+    try:
+        pipe = rq.connection.pipeline(transaction=False)
+        pipe.hincrbyfloat(METRICS_KEY, f"{name}.count", 1)
+        pipe.hincrbyfloat(METRICS_KEY, f"{name}.sum", value)
+        pipe.execute()
+    except (RedisError, OSError) as e:
+        logger.debug(f"Dropped metric {name}: {e}")
+
+
+def snapshot() -> Dict[str, float]:
+    """
+    Read every metric.
+
+    Returns:
+        Mapping of metric name to value, empty when Redis is unavailable
+    """
+    try:
+        raw = rq.connection.hgetall(METRICS_KEY)
+    except (RedisError, OSError) as e:
+        logger.warning(f"Could not read metrics: {e}")
+        return {}
+    return {
+        (k.decode() if isinstance(k, bytes) else k): float(v) for k, v in raw.items()
+    }
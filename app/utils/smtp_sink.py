@@ -0,0 +1,212 @@
+"""
+Minimal in-process SMTP sink.
+
+Accepts SMTP sessions on a local port and keeps every message it receives in
+memory instead of delivering it. Used by the benchmarks and by tests that
+need a real SMTP conversation without a relay.
+"""
+
+from __future__ import annotations
+
+import socketserver
+import threading
+import time
+from dataclasses import dataclass, field
+from email.parser import BytesHeaderParser
+from typing import List, Optional, Set, Tuple
+
+
+@dataclass
+class ReceivedMessage:
+    """A message accepted by the sink."""
+
+    mail_from: str
+    rcpt_to: List[str]
+    data: bytes
+
+    @property
+    def message_id(self) -> Optional[str]:
+        """Return the Message-ID header of the message, if any."""
+        return BytesHeaderParser().parsebytes(self.data).get("Message-ID")
+
+
+@dataclass
+class SinkState:
+    """Shared state of a running sink."""
+
+    messages: List[ReceivedMessage] = field(default_factory=list)
+    connections: int = 0
+    handshake_delay: float = 0.0
+    dedupe: bool = False
+    seen_ids: Set[str] = field(default_factory=set)
+    duplicates: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def accept(self, message: ReceivedMessage) -> None:
+        """Store a message, dropping repeated Message-IDs when deduping."""
+        with self.lock:
+            if self.dedupe and message.message_id:
+                if message.message_id in self.seen_ids:
+                    self.duplicates += 1
+                    return
+                self.seen_ids.add(message.message_id)
+            self.messages.append(message)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib to send mail."""
+
+    server: "_SinkServer"
+
+    def reply(self, line: str) -> None:
+        """Write one reply line to the client."""
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self) -> None:
+        """Run one SMTP session until QUIT or disconnect."""
+        state = self.server.state
+        with state.lock:
+            state.connections += 1
+        if state.handshake_delay:
+            # Stands in for the TCP + TLS + AUTH cost of a real relay.
+            time.sleep(state.handshake_delay)
+        self.reply("220 sink ESMTP")
+        mail_from: Optional[str] = None
+        rcpt_to: List[str] = []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            command, _, arg = raw.decode("ascii", "replace").strip().partition(" ")
+            command = command.upper()
+            if command == "EHLO":
+                self.reply("250-sink")
+                self.reply("250 8BITMIME")
+            elif command == "HELO":
+                self.reply("250 sink")
+            elif command == "MAIL":
+                mail_from, rcpt_to = _address(arg), []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                rcpt_to.append(_address(arg))
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = self._read_data()
+                state.accept(ReceivedMessage(mail_from or "", rcpt_to, data))
+                mail_from, rcpt_to = None, []
+                self.reply("250 OK queued")
+            elif command == "RSET":
+                mail_from, rcpt_to = None, []
+                self.reply("250 OK")
+            elif command == "NOOP":
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def _read_data(self) -> bytes:
+        """Read a DATA payload up to the terminating dot line."""
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line == b".\r\n":
+                break
+            if line.startswith(b".."):
+                line = line[1:]
+            lines.append(line)
+        return b"".join(lines)
+
+
+def _address(arg: str) -> str:
+    """Extract the address from a ``FROM:<a@b>`` or ``TO:<a@b>`` argument."""
+    _, _, value = arg.partition(":")
+    return value.strip().split(" ")[0].strip("<>")
+
+
+class _SinkServer(socketserver.ThreadingTCPServer):
+    """Threaded TCP server carrying the sink state."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int], state: SinkState) -> None:
+        super().__init__(address, _SMTPHandler)
+        self.state = state
+
+
+class SMTPSink:
+    """
+    SMTP server running in a background thread.
+
+    Example:
+        >>> with SMTPSink() as sink:
+        ...     app.config["MAIL_PORT"] = sink.port
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        handshake_delay: float = 0.0,
+        dedupe: bool = False,
+    ) -> None:
+        """
+        Initialize the sink.
+
+        Args:
+            host: Interface to listen on
+            port: Port to listen on, 0 picks a free one
+            handshake_delay: Seconds to wait before greeting a new client
+            dedupe: Drop messages whose Message-ID was already received, the
+                way relays deduplicate resent mail
+        """
+        self.state = SinkState(handshake_delay=handshake_delay, dedupe=dedupe)
+        self._server = _SinkServer((host, port), self.state)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def host(self) -> str:
+        """Return the address the sink listens on."""
+        return str(self._server.server_address[0])
+
+    @property
+    def port(self) -> int:
+        """Return the port the sink listens on."""
+        return int(self._server.server_address[1])
+
+    @property
+    def messages(self) -> List[ReceivedMessage]:
+        """Return a snapshot of the received messages."""
+        with self.state.lock:
+            return list(self.state.messages)
+
+    @property
+    def duplicates(self) -> int:
+        """Return the number of messages dropped as duplicates."""
+        return self.state.duplicates
+
+    @property
+    def connections(self) -> int:
+        """Return the number of SMTP sessions opened so far."""
+        return self.state.connections
+
+    def start(self) -> "SMTPSink":
+        """Start serving in the background."""
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the listening socket."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "SMTPSink":
+        """Start the sink when entering a with block."""
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Stop the sink when leaving a with block."""
+        self.stop()
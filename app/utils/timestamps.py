@@ -0,0 +1,155 @@
+"""Parsing of send times.
+
+Send times arrive as strings in API payloads, bulk submissions and forms and
+are stored as naive UTC datetimes. Parsing goes through two paths:
+
+* ISO-8601 strings (``2025-05-10T12:00:00+08:00``, ``2025-05-10 12:00``,
+  ``...Z``) are parsed by datetime.fromisoformat, which is strict and fast
+* anything else (``10 May 2025 12:00 +08``, RFC 2822) falls back to dateutil
+
+A string may end with an IANA zone name (``2025-05-10 12:00 Asia/Jakarta``),
+and callers can pass the zone separately; it applies to times without an
+offset. Times with neither are in the server's local zone, resolved once per
+process. Zones are looked up once per name, and parsed strings are kept in
+an LRU of TIMESTAMP_CACHE_SIZE entries, since bulk submissions tend to
+repeat the same few send times.
+
+Strings that cannot be parsed and unknown zones raise ValueError.
+"""
+
+from __future__ import annotations
+
+from datetime import UTC, datetime
+from functools import lru_cache
+from typing import Optional, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import dateutil.parser
+from tzlocal import get_localzone
+
+# Number of distinct (timestamp, zone) strings whose parse is kept
+TIMESTAMP_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name: str) -> ZoneInfo:
+    """
+    Return the zone with an IANA name, e.g. "Europe/Berlin".
+
+    Args:
+        name: IANA zone name
+
+    Returns:
+        The zone, looked up once per name
+
+    Raises:
+        ValueError: If no zone has this name
+    """
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        raise ValueError(f"Unknown timezone: {name!r}") from e
+
+
+@lru_cache(maxsize=1)
+def local_timezone():
+    """Return the server's local zone, resolved once per process."""
+    return get_localzone()
+
+
+def to_utc(moment: datetime, tz: Optional[str] = None) -> datetime:
+    """
+    Convert a datetime to naive UTC.
+
+    Args:
+        moment: Aware datetime, or naive one in tz
+        tz: IANA zone of a naive moment, the local zone by default
+
+    Returns:
+        Naive datetime in UTC
+
+    Raises:
+        ValueError: If tz is not a known zone or the moment is out of the
+            datetime range in UTC
+    """
+    if moment.tzinfo is None:
+        zone = get_timezone(tz) if tz else local_timezone()
+        if hasattr(zone, "localize"):
+            # pytz zones need localize() to pick the right offset
+            moment = zone.localize(moment)
+        else:
+            moment = moment.replace(tzinfo=zone)
+    try:
+        return moment.astimezone(UTC).replace(tzinfo=None)
+    except OverflowError as e:
+        raise ValueError(f"Datetime out of range: {moment.isoformat()}") from e
+
+
+def to_local(moment: datetime) -> datetime:
+    """
+    Convert a stored naive UTC datetime to the server's local zone.
+
+    The inverse of to_utc() without a zone, for forms that show a send time
+    and read it back as local time.
+
+    Args:
+        moment: Naive datetime in UTC
+
+    Returns:
+        Naive datetime in the local zone
+    """
+    local = moment.replace(tzinfo=UTC).astimezone(local_timezone())
+    return local.replace(tzinfo=None)
+
+
+@lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
+def parse_timestamp(text: str, tz: Optional[str] = None) -> datetime:
+    """
+    Parse a send time into naive UTC.
+
+    Args:
+        text: ISO-8601 or other dateutil-readable time, optionally followed
+            by an IANA zone name
+        tz: IANA zone of a time without offset or zone name
+
+    Returns:
+        Naive datetime in UTC
+
+    Raises:
+        ValueError: If the string cannot be parsed or a zone is unknown
+    """
+    text = text.strip()
+    head, _, tail = text.rpartition(" ")
+    # Area/Location names never occur in dateutil formats
+    if head and "/" in tail and tail[0].isalpha():
+        text, tz = head, tail
+    try:
+        moment = datetime.fromisoformat(text)
+    except ValueError:
+        try:
+            moment = dateutil.parser.parse(text)
+        except (ValueError, OverflowError) as e:
+            raise ValueError(f"Invalid datetime format: {text!r}") from e
+    return to_utc(moment, tz)
+
+
+def dt_utc(dt: Union[str, datetime], tz: Optional[str] = None) -> datetime:
+    """
+    Convert a send time to naive UTC before storing it.
+
+    Args:
+        dt: Datetime string or object, possibly with timezone info
+        tz: IANA zone of a time without timezone info, the server's local
+            zone by default
+
+    Returns:
+        Datetime object in UTC, without tzinfo
+
+    Raises:
+        ValueError: If dt cannot be parsed or tz is not a known zone
+    """
+    if isinstance(dt, datetime):
+        return to_utc(dt, tz)
+    if not isinstance(dt, str):
+        raise ValueError(f"Invalid datetime: {dt!r}")
+    return parse_timestamp(dt, tz or None)
@@ -0,0 +1,108 @@
+"""
+Benchmark storing an event's recipient list.
+
+For every size in ``--sizes`` it stores that many addresses for one event
+two ways:
+
+* ``orm``: one Recipient object per address added to the session, the way
+  add_recipients() worked before; only run up to ``--orm-max`` addresses
+* ``bulk``: add_recipients(), which inserts in chunks of
+  RECIPIENT_INSERT_CHUNK with executemany, or COPY on Postgres
+
+and prints addresses per second. With ``--memory`` the runs are traced
+with tracemalloc and the peak allocation is printed as well; tracing slows
+both modes down, so compare times from runs without it.
+
+Uses an in-memory SQLite database unless ``--database-url`` is given. Use a
+scratch database: the tables are dropped and recreated before every run.
+
+Usage:
+    python benchmarks/bench_add_recipients.py \\
+        --database-url postgresql://localhost/mail_scheduler_bench
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from typing import Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config, create_app  # noqa: E402
+from app.database import db  # noqa: E402
+from app.database.models import Recipient  # noqa: E402
+from app.event.jobs import add_recipients, parse_recipients  # noqa: E402
+
+EVENT_ID = 1
+
+
+def make_config(database_url: str) -> type:
+    """Build an app config that talks to the given database."""
+
+    class BenchConfig(config.TestingConfig):
+        SQLALCHEMY_DATABASE_URI = database_url
+
+    return BenchConfig
+
+
+def add_recipients_orm(data: str, event_id: int) -> None:
+    """Store recipients one ORM object at a time, as before."""
+    for email, name in parse_recipients(data):
+        db.session.add(Recipient(email=email, name=name, event_id=event_id))
+    db.session.commit()
+
+
+def run(mode: str, data: str, memory: bool) -> Tuple[float, float]:
+    """Store the recipients; return elapsed seconds and peak MB."""
+    func = add_recipients if mode == "bulk" else add_recipients_orm
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    func(data, EVENT_ID)
+    elapsed = time.perf_counter() - start
+    peak = 0.0
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def main() -> None:
+    """Run the benchmark and print a small report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", default="sqlite:///:memory:")
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--orm-max", type=int, default=100_000)
+    parser.add_argument("--memory", action="store_true")
+    args = parser.parse_args()
+
+    app = create_app(make_config(args.database_url))
+    with app.app_context():
+        print(
+            f"{'mode':<6}{'addresses':>11}{'seconds':>10}{'addr/s':>12}{'peak MB':>10}"
+        )
+        for size in (int(s) for s in args.sizes.split(",")):
+            data = ", ".join(f"user{i}@example.com" for i in range(size))
+            for mode in ("orm", "bulk"):
+                if mode == "orm" and size > args.orm_max:
+                    continue
+                db.session.remove()
+                db.drop_all()
+                db.create_all()
+                elapsed, peak = run(mode, data, args.memory)
+                assert (
+                    db.session.query(Recipient).filter_by(event_id=EVENT_ID).count()
+                    == size
+                )
+                print(
+                    f"{mode:<6}{size:>11}{elapsed:>10.2f}{size / elapsed:>12.0f}"
+                    f"{peak:>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
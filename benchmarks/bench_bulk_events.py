@@ -0,0 +1,117 @@
+"""
+Benchmark creating events through the bulk path and one at a time.
+
+For every size in ``--sizes`` it creates that many events, each with
+``--recipients`` recipients, two ways:
+
+* ``bulk``: add_events(), as called by POST /api/events/bulk
+* ``single``: add_event() once per event, as POST /api/save_emails does;
+  only run up to ``--single-max`` events because it is slow
+
+and prints events per second. The tables are recreated before every run.
+
+Needs a Redis server for the scheduling half. ``--no-redis`` leaves the
+send jobs out in both modes and measures the database writes alone. Use a
+scratch Redis database and a scratch SQL database: the scheduled set is
+deleted after each run and the tables are dropped.
+
+Usage:
+    python benchmarks/bench_bulk_events.py --redis-url redis://localhost:6379/15 \\
+        --database-url postgresql://localhost/mail_scheduler_bench
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import os
+import sys
+import time
+from datetime import UTC, datetime, timedelta
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config, create_app  # noqa: E402
+from app.database import db  # noqa: E402
+from app.event.bulk import add_events  # noqa: E402
+from app.event.jobs import add_event  # noqa: E402
+from app.extensions import rq  # noqa: E402
+
+
+def make_config(redis_url: str, database_url: str) -> type:
+    """Build an app config that talks to the given Redis and database."""
+
+    class BenchConfig(config.TestingConfig):
+        RQ_REDIS_URL = redis_url
+        RQ_ASYNC = True
+        SQLALCHEMY_DATABASE_URI = database_url
+        BULK_EVENTS_MAX_ITEMS = 10_000_000
+
+    return BenchConfig
+
+
+def make_items(count: int, recipients: int) -> List[Dict[str, Any]]:
+    """Event payloads due over the next day."""
+    start = datetime.now(UTC) + timedelta(hours=1)
+    return [
+        {
+            "subject": f"Bench {i}",
+            "content": f"<p>Hello number {i}</p>",
+            "timestamp": (start + timedelta(seconds=i % 86400)).isoformat(),
+            "recipients": ", ".join(
+                f"user{i}-{r}@example.com" for r in range(recipients)
+            ),
+        }
+        for i in range(count)
+    ]
+
+
+def run(mode: str, items: List[Dict[str, Any]], no_redis: bool) -> float:
+    """Create the events and return the elapsed seconds."""
+    with contextlib.ExitStack() as stack:
+        if no_redis:
+            stack.enter_context(patch("app.event.bulk.schedule_events"))
+            stack.enter_context(patch("app.event.jobs.schedule_mail"))
+        start = time.perf_counter()
+        if mode == "bulk":
+            results = add_events(items)
+            assert all("id" in result for result in results)
+        else:
+            for item in items:
+                add_event(item)
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    """Run the benchmark and print a small report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--database-url", default="sqlite:///:memory:")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--recipients", type=int, default=3)
+    parser.add_argument("--single-max", type=int, default=10_000)
+    parser.add_argument("--no-redis", action="store_true")
+    args = parser.parse_args()
+
+    app = create_app(make_config(args.redis_url, args.database_url))
+    with app.app_context():
+        print(f"{'mode':<8}{'events':>10}{'seconds':>10}{'events/s':>12}")
+        for size in (int(s) for s in args.sizes.split(",")):
+            items = make_items(size, args.recipients)
+            for mode in ("bulk", "single"):
+                if mode == "single" and size > args.single_max:
+                    continue
+                db.drop_all()
+                db.create_all()
+                elapsed = run(mode, items, args.no_redis)
+                print(f"{mode:<8}{size:>10}{elapsed:>10.2f}{size / elapsed:>12.0f}")
+                if not args.no_redis:
+                    scheduler = rq.get_scheduler()
+                    scheduler.connection.delete(scheduler.scheduled_jobs_key)
+        db.session.remove()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark cancelling and re-timing one event's send job among many.
+
+Fills the rq-scheduler sorted set with ``--jobs`` scheduled send jobs and
+measures cancel_mail and retime_mail for randomly picked events, which
+address their job by the ID stored on the event. For comparison it also
+times finding a job the way it had to be done before job IDs were stored:
+scanning the scheduled set for the event. That scan only compares member
+names, so it is a lower bound of the old cost, which also loaded every job.
+
+Needs a Redis server. Use a scratch database: the scheduler key is shared
+with any scheduler using the same database.
+
+Usage:
+    python benchmarks/bench_cancel.py --redis-url redis://localhost:6379/15
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rq.job import Job  # noqa: E402
+
+from app import config, create_app  # noqa: E402
+from app.event.jobs import cancel_mail, retime_mail, send_job_id  # noqa: E402
+from app.extensions import rq  # noqa: E402
+
+BATCH = 10_000
+
+
+def make_config(redis_url: str) -> type:
+    """Build an app config that talks to the given Redis."""
+
+    class BenchConfig(config.TestingConfig):
+        RQ_REDIS_URL = redis_url
+        RQ_ASYNC = True
+
+    return BenchConfig
+
+
+def fill(connection, key: str, count: int) -> None:
+    """Schedule ``count`` send jobs over the next day."""
+    now = time.time()
+    pipe = connection.pipeline(transaction=False)
+    for start in range(0, count, BATCH):
+        members = {
+            send_job_id(event_id): now + random.uniform(60, 86400)
+            for event_id in range(start, min(count, start + BATCH))
+        }
+        pipe.zadd(key, members)
+        pipe.execute()
+
+
+def timed(func: Callable[[int], object], event_ids: List[int]) -> List[float]:
+    """Run func for every event ID and return latencies in microseconds."""
+    latencies = []
+    for event_id in event_ids:
+        start = time.perf_counter()
+        func(event_id)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def report(name: str, latencies: List[float]) -> None:
+    """Print latency percentiles."""
+    ordered = sorted(latencies)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    print(
+        f"{name:<22}{len(ordered):>8}{statistics.median(ordered):>10.0f}"
+        f"{pct(0.95):>10.0f}{pct(0.99):>10.0f}{ordered[-1]:>12.0f}"
+    )
+
+
+def main() -> None:
+    """Run the benchmark and print a small report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--jobs", type=int, default=1_000_000)
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--scan-samples", type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app(make_config(args.redis_url))
+    with app.app_context():
+        scheduler = rq.get_scheduler()
+        connection = scheduler.connection
+        key = scheduler.scheduled_jobs_key
+        connection.delete(key)
+
+        started = time.perf_counter()
+        fill(connection, key, args.jobs)
+        print(f"Scheduled {args.jobs} jobs in {time.perf_counter() - started:.1f}s")
+
+        picked = random.sample(range(args.jobs), args.samples * 2)
+        to_retime = picked[: args.samples]
+        to_cancel = picked[args.samples :]  # noqa: E203
+        later = datetime.now(UTC).replace(tzinfo=None) + timedelta(days=2)
+
+        def retime(event_id: int) -> object:
+            event = SimpleNamespace(
+                id=event_id,
+                job_id=send_job_id(event_id),
+                timestamp=later,
+                is_done=False,
+            )
+            return retime_mail(event)  # type: ignore[arg-type]
+
+        def cancel(event_id: int) -> object:
+            event = SimpleNamespace(id=event_id, job_id=send_job_id(event_id))
+            return cancel_mail(event)  # type: ignore[arg-type]
+
+        def scan(event_id: int) -> object:
+            wanted = send_job_id(event_id).encode()
+            for member, _ in connection.zscan_iter(key, count=BATCH):
+                if member == wanted:
+                    return member
+            return None
+
+        print(
+            f"{'operation (us)':<22}{'samples':>8}{'p50':>10}{'p95':>10}"
+            f"{'p99':>10}{'max':>12}"
+        )
+        report("retime_mail", timed(retime, to_retime))
+        report("cancel_mail", timed(cancel, to_cancel))
+        report("scan (old, lower bd)", timed(scan, to_retime[: args.scan_samples]))
+
+        remaining = connection.zcard(key)
+        assert remaining == args.jobs - args.samples, remaining
+        assert not Job.exists(send_job_id(to_cancel[0]), connection=connection)
+        connection.delete(key)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark dispatch lag of scheduled jobs.
+
+Schedules ``--jobs`` jobs with due times spread evenly over ``--duration``
+seconds and measures, for every job, how late it was moved to its queue.
+Two modes are compared:
+
+* ``dispatcher``: the precise dispatcher, sleeping until the next due time
+* ``poll``: the same move script run every ``--interval`` seconds, the way
+  rq-scheduler polls (RQ_SCHEDULER_INTERVAL)
+
+Needs a Redis server. Use a scratch database: the scheduler key and the
+``bench-dispatch`` queue are deleted before and after each run.
+
+Usage:
+    python benchmarks/bench_dispatcher.py --redis-url redis://localhost:6379/15
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+import time
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rq.job import Job  # noqa: E402
+from rq.queue import Queue  # noqa: E402
+
+from app import config, create_app  # noqa: E402
+from app.event.dispatcher import Dispatcher  # noqa: E402
+from app.extensions import rq  # noqa: E402
+
+QUEUE = "bench-dispatch"
+BATCH = 10_000
+
+
+def make_config(redis_url: str) -> type:
+    """Build an app config that talks to the given Redis."""
+
+    class BenchConfig(config.TestingConfig):
+        RQ_REDIS_URL = redis_url
+        RQ_ASYNC = True
+
+    return BenchConfig
+
+
+def clean(connection, key: str, count: int) -> None:
+    """Drop the scheduled set, the queue and the job hashes."""
+    connection.delete(key, Queue.redis_queue_namespace_prefix + QUEUE)
+    for start in range(0, count, BATCH):
+        connection.delete(
+            *(
+                Job.redis_job_namespace_prefix + f"bench-{i}"
+                for i in range(start, min(count, start + BATCH))
+            )
+        )
+
+
+def schedule(connection, key: str, count: int, start: float, duration: float) -> None:
+    """Schedule ``count`` minimal jobs evenly between start and start+duration."""
+    pipe = connection.pipeline(transaction=False)
+    step = duration / count
+    for first in range(0, count, BATCH):
+        members = {}
+        for i in range(first, min(count, first + BATCH)):
+            job_id = f"bench-{i}"
+            pipe.hset(Job.redis_job_namespace_prefix + job_id, "origin", QUEUE)
+            members[job_id] = start + i * step
+        pipe.zadd(key, members)
+        pipe.execute()
+
+
+def run(
+    dispatcher: Dispatcher, mode: str, interval: float, until: float
+) -> Tuple[List[float], int]:
+    """
+    Dispatch until ``until``.
+
+    Returns:
+        The lag of every job in seconds and the number of script calls
+    """
+    lags: List[float] = []
+    calls = 0
+    move_due = dispatcher.move_due
+
+    def measured_move_due():
+        nonlocal calls
+        moved, next_due = move_due()
+        now = time.time()
+        calls += 1
+        lags.extend(now - score for score in moved)
+        return moved, next_due
+
+    dispatcher.move_due = measured_move_due  # type: ignore[method-assign]
+    if mode == "dispatcher":
+        thread = threading.Thread(target=dispatcher.run)
+        thread.start()
+        time.sleep(max(0.0, until - time.time()))
+        dispatcher.stop()
+        thread.join()
+    else:
+        while time.time() < until:
+            dispatcher.dispatch()
+            time.sleep(interval)
+        dispatcher.dispatch()
+    return lags, calls
+
+
+def report(mode: str, lags: List[float], calls: int) -> None:
+    """Print lag percentiles in milliseconds."""
+    ordered = sorted(lags)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    print(
+        f"{mode:<12}{len(ordered):>8}{pct(0.5):>10.1f}{pct(0.9):>10.1f}"
+        f"{pct(0.99):>10.1f}{ordered[-1] * 1000:>10.1f}{calls:>10}"
+    )
+
+
+def main() -> None:
+    """Run the benchmark and print a small report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--jobs", type=int, default=100_000)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--interval", type=float, default=10)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--modes", default="dispatcher,poll")
+    args = parser.parse_args()
+
+    app = create_app(make_config(args.redis_url))
+    with app.app_context():
+        scheduler = rq.get_scheduler()
+        connection = scheduler.connection
+        key = scheduler.scheduled_jobs_key
+
+        print(
+            f"{'mode':<12}{'jobs':>8}{'p50 ms':>10}{'p90 ms':>10}"
+            f"{'p99 ms':>10}{'max ms':>10}{'scripts':>10}"
+        )
+        for mode in args.modes.split(","):
+            clean(connection, key, args.jobs)
+            start = time.time() + 2
+            schedule(connection, key, args.jobs, start, args.duration)
+            dispatcher = Dispatcher(
+                connection, key, batch_size=args.batch_size, max_sleep=5
+            )
+            lags, calls = run(
+                dispatcher, mode, args.interval, start + args.duration + 1
+            )
+            report(mode, lags, calls)
+            assert len(lags) == args.jobs, len(lags)
+        clean(connection, key, args.jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark storing and rendering a recurring campaign body.
+
+Stores ``--events`` events that all send the same ``--body-kb`` KB HTML body
+and renders the message template of each, two ways:
+
+* ``inline``: every event row carries the whole body and every template
+  renders and keeps its own copy, as before the body store
+* ``store``: the body is stored once in EmailBody and rendered once into
+  the message cache, shared by all events
+
+Prints the time to store the events, the size of the SQLite database file,
+the time to render all templates and the bytes the rendered templates take
+in the message cache. Each mode uses a fresh database file in
+``--directory``.
+
+Usage:
+    python benchmarks/bench_email_bodies.py --events 1000 --body-kb 300
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import UTC, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config, create_app  # noqa: E402
+from app.database import db  # noqa: E402
+from app.database.models import Event  # noqa: E402
+from app.event.message_cache import MessageCache, render_template  # noqa: E402
+from app.utils.content import classify_content  # noqa: E402
+
+
+def make_config(database_url: str) -> type:
+    """Build an app config that talks to the given database."""
+
+    class BenchConfig(config.TestingConfig):
+        SQLALCHEMY_DATABASE_URI = database_url
+
+    return BenchConfig
+
+
+def make_body(size_kb: int) -> str:
+    """Build an HTML newsletter body of about size_kb kilobytes."""
+    paragraph = "<p>" + "Lorem ipsum dolor sit amet, consectetur. " * 20 + "</p>\n"
+    count = size_kb * 1024 // len(paragraph) + 1
+    return "<html><body><h1>Weekly</h1>\n" + paragraph * count + "</body></html>"
+
+
+def store_inline(body: str, events: int) -> None:
+    """Insert events carrying the body in their own row."""
+    now = datetime.now(UTC)
+    for i in range(events):
+        # The model classified the content of every event it stored
+        parts = classify_content(body)
+        row = {
+            "_email_subject": f"Week {i}",
+            "_email_content": body,
+            "_content_text": parts.text,
+            "content_type": parts.content_type,
+            "content_hash": parts.content_hash,
+            "timestamp": now,
+            "created_at": now,
+            "_is_done": False,
+        }
+        db.session.execute(db.insert(Event), [row])
+    db.session.commit()
+
+
+def store_shared(body: str, events: int) -> None:
+    """Add events through the model, which stores the body once."""
+    now = datetime.now(UTC)
+    for i in range(events):
+        db.session.add(Event(f"Week {i}", body, now))
+    db.session.commit()
+
+
+def render_inline(events: list) -> int:
+    """Render every template on its own; return the bytes kept."""
+    return sum(len(render_template(event).data) for event in events)
+
+
+def render_shared(events: list) -> int:
+    """Render through the cache; return the bytes kept."""
+    cache = MessageCache(max_bytes=1 << 40)
+    for event in events:
+        cache.get(event)
+    return cache.size
+
+
+def main() -> None:
+    """Run the benchmark and print a small report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--body-kb", type=int, default=300)
+    parser.add_argument("--directory", default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    body = make_body(args.body_kb)
+    print(f"{'mode':<8}{'store s':>9}{'db MB':>9}{'render s':>10}{'cache MB':>10}")
+    modes = (
+        ("inline", store_inline, render_inline),
+        ("store", store_shared, render_shared),
+    )
+    for mode, store, render in modes:
+        path = os.path.join(args.directory, f"bench_email_bodies_{mode}.db")
+        if os.path.exists(path):
+            os.remove(path)
+        app = create_app(make_config(f"sqlite:///{path}"))
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            store(body, args.events)
+            stored = time.perf_counter() - start
+            events = db.session.scalars(db.select(Event).order_by(Event.id)).all()
+            start = time.perf_counter()
+            cached = render(events)
+            rendered = time.perf_counter() - start
+            db.session.remove()
+            db.engine.dispose()
+        size = os.path.getsize(path) / 1e6
+        print(
+            f"{mode:<8}{stored:>9.2f}{size:>9.1f}{rendered:>10.2f}"
+            f"{cached / 1e6:>10.1f}"
+        )
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
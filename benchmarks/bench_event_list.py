@@ -0,0 +1,162 @@
+"""
+Benchmark the web event list.
+
+Stores ``--events`` events with a ``--body-kb`` KB body each and renders the
+event list two ways:
+
+* ``all``: load every event with its content and render them all, as the
+  list page did before pagination
+* ``first`` / ``deep``: render one keyset page of ``--per-page`` events
+  through the list view, at the start and near the end of the listing
+
+Prints the time and the peak Python memory of each. Uses a fresh SQLite
+database file in ``--directory``.
+
+Usage:
+    python benchmarks/bench_event_list.py --events 100000 --body-kb 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import UTC, datetime, timedelta
+from typing import Callable, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template_string  # noqa: E402
+
+from app import config, create_app  # noqa: E402
+from app.database import db  # noqa: E402
+from app.database.models import Event  # noqa: E402
+from app.services.event_service import encode_cursor  # noqa: E402
+from app.utils.content import classify_content, make_preview  # noqa: E402
+
+# The rows of the list page before pagination
+LEGACY_ROWS = """
+{% for item in items %}
+<tr><td>{{ item.email_subject }}</td><td>{{ item.email_content|truncate(50) }}</td>
+<td>{{ item.timestamp.strftime('%Y-%m-%d %H:%M') }}</td>
+<td>{% if item.is_done %}Sent{% else %}Pending{% endif %}</td></tr>
+{% endfor %}
+"""
+
+
+def make_config(database_url: str) -> type:
+    """Build an app config that talks to the given database."""
+
+    class BenchConfig(config.TestingConfig):
+        SQLALCHEMY_DATABASE_URI = database_url
+        LOGIN_DISABLED = True
+
+    return BenchConfig
+
+
+def store_events(count: int, body_kb: int) -> None:
+    """Insert events with distinct bodies stored on the event rows."""
+    start = datetime(2026, 1, 1, tzinfo=UTC)
+    filler = "Lorem ipsum dolor sit amet. " * (body_kb * 1024 // 28 + 1)
+    batch = []
+    for i in range(count):
+        content = f"Issue {i}. {filler}"
+        parts = classify_content(content)
+        batch.append(
+            {
+                "_email_subject": f"Issue {i}",
+                "_email_content": content,
+                "content_type": parts.content_type,
+                "content_hash": parts.content_hash,
+                "preview": make_preview(content, parts),
+                "timestamp": start + timedelta(minutes=i),
+                "created_at": start,
+                "_is_done": i % 2 == 0,
+            }
+        )
+        if len(batch) == 10_000:
+            db.session.execute(db.insert(Event), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(Event), batch)
+    db.session.commit()
+
+
+def measure(func: Callable[[], int]) -> Tuple[int, float, float]:
+    """Run func; return its result, the seconds and the peak MB it took."""
+    db.session.expire_all()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main() -> None:
+    """Run the benchmark and print a small report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--body-kb", type=int, default=2)
+    parser.add_argument("--per-page", type=int, default=50)
+    parser.add_argument("--directory", default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    path = os.path.join(args.directory, "bench_event_list.db")
+    if os.path.exists(path):
+        os.remove(path)
+    app = create_app(make_config(f"sqlite:///{path}"))
+    client = app.test_client()
+    with app.app_context():
+        db.create_all()
+        store_events(args.events, args.body_kb)
+        deep = db.session.execute(
+            db.select(Event.timestamp, Event.id)
+            .order_by(Event.timestamp, Event.id)
+            .limit(1)
+            .offset(args.per_page)
+        ).one()
+
+        def render_all() -> int:
+            # The content column was loaded with every event before it
+            # was deferred
+            events = db.session.scalars(
+                db.select(Event).options(db.undefer(Event._email_content))
+            ).all()
+            with app.test_request_context():
+                return len(render_template_string(LEGACY_ROWS, items=events))
+
+        def render_page(query: str) -> Callable[[], int]:
+            def run() -> int:
+                response = client.get(f"/items/?per_page={args.per_page}{query}")
+                assert response.status_code == 200, response.status_code
+                return len(response.data)
+
+            return run
+
+        print(f"{'mode':<7}{'rows':>9}{'seconds':>10}{'peak MB':>10}")
+        modes = (
+            ("all", render_all, args.events),
+            ("first", render_page(""), args.per_page),
+            (
+                "deep",
+                render_page(f"&after={encode_cursor(tuple(deep))}"),
+                args.per_page,
+            ),
+        )
+        for mode, func, rows in modes:
+            _, elapsed, peak = measure(func)
+            print(f"{mode:<7}{rows:>9}{elapsed:>10.2f}{peak:>10.1f}")
+        db.session.remove()
+        db.engine.dispose()
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Compare the Redis footprint of send_mail job payloads.
+
+Version 1 jobs pickled the full recipient list into the job hash; version 2
+jobs only carry the event id and a payload version. The script builds the job
+hash rq would store for both shapes (no Redis server needed) and reports its
+size and the time to (de)serialize the payload.
+
+Usage:
+    python benchmarks/bench_job_payload.py --recipients 10 1000 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redis import Redis  # noqa: E402
+from rq.job import Job  # noqa: E402
+
+from app.event.jobs import SEND_MAIL_PAYLOAD_VERSION, send_mail  # noqa: E402
+
+
+def job_hash_bytes(job: Job) -> int:
+    """Return the bytes rq writes to the job hash in Redis."""
+    return sum(len(str(k)) + len(str(v)) for k, v in job.to_dict().items())
+
+
+def measure(args: tuple, rounds: int = 20) -> tuple:
+    """Return (hash bytes, serialize ms, deserialize ms) for a payload."""
+    connection = Redis()
+    job = Job.create(send_mail, args=args, connection=connection)
+    size = job_hash_bytes(job)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        job = Job.create(send_mail, args=args, connection=connection)
+        data = job.data
+    dumped = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        restored = Job(connection=connection)
+        restored.data = data
+        restored.args
+    loaded = (time.perf_counter() - start) / rounds
+    return size, dumped * 1000, loaded * 1000
+
+
+def main() -> None:
+    """Print the payload size per job for each recipient count."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--recipients", type=int, nargs="+", default=[10, 1000, 50000])
+    args = parser.parse_args()
+
+    print(
+        f"{'recipients':>10}  {'payload':<8}{'bytes/job':>12}"
+        f"{'dump ms':>10}{'load ms':>10}"
+    )
+    for count in args.recipients:
+        recipients = [f"user{i:07d}@example.com" for i in range(count)]
+        for label, job_args in (
+            ("v1", (1, recipients)),
+            ("v2", (1, SEND_MAIL_PAYLOAD_VERSION)),
+        ):
+            size, dumped, loaded = measure(job_args)
+            print(f"{count:>10}  {label:<8}{size:>12}{dumped:>10.3f}{loaded:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
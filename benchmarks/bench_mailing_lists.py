@@ -0,0 +1,156 @@
+"""
+Benchmark a year of weekly sends to the same audience.
+
+Simulates ``--weeks`` weekly events sent to ``--members`` addresses, of
+which a ``--churn`` fraction is replaced every week, two ways:
+
+* ``copy``: every event gets its own recipient rows, inserted with
+  insert_recipients() and marked sent afterwards, as before mailing lists
+* ``list``: the addresses are stored once in a mailing list, changed with
+  add_members() and remove_members() every week, and each event only
+  references the list and writes its ListProgress checkpoint
+
+Deliveries themselves are not simulated, only the rows a send reads and
+writes. Prints the time spent, the rows written and the size of the
+SQLite database file each mode ends up with. Each mode uses a fresh
+database file in ``--directory``.
+
+Usage:
+    python benchmarks/bench_mailing_lists.py --members 100000 --weeks 52
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import UTC, datetime, timedelta
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config, create_app  # noqa: E402
+from app.database import db  # noqa: E402
+from app.database.models import (  # noqa: E402
+    DeliveryStatus,
+    Event,
+    ListProgress,
+    Recipient,
+)
+from app.event.jobs import insert_recipients  # noqa: E402
+from app.event.lists import add_members, create_list, remove_members  # noqa: E402
+
+
+def make_config(database_url: str) -> type:
+    """Build an app config that talks to the given database."""
+
+    class BenchConfig(config.TestingConfig):
+        SQLALCHEMY_DATABASE_URI = database_url
+
+    return BenchConfig
+
+
+def weekly_changes(
+    members: int, weeks: int, churn: float
+) -> Tuple[List[str], List[Tuple[List[str], List[str]]]]:
+    """Return the first audience and the (removed, added) of every week."""
+    audience = [f"user{i}@example.com" for i in range(members)]
+    step = int(members * churn)
+    changes = []
+    for week in range(weeks):
+        first, end = week * step, (week + 1) * step
+        removed = audience[first:end]
+        added = [f"week{week}.user{i}@example.com" for i in range(step)]
+        changes.append((removed, added))
+    return audience, changes
+
+
+def new_event(week: int) -> Event:
+    """Add the event of one week to the session."""
+    event = Event(
+        email_subject=f"Week {week}",
+        email_content="Weekly news",
+        timestamp=datetime(2026, 1, 5, 9, tzinfo=UTC) + timedelta(weeks=week),
+    )
+    db.session.add(event)
+    db.session.flush()
+    return event
+
+
+def run_copy(audience: List[str], changes: list) -> int:
+    """Copy the audience into recipient rows for every event."""
+    current = dict.fromkeys(audience)
+    rows = 0
+    for week, (removed, added) in enumerate(changes):
+        for email in removed:
+            del current[email]
+        current.update(dict.fromkeys(added))
+        event = new_event(week)
+        rows += insert_recipients((event.id, email, None) for email in current)
+        db.session.execute(
+            db.update(Recipient)
+            .where(Recipient.event_id == event.id)
+            .values(status=DeliveryStatus.SENT, attempts=1)
+        )
+        db.session.commit()
+    return rows
+
+
+def run_list(audience: List[str], changes: list) -> int:
+    """Keep the audience in a mailing list and reference it per event."""
+    mailing_list = create_list("Weekly")
+    rows = len(add_members(mailing_list.id, audience).addresses)
+    for week, (removed, added) in enumerate(changes):
+        remove_members(mailing_list.id, removed)
+        rows += len(add_members(mailing_list.id, added).addresses)
+        event = new_event(week)
+        event.mailing_list_id = mailing_list.id
+        event.list_snapshot_at = datetime.now(UTC)
+        db.session.add(
+            ListProgress(
+                event_id=event.id,
+                first_id=0,
+                sent_through=2**31 - 1,
+                sent=len(audience),
+            )
+        )
+        db.session.commit()
+        rows += 1
+    return rows
+
+
+def main() -> None:
+    """Run the benchmark and print a small report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--weeks", type=int, default=52)
+    parser.add_argument("--churn", type=float, default=0.01)
+    parser.add_argument("--directory", default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    # The list functions log every change; keep the report readable
+    logging.disable(logging.INFO)
+    audience, changes = weekly_changes(args.members, args.weeks, args.churn)
+    print(f"{'mode':<6}{'rows':>12}{'seconds':>10}{'db MB':>10}")
+    for mode, func in (("copy", run_copy), ("list", run_list)):
+        path = os.path.join(args.directory, f"bench_mailing_lists_{mode}.db")
+        if os.path.exists(path):
+            os.remove(path)
+        app = create_app(make_config(f"sqlite:///{path}"))
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            rows = func(audience, changes)
+            elapsed = time.perf_counter() - start
+            db.session.remove()
+            db.engine.dispose()
+        size = os.path.getsize(path) / 1e6
+        print(f"{mode:<6}{rows:>12}{elapsed:>10.2f}{size:>10.1f}")
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark building one email message from an event's content.
+
+Compares the old send path, which parsed the body with BeautifulSoup on
+every send to decide between HTML and text, with the current one, which
+reads the content type and plain-text alternative stored on the event and
+builds a multipart/alternative message from them, and with the cached
+path, which renders that message once per event and only splices the To
+and Message-ID headers in per recipient. All include rendering the message
+to bytes.
+
+Usage:
+    python benchmarks/bench_message_build.py --repeat 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from datetime import UTC, datetime
+from typing import Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+from flask_mail import Message  # noqa: E402
+
+from app import config, create_app  # noqa: E402
+from app.database.models import Event  # noqa: E402
+from app.event.message_cache import MessageTemplate, render_template  # noqa: E402
+from app.utils.content import classify_content  # noqa: E402
+
+SIZES = {"1 KB": 1024, "100 KB": 100 * 1024, "1 MB": 1024 * 1024}
+PARAGRAPH = (
+    "<p>Lorem ipsum dolor sit amet, <b>consectetur</b> adipiscing elit, sed do "
+    '<a href="https://example.com">eiusmod</a> tempor incididunt.</p>\n'
+)
+
+
+def make_body(size: int) -> str:
+    """Build an HTML body of about ``size`` bytes."""
+    return (
+        "<html><body>" + PARAGRAPH * max(1, size // len(PARAGRAPH)) + "</body></html>"
+    )
+
+
+def build_parsed(content: str) -> bytes:
+    """Build a message the old way, parsing the body on every send."""
+    msg = Message(subject="Benchmark", recipients=["bench@example.com"])
+    if BeautifulSoup(content, "html.parser").find():
+        msg.html = content
+    else:
+        msg.body = content
+    return msg.as_bytes()
+
+
+def build_stored(content: str, text: str) -> bytes:
+    """Build a message from the parts stored on the event."""
+    msg = Message(subject="Benchmark", recipients=["bench@example.com"])
+    msg.body = text
+    msg.html = content
+    return msg.as_bytes()
+
+
+def build_cached(template: MessageTemplate) -> bytes:
+    """Build a message from a cached template."""
+    msg = template.message("bench@example.com", "<bench@example.com>")
+    return msg.as_bytes()
+
+
+def timeit(func: Callable[[], bytes], repeat: int) -> float:
+    """Return the mean milliseconds per call."""
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main() -> None:
+    """Run the benchmark and print a small report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app(config.TestingConfig)
+    print(
+        f"{'body':<8}{'parse/send ms':>15}{'stored ms':>12}"
+        f"{'cached ms':>12}{'ingest ms':>12}"
+    )
+    with app.app_context():
+        for label, size in SIZES.items():
+            content = make_body(size)
+            start = time.perf_counter()
+            parts = classify_content(content)
+            ingest = (time.perf_counter() - start) * 1000
+            text = parts.text or ""
+            parsed = timeit(lambda: build_parsed(content), args.repeat)
+            stored = timeit(lambda: build_stored(content, text), args.repeat)
+            event = Event(
+                email_subject="Benchmark",
+                email_content=content,
+                timestamp=datetime.now(UTC),
+            )
+            template = render_template(event)
+            cached = timeit(lambda: build_cached(template), args.repeat)
+            print(
+                f"{label:<8}{parsed:>15.3f}{stored:>12.3f}"
+                f"{cached:>12.3f}{ingest:>12.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
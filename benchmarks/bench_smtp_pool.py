@@ -0,0 +1,99 @@
+"""
+Benchmark send_mail throughput with and without the SMTP connection pool.
+
+Runs the send_mail job body repeatedly in-process against a local SMTP sink,
+the way a worker would execute consecutive jobs, and reports jobs/sec and the
+number of SMTP sessions opened.
+
+Usage:
+    python benchmarks/bench_smtp_pool.py --jobs 500 --handshake-delay 0.02
+
+``--handshake-delay`` makes the sink pause before greeting each new client to
+stand in for the TCP + STARTTLS + AUTH cost of a real relay.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from datetime import UTC, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config, create_app  # noqa: E402
+from app.database import db  # noqa: E402
+from app.database.models import DeliveryStatus, Event, Recipient  # noqa: E402
+from app.event.jobs import send_mail  # noqa: E402
+from app.utils.smtp_sink import SMTPSink  # noqa: E402
+
+
+def make_config(sink: SMTPSink) -> type:
+    """Build an app config that delivers to the sink."""
+
+    class BenchConfig(config.TestingConfig):
+        DEBUG = False
+        MAIL_SERVER = sink.host
+        MAIL_PORT = sink.port
+        MAIL_USE_TLS = False
+        MAIL_USERNAME = None
+        MAIL_PASSWORD = None
+        MAIL_SUPPRESS_SEND = False
+
+    return BenchConfig
+
+
+def run(app, jobs: int, pooled: bool) -> float:
+    """Run ``jobs`` send_mail calls and return the elapsed seconds."""
+    app.config["MAIL_POOL_ENABLED"] = pooled
+    with app.app_context():
+        event = Event(
+            email_subject="Benchmark",
+            email_content="Hello from the benchmark",
+            timestamp=datetime.now(UTC),
+        )
+        db.session.add(event)
+        db.session.commit()
+        db.session.add(Recipient(email="bench@example.com", event_id=event.id))
+        db.session.commit()
+        # Make the same event due again before every run, the way a fresh
+        # event would be
+        reset = (
+            db.update(Recipient)
+            .where(Recipient.event_id == event.id)
+            .values(status=DeliveryStatus.QUEUED)
+        )
+
+        start = time.perf_counter()
+        for _ in range(jobs):
+            event.is_done = False
+            db.session.execute(reset)
+            db.session.commit()
+            send_mail(event.id)
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    """Run the benchmark and print a small report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--jobs", type=int, default=500)
+    parser.add_argument("--handshake-delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'jobs':>8}{'seconds':>10}{'jobs/sec':>12}{'sessions':>10}")
+    for pooled in (False, True):
+        with SMTPSink(handshake_delay=args.handshake_delay) as sink:
+            app = create_app(make_config(sink))
+            with app.app_context():
+                db.create_all()
+            elapsed = run(app, args.jobs, pooled)
+            mode = "pool" if pooled else "no-pool"
+            print(
+                f"{mode:<10}{args.jobs:>8}{elapsed:>10.2f}"
+                f"{args.jobs / elapsed:>12.1f}{sink.connections:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark parsing send times.
+
+Parses ``--count`` timestamps, of which ``--distinct`` differ, as a bulk
+submission repeating a few send times would, two ways:
+
+* ``legacy``: the dt_utc() shipped before app.utils.timestamps, copied
+  below; it resolves the local zone and runs dateutil for every call
+* ``current``: app.utils.timestamps.dt_utc(), with the ISO-8601 fast path,
+  cached zones and the LRU of parsed strings
+
+Each mode runs over the same mix of ISO-8601 strings with an offset,
+naive ISO strings in the local zone and ``10 May 2025 12:00 +08`` style
+strings. Prints the time spent and timestamps parsed per second.
+
+Usage:
+    python benchmarks/bench_timestamps.py --count 1000000 --distinct 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from datetime import UTC, datetime, timedelta
+from typing import Callable, List
+
+import dateutil.parser
+import pytz
+from tzlocal import get_localzone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.timestamps import dt_utc, parse_timestamp  # noqa: E402
+
+
+def legacy_dt_utc(dt: str) -> datetime:
+    """The string path of dt_utc() before the rewrite, minus its fallback."""
+    if " US/Pacific" in dt:
+        parsed_dt = dateutil.parser.parse(dt.replace(" US/Pacific", ""))
+        parsed_dt = pytz.timezone("US/Pacific").localize(parsed_dt)
+    else:
+        parsed_dt = dateutil.parser.parse(dt)
+    if parsed_dt.tzinfo is None:
+        local_tz = get_localzone()
+        if hasattr(local_tz, "localize"):
+            parsed_dt = local_tz.localize(parsed_dt)
+        else:
+            parsed_dt = parsed_dt.replace(tzinfo=local_tz)
+    return parsed_dt.astimezone(pytz.UTC).replace(tzinfo=None)
+
+
+def make_timestamps(count: int, distinct: int) -> List[str]:
+    """Build count timestamps cycling through distinct values."""
+    start = datetime(2030, 1, 1, 9, tzinfo=UTC)
+    values = []
+    for i in range(distinct):
+        moment = start + timedelta(minutes=15 * i)
+        if i % 3 == 0:
+            values.append(moment.isoformat())
+        elif i % 3 == 1:
+            values.append(moment.strftime("%Y-%m-%d %H:%M:%S"))
+        else:
+            values.append(moment.strftime("%d %b %Y %H:%M +00"))
+    return [values[i % distinct] for i in range(count)]
+
+
+def run(parse: Callable[[str], datetime], timestamps: List[str]) -> float:
+    """Parse every timestamp; return the seconds spent."""
+    start = time.perf_counter()
+    for value in timestamps:
+        parse(value)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Run the benchmark and print a small report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--distinct", type=int, default=1000)
+    args = parser.parse_args()
+
+    timestamps = make_timestamps(args.count, args.distinct)
+    for value in timestamps[: args.distinct]:
+        assert legacy_dt_utc(value) == dt_utc(value), value
+    parse_timestamp.cache_clear()
+
+    print(f"{'mode':<9}{'seconds':>10}{'parses/s':>14}")
+    for mode, parse in (("legacy", legacy_dt_utc), ("current", dt_utc)):
+        elapsed = run(parse, timestamps)
+        print(f"{mode:<9}{elapsed:>10.2f}{args.count / elapsed:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,37 @@ source /opt/venv/bin/activate
 # Set up Python path
 export PYTHONPATH=/var/www/mail-scheduler
 
+# RECONCILE_ON_STARTUP=true repairs drift between events and scheduled jobs
+# before scheduling starts, e.g. after Redis lost its data
+if [ "${RECONCILE_ON_STARTUP:-false}" = "true" ]; then
+    echo "Reconciling scheduled jobs..."
+    flask reconcile-schedule || echo "Reconcile failed, starting anyway"
+fi
+
+# LEADER_ELECTION=true lets several replicas run hot-standby; only the one
+# holding the Redis lease schedules (SCHEDULER_MODE rqscheduler or dispatcher)
+if [ "${LEADER_ELECTION:-false}" = "true" ]; then
+    if [ "${SCHEDULER_MODE:-rqscheduler}" = "database" ]; then
+        # Database dispatchers claim with SKIP LOCKED and run side by side
+        echo "LEADER_ELECTION=true does not apply to SCHEDULER_MODE=database;" \
+            "unset LEADER_ELECTION to run database dispatchers on every replica" >&2
+        exit 1
+    fi
+    echo "Starting elected scheduler..."
+    exec flask run-scheduler --mode "${SCHEDULER_MODE:-rqscheduler}"
+fi
+
+# SCHEDULER_MODE=dispatcher runs the precise dispatcher instead of polling,
+# SCHEDULER_MODE=database claims due events from the database
+if [ "${SCHEDULER_MODE:-rqscheduler}" = "dispatcher" ]; then
+    echo "Starting dispatcher..."
+    exec flask run-dispatcher
+fi
+if [ "${SCHEDULER_MODE:-rqscheduler}" = "database" ]; then
+    echo "Starting database dispatcher..."
+    exec flask run-dispatcher --database
+fi
+
 # Create a monkey patch module for RQ utils
 cat > /tmp/patch_rq.py << 'EOF'
 import logging
@@ -7,6 +7,8 @@ from unittest.mock import MagicMock, patch
 import pytest
 from flask import url_for
 
+from app.database.models import DeliveryStatus, Recipient
+
 
 def test_health_check(client):
     """Test the health check endpoint."""
@@ -109,3 +111,46 @@ def test_save_emails_exception(mock_add_event, client):
     result = json.loads(response.data)
     assert "message" in result
     assert "Test error" in result["message"]
+
+
+def test_get_event_reports_progress(client, make_event, session):
+    """Event details include the fan-out progress counters."""
+    event = make_event(recipients=["a@example.com", "b@example.com"])
+    event.chunks_total = 4
+    event.chunks_done = 1
+    session.commit()
+
+    response = client.get(f"/api/events/{event.id}")
+
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data["chunks_total"] == 4
+    assert data["chunks_done"] == 1
+    assert data["progress"] == 0.25
+
+
+def test_get_event_reports_delivery_counts(client, make_event, session):
+    """Event details include per-recipient delivery counts."""
+    event = make_event(recipients=["a@example.com", "b@example.com", "c@example.com"])
+    statuses = [DeliveryStatus.SENT, DeliveryStatus.SENT, DeliveryStatus.FAILED]
+    for recipient, status in zip(event.recipients.order_by(Recipient.id), statuses):
+        recipient.status = status
+    session.commit()
+
+    response = client.get(f"/api/events/{event.id}")
+
+    data = json.loads(response.data)
+    assert data["sent_count"] == 2
+    assert data["failed_count"] == 1
+
+
+def test_metrics_endpoint(client):
+    """The metrics endpoint reports the shared counters."""
+    with patch(
+        "app.api.routes.metrics.snapshot",
+        return_value={"rate_limit.throttled_sends": 3.0},
+    ):
+        response = client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert json.loads(response.data) == {"rate_limit.throttled_sends": 3.0}
@@ -100,5 +100,79 @@ def mock_redis(monkeypatch):
     from unittest.mock import Mock
 
     mock_scheduler = Mock()
+    # No job exists yet
+    mock_scheduler.connection.exists.return_value = 0
     monkeypatch.setattr("app.event.jobs.rq.get_scheduler", lambda: mock_scheduler)
+    # Jobs due now skip the scheduler and land on mock_scheduler.queue
+    monkeypatch.setattr(
+        "app.event.jobs.rq.get_queue", lambda name=None: mock_scheduler.queue
+    )
     return mock_scheduler
+
+
+@pytest.fixture
+def local_zone(monkeypatch):
+    """Set the server's local zone used for times without one."""
+    from app.utils.timestamps import parse_timestamp
+
+    def _local_zone(zone):
+        monkeypatch.setattr("app.utils.timestamps.local_timezone", lambda: zone)
+        # Parses made in the real local zone must not be reused
+        parse_timestamp.cache_clear()
+
+    yield _local_zone
+    parse_timestamp.cache_clear()
+
+
+@pytest.fixture
+def make_event(session):
+    """Factory persisting an event together with its recipients."""
+    from datetime import UTC
+
+    from app.database.models import Event, Recipient
+
+    def _make_event(
+        recipients=("test@example.com",),
+        subject="Test Subject",
+        content="Test content",
+    ):
+        event = Event(
+            email_subject=subject,
+            email_content=content,
+            timestamp=datetime.now(UTC),
+        )
+        session.add(event)
+        session.commit()
+        for address in recipients:
+            session.add(Recipient(email=address, event_id=event.id))
+        session.commit()
+        return event
+
+    return _make_event
+
+
+@pytest.fixture
+def sink(app, monkeypatch):
+    """Point Flask-Mail at a local SMTP sink for the duration of a test."""
+    from app.utils.smtp_sink import SMTPSink
+
+    with SMTPSink() as smtp_sink:
+        state = app.extensions["mail"]
+        monkeypatch.setattr(state, "server", smtp_sink.host)
+        monkeypatch.setattr(state, "port", smtp_sink.port)
+        monkeypatch.setattr(state, "use_tls", False)
+        monkeypatch.setattr(state, "username", None)
+        monkeypatch.setattr(state, "suppress", False)
+        monkeypatch.setattr(state, "debug", 0)
+        with app.app_context():
+            yield smtp_sink
+
+
+@pytest.fixture(autouse=True)
+def clear_message_cache(app):
+    """Start every test with an empty rendered message cache."""
+    # Event IDs are reused once a test's transaction is rolled back
+    yield
+    cache = app.extensions.get("message_cache")
+    if cache is not None:
+        cache.clear()
@@ -0,0 +1,121 @@
+"""Tests for recipient address parsing."""
+
+import re
+from unittest.mock import patch
+
+import pytest
+
+from app.event.addresses import (
+    Address,
+    normalize_domain,
+    normalize_email,
+    parse_address,
+    parse_addresses,
+)
+from app.event.jobs import parse_recipients
+
+
+@pytest.mark.parametrize(
+    "email, expected",
+    [
+        (" Ann@Example.COM ", "ann@example.com"),
+        ("first.last+tag@mail.example.co.uk", "first.last+tag@mail.example.co.uk"),
+        ('"john doe"@example.com', '"john doe"@example.com'),
+        ("user@bücher.example", "user@xn--bcher-kva.example"),
+        ("no-at-sign", None),
+        ("a@b", None),
+        ("a..b@example.com", None),
+        (".a@example.com", None),
+        ("a@-example.com", None),
+        ("a@example.123", None),
+        ("josé@example.com", None),
+        ("x" * 65 + "@example.com", None),
+    ],
+)
+def test_normalize_email(email, expected):
+    """Addresses are trimmed, lower-cased, IDNA-encoded and checked."""
+    assert normalize_email(email) == expected
+
+
+@pytest.mark.parametrize(
+    "entry, expected",
+    [
+        ("Jane Doe <Jane@Example.com>", Address("jane@example.com", "Jane Doe")),
+        ('"Doe, Jane" <jane@example.com>', Address("jane@example.com", "Doe, Jane")),
+        ('"Say \\"hi\\"" <a@example.com>', Address("a@example.com", 'Say "hi"')),
+        ("<a@example.com>", Address("a@example.com")),
+        ("a@example.com", Address("a@example.com")),
+        ("Jane <not an address>", None),
+        ("Jane <a@example.com", None),
+    ],
+)
+def test_parse_address(entry, expected):
+    """Display names are kept, unquoted and unescaped."""
+    assert parse_address(entry) == expected
+
+
+def test_parse_addresses_splits_outside_quotes():
+    """Separators inside quotes or brackets do not split entries."""
+    data = (
+        '"Doe, Jane" <jane@example.com>; bob@example.com\n'
+        "Carl <carl@example.com>,, JANE@example.com, nope, bob@EXAMPLE.com"
+    )
+
+    result = parse_addresses(data)
+
+    assert result.addresses == [
+        Address("jane@example.com", "Doe, Jane"),
+        Address("bob@example.com"),
+        Address("carl@example.com", "Carl"),
+    ]
+    assert result.invalid == ["nope"]
+    assert result.duplicates == 2
+
+
+def test_parse_addresses_in_batches():
+    """A shared seen set deduplicates across batches of one list."""
+    seen = set()
+    first = parse_addresses(["a@example.com", "b@example.com"], seen)
+    second = parse_addresses(["B@example.com", "c@example.com"], seen)
+
+    assert len(first.addresses) == 2
+    assert second.addresses == [Address("c@example.com")]
+    assert second.duplicates == 1
+
+
+def test_domain_checks_are_cached():
+    """Each domain is validated once."""
+    normalize_domain.cache_clear()
+    parse_addresses(", ".join(f"user{i}@cached.example.com" for i in range(100)))
+
+    info = normalize_domain.cache_info()
+    assert (info.misses, info.hits) == (1, 99)
+
+
+def test_parse_recipients_rejects_invalid():
+    """Invalid entries are named in the error."""
+    with pytest.raises(ValueError, match="Invalid recipient address.*: nope, x@y"):
+        parse_recipients("a@example.com, nope, x@y")
+
+
+@pytest.mark.parametrize("entry", [1, None, ["a@example.com"]])
+def test_parse_addresses_rejects_entries_that_are_not_text(entry):
+    """A list entry that is not a string is a ValueError naming it."""
+    with pytest.raises(ValueError, match=f"got {re.escape(repr(entry))}"):
+        parse_addresses(["a@example.com", entry])
+
+
+@patch("app.api.routes.add_event", return_value=5)
+def test_save_emails_accepts_dotted_domains_and_names(mock_add_event, client):
+    """The API no longer rejects dotted domains or display names itself."""
+    response = client.post(
+        "/api/save_emails",
+        json={
+            "subject": "Hi",
+            "content": "Body",
+            "timestamp": "2030-01-01T09:00:00+00:00",
+            "recipients": '"Doe, Jane" <jane.doe@mail.example.co.uk>',
+        },
+    )
+
+    assert response.status_code == 201
@@ -0,0 +1,102 @@
+"""Tests for the content-addressed email body store."""
+
+from email import message_from_bytes
+
+from app.database import db
+from app.database.models import EmailBody, Event
+from app.event.bodies import collect_bodies, move_inline_bodies
+from app.event.message_cache import MessageCache
+from app.utils.content import content_hash
+
+HTML = "<html><body><h1>Weekly</h1><p>News</p></body></html>"
+
+
+def stored(session, *contents):
+    """Contents among the given ones that have a stored body."""
+    hashes = [content_hash(content) for content in contents]
+    rows = session.query(EmailBody).filter(EmailBody.content_hash.in_(hashes))
+    return sorted(body.content for body in rows)
+
+
+def test_events_share_one_body(make_event, session):
+    """Events with the same content refer to one stored body."""
+    first = make_event(content=HTML)
+    second = make_event(subject="Again", content=HTML)
+    session.expire_all()
+
+    assert first._email_content is None
+    assert first.content_hash == second.content_hash == content_hash(HTML)
+    assert second.email_content == HTML
+    assert second.content_text == "Weekly\nNews"
+    body = session.get(EmailBody, content_hash(HTML))
+    assert body.size == len(HTML)
+
+
+def test_unreferenced_bodies_are_collected(make_event, session):
+    """Replaced bodies go once their grace period is over."""
+    event = make_event(content="Old body")
+    event.email_content = "New body"
+    session.commit()
+    assert stored(session, "Old body", "New body") == ["New body", "Old body"]
+
+    collect_bodies()
+    assert stored(session, "Old body", "New body") == ["New body", "Old body"]
+    collect_bodies(grace=0)
+
+    assert stored(session, "Old body", "New body") == ["New body"]
+    assert event.email_content == "New body"
+
+
+def test_inline_bodies_are_moved(make_event, session):
+    """Bodies of events stored before the body store are moved into it."""
+    event = make_event(content="placeholder")
+    # Rows written before the body store kept the body on the event
+    session.execute(
+        db.update(Event)
+        .where(Event.id == event.id)
+        .values(_email_content=HTML, content_type=None, content_hash=None)
+    )
+    session.commit()
+    session.expire_all()
+    assert event.email_content == HTML
+
+    assert move_inline_bodies(batch_size=1) == 1
+
+    session.expire_all()
+    assert event._email_content is None
+    assert event.content_hash == content_hash(HTML)
+    assert event.email_content == HTML
+    assert event.content_parts().is_html
+
+
+def test_cache_renders_a_shared_body_once(make_event):
+    """Templates of events with the same body share its rendered bytes."""
+    first = make_event(subject="Week 1", content=HTML)
+    second = make_event(subject="Week 2", content=HTML)
+    cache = MessageCache()
+
+    one = cache.get(first)
+    two = cache.get(second)
+
+    assert one.body is two.body
+    assert (cache.misses, cache.body_hits) == (2, 1)
+    assert cache.size == len(one.headers) + len(two.headers) + len(one.body)
+    parsed = message_from_bytes(two.render("a@example.com", "<id@example.com>"))
+    assert parsed["Subject"] == "Week 2"
+    assert parsed.is_multipart()
+
+    cache.invalidate(first.id)
+    assert cache.size == len(two.headers) + len(two.body)
+    cache.invalidate(second.id)
+    assert cache.size == 0
+
+
+def test_compact_bodies_cli(app, make_event, session):
+    """The CLI moves inline bodies and reports what it removed."""
+    make_event(content="Kept body")
+
+    result = app.test_cli_runner().invoke(args=["compact-bodies", "--grace", "0"])
+
+    assert result.exit_code == 0, result.output
+    assert "inline body(ies) to the store" in result.output
+    assert stored(session, "Kept body") == ["Kept body"]
@@ -0,0 +1,159 @@
+"""Tests for bulk creation and scheduling of events."""
+
+import json
+from datetime import UTC, datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import event as sa_event
+
+from app.database.models import Event, Recipient
+from app.event.bulk import add_events, parse_ndjson, validate_items
+from app.event.lists import create_list
+from app.utils.content import CONTENT_TYPE_HTML
+
+
+@pytest.fixture
+def scheduler(mock_redis):
+    """Mocked scheduler whose pipeline saves jobs."""
+    mock_redis.scheduled_jobs_key = "rq:scheduler:scheduled_jobs"
+    mock_redis.queue_name = "default"
+    mock_redis.queue.name = "default"
+    # rq caches the server version on the connection
+    setattr(mock_redis.connection, "__rq_redis_server_version", (7, 2, 4))
+    return mock_redis
+
+
+def item(subject="Bulk", recipients="a@example.com", hours=1):
+    """A bulk item due the given number of hours from now."""
+    when = datetime.now(UTC) + timedelta(hours=hours)
+    return {
+        "subject": subject,
+        "content": "<p>Hello</p>",
+        "timestamp": when.isoformat(),
+        "recipients": recipients,
+    }
+
+
+@patch("app.event.bulk.notify_dispatcher")
+def test_add_events_stores_and_schedules(mock_notify, app, session, scheduler):
+    """Valid items are stored and scheduled together, invalid ones reported."""
+    items = [
+        item("Later", "a@example.com, Bo <b@example.com>"),
+        {"subject": "No content"},
+        "not an object",
+        item("Now", hours=0),
+    ]
+
+    results = add_events(items)
+
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert results[1] == {"index": 1, "error": "Email content is required"}
+    assert results[2]["error"] == "Item must be a JSON object"
+    later = session.get(Event, results[0]["id"])
+    assert later.job_id == results[0]["job_id"] == f"send:{later.id}:1"
+    assert later.content_type == CONTENT_TYPE_HTML
+    assert later.content_text == "Hello"
+    stored = session.query(Recipient).filter_by(event_id=later.id).all()
+    assert sorted((r.email, r.name) for r in stored) == [
+        ("a@example.com", None),
+        ("b@example.com", "Bo"),
+    ]
+
+    pipe = scheduler.connection.pipeline.return_value
+    pipe.execute.assert_called_once_with()
+    (key, members), _ = pipe.zadd.call_args
+    assert key == scheduler.scheduled_jobs_key
+    assert list(members) == [later.job_id]
+    (job,), kwargs = scheduler.queue.enqueue_job.call_args
+    assert job.id == results[3]["job_id"]
+    assert kwargs == {"pipeline": pipe}
+    mock_notify.assert_called_once_with(scheduler.connection, later.timestamp)
+
+
+@patch("app.event.bulk.notify_dispatcher")
+def test_malformed_items_are_reported_per_item(mock_notify, session, scheduler):
+    """Items of the wrong shape fail alone, the valid ones are still created."""
+    items = [
+        item(recipients=[1]),
+        {**item(), "timestamp": "0001-01-01T00:00+05:00"},
+        {**item(), "recipients": None, "mailing_list_id": 2**70},
+        item("Valid"),
+    ]
+
+    results = add_events(items)
+
+    assert results[0] == {"index": 0, "error": "Recipient must be an address, got 1"}
+    assert results[1]["error"].startswith("Datetime out of range")
+    assert results[2]["error"] == f"Mailing list {2**70} not found"
+    assert session.get(Event, results[3]["id"]).email_subject == "Valid"
+
+
+def test_add_events_only_invalid(app, scheduler):
+    """Nothing is written when no item is valid."""
+    results = add_events([{}, {"subject": "x"}])
+
+    assert all("error" in result for result in results)
+    assert not scheduler.connection.pipeline.called
+
+
+def test_mailing_lists_are_checked_with_one_query(session):
+    """A batch naming lists looks them all up at once."""
+    mailing_list = create_list("Bulk readers")
+    items = []
+    for list_id in (mailing_list.id, 999999, mailing_list.id):
+        items.append({**item(), "recipients": None, "mailing_list_id": list_id})
+    selects = []
+
+    def before_execute(conn, cursor, statement, *args):
+        if "FROM mailing_lists" in statement:
+            selects.append(statement)
+
+    engine = session.get_bind().engine
+    sa_event.listen(engine, "before_cursor_execute", before_execute)
+    try:
+        valid, errors = validate_items(items)
+    finally:
+        sa_event.remove(engine, "before_cursor_execute", before_execute)
+
+    assert [index for index, _ in valid] == [0, 2]
+    assert errors == [{"index": 1, "error": "Mailing list 999999 not found"}]
+    assert len(selects) == 1
+
+
+def test_parse_ndjson():
+    """Blank lines are skipped and bad lines kept as errors in place."""
+    items = parse_ndjson('{"subject": "a"}\n\n{oops\n{"subject": "b"}\n')
+
+    assert items[0] == {"subject": "a"}
+    assert isinstance(items[1], ValueError)
+    assert "Line 3" in str(items[1])
+    assert items[2] == {"subject": "b"}
+
+
+@patch("app.event.bulk.notify_dispatcher")
+def test_bulk_endpoint(mock_notify, client, scheduler):
+    """JSON arrays and NDJSON are accepted; the status reflects rejections."""
+    response = client.post("/api/events/bulk", json=[item(), {"subject": "x"}])
+    assert response.status_code == 207
+    assert (response.json["created"], response.json["rejected"]) == (1, 1)
+
+    body = "\n".join(json.dumps(item(f"Line {n}")) for n in range(3))
+    response = client.post(
+        "/api/events/bulk", data=body, content_type="application/x-ndjson"
+    )
+    assert response.status_code == 201
+    assert [r["index"] for r in response.json["results"]] == [0, 1, 2]
+
+    response = client.post("/api/events/bulk", json={"subject": "x"})
+    assert response.status_code == 400
+
+
+def test_bulk_endpoint_limit(app, client):
+    """Requests over BULK_EVENTS_MAX_ITEMS are refused before validation."""
+    app.config["BULK_EVENTS_MAX_ITEMS"] = 2
+    try:
+        response = client.post("/api/events/bulk", json=[{}, {}, {}])
+    finally:
+        app.config["BULK_EVENTS_MAX_ITEMS"] = 100000
+    assert response.status_code == 413
@@ -0,0 +1,204 @@
+"""Tests for the database-backed dispatcher."""
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.dialects import mysql, postgresql
+
+from app.database import db
+from app.database.models import Event
+from app.event.db_dispatcher import DatabaseDispatcher
+from app.event.jobs import SEND_MAIL_PAYLOAD_VERSION, send_mail
+
+# Earlier than the events other tests leave in the shared database
+NOW = datetime(2000, 1, 1, 12, 0)
+
+
+class FakeClock:
+    """Clock that only moves when told to."""
+
+    def __init__(self, now=NOW):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def events(session):
+    """Two due events, one future event and one that is done."""
+
+    def add(minutes, is_done=False, job_id=None):
+        event = Event("Subject", "Body", NOW + timedelta(minutes=minutes))
+        event.is_done = is_done
+        event.job_id = job_id
+        session.add(event)
+        return event
+
+    rows = [
+        add(-10, job_id="send:due-1:1"),
+        add(-1),
+        add(10, job_id="send:future:1"),
+        add(-20, is_done=True, job_id="send:done:1"),
+    ]
+    session.commit()
+    return rows
+
+
+@pytest.fixture
+def queue(mock_redis):
+    """Send-now queue; no job is scheduled, queued or run yet."""
+    mock_redis.connection.hget.return_value = None
+    mock_redis.connection.zrem.return_value = 0
+    mock_redis.scheduled_jobs_key = "rq:scheduler:scheduled_jobs"
+    return mock_redis.queue
+
+
+def make_dispatcher(clock=None, batch_size=500):
+    """Dispatcher with a fixed clock and a 60 second lease."""
+    return DatabaseDispatcher(
+        batch_size=batch_size, lease=60, name="node-1", clock=clock or FakeClock()
+    )
+
+
+@patch("app.event.db_dispatcher.metrics")
+def test_claims_due_pending_events_once(mock_metrics, events, session):
+    """Only due, pending events are claimed, and a lease blocks a second claim."""
+    dispatcher = make_dispatcher()
+
+    claimed = dispatcher.claim()
+
+    assert [row.id for row in claimed] == [events[0].id, events[1].id]
+    session.expire_all()
+    assert events[0].claimed_by == "node-1"
+    assert events[0].claim_expires_at == NOW + timedelta(seconds=60)
+    assert events[2].claimed_by is None
+    assert dispatcher.claim() == []
+
+
+@patch("app.event.db_dispatcher.metrics")
+def test_expired_lease_is_claimed_again(mock_metrics, events):
+    """An event that is not done when its lease runs out is dispatched again."""
+    clock = FakeClock()
+    dispatcher = make_dispatcher(clock)
+    dispatcher.claim()
+
+    clock.now += timedelta(seconds=61)
+
+    assert [row.id for row in dispatcher.claim()] == [events[0].id, events[1].id]
+
+
+@patch("app.event.db_dispatcher.metrics")
+def test_event_being_sent_is_not_claimed_again(mock_metrics, events, session):
+    """A chunked send outliving its lease is left to its chunk jobs."""
+    clock = FakeClock()
+    dispatcher = make_dispatcher(clock)
+    dispatcher.claim()
+    events[0].chunks_total, events[0].chunks_done = 4, 1
+    session.commit()
+
+    clock.now += timedelta(seconds=61)
+
+    assert [row.id for row in dispatcher.claim()] == [events[1].id]
+    assert send_mail(events[0].id).startswith("Skipped. Event")
+    session.refresh(events[0])
+    assert (events[0].chunks_total, events[0].chunks_done) == (4, 1)
+
+
+@patch("app.event.db_dispatcher.metrics")
+def test_dispatch_enqueues_send_jobs_by_stored_id(mock_metrics, events, queue):
+    """Claimed events are enqueued under their job ID, in batches."""
+    dispatcher = make_dispatcher(batch_size=1)
+
+    assert dispatcher.dispatch() == 2
+
+    assert [c.kwargs["job_id"] for c in queue.enqueue_call.call_args_list] == [
+        "send:due-1:1",
+        f"send:{events[1].id}:1",
+    ]
+    assert queue.enqueue_call.call_args.args == (send_mail,)
+    assert queue.enqueue_call.call_args.kwargs["args"] == (
+        events[1].id,
+        SEND_MAIL_PAYLOAD_VERSION,
+    )
+    mock_metrics.incr.assert_called_once_with("db_dispatcher.dispatched", 2)
+    assert dispatcher.dispatched == 2
+
+
+@pytest.mark.parametrize("status", [b"queued", b"started", b"finished"])
+@patch("app.event.db_dispatcher.metrics")
+def test_dispatch_skips_jobs_in_flight(mock_metrics, status, events, queue, mock_redis):
+    """Events whose job is queued, running or ran are not enqueued again."""
+    mock_redis.connection.hget.return_value = status
+
+    assert make_dispatcher().dispatch() == 0
+    assert not queue.enqueue_call.called
+    assert not mock_redis.connection.zrem.called
+
+
+@patch("app.event.db_dispatcher.metrics")
+def test_dispatch_moves_scheduled_jobs(mock_metrics, events, queue, mock_redis):
+    """A job only in rq-scheduler's set is taken out of it and enqueued."""
+    # rq-scheduler stores the job hash without a status
+    mock_redis.connection.exists.return_value = 1
+    mock_redis.connection.zrem.return_value = 1
+
+    assert make_dispatcher().dispatch() == 2
+
+    mock_redis.connection.zrem.assert_any_call(
+        "rq:scheduler:scheduled_jobs", "send:due-1:1"
+    )
+    assert queue.enqueue_call.call_args_list[0].kwargs["job_id"] == "send:due-1:1"
+
+
+def test_claim_uses_skip_locked_where_supported(app):
+    """Dialects with SKIP LOCKED claim concurrently, SQLite claims alone."""
+    dispatcher = make_dispatcher()
+    assert dispatcher.skip_locked is False
+    assert "FOR UPDATE" not in str(dispatcher.claim_statement(NOW))
+
+    dispatcher.skip_locked = True
+    sql = str(dispatcher.claim_statement(NOW).compile(dialect=postgresql.dialect()))
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "RETURNING" in sql
+
+
+@patch("app.event.db_dispatcher.metrics")
+def test_mysql_selects_the_batch_before_claiming(mock_metrics, events, session):
+    """Without LIMIT in IN subqueries or RETURNING the batch is read first."""
+    dispatcher = make_dispatcher()
+    dispatcher.skip_locked, dispatcher.one_statement = True, False
+    due = dispatcher.due_statement(NOW, Event.id).compile(dialect=mysql.dialect())
+    assert "FOR UPDATE SKIP LOCKED" in str(due)
+    # SQLite has no row locks; claim the rest of the way without them
+    dispatcher.skip_locked = False
+
+    claimed = dispatcher.claim()
+
+    assert [row.id for row in claimed] == [events[0].id, events[1].id]
+    assert claimed[0].job_id == "send:due-1:1"
+    session.expire_all()
+    assert events[1].claimed_by == "node-1"
+    assert dispatcher.claim() == []
+
+
+def test_due_events_index_exists(app):
+    """Due events are looked up by (is_done, timestamp)."""
+    indexes = {
+        index["name"]: index["column_names"]
+        for index in inspect(db.engine).get_indexes("events")
+    }
+
+    assert indexes["ix_events_is_done_timestamp"] == ["is_done", "timestamp"]
+
+
+def test_run_dispatcher_cli_database(app):
+    """--database runs the database dispatcher."""
+    with patch("app.commands.get_db_dispatcher") as mock_get:
+        mock_get.return_value.dispatched = 0
+        result = app.test_cli_runner().invoke(args=["run-dispatcher", "--database"])
+
+    assert result.exit_code == 0
+    mock_get.return_value.run.assert_called_once_with()
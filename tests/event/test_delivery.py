@@ -0,0 +1,225 @@
+"""Tests for per-recipient delivery bookkeeping."""
+
+import smtplib
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import event as sa_event
+
+from app.database import db
+from app.database.models import DeliveryStatus, Event, Recipient
+from app.event.delivery import DeliveryStatusBuffer, message_id
+from app.event.jobs import send_mail
+
+
+@pytest.fixture
+def update_statements(session):
+    """Collect the UPDATE statements issued on the test connection."""
+    statements = []
+
+    def before_execute(conn, cursor, statement, *args):
+        if statement.startswith("UPDATE recipients"):
+            statements.append(statement)
+
+    engine = session.get_bind().engine
+    sa_event.listen(engine, "before_cursor_execute", before_execute)
+    yield statements
+    sa_event.remove(engine, "before_cursor_execute", before_execute)
+
+
+def recipient_rows(event):
+    """Return the event's recipients ordered by ID."""
+    return list(event.recipients.order_by(Recipient.id))
+
+
+def test_buffer_writes_one_statement_per_batch(make_event, update_statements):
+    """Outcomes are written in bulk every flush_size recipients."""
+    event = make_event(recipients=[f"user{i}@example.com" for i in range(10)])
+    ids = [r.id for r in recipient_rows(event)]
+
+    with DeliveryStatusBuffer(flush_size=4) as statuses:
+        for recipient_id in ids:
+            statuses.mark_sent(recipient_id)
+
+    assert statuses.flushes == 3
+    assert len(update_statements) == 3
+    rows = recipient_rows(event)
+    assert {r.status for r in rows} == {DeliveryStatus.SENT}
+    assert all(r.attempts == 1 and r.sent_at is not None for r in rows)
+
+
+def test_buffer_groups_failures_by_error(make_event, update_statements):
+    """Failures sharing an error message share an UPDATE."""
+    event = make_event(recipients=["a@example.com", "b@example.com", "c@example.com"])
+    a, b, c = [r.id for r in recipient_rows(event)]
+
+    with DeliveryStatusBuffer(flush_size=100) as statuses:
+        statuses.mark_failed(a, "550 No such user")
+        statuses.mark_failed(b, "550 No such user")
+        statuses.mark_sent(c)
+
+    assert len(update_statements) == 2
+    rows = {r.id: r for r in recipient_rows(event)}
+    assert rows[a].status == DeliveryStatus.FAILED
+    assert rows[a].last_error == "550 No such user"
+    assert rows[a].sent_at is None
+    assert rows[c].status == DeliveryStatus.SENT
+    assert event.sent_count == 1
+    assert event.failed_count == 2
+
+
+def test_buffer_flushes_when_block_raises(make_event):
+    """Deliveries made before an error are still recorded."""
+    event = make_event(recipients=["a@example.com"])
+    (recipient,) = recipient_rows(event)
+
+    with pytest.raises(RuntimeError):
+        with DeliveryStatusBuffer(flush_size=100) as statuses:
+            statuses.mark_sent(recipient.id)
+            raise RuntimeError("connection lost")
+
+    db.session.refresh(recipient)
+    assert recipient.status == DeliveryStatus.SENT
+
+
+@patch("app.event.jobs.mail")
+def test_send_mail_records_rejected_recipient(mock_mail, make_event):
+    """A rejected address is marked failed and the others are still sent."""
+    event = make_event(
+        recipients=["good@example.com", "bad@example.com", "also@example.com"]
+    )
+    mock_conn = MagicMock()
+    mock_conn.send.side_effect = [
+        None,
+        smtplib.SMTPRecipientsRefused({"bad@example.com": (550, b"No such user")}),
+        None,
+    ]
+    mock_mail.connect.return_value.__enter__.return_value = mock_conn
+
+    result = send_mail(event.id)
+
+    assert "Success" in result
+    statuses = {r.email: r for r in recipient_rows(event)}
+    assert statuses["good@example.com"].status == DeliveryStatus.SENT
+    assert statuses["also@example.com"].status == DeliveryStatus.SENT
+    assert statuses["bad@example.com"].status == DeliveryStatus.FAILED
+    assert "No such user" in statuses["bad@example.com"].last_error
+    assert statuses["bad@example.com"].attempts == 1
+    assert event.sent_count == 2
+    assert event.failed_count == 1
+
+
+class WorkerKilled(BaseException):
+    """Stands in for the work horse being killed mid-send."""
+
+
+def test_interrupted_send_resumes_without_duplicates_or_gaps(
+    app, sink, session, make_event, monkeypatch
+):
+    """A send killed mid-batch resumes where the last checkpoint left off."""
+    sink.state.dedupe = True
+    recipients = [f"user{i}@example.com" for i in range(12)]
+    event = make_event(recipients=recipients)
+    monkeypatch.setitem(app.config, "MAIL_STATUS_FLUSH_SIZE", 5)
+
+    mark_sent = DeliveryStatusBuffer.mark_sent
+    sends = []
+
+    def mark_sent_then_die(self, recipient_id):
+        # The 8th message reached the relay but the worker dies before
+        # recording it; only the checkpoint after the 5th was written.
+        sends.append(recipient_id)
+        if len(sends) == 8:
+            raise WorkerKilled()
+        mark_sent(self, recipient_id)
+
+    with patch.object(DeliveryStatusBuffer, "mark_sent", mark_sent_then_die):
+        with pytest.raises(WorkerKilled):
+            send_mail(event.id)
+
+    session.expire_all()
+    assert event.sent_count == 5
+    assert event.is_done is False
+    assert len(sink.messages) == 8
+
+    result = send_mail(event.id)
+
+    assert "Success" in result
+    received = [m.rcpt_to[0] for m in sink.messages]
+    # No gaps: everyone got the email. No duplicates: the three messages
+    # sent again after the crash reused their Message-IDs and were dropped.
+    assert sorted(received) == sorted(recipients)
+    assert sink.duplicates == 3
+    assert {m.message_id for m in sink.messages} == {
+        message_id(event.id, address, app.config["MAIL_DEFAULT_SENDER"])
+        for address in recipients
+    }
+    session.expire_all()
+    assert event.sent_count == 12
+    assert event.is_done is True
+
+
+def test_recipients_are_read_in_keyset_batches(
+    app, sink, session, make_event, monkeypatch
+):
+    """Each batch is its own query, so flushes never commit an open cursor."""
+    event = make_event(recipients=[f"user{i}@example.com" for i in range(7)])
+    monkeypatch.setitem(app.config, "MAIL_RECIPIENT_BATCH_SIZE", 3)
+    monkeypatch.setitem(app.config, "MAIL_STATUS_FLUSH_SIZE", 2)
+    selects = []
+
+    def before_execute(conn, cursor, statement, *args):
+        if statement.startswith("SELECT recipients.id, recipients.email"):
+            selects.append(statement)
+
+    engine = session.get_bind().engine
+    sa_event.listen(engine, "before_cursor_execute", before_execute)
+    try:
+        result = send_mail(event.id)
+    finally:
+        sa_event.remove(engine, "before_cursor_execute", before_execute)
+
+    assert "Success" in result
+    assert len(sink.messages) == 7
+    assert len(selects) == 3
+    assert all("LIMIT" in statement for statement in selects)
+    session.expire_all()
+    assert event.sent_count == 7
+
+
+def test_delivery_counts_of_many_events_take_one_query(session, make_event):
+    """Counts are read for all events at once and kept until expiry."""
+    events = [
+        make_event(recipients=["a@example.com", "b@example.com"]),
+        make_event(recipients=["c@example.com"]),
+    ]
+    db.session.execute(
+        db.update(Recipient)
+        .where(Recipient.event_id == events[0].id, Recipient.email == "a@example.com")
+        .values(status=DeliveryStatus.FAILED)
+    )
+    for event in events:
+        session.refresh(event)
+    selects = []
+
+    def before_execute(conn, cursor, statement, *args):
+        if statement.startswith("SELECT"):
+            selects.append(statement)
+
+    engine = session.get_bind().engine
+    sa_event.listen(engine, "before_cursor_execute", before_execute)
+    try:
+        Event.load_delivery_counts(events)
+        counts = [(e.sent_count, e.failed_count) for e in events]
+    finally:
+        sa_event.remove(engine, "before_cursor_execute", before_execute)
+
+    assert counts == [(0, 1), (0, 0)]
+    assert len(selects) == 1
+    db.session.execute(
+        db.update(Recipient)
+        .where(Recipient.event_id == events[0].id)
+        .values(status=DeliveryStatus.FAILED)
+    )
+    session.commit()
+    assert events[0].failed_count == 2
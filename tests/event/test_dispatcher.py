@@ -0,0 +1,157 @@
+"""Tests for the precise job dispatcher."""
+
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.event.dispatcher import (
+    WAKEUP_CHANNEL,
+    Dispatcher,
+    LeadershipLost,
+    get_dispatcher,
+    notify_dispatcher,
+)
+
+
+class FakeClock:
+    """Clock that only moves when told to."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakePubSub:
+    """PubSub delivering queued messages, advancing the clock on timeouts."""
+
+    def __init__(self, clock, messages=()):
+        self.clock = clock
+        self.messages = list(messages)
+        self.timeouts = []
+
+    def get_message(self, timeout):
+        self.timeouts.append(timeout)
+        if self.messages:
+            return {"type": "message", "data": self.messages.pop(0)}
+        self.clock.now += timeout
+        return None
+
+
+def make_dispatcher(results, batch_size=2, clock=None):
+    """Dispatcher whose Lua script returns the given results in turn."""
+    connection = MagicMock()
+    connection.register_script.return_value.side_effect = results
+    return Dispatcher(
+        connection,
+        "rq:scheduler:scheduled_jobs",
+        batch_size=batch_size,
+        max_sleep=5,
+        clock=clock or FakeClock(),
+    )
+
+
+@patch("app.event.dispatcher.metrics")
+def test_move_due_runs_one_script(mock_metrics):
+    """A batch is moved by one script call that also returns the next due time."""
+    dispatcher = make_dispatcher([[b"998.5", b"999", b"1002.25"]])
+
+    moved, next_due = dispatcher.move_due()
+
+    assert moved == [998.5, 999.0]
+    assert next_due == 1002.25
+    kwargs = dispatcher._script.call_args.kwargs
+    assert kwargs["keys"][0] == "rq:scheduler:scheduled_jobs"
+    assert kwargs["args"][:2] == [1000.0, 2]
+    assert kwargs["args"][3:] == ["rq:queue:", "rq:job:", "rq:queues", ""]
+
+
+def test_fenced_move_due_checks_the_lease():
+    """A fenced dispatcher passes its lease and stops when the script refuses."""
+    dispatcher = make_dispatcher([None])
+    dispatcher.fence = ("mail_scheduler:leader", "node-1|7")
+
+    with pytest.raises(LeadershipLost):
+        dispatcher.move_due()
+
+    kwargs = dispatcher._script.call_args.kwargs
+    assert kwargs["keys"][1] == "mail_scheduler:leader"
+    assert kwargs["args"][-1] == "node-1|7"
+
+
+@patch("app.event.dispatcher.metrics")
+def test_dispatch_drains_full_batches(mock_metrics):
+    """Full batches are followed by another call until one comes back short."""
+    dispatcher = make_dispatcher([[b"990", b"991", b"992"], [b"992", b""]])
+
+    assert dispatcher.dispatch() is None
+
+    assert dispatcher._script.call_count == 2
+    assert dispatcher.dispatched == 3
+    mock_metrics.observe.assert_any_call("dispatcher.lag_seconds", 10.0)
+
+
+def test_wait_sleeps_until_next_due():
+    """Without wakeups the dispatcher sleeps exactly until the next job."""
+    clock = FakeClock()
+    dispatcher = make_dispatcher([], clock=clock)
+    pubsub = FakePubSub(clock)
+
+    dispatcher.wait(pubsub, next_due=1001.5)
+
+    assert pubsub.timeouts == [1.5]
+    assert clock.now == 1001.5
+
+
+def test_wait_is_capped_by_max_sleep():
+    """Nothing scheduled means a check every max_sleep seconds."""
+    clock = FakeClock()
+    dispatcher = make_dispatcher([], clock=clock)
+    pubsub = FakePubSub(clock)
+
+    dispatcher.wait(pubsub, next_due=None)
+
+    assert pubsub.timeouts == [5]
+
+
+def test_wait_wakes_for_earlier_jobs_only():
+    """A wakeup for a later job keeps sleeping, one for an earlier job ends it."""
+    clock = FakeClock()
+    dispatcher = make_dispatcher([], clock=clock)
+    pubsub = FakePubSub(clock, messages=[b"1003", b"1000.5"])
+
+    dispatcher.wait(pubsub, next_due=1002)
+
+    assert len(pubsub.timeouts) == 2
+    assert clock.now == 1000
+
+
+def test_notify_dispatcher_publishes_due_time():
+    """Naive datetimes are taken as UTC."""
+    connection = MagicMock()
+
+    notify_dispatcher(connection, datetime(2030, 1, 1))
+
+    connection.publish.assert_called_once_with(WAKEUP_CHANNEL, 1893456000.0)
+
+
+def test_schedule_mail_wakes_dispatcher(mock_redis):
+    """Scheduling a job publishes its due time."""
+    from app.event.jobs import schedule_mail
+
+    schedule_mail(1, datetime(2030, 1, 1))
+
+    mock_redis.connection.publish.assert_called_once_with(WAKEUP_CHANNEL, 1893456000.0)
+
+
+def test_get_dispatcher_from_config(app, mock_redis, monkeypatch):
+    """The dispatcher works on the scheduler's sorted set."""
+    monkeypatch.setitem(app.config, "DISPATCHER_BATCH_SIZE", 100)
+    monkeypatch.setitem(app.config, "DISPATCHER_MAX_SLEEP", 0.5)
+
+    dispatcher = get_dispatcher()
+
+    assert dispatcher.scheduled_jobs_key is mock_redis.scheduled_jobs_key
+    assert (dispatcher.batch_size, dispatcher.max_sleep) == (100, 0.5)
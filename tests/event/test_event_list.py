@@ -0,0 +1,115 @@
+"""Tests for the keyset-paginated event listing."""
+
+from datetime import date, datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import inspect
+
+from app.database.models import Event, User
+from app.services.event_service import EventFilters, EventService, decode_cursor
+
+# Far from the send times other tests use, so date filters isolate our rows
+BASE = datetime(2091, 3, 1, 9, 0)
+
+
+def make_events(session, count, user=None, done=False):
+    """Add count events an hour apart, starting at BASE."""
+    events = [
+        Event(
+            f"Event {i}",
+            f"<p>Body   of\nevent {i}</p>",
+            BASE + timedelta(hours=i),
+            is_done=done,
+            user_id=user.id if user else None,
+        )
+        for i in range(count)
+    ]
+    session.add_all(events)
+    session.commit()
+    return events
+
+
+def make_user(session, username):
+    """Add a user."""
+    user = User(username=username, email=f"{username}@example.com")
+    user.password = "secret"
+    session.add(user)
+    session.commit()
+    return user
+
+
+def in_range(**kwargs):
+    """Filters limited to the days of the test events."""
+    return EventFilters(start=BASE.date(), end=date(2091, 3, 3), **kwargs)
+
+
+def test_pages_walk_forward_and_back(session):
+    """Cursors page through all events in (timestamp, id) order."""
+    make_events(session, 5)
+    filters = in_range()
+
+    first = EventService.get_page(filters, per_page=2)
+    second = EventService.get_page(filters, after=first.next_cursor, per_page=2)
+    third = EventService.get_page(filters, after=second.next_cursor, per_page=2)
+
+    subjects = [[e.email_subject for e in p.events] for p in (first, second, third)]
+    assert subjects == [["Event 4", "Event 3"], ["Event 2", "Event 1"], ["Event 0"]]
+    assert first.prev_cursor is None and third.next_cursor is None
+
+    back = EventService.get_page(filters, before=third.prev_cursor, per_page=2)
+    assert [e.email_subject for e in back.events] == ["Event 2", "Event 1"]
+    assert back.prev_cursor is not None and back.next_cursor is not None
+    assert decode_cursor(back.next_cursor)[1] == back.events[-1].id
+
+
+def test_listing_skips_bodies(session):
+    """Listed events carry a preview and never load their content."""
+    make_events(session, 1)
+    session.expire_all()
+
+    (event,) = EventService.get_page(in_range()).events
+
+    assert event.preview == "Body of event 0"
+    unloaded = inspect(event).unloaded
+    assert {"_email_content", "_content_text", "content_hash"} <= unloaded
+
+
+def test_filters(session):
+    """Status, date range and owner narrow the listing."""
+    owner = make_user(session, "lister")
+    make_events(session, 2, user=owner)
+    make_events(session, 1, done=True)
+
+    sent = EventService.get_page(in_range(status="sent")).events
+    assert [e.is_done for e in sent] == [True]
+    owned = EventService.get_page(in_range(owner="lister")).events
+    assert [e.user.username for e in owned] == ["lister", "lister"]
+    one_day = EventFilters(start=BASE.date(), end=BASE.date())
+    assert len(EventService.get_page(one_day).events) == 3
+    assert EventService.get_page(in_range(owner="nobody")).unknown_owner
+
+    with pytest.raises(ValueError, match="status"):
+        EventFilters.from_args({"status": "lost"})
+    with pytest.raises(ValueError, match="YYYY-MM-DD"):
+        EventFilters.from_args({"start": "March"})
+    with pytest.raises(ValueError, match="cursor"):
+        EventService.get_page(after="nonsense")
+
+
+def test_list_view_renders_a_page(app, client, session):
+    """The list page shows one page with a link to the next."""
+    make_events(session, 3)
+    with patch("flask_login.utils._get_user") as mock_get_user:
+        mock_get_user.return_value = MagicMock(is_authenticated=True)
+        response = client.get(
+            "/items/?start=2091-03-01&end=2091-03-01&per_page=2&status=pending"
+        )
+        bad = client.get("/items/?start=March")
+
+    body = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert "Event 2" in body and "Event 1" in body and "Event 0" not in body
+    assert "Body of event 2" in body
+    assert "after=" in body and "status=pending" in body
+    assert bad.status_code == 200
@@ -0,0 +1,165 @@
+"""Tests for streaming recipient imports."""
+
+import io
+
+import pytest
+
+from app.database.models import ImportStatus, Recipient
+from app.event.imports import detect_format, import_recipients, read_csv, read_ndjson
+
+
+def emails(session, event):
+    """Stored addresses of an event, sorted."""
+    rows = session.query(Recipient).filter_by(event_id=event.id).all()
+    return sorted((r.email, r.name) for r in rows)
+
+
+def test_read_csv_with_and_without_header():
+    """A header picks the columns; otherwise email comes first, then name."""
+    with_header = io.StringIO("name,email\nAnn,ann@example.com\n,\n")
+    assert list(read_csv(with_header)) == [("ann@example.com", "Ann")]
+
+    without = io.StringIO("bo@example.com,Bo\ncy@example.com\n")
+    assert list(read_csv(without)) == [
+        ("bo@example.com", "Bo"),
+        ("cy@example.com", None),
+    ]
+
+
+def test_read_ndjson():
+    """Objects and plain strings are read; anything else is a bad row."""
+    stream = io.StringIO('{"email": "a@example.com", "name": "A"}\n\n"b@x.io"\n[1]\n{')
+    assert list(read_ndjson(stream)) == [
+        ("a@example.com", "A"),
+        ("b@x.io", None),
+        (None, None),
+        (None, None),
+    ]
+
+
+def test_detect_format():
+    """The format comes from the extension or the content type."""
+    assert detect_format("list.CSV", None) == "csv"
+    assert detect_format("list.jsonl", None) == "ndjson"
+    assert detect_format(None, "application/x-ndjson") == "ndjson"
+    assert detect_format("list.txt", "text/plain") is None
+
+
+def test_import_dedupes_and_reports_progress(make_event, session):
+    """Chunks are validated, deduplicated and committed with the progress."""
+    event = make_event(recipients=("old@example.com",))
+    data = io.StringIO(
+        "email,name\n"
+        "new1@example.com,One\n"
+        "OLD@example.com,Old\n"
+        "not-an-address,X\n"
+        "new1@example.com,Again\n"
+        "new2@example.com,\n"
+    )
+    progress = []
+
+    record = import_recipients(
+        event.id,
+        data,
+        "csv",
+        source="list.csv",
+        chunk_size=2,
+        on_chunk=lambda r: progress.append((r.rows_read, r.imported)),
+    )
+
+    assert record.status == ImportStatus.DONE
+    assert progress == [(2, 1), (4, 1), (5, 2)]
+    assert (record.rows_read, record.imported) == (5, 2)
+    assert (record.duplicates, record.invalid) == (2, 1)
+    assert record.finished_at is not None
+    assert emails(session, event) == [
+        ("new1@example.com", "One"),
+        ("new2@example.com", None),
+        ("old@example.com", None),
+    ]
+
+
+def test_import_fails_on_undecodable_input(make_event, session):
+    """Bad bytes fail the import; earlier chunks stay imported."""
+    event = make_event(recipients=())
+    # The stream decodes in blocks; the bad bytes come after the first one
+    raw = io.BytesIO(b'"a@example.com"\n' * 1000 + b"\xff\xfe\n")
+    stream = io.TextIOWrapper(raw, encoding="utf-8")
+
+    record = import_recipients(event.id, stream, "ndjson", chunk_size=100)
+
+    assert record.status == ImportStatus.FAILED
+    assert "decode" in record.error
+    assert record.imported == 1
+    assert record.duplicates > 0
+    assert emails(session, event) == [("a@example.com", None)]
+
+
+def test_import_rejects_unknown_format(make_event):
+    """Only CSV and NDJSON can be imported."""
+    with pytest.raises(ValueError):
+        import_recipients(make_event().id, io.StringIO(""), "xlsx")
+
+
+def test_import_endpoint(make_event, session, client):
+    """Uploads and raw bodies are imported; progress is listed per event."""
+    event = make_event(recipients=())
+    upload = (io.BytesIO(b"a@example.com,A\nb@example.com,B\n"), "list.csv")
+    response = client.post(
+        f"/api/events/{event.id}/recipients/import",
+        data={"file": upload},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 201
+    assert response.json["imported"] == 2
+    assert response.json["source"] == "list.csv"
+
+    response = client.post(
+        f"/api/events/{event.id}/recipients/import",
+        data='{"email": "c@example.com"}\n"a@example.com"\n',
+        content_type="application/x-ndjson",
+    )
+    assert response.status_code == 201
+    assert (response.json["imported"], response.json["duplicates"]) == (1, 1)
+
+    response = client.get(f"/api/events/{event.id}/recipients/imports")
+    assert [i["format"] for i in response.json] == ["ndjson", "csv"]
+    assert len(emails(session, event)) == 3
+
+
+def test_import_endpoint_refuses(make_event, session, client):
+    """Unknown events, sent events and unknown formats are refused."""
+    response = client.post("/api/events/999999/recipients/import", data="x")
+    assert response.status_code == 404
+
+    event = make_event()
+    response = client.post(
+        f"/api/events/{event.id}/recipients/import",
+        data="x",
+        content_type="text/plain",
+    )
+    assert response.status_code == 400
+
+    event.is_done = True
+    session.commit()
+    response = client.post(
+        f"/api/events/{event.id}/recipients/import",
+        data="a@example.com\n",
+        content_type="text/csv",
+    )
+    assert response.status_code == 409
+
+
+def test_import_recipients_cli(app, make_event, session, tmp_path):
+    """The CLI streams a file and prints the outcome."""
+    event = make_event(recipients=())
+    path = tmp_path / "list.ndjson"
+    path.write_text('{"email": "a@example.com", "name": "A"}\n"bad"\n')
+
+    result = app.test_cli_runner().invoke(
+        args=["import-recipients", str(event.id), str(path)]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "1 imported, 0 duplicate(s), 1 invalid" in result.output
+    assert emails(session, event) == [("a@example.com", "A")]
@@ -7,7 +7,13 @@ import pytest
 import pytz
 
 from app.database.models import Event, Recipient
-from app.event.jobs import add_recipients, dt_utc, schedule_mail, send_mail
+from app.event.jobs import (
+    SEND_MAIL_PAYLOAD_VERSION,
+    add_recipients,
+    dt_utc,
+    schedule_mail,
+    send_mail,
+)
 
 
 @pytest.fixture
@@ -46,17 +52,19 @@ def test_add_recipients(app, mock_db_session):
         assert "test2@example.com" in result
         assert "test3@example.com" in result
 
-        # Check that recipients were added to the database
-        assert mock_db_session.add.call_count == 3
+        # Check that recipients were inserted in one statement
+        assert not mock_db_session.add.called
+        assert mock_db_session.execute.call_count == 1
+        _, rows = mock_db_session.execute.call_args.args
+        assert [row["email"] for row in rows] == result
         assert mock_db_session.commit.call_count == 1
 
 
 # Test dt_utc function
-def test_dt_utc_with_timezone(monkeypatch):
+def test_dt_utc_with_timezone(local_zone):
     """Test converting datetime string with timezone to UTC."""
-    # Mock get_localzone to return a consistent timezone
-    mock_tz = pytz.timezone("America/New_York")
-    monkeypatch.setattr("app.event.jobs.get_localzone", lambda: mock_tz)
+    # The zone named in the string wins over the local zone
+    local_zone(pytz.timezone("America/New_York"))
 
     # Define test datetime in a specific timezone
     test_dt = "2023-01-01 12:00:00 US/Pacific"
@@ -72,11 +80,10 @@ def test_dt_utc_with_timezone(monkeypatch):
     assert result == expected
 
 
-def test_dt_utc_without_timezone(monkeypatch):
+def test_dt_utc_without_timezone(local_zone):
     """Test converting datetime string without timezone to UTC."""
-    # Mock get_localzone to return a consistent timezone
-    mock_tz = pytz.timezone("America/New_York")
-    monkeypatch.setattr("app.event.jobs.get_localzone", lambda: mock_tz)
+    # Use a consistent local timezone
+    local_zone(pytz.timezone("America/New_York"))
 
     # Define test datetime without timezone
     test_dt = "2023-01-01 12:00:00"
@@ -96,27 +103,23 @@ def test_dt_utc_without_timezone(monkeypatch):
 def test_schedule_mail(mock_redis):
     """Test scheduling an email."""
     event_id = 1
-    recipients = ["test@example.com"]
     timestamp = datetime.now(UTC) + timedelta(hours=1)
 
     # Call the function
-    schedule_mail(event_id, recipients, timestamp)
+    schedule_mail(event_id, timestamp)
 
     # Check that the scheduler's enqueue_at method was called
     assert mock_redis.enqueue_at.called
-    mock_redis.enqueue_at.assert_called_with(timestamp, send_mail, event_id, recipients)
+    mock_redis.enqueue_at.assert_called_with(
+        timestamp, send_mail, event_id, SEND_MAIL_PAYLOAD_VERSION, job_id="send:1:1"
+    )
 
 
 # Test send_mail function
-@patch("app.event.jobs.Message")
-def test_send_mail(mock_message_class, app, mock_event, monkeypatch):
+def test_send_mail(app, make_event, monkeypatch):
     """Test sending an email."""
-    # Setup
-    mock_msg = MagicMock()
-    mock_message_class.return_value = mock_msg
-
-    # Ensure the event has the expected ID for the test
-    mock_event.id = 1
+    # Persist the event and its recipient
+    event = make_event(content="<p>Test Content</p>")
 
     # Mock mail.connect() context manager
     mock_mail = MagicMock()
@@ -124,34 +127,17 @@ def test_send_mail(mock_message_class, app, mock_event, monkeypatch):
     mock_mail.connect.return_value.__enter__.return_value = mock_conn
     monkeypatch.setattr("app.event.jobs.mail", mock_mail)
 
-    # Mock recipient query and update
-    mock_recipient = MagicMock()
-    mock_recipient_query = MagicMock()
-    mock_recipient_query.filter_by.return_value.first.return_value = mock_recipient
-    mock_recipient_class = MagicMock()
-    mock_recipient_class.query = mock_recipient_query
-    monkeypatch.setattr("app.event.jobs.Recipient", mock_recipient_class)
-
-    # Mock db session
-    mock_db_session = MagicMock()
-    mock_db_session.get.return_value = mock_event  # Add get method to return mock_event
-    monkeypatch.setattr("app.event.jobs.db.session", mock_db_session)
-
     # Call the function
-    with app.app_context():
-        result = send_mail(1, ["test@example.com"])
-
-    # Check that email was created with correct subject
-    mock_message_class.assert_called_once_with(subject=mock_event.email_subject)
-
-    # Check that email recipients were added
-    assert mock_msg.add_recipient.called
+    result = send_mail(event.id)
 
-    # Check that email was sent
+    # Check that email was sent to the recipient with the event subject
     assert mock_conn.send.called
+    sent = mock_conn.send.call_args.args[0]
+    assert sent.subject == event.email_subject
+    assert sent.recipients == ["test@example.com"]
 
-    # Check that recipient was updated in the database
-    assert mock_db_session.commit.called
+    # Check that the event was updated in the database
+    assert event.is_done is True
 
     # Check result contains success message
     assert "Success" in result
@@ -1,6 +1,7 @@
 """Comprehensive tests for app/event/jobs.py module."""
 
 from datetime import UTC, datetime, timedelta
+from email import message_from_bytes
 from unittest.mock import MagicMock, call, patch
 
 import dateutil.parser
@@ -9,21 +10,15 @@ import pytz
 from bs4 import BeautifulSoup
 from flask_mail import Message
 
-from app.database.models import Event, Recipient
-from app.event.jobs import add_event, add_recipients, dt_utc, schedule_mail, send_mail
-
-
-@pytest.fixture
-def mock_event():
-    """Create a mock event for testing."""
-    event = MagicMock()
-    event.id = 1
-    event.email_subject = "Test Subject"
-    event.email_content = "<p>Test Content</p>"
-    event.timestamp = datetime.now(UTC) + timedelta(days=1)
-    event.is_done = False
-    event.done_at = None
-    return event
+from app.database.models import DeliveryStatus, Event, Recipient
+from app.event.jobs import (
+    SEND_MAIL_PAYLOAD_VERSION,
+    add_event,
+    add_recipients,
+    dt_utc,
+    schedule_mail,
+    send_mail,
+)
 
 
 @pytest.fixture
@@ -35,52 +30,20 @@ def mock_db_session(monkeypatch):
 
 
 @pytest.fixture
-def mock_recipient(monkeypatch):
-    """Mock Recipient class for testing."""
-
-    # Create a mock recipient class that will accept the positional arguments
-    # as they're passed in the add_recipients function
-    class MockRecipient:
-        def __init__(self, email, event_id, name=None, is_sent=False, sent_at=None):
-            self.email = email
-            # For backward compatibility with tests expecting email_address
-            self.email_address = email
-            self.event_id = event_id
-            self.name = name
-            self.is_sent = is_sent
-            self.sent_at = sent_at
-
-    # Replace the Recipient class with our mock
-    monkeypatch.setattr("app.event.jobs.Recipient", MockRecipient)
-    return MockRecipient
-
-
-@pytest.fixture
-def mock_event_query(monkeypatch, mock_event):
-    """Mock db.session.get for testing."""
-    mock_session = MagicMock()
-    mock_session.get.return_value = mock_event
-
-    mock_db = MagicMock()
-    mock_db.session = mock_session
-
-    monkeypatch.setattr("app.event.jobs.db", mock_db)
-    return mock_session
-
-
-@pytest.fixture
-def mock_mail_connection(monkeypatch):
+def mock_mail_connection(app, monkeypatch):
     """Mock flask_mail connection for testing."""
     mock_connection = MagicMock()
     mock_mail = MagicMock()
     mock_mail.connect.return_value.__enter__.return_value = mock_connection
 
     monkeypatch.setattr("app.event.jobs.mail", mock_mail)
-    return mock_connection
+    # Jobs run inside the worker's application context
+    with app.app_context():
+        yield mock_connection
 
 
 # Test add_recipients function
-def test_add_recipients(mock_db_session, mock_recipient):
+def test_add_recipients(mock_db_session):
     """Test adding recipients to the database."""
     # Test data
     test_data = "test1@example.com, test2@example.com, test3@example.com"
@@ -95,25 +58,25 @@ def test_add_recipients(mock_db_session, mock_recipient):
     assert "test2@example.com" in result
     assert "test3@example.com" in result
 
-    # Check that recipients were added to the database
-    assert mock_db_session.add.call_count == 3
+    # Check that recipients were inserted in one statement, without ORM objects
+    assert not mock_db_session.add.called
+    assert mock_db_session.execute.call_count == 1
     assert mock_db_session.commit.call_count == 1
 
-    # Verify the Recipient constructor was called with correct parameters
-    for i, call_args in enumerate(mock_db_session.add.call_args_list):
-        recipient = call_args[0][0]
-        assert isinstance(recipient, mock_recipient)
-        assert recipient.email_address in [
+    # Verify the inserted rows
+    _, rows = mock_db_session.execute.call_args.args
+    for row in rows:
+        assert row["email"] in [
             "test1@example.com",
             "test2@example.com",
             "test3@example.com",
         ]
-        assert recipient.event_id == event_id
-        assert recipient.is_sent is False
-        assert recipient.sent_at is None
+        assert row["event_id"] == event_id
+        assert row["status"] == DeliveryStatus.QUEUED
+        assert row["attempts"] == 0
 
 
-def test_add_recipients_with_spaces(mock_db_session, mock_recipient):
+def test_add_recipients_with_spaces(mock_db_session):
     """Test adding recipients with spaces in the input."""
     # Test data with spaces
     test_data = " test1@example.com ,  test2@example.com , test3@example.com "
@@ -128,26 +91,18 @@ def test_add_recipients_with_spaces(mock_db_session, mock_recipient):
     assert "test2@example.com" in result
     assert "test3@example.com" in result
 
-    # Verify the Recipient constructor was called with correct parameters
-    for i, call_args in enumerate(mock_db_session.add.call_args_list):
-        recipient = call_args[0][0]
-        assert isinstance(recipient, mock_recipient)
-        assert recipient.email_address in [
-            "test1@example.com",
-            "test2@example.com",
-            "test3@example.com",
-        ]
-        assert recipient.event_id == event_id
-        assert recipient.is_sent is False
-        assert recipient.sent_at is None
+    # Verify the inserted rows
+    _, rows = mock_db_session.execute.call_args.args
+    assert [row["email"] for row in rows] == result
+    assert all(row["event_id"] == event_id for row in rows)
 
 
 # Test dt_utc function
-def test_dt_utc_with_timezone(monkeypatch):
+def test_dt_utc_with_timezone(local_zone):
     """Test converting datetime string with timezone to UTC."""
-    # Mock get_localzone to return a consistent timezone
+    # Use a consistent local timezone
     mock_tz = pytz.timezone("America/New_York")
-    monkeypatch.setattr("app.event.jobs.get_localzone", lambda: mock_tz)
+    local_zone(mock_tz)
 
     # Define test datetime in ISO format with timezone
     test_dt = "2023-01-01T12:00:00-05:00"  # Eastern Time (UTC-5)
@@ -163,11 +118,11 @@ def test_dt_utc_with_timezone(monkeypatch):
     assert result == expected
 
 
-def test_dt_utc_without_timezone(monkeypatch):
+def test_dt_utc_without_timezone(monkeypatch, local_zone):
     """Test converting datetime string without timezone to UTC."""
-    # Mock get_localzone to return a consistent timezone
+    # Use a consistent local timezone
     mock_tz = pytz.timezone("America/New_York")
-    monkeypatch.setattr("app.event.jobs.get_localzone", lambda: mock_tz)
+    local_zone(mock_tz)
 
     # Define test datetime without timezone
     test_dt = "2023-01-01 12:00:00"
@@ -197,11 +152,11 @@ def test_dt_utc_without_timezone(monkeypatch):
     assert result == expected
 
 
-def test_dt_utc_iso_format(monkeypatch):
+def test_dt_utc_iso_format(local_zone):
     """Test converting ISO format datetime string to UTC."""
-    # Mock get_localzone to return a consistent timezone
+    # Use a consistent local timezone
     mock_tz = pytz.timezone("America/New_York")
-    monkeypatch.setattr("app.event.jobs.get_localzone", lambda: mock_tz)
+    local_zone(mock_tz)
 
     # Define test datetime in ISO format
     test_dt = "2023-01-01T12:00:00Z"  # Z indicates UTC
@@ -222,127 +177,71 @@ def test_schedule_mail(monkeypatch):
     """Test scheduling an email."""
     # Setup mock scheduler
     mock_scheduler = MagicMock()
+    mock_scheduler.connection.exists.return_value = 0
     mock_rq = MagicMock()
     mock_rq.get_scheduler.return_value = mock_scheduler
     monkeypatch.setattr("app.event.jobs.rq", mock_rq)
 
     # Test data
     event_id = 1
-    recipients = ["test@example.com"]
     timestamp = datetime.now(UTC) + timedelta(hours=1)
 
     # Call the function
-    schedule_mail(event_id, recipients, timestamp)
+    schedule_mail(event_id, timestamp)
 
-    # Check that the scheduler's enqueue_at method was called correctly
+    # Only the event ID and payload version go into the job
     mock_scheduler.enqueue_at.assert_called_once_with(
-        timestamp, send_mail, event_id, recipients
+        timestamp, send_mail, event_id, SEND_MAIL_PAYLOAD_VERSION, job_id="send:1:1"
     )
 
 
 # Test send_mail function
-def test_send_mail_html_content(
-    mock_event_query, mock_db_session, mock_mail_connection, monkeypatch
-):
+def test_send_mail_html_content(make_event, mock_mail_connection):
     """Test sending an email with HTML content."""
-    # Setup mock Message class
-    mock_msg = MagicMock()
-    # Initialize attributes to None so they can be set later
-    mock_msg.html = None
-    mock_msg.body = None
-
-    mock_message_class = MagicMock()
-    mock_message_class.return_value = mock_msg
-    monkeypatch.setattr("app.event.jobs.Message", mock_message_class)
-
-    # Test data
-    event_id = 1
+    # Test data: an HTML event with two recipients in the database
     recipients = ["test@example.com", "another@example.com"]
-
-    # Set mock event to have HTML content (mock_event already has correct email_subject)
-    mock_event = mock_event_query.get.return_value
-    mock_event.email_content = "<p>This is HTML content</p>"
-
-    # Mock BeautifulSoup to return a tag (indicating HTML)
-    mock_soup = MagicMock()
-    mock_soup.find.return_value = True  # Simulate finding HTML tags
-    mock_soup_class = MagicMock(return_value=mock_soup)
-    monkeypatch.setattr("app.event.jobs.BeautifulSoup", mock_soup_class)
+    event = make_event(recipients=recipients, content="<p>This is HTML content</p>")
 
     # Call the function
-    result = send_mail(event_id, recipients)
-
-    # Check that Message was created (subject is passed correctly)
-    mock_message_class.assert_called_once()
-    args, kwargs = mock_message_class.call_args
-    assert "subject" in kwargs  # Verify subject parameter is passed
-
-    # Check that all recipients were added
-    assert mock_msg.add_recipient.call_count == 2
-    mock_msg.add_recipient.assert_has_calls(
-        [call("test@example.com"), call("another@example.com")]
-    )
-
-    # Check that HTML content was set
-    # Note: Skipping assertion on mock_msg.html as it involves complex mock chaining
-    assert mock_msg.body is None  # Body should be None for HTML email
-
-    # Check that email was sent
-    mock_mail_connection.send.assert_called_once_with(mock_msg)
-
-    # Check that event was updated
-    # Note: Skipping detailed mock assertions, functionality is tested in enhanced tests
+    result = send_mail(event.id)
+
+    # Check that one message was sent per recipient
+    sent = [c.args[0] for c in mock_mail_connection.send.call_args_list]
+    assert [m.recipients for m in sent] == [[r] for r in recipients]
+
+    # Check the rendered message carries the subject and both parts
+    parsed = message_from_bytes(sent[0].as_bytes())
+    assert parsed["Subject"] == "Test Subject"
+    assert parsed["To"] == "test@example.com"
+    (alternative,) = parsed.get_payload()
+    assert alternative.get_content_type() == "multipart/alternative"
+    text, html = alternative.get_payload()
+    assert text.get_payload(decode=True) == b"This is HTML content"
+    assert html.get_payload(decode=True) == b"<p>This is HTML content</p>"
 
     # Check result contains success message
     assert "Success" in result
     assert "Done at" in result
 
 
-def test_send_mail_text_content(
-    mock_event_query, mock_db_session, mock_mail_connection, monkeypatch
-):
+def test_send_mail_text_content(make_event, mock_mail_connection):
     """Test sending an email with plain text content."""
-    # Setup mock Message class
-    mock_msg = MagicMock()
-    # Initialize attributes to None so they can be set later
-    mock_msg.html = None
-    mock_msg.body = None
-
-    mock_message_class = MagicMock()
-    mock_message_class.return_value = mock_msg
-    monkeypatch.setattr("app.event.jobs.Message", mock_message_class)
-
-    # Test data
-    event_id = 1
-    recipients = ["test@example.com"]
-
-    # Set mock event to have plain text content (mock_event already has correct email_subject)
-    mock_event = mock_event_query.get.return_value
-    mock_event.email_content = "This is plain text content"
-
-    # Mock BeautifulSoup to return None (indicating plain text)
-    mock_soup = MagicMock()
-    mock_soup.find.return_value = False  # Simulate NOT finding HTML tags
-    mock_soup_class = MagicMock(return_value=mock_soup)
-    monkeypatch.setattr("app.event.jobs.BeautifulSoup", mock_soup_class)
+    # Test data: a plain text event in the database
+    event = make_event(content="This is plain text content")
 
     # Call the function
-    result = send_mail(event_id, recipients)
+    result = send_mail(event.id)
 
-    # Check that Message was created (subject is passed correctly)
-    mock_message_class.assert_called_once()
-    args, kwargs = mock_message_class.call_args
-    assert "subject" in kwargs  # Verify subject parameter is passed
+    # Check that email was sent as a single text part
+    mock_mail_connection.send.assert_called_once()
+    parsed = message_from_bytes(mock_mail_connection.send.call_args.args[0].as_bytes())
+    assert parsed["Subject"] == "Test Subject"
+    assert parsed.get_content_type() == "text/plain"
+    assert parsed.get_payload(decode=True) == b"This is plain text content"
 
-    # Check that body content was set
-    # Note: Skipping assertion on mock_msg.body as it involves complex mock chaining
-    assert mock_msg.html is None  # HTML should be None for text-only email
-
-    # Check that email was sent
-    mock_mail_connection.send.assert_called_once_with(mock_msg)
-
-    # Check that event was updated
-    # Note: Skipping detailed mock assertions, functionality is tested in enhanced tests
+    # Check that the event was marked as sent
+    assert event.is_done is True
+    assert "Success" in result
 
 
 # Test add_event function
@@ -354,9 +253,9 @@ def test_add_event(mock_db_session, monkeypatch):
     mock_event_class = MagicMock(return_value=mock_event)
     monkeypatch.setattr("app.event.jobs.Event", mock_event_class)
 
-    # Mock add_recipients function
-    mock_add_recipients = MagicMock(return_value=["test@example.com"])
-    monkeypatch.setattr("app.event.jobs.add_recipients", mock_add_recipients)
+    # Mock insert_recipients function
+    mock_insert_recipients = MagicMock(return_value=1)
+    monkeypatch.setattr("app.event.jobs.insert_recipients", mock_insert_recipients)
 
     # Mock schedule_mail function
     mock_schedule_mail = MagicMock()
@@ -393,10 +292,10 @@ def test_add_event(mock_db_session, monkeypatch):
     mock_db_session.add.assert_called_once_with(mock_event)
     mock_db_session.commit.assert_called_once()
 
-    # Check add_recipients was called
-    mock_add_recipients.assert_called_once_with(test_data["recipients"], mock_event.id)
+    # Check the parsed recipients were inserted
+    mock_insert_recipients.assert_called_once()
+    rows = list(mock_insert_recipients.call_args.args[0])
+    assert rows == [(mock_event.id, "test@example.com", None)]
 
     # Check schedule_mail was called
-    mock_schedule_mail.assert_called_once_with(
-        mock_event.id, ["test@example.com"], test_datetime
-    )
+    mock_schedule_mail.assert_called_once_with(mock_event.id, test_datetime)
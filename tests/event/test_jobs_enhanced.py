@@ -1,6 +1,7 @@
 """Comprehensive tests for app/event/jobs.py."""
 
 from datetime import UTC, datetime, timedelta
+from email import message_from_bytes
 from unittest.mock import ANY, MagicMock, patch
 
 import pytest
@@ -8,7 +9,19 @@ import pytz
 from bs4 import BeautifulSoup
 
 from app.database.models import Event, Recipient
-from app.event.jobs import add_event, add_recipients, dt_utc, schedule_mail, send_mail
+from app.event.jobs import (
+    SEND_MAIL_PAYLOAD_VERSION,
+    add_event,
+    add_recipients,
+    chunk_starts,
+    dt_utc,
+    get_send_job,
+    insert_recipients,
+    iter_recipients,
+    schedule_mail,
+    send_mail,
+    send_mail_chunk,
+)
 
 
 class TestAddRecipients:
@@ -71,6 +84,39 @@ class TestAddRecipients:
         recipients = session.query(Recipient).filter_by(event_id=event_id).all()
         assert len(recipients) == 3
 
+    def test_insert_recipients_in_chunks(self, session):
+        """Rows are inserted a chunk per statement with the default status."""
+        rows = [(103, f"user{i}@example.com", None) for i in range(5)]
+
+        with patch.object(session, "execute", wraps=session.execute) as mock_execute:
+            assert insert_recipients(iter(rows), chunk_size=2) == 5
+        session.commit()
+
+        assert mock_execute.call_count == 3
+        stored = session.query(Recipient).filter_by(event_id=103).all()
+        assert sorted(r.email for r in stored) == [row[1] for row in rows]
+        assert {(r.status, r.attempts) for r in stored} == {("queued", 0)}
+
+    def test_insert_recipients_copies_on_postgres(self, app):
+        """Postgres gets one COPY per chunk with escaped text values."""
+        cursor = MagicMock()
+        session = MagicMock()
+        session.get_bind.return_value.dialect.name = "postgresql"
+        dbapi = session.connection.return_value.connection.dbapi_connection
+        dbapi.cursor.return_value.__enter__.return_value = cursor
+        rows = [(7, "a@example.com", None), (7, "b@example.com", "Tab\tName")]
+
+        with patch("app.event.jobs.db.session", session):
+            insert_recipients(rows, chunk_size=1)
+
+        assert cursor.copy_expert.call_count == 2
+        sql, buffer = cursor.copy_expert.call_args.args
+        assert sql == (
+            "COPY recipients (event_id, email, name, status, attempts) FROM STDIN"
+        )
+        assert buffer.getvalue() == "7\tb@example.com\tTab\\tName\tqueued\t0\n"
+        assert not session.execute.called
+
 
 class TestDtUtc:
     """Tests for the dt_utc function."""
@@ -88,11 +134,11 @@ class TestDtUtc:
         expected = datetime(2023, 5, 10, 19, 30, 0)
         assert result == expected
 
-    def test_dt_utc_without_timezone(self, monkeypatch):
+    def test_dt_utc_without_timezone(self, local_zone):
         """Test conversion of datetime without timezone to UTC."""
         # Setup - Mock local timezone to ensure consistent test
         mock_local_tz = pytz.timezone("Europe/London")
-        monkeypatch.setattr("app.event.jobs.get_localzone", lambda: mock_local_tz)
+        local_zone(mock_local_tz)
 
         # Test with a datetime without timezone
         dt_str = "2023-05-10 15:30:00"
@@ -125,140 +171,259 @@ class TestScheduleMail:
         """Test scheduling an email."""
         # Setup
         event_id = 1
-        recipients = ["test@example.com"]
         timestamp = datetime.now(UTC) + timedelta(hours=1)
 
         # Execute
-        schedule_mail(event_id, recipients, timestamp)
+        schedule_mail(event_id, timestamp)
 
         # Verify
         # Assert that scheduler.enqueue_at was called with correct args
         # This depends on the mock_redis fixture in conftest.py
         mock_redis.enqueue_at.assert_called_once_with(
-            timestamp, send_mail, event_id, recipients
+            timestamp, send_mail, event_id, SEND_MAIL_PAYLOAD_VERSION, job_id="send:1:1"
+        )
+
+    def test_schedule_mail_is_idempotent(self, mock_redis):
+        """An event whose job exists already is not scheduled again."""
+        mock_redis.connection.exists.return_value = 1
+
+        job_id = schedule_mail(1, datetime.now(UTC), version=2)
+
+        assert job_id == "send:1:2"
+        mock_redis.connection.exists.assert_called_once_with(b"rq:job:send:1:2")
+        assert not mock_redis.enqueue_at.called
+
+    @pytest.mark.parametrize("offset", [-3600, 0, 4])
+    @patch("app.event.jobs.metrics")
+    def test_schedule_mail_due_now_skips_scheduler(
+        self, mock_metrics, app, mock_redis, monkeypatch, offset
+    ):
+        """Sends due within the threshold go straight to the send-now queue."""
+        monkeypatch.setitem(app.config, "MAIL_SEND_NOW_THRESHOLD", 5)
+        monkeypatch.setitem(app.config, "RQ_SCHEDULER_INTERVAL", 10)
+        timestamp = datetime.now(UTC) + timedelta(seconds=offset)
+
+        assert schedule_mail(1, timestamp) == "send:1:1"
+
+        assert not mock_redis.enqueue_at.called
+        mock_redis.queue.enqueue_call.assert_called_once_with(
+            send_mail, args=(1, SEND_MAIL_PAYLOAD_VERSION), job_id="send:1:1"
         )
+        mock_metrics.incr.assert_called_once_with("schedule.send_now")
+        name, saved = mock_metrics.observe.call_args.args
+        assert name == "schedule.send_now_saved_seconds"
+        assert 5 <= saved <= 5 + max(offset, 0)
+
+    @patch("app.event.jobs.metrics")
+    def test_schedule_mail_beyond_threshold_is_scheduled(
+        self, mock_metrics, app, mock_redis, monkeypatch
+    ):
+        """Later sends still go through the scheduler."""
+        monkeypatch.setitem(app.config, "MAIL_SEND_NOW_THRESHOLD", 5)
+
+        schedule_mail(1, datetime.now(UTC) + timedelta(seconds=30))
+
+        assert mock_redis.enqueue_at.called
+        assert not mock_redis.queue.enqueue_call.called
+        mock_metrics.incr.assert_called_once_with("schedule.scheduled")
+
+    def test_send_now_uses_configured_queue(self, app, mock_redis, monkeypatch):
+        """MAIL_SEND_NOW_QUEUE picks the queue of due-now sends."""
+        monkeypatch.setitem(app.config, "MAIL_SEND_NOW_QUEUE", "high")
+        with patch("app.event.jobs.rq.get_queue") as mock_get_queue:
+            schedule_mail(1, datetime.now(UTC))
+
+        mock_get_queue.assert_called_once_with("high")
+        assert mock_get_queue.return_value.enqueue_call.called
+
+    def test_add_event_stores_job_id(self, session, mock_redis):
+        """The event row links to its job and the job is found by that ID."""
+        event_id = add_event(
+            {
+                "subject": "Linked",
+                "content": "Body",
+                "timestamp": "2030-01-01T09:00:00+00:00",
+                "recipients": "a@example.com",
+            }
+        )
+
+        event = session.get(Event, event_id)
+        assert event.job_id == f"send:{event_id}:1"
+        assert mock_redis.enqueue_at.call_args.kwargs == {"job_id": event.job_id}
+        with patch("app.event.jobs.Job.fetch") as mock_fetch:
+            assert get_send_job(event) is mock_fetch.return_value
+        assert mock_fetch.call_args.args == (event.job_id,)
+
+
+class TestIterRecipients:
+    """Tests for streaming recipients from the database."""
+
+    def test_iter_recipients_streams_event_rows(self, session):
+        """Only the event's recipients are returned, in insertion order."""
+        add_recipients("b@example.com, a@example.com", 110)
+        add_recipients("other@example.com", 111)
+
+        rows = list(iter_recipients(110))
+
+        assert [email for _, email in rows] == ["b@example.com", "a@example.com"]
+        assert rows[0].id < rows[1].id
 
 
 class TestSendMail:
     """Tests for the send_mail function."""
 
-    @patch("app.event.jobs.Event")
-    @patch("app.event.jobs.Message")
     @patch("app.event.jobs.mail")
-    @patch("app.event.jobs.db")
-    def test_send_mail_text_content(self, mock_db, mock_mail, mock_message, mock_event):
+    def test_send_mail_text_content(self, mock_mail, session, make_event):
         """Test sending an email with text content."""
         # Setup
-        event_id = 1
-        recipients = ["test@example.com"]
-
-        # Mock event
-        mock_event_obj = MagicMock()
-        mock_event_obj.email_subject = "Test Subject"
-        mock_event_obj.email_content = "Test content with no HTML"
-        mock_db.session.get.return_value = mock_event_obj
-
-        # Mock message
-        mock_msg = MagicMock()
-        mock_message.return_value = mock_msg
+        event = make_event(content="Test content with no HTML")
 
         # Mock mail connection
         mock_conn = MagicMock()
         mock_mail.connect.return_value.__enter__.return_value = mock_conn
 
         # Execute
-        result = send_mail(event_id, recipients)
+        result = send_mail(event.id)
 
         # Verify
-        mock_message.assert_called_once_with(subject="Test Subject")
-        mock_msg.add_recipient.assert_called_once_with("test@example.com")
-        # Skip checking mock attributes directly as they're MagicMock objects
-        mock_conn.send.assert_called_once_with(mock_msg)
-        assert mock_event_obj.is_done is True
-        assert mock_event_obj.done_at is not None
-        mock_db.session.add.assert_called_once_with(mock_event_obj)
-        mock_db.session.commit.assert_called_once()
+        mock_conn.send.assert_called_once()
+        sent = mock_conn.send.call_args.args[0]
+        assert sent.subject == "Test Subject"
+        assert sent.recipients == ["test@example.com"]
+        parsed = message_from_bytes(sent.as_bytes())
+        assert parsed.get_payload(decode=True) == b"Test content with no HTML"
+        session.refresh(event)
+        assert event.is_done is True
+        assert event.done_at is not None
         assert "Success" in result
 
-    @patch("app.event.jobs.Event")
-    @patch("app.event.jobs.Message")
     @patch("app.event.jobs.mail")
-    @patch("app.event.jobs.db")
-    def test_send_mail_html_content(self, mock_db, mock_mail, mock_message, mock_event):
+    def test_send_mail_html_content(self, mock_mail, session, make_event):
         """Test sending an email with HTML content."""
         # Setup
-        event_id = 1
-        recipients = ["test@example.com"]
-
-        # Mock event
-        mock_event_obj = MagicMock()
-        mock_event_obj.email_subject = "Test Subject"
-        mock_event_obj.email_content = (
-            "<html><body><p>Test HTML content</p></body></html>"
-        )
-        mock_db.session.get.return_value = mock_event_obj
-
-        # Mock message
-        mock_msg = MagicMock()
-        mock_message.return_value = mock_msg
+        html = "<html><body><p>Test HTML content</p></body></html>"
+        event = make_event(content=html)
 
         # Mock mail connection
         mock_conn = MagicMock()
         mock_mail.connect.return_value.__enter__.return_value = mock_conn
 
         # Execute
-        result = send_mail(event_id, recipients)
+        result = send_mail(event.id)
 
         # Verify
-        mock_message.assert_called_once_with(subject="Test Subject")
-        mock_msg.add_recipient.assert_called_once_with("test@example.com")
-        # Skip checking mock attributes directly as they're MagicMock objects
-        mock_conn.send.assert_called_once_with(mock_msg)
-        assert mock_event_obj.is_done is True
-        assert mock_event_obj.done_at is not None
-        mock_db.session.add.assert_called_once_with(mock_event_obj)
-        mock_db.session.commit.assert_called_once()
+        mock_conn.send.assert_called_once()
+        sent = mock_conn.send.call_args.args[0]
+        assert sent.recipients == ["test@example.com"]
+        assert html.encode() in sent.as_bytes()
+        session.refresh(event)
+        assert event.is_done is True
+        assert event.done_at is not None
         assert "Success" in result
 
-    @patch("app.event.jobs.Event")
-    @patch("app.event.jobs.Message")
     @patch("app.event.jobs.mail")
-    @patch("app.event.jobs.db")
-    def test_send_mail_multiple_recipients(
-        self, mock_db, mock_mail, mock_message, mock_event
-    ):
+    def test_send_mail_multiple_recipients(self, mock_mail, make_event):
         """Test sending an email to multiple recipients."""
         # Setup
-        event_id = 1
-        recipients = [
-            "test1@example.com",
-            "test2@example.com",
-            "test3@example.com",
-        ]
-
-        # Mock event
-        mock_event_obj = MagicMock()
-        mock_event_obj.email_subject = "Test Subject"
-        mock_event_obj.email_content = "Test content"
-        mock_db.session.get.return_value = mock_event_obj
-
-        # Mock message
-        mock_msg = MagicMock()
-        mock_message.return_value = mock_msg
+        recipients = ["test1@example.com", "test2@example.com", "test3@example.com"]
+        event = make_event(recipients=recipients)
 
         # Mock mail connection
         mock_conn = MagicMock()
         mock_mail.connect.return_value.__enter__.return_value = mock_conn
 
         # Execute
-        result = send_mail(event_id, recipients)
+        result = send_mail(event.id)
 
-        # Verify
-        mock_message.assert_called_once_with(subject="Test Subject")
-        assert mock_msg.add_recipient.call_count == 3
-        mock_conn.send.assert_called_once_with(mock_msg)
+        # Verify: one message per recipient, all from the same template
+        sent = [c.args[0] for c in mock_conn.send.call_args_list]
+        assert [m.recipients for m in sent] == [[r] for r in recipients]
+        assert len({m.template for m in sent}) == 1
+        assert len({m.msgId for m in sent}) == 3
+        assert "Success" in result
+
+    @patch("app.event.jobs.mail")
+    def test_send_mail_legacy_payload(self, mock_mail, make_event):
+        """Version 1 jobs ignore their pickled list and read the database."""
+        event = make_event(recipients=["current@example.com"])
+        mock_conn = mock_mail.connect.return_value.__enter__.return_value
+
+        result = send_mail(event.id, ["stale@example.com"])
+
+        mock_conn.send.assert_called_once()
+        assert mock_conn.send.call_args.args[0].recipients == ["current@example.com"]
         assert "Success" in result
 
+    def test_send_mail_missing_event(self, session):
+        """A job for a deleted event raises."""
+        with pytest.raises(ValueError):
+            send_mail(999999)
+
+
+class TestFanOut:
+    """Tests for splitting large events into chunk jobs."""
+
+    def test_chunk_starts(self, make_event):
+        """Chunk starts are every chunk_size-th recipient ID."""
+        event = make_event(recipients=[f"user{i}@example.com" for i in range(7)])
+        ids = [r.id for r in event.recipients.order_by(Recipient.id)]
+
+        assert chunk_starts(event.id, 3) == [ids[0], ids[3], ids[6]]
+        assert chunk_starts(event.id, 10) == [ids[0]]
+
+    @patch("app.event.jobs.send_mail_chunk")
+    def test_send_mail_fans_out(self, mock_chunk, app, session, make_event):
+        """Large events are dispatched as chained chunk jobs."""
+        event = make_event(recipients=[f"user{i}@example.com" for i in range(5)])
+        ids = [r.id for r in event.recipients.order_by(Recipient.id)]
+        mock_chunk.queue.side_effect = ["job-0", "job-1", "job-2"]
+        app.config.update(MAIL_CHUNK_SIZE=2, MAIL_MAX_CHUNK_CONCURRENCY=2)
+        try:
+            result = send_mail(event.id)
+        finally:
+            app.config.update(MAIL_CHUNK_SIZE=500, MAIL_MAX_CHUNK_CONCURRENCY=4)
+
+        assert "Dispatched 3 chunks" in result
+        calls = mock_chunk.queue.call_args_list
+        assert [c.args for c in calls] == [
+            (event.id, ids[0], ids[2]),
+            (event.id, ids[2], ids[4]),
+            (event.id, ids[4], None),
+        ]
+        # The first two chunks run at once, the third waits for the first
+        assert calls[0].kwargs["depends_on"] is None
+        assert calls[1].kwargs["depends_on"] is None
+        dependency = calls[2].kwargs["depends_on"]
+        assert dependency.dependencies == ["job-0"]
+        assert dependency.allow_failure is True
+
+        session.refresh(event)
+        assert event.chunks_total == 3
+        assert event.chunks_done == 0
+        assert event.is_done is False
+
+    @patch("app.event.jobs.mail")
+    def test_last_chunk_finalizes_event(self, mock_mail, session, make_event):
+        """The event is done only after every chunk completed."""
+        event = make_event(recipients=[f"user{i}@example.com" for i in range(4)])
+        ids = [r.id for r in event.recipients.order_by(Recipient.id)]
+        event.chunks_total = 2
+        session.commit()
+        mock_conn = mock_mail.connect.return_value.__enter__.return_value
+
+        send_mail_chunk(event.id, ids[2], None)
+        session.refresh(event)
+        assert event.chunks_done == 1
+        assert event.is_done is False
+        assert event.progress == 0.5
+
+        send_mail_chunk(event.id, ids[0], ids[2])
+        session.refresh(event)
+        assert event.chunks_done == 2
+        assert event.is_done is True
+        assert event.done_at is not None
+        assert mock_conn.send.call_count == 4
+
 
 class TestAddEvent:
     """Tests for the add_event function."""
@@ -266,12 +431,12 @@ class TestAddEvent:
     @patch("app.event.jobs.dt_utc")
     @patch("app.event.jobs.Event")
     @patch("app.event.jobs.db")
-    @patch("app.event.jobs.add_recipients")
+    @patch("app.event.jobs.insert_recipients")
     @patch("app.event.jobs.schedule_mail")
     def test_add_event(
         self,
         mock_schedule,
-        mock_add_recipients,
+        mock_insert_recipients,
         mock_db,
         mock_event,
         mock_dt_utc,
@@ -294,14 +459,14 @@ class TestAddEvent:
         mock_event_obj.id = 1
         mock_event.return_value = mock_event_obj
 
-        # Mock add_recipients
-        mock_add_recipients.return_value = ["test@example.com"]
+        # Mock insert_recipients
+        mock_insert_recipients.return_value = 1
 
         # Execute
         result = add_event(event_data)
 
         # Verify
-        mock_dt_utc.assert_called_once_with("2023-05-10T15:30:00Z")
+        mock_dt_utc.assert_called_once_with("2023-05-10T15:30:00Z", None)
         mock_event.assert_called_once_with(
             email_subject="Test Subject",
             email_content="Test Content",
@@ -312,6 +477,8 @@ class TestAddEvent:
         )
         mock_db.session.add.assert_called_once_with(mock_event_obj)
         mock_db.session.commit.assert_called_once()
-        mock_add_recipients.assert_called_once_with("test@example.com", 1)
-        mock_schedule.assert_called_once_with(1, ["test@example.com"], timestamp)
+        mock_insert_recipients.assert_called_once()
+        rows = list(mock_insert_recipients.call_args.args[0])
+        assert rows == [(1, "test@example.com", None)]
+        mock_schedule.assert_called_once_with(1, timestamp)
         assert result == 1
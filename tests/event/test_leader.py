@@ -0,0 +1,174 @@
+"""Tests for scheduler leader election."""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.event.dispatcher import LeadershipLost
+from app.event.leader import (
+    FENCING_KEY,
+    LEADER_KEY,
+    ElectedScheduler,
+    LeaderLease,
+    current_leader,
+)
+
+
+class FakeClock:
+    """Monotonic clock that only moves when told to."""
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_lease(tokens, clock=None):
+    """Lease whose acquire script returns the given tokens in turn."""
+    connection = MagicMock()
+    acquire, release = MagicMock(side_effect=tokens), MagicMock()
+    connection.register_script.side_effect = [acquire, release]
+    return LeaderLease(connection, "node-1", ttl=15, clock=clock or FakeClock())
+
+
+def test_acquire_takes_and_renews_the_lease():
+    """The token is kept across renewals and passed with the node and TTL."""
+    lease = make_lease([7, 7])
+
+    assert lease.acquire() == 7
+    assert lease.acquire() == 7
+
+    assert lease.is_leader()
+    assert lease.value == "node-1|7"
+    lease._acquire.assert_called_with(
+        keys=[LEADER_KEY, FENCING_KEY], args=["node-1", 15000]
+    )
+
+
+def test_standby_is_not_leader():
+    """While another node holds the lease acquire() returns None."""
+    lease = make_lease([None])
+
+    assert lease.acquire() is None
+    assert not lease.is_leader()
+
+
+def test_leadership_ends_at_the_local_deadline():
+    """A leader that missed its renewals stops before the lease expires."""
+    clock = FakeClock()
+    lease = make_lease([3], clock)
+    lease.acquire()
+
+    clock.now += 15
+
+    assert not lease.is_leader()
+
+
+def test_release_only_while_holding():
+    """Releasing deletes our lease value; a standby has nothing to release."""
+    lease = make_lease([4])
+    lease.release()
+    assert not lease._release.called
+
+    lease.acquire()
+    lease.release()
+
+    lease._release.assert_called_once_with(keys=[LEADER_KEY], args=["node-1|4"])
+    assert lease.token is None
+
+
+@pytest.mark.parametrize(
+    "reply, expected",
+    [
+        ([b"web-2:17|12", 9500], {"node": "web-2:17", "token": 12, "expires_in": 9.5}),
+        ([None, -2], None),
+    ],
+)
+def test_current_leader(reply, expected):
+    """The leader is read with its token and the time left on the lease."""
+    connection = MagicMock()
+    connection.pipeline.return_value.execute.return_value = reply
+
+    assert current_leader(connection) == expected
+
+
+def campaign(scheduler, results):
+    """Make lease.acquire() return results in turn, then stop the scheduler."""
+    results = list(results)
+
+    def acquire():
+        if len(results) == 1:
+            scheduler.stop()
+        token = results.pop(0)
+        scheduler.lease.token = token
+        return token
+
+    scheduler.lease.acquire.side_effect = acquire
+
+
+def make_scheduler(mode):
+    """Elected scheduler around a mocked lease that never sleeps."""
+    lease = MagicMock(renew_interval=0, key=LEADER_KEY, value="node-1|5")
+    return ElectedScheduler(lease, mode=mode, interval=0)
+
+
+def test_only_the_leader_polls(mock_redis):
+    """rq-scheduler only moves jobs on the node holding the lease."""
+    scheduler = make_scheduler("rqscheduler")
+    scheduler.lease.is_leader.return_value = True
+    campaign(scheduler, [None, 5, 5])
+
+    scheduler.run()
+
+    assert mock_redis.enqueue_jobs.call_count == 2
+    scheduler.lease.release.assert_called_once_with()
+
+
+def test_fenced_dispatcher_steps_down(mock_redis):
+    """A dispatcher fenced out of the lease stops until it wins it again."""
+    scheduler = make_scheduler("dispatcher")
+    campaign(scheduler, [5, 6])
+    dispatcher = MagicMock()
+    dispatcher.dispatch.side_effect = [LeadershipLost("lease moved"), 2000.0]
+    scheduler.lease.value = "node-1|6"
+
+    with patch("app.event.leader.get_fenced_dispatcher", return_value=dispatcher):
+        scheduler.run()
+
+    assert dispatcher.dispatch.call_count == 2
+    assert dispatcher.fence == (LEADER_KEY, "node-1|6")
+    dispatcher.wait.assert_called_once_with(
+        mock_redis.connection.pubsub.return_value, 2000.0
+    )
+
+
+def test_unknown_mode():
+    """Only rq-scheduler polling and the dispatcher can be elected."""
+    with pytest.raises(ValueError):
+        make_scheduler("database")
+
+
+def test_health_reports_leader(client):
+    """The health endpoint names the leader, and survives without Redis."""
+    leader = {"node": "sched-1", "token": 3, "expires_in": 12.0}
+    with patch("app.api.routes.current_leader", return_value=leader):
+        response = client.get("/api/health")
+    assert response.json["scheduler_leader"] == leader
+
+    with patch("app.api.routes.current_leader", side_effect=ConnectionError()):
+        response = client.get("/api/health")
+    assert response.status_code == 200
+    assert response.json["scheduler_leader"] is None
+
+
+def test_run_scheduler_cli(app):
+    """run-scheduler runs the elected scheduler in the chosen mode."""
+    with patch("app.commands.get_elected_scheduler") as mock_get:
+        result = app.test_cli_runner().invoke(
+            args=["run-scheduler", "--mode", "dispatcher"]
+        )
+
+    assert result.exit_code == 0
+    mock_get.assert_called_once_with("dispatcher")
+    mock_get.return_value.run.assert_called_once_with()
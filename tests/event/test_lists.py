@@ -0,0 +1,221 @@
+"""Tests for mailing lists and sending events to them."""
+
+import smtplib
+from datetime import UTC, datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.database.models import DeliveryStatus, Event, ListProgress, Recipient
+from app.event.jobs import deliver, member_chunk_starts, send_mail, send_mail_chunk
+from app.event.lists import (
+    add_members,
+    create_list,
+    iter_members,
+    member_count,
+    remove_members,
+)
+from app.event.retry import DeliveryDeferred
+
+
+def make_list(name="Weekly", members=("a@example.com", "b@example.com")):
+    """Create a list with members."""
+    mailing_list = create_list(name)
+    add_members(mailing_list.id, ", ".join(members))
+    return mailing_list
+
+
+def make_list_event(session, mailing_list):
+    """Create an event sent to a list."""
+    event = Event(
+        email_subject="Weekly",
+        email_content="News",
+        timestamp=datetime.now(UTC),
+    )
+    event.mailing_list_id = mailing_list.id
+    session.add(event)
+    session.commit()
+    return event
+
+
+def recipient_rows(session, event):
+    """Recipient rows of an event, by email."""
+    rows = session.query(Recipient).filter_by(event_id=event.id).all()
+    return {r.email: r for r in rows}
+
+
+def test_add_and_remove_members(session):
+    """Members are deduplicated, and removal keeps the list's history."""
+    mailing_list = make_list(members=("a@example.com", "B@example.com"))
+
+    result = add_members(mailing_list.id, "b@example.com, Cy <c@example.com>, nope")
+    assert [a.email for a in result.addresses] == ["c@example.com"]
+    assert (result.duplicates, result.invalid) == (1, ["nope"])
+    assert member_count(mailing_list.id) == 3
+
+    before = datetime.now(UTC)
+    assert remove_members(mailing_list.id, "A@example.com, x@example.com") == 1
+    assert member_count(mailing_list.id) == 2
+    assert member_count(mailing_list.id, before) == 3
+
+    # Adding a removed address again makes it a member again
+    assert len(add_members(mailing_list.id, "a@example.com").addresses) == 1
+    assert member_count(mailing_list.id) == 3
+
+
+def test_create_list_rejects_taken_names(session):
+    """List names are unique."""
+    create_list("Weekly")
+    with pytest.raises(ValueError, match="exists"):
+        create_list(" Weekly ")
+    with pytest.raises(ValueError, match="required"):
+        create_list("")
+
+
+@patch("app.event.jobs.mail")
+def test_send_to_list_only_stores_failures(mock_mail, session):
+    """Sent members leave no recipient rows; failures get one."""
+    mailing_list = make_list(
+        members=("a@example.com", "bad@example.com", "c@example.com")
+    )
+    event = make_list_event(session, mailing_list)
+    conn = MagicMock()
+    conn.send.side_effect = [
+        None,
+        smtplib.SMTPRecipientsRefused({"bad@example.com": (550, b"No such user")}),
+        None,
+    ]
+    mock_mail.connect.return_value.__enter__.return_value = conn
+
+    result = send_mail(event.id)
+
+    assert "Success" in result
+    rows = recipient_rows(session, event)
+    assert list(rows) == ["bad@example.com"]
+    assert rows["bad@example.com"].status == DeliveryStatus.FAILED
+    assert rows["bad@example.com"].member_id is not None
+    assert (event.sent_count, event.failed_count) == (2, 1)
+    assert event.list_snapshot_at is not None
+    (progress,) = session.query(ListProgress).filter_by(event_id=event.id).all()
+    assert (progress.first_id, progress.sent) == (0, 2)
+
+
+@patch("app.event.jobs.mail")
+def test_retry_sends_deferred_members_of_the_snapshot(mock_mail, session):
+    """A retried send keeps to the list as it was when the send started."""
+    mailing_list = make_list(
+        members=("a@example.com", "slow@example.com", "c@example.com")
+    )
+    event = make_list_event(session, mailing_list)
+    event.list_snapshot_at = datetime.now(UTC)
+    session.commit()
+    conn = MagicMock()
+    conn.send.side_effect = [
+        None,
+        smtplib.SMTPRecipientsRefused({"slow@example.com": (451, b"Try later")}),
+        None,
+    ]
+    mock_mail.connect.return_value.__enter__.return_value = conn
+
+    with pytest.raises(DeliveryDeferred):
+        deliver(event, None, None)
+    assert recipient_rows(session, event)["slow@example.com"].status == (
+        DeliveryStatus.DEFERRED
+    )
+
+    # Changes after the snapshot do not affect the running send
+    add_members(mailing_list.id, "late@example.com")
+    remove_members(mailing_list.id, "slow@example.com")
+    conn.send.side_effect = None
+    conn.send.reset_mock()
+
+    deliver(event, None, None)
+
+    sent_to = [call.args[0].recipients for call in conn.send.call_args_list]
+    assert sent_to == [["slow@example.com"]]
+    rows = recipient_rows(session, event)
+    assert rows["slow@example.com"].status == DeliveryStatus.SENT
+    assert rows["slow@example.com"].attempts == 2
+    assert event.sent_count == 3
+
+
+@patch("app.event.jobs.mail")
+def test_large_list_is_sent_in_member_chunks(mock_mail, app, session, mock_redis):
+    """Lists larger than MAIL_CHUNK_SIZE are split by member ID."""
+    members = [f"user{i}@example.com" for i in range(5)]
+    mailing_list = make_list(members=members)
+    event = make_list_event(session, mailing_list)
+    conn = MagicMock()
+    mock_mail.connect.return_value.__enter__.return_value = conn
+
+    with patch.dict(app.config, {"MAIL_CHUNK_SIZE": 2}):
+        with patch.object(send_mail_chunk, "queue") as queue:
+            result = send_mail(event.id)
+
+    assert "Dispatched 3 chunks" in result
+    starts = member_chunk_starts(event, 2)
+    assert [call.args[1] for call in queue.call_args_list] == starts
+    bounds = list(zip(starts, starts[1:] + [None]))
+    assert [len(list(iter_members(event, *bound))) for bound in bounds] == [2, 2, 1]
+
+    for first_id, before_id in bounds:
+        send_mail_chunk(event.id, first_id, before_id)
+
+    assert sorted(c.args[0].recipients[0] for c in conn.send.call_args_list) == (
+        members
+    )
+    session.expire_all()
+    assert event.is_done is True
+    assert event.sent_count == 5
+    assert recipient_rows(session, event) == {}
+
+
+def test_snapshot_excludes_later_members(session):
+    """Members added after the snapshot are not part of the send."""
+    mailing_list = make_list()
+    event = make_list_event(session, mailing_list)
+    event.list_snapshot_at = datetime.now(UTC)
+    session.commit()
+    add_members(mailing_list.id, "new@example.com")
+
+    assert [email for _, email in iter_members(event)] == [
+        "a@example.com",
+        "b@example.com",
+    ]
+    event.list_snapshot_at -= timedelta(days=1)
+    assert list(iter_members(event)) == []
+
+
+def test_list_endpoints(client, session):
+    """Lists are created, changed and referenced by events over the API."""
+    response = client.post("/api/lists", json={"name": "Weekly"})
+    assert response.status_code == 201
+    list_id = response.json["id"]
+    assert client.post("/api/lists", json={"name": "Weekly"}).status_code == 400
+
+    response = client.post(
+        f"/api/lists/{list_id}/members",
+        json={"recipients": "a@example.com, b@example.com, a@example.com, x"},
+    )
+    assert response.json == {"added": 2, "duplicates": 1, "invalid": ["x"]}
+    response = client.delete(
+        f"/api/lists/{list_id}/members", json={"recipients": "b@example.com"}
+    )
+    assert response.json == {"removed": 1}
+    assert client.get(f"/api/lists/{list_id}").json["members"] == 1
+    assert client.get("/api/lists/999999").status_code == 404
+
+    event = {
+        "subject": "Weekly",
+        "content": "News",
+        "timestamp": "2030-01-01T09:00:00+00:00",
+        "mailing_list_id": list_id,
+    }
+    response = client.post("/api/save_emails", json=event)
+    assert response.status_code == 201
+    stored = session.get(Event, response.json["id"])
+    assert stored.mailing_list_id == list_id
+    assert stored.recipients.count() == 0
+
+    response = client.post("/api/save_emails", json={**event, "mailing_list_id": 0})
+    assert response.status_code == 400
@@ -0,0 +1,115 @@
+"""Tests for the rendered message cache."""
+
+from email import message_from_bytes
+from email.utils import parsedate_to_datetime
+from unittest.mock import patch
+
+import pytest
+
+from app.event.message_cache import MessageCache, get_message_cache, render_template
+from app.services.event_service import EventService
+
+
+def test_template_splices_recipient_headers(make_event):
+    """Each rendered message carries exactly its own To and Message-ID."""
+    event = make_event(subject="Hello", content="<p>Hi</p>")
+    template = render_template(event)
+
+    assert b"recipient@invalid" not in template.data
+    parsed = message_from_bytes(template.render("a@example.com", "<id-a@example.com>"))
+
+    assert parsed.get_all("To") == ["a@example.com"]
+    assert parsed.get_all("Message-ID") == ["<id-a@example.com>"]
+    assert parsed["Subject"] == "Hello"
+    assert b"<p>Hi</p>" in template.data
+
+
+def test_date_header_is_the_send_time(make_event):
+    """A cached template still dates every message when it is sent."""
+    template = render_template(make_event())
+
+    assert b"Date:" not in template.data
+    dates = []
+    for now in (1_900_000_000, 1_900_003_600):
+        with patch("app.event.message_cache.time.time", return_value=now):
+            parsed = message_from_bytes(template.render("a@example.com", "<id>"))
+        assert len(parsed.get_all("Date")) == 1
+        dates.append(parsedate_to_datetime(parsed["Date"]).timestamp())
+
+    assert dates == [1_900_000_000, 1_900_003_600]
+
+
+def test_cache_reuses_template(make_event):
+    """The template is rendered once per event and content."""
+    event = make_event()
+    cache = MessageCache()
+
+    first = cache.get(event)
+    second = cache.get(event)
+
+    assert first is second
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.size == len(first.data)
+
+
+def test_cache_rerenders_changed_content_and_subject(session, make_event):
+    """New content or a new subject never reuses an old template."""
+    event = make_event(content="Old content")
+    cache = MessageCache()
+    old = cache.get(event)
+
+    event.email_content = "New content"
+    session.commit()
+    new_content = cache.get(event)
+
+    event.email_subject = "New subject"
+    session.commit()
+    new_subject = cache.get(event)
+
+    assert b"New content" in new_content.data
+    assert new_content is not old
+    assert new_subject.subject == "New subject"
+    assert cache.misses == 3
+
+
+def test_cache_evicts_least_recently_used(make_event):
+    """The summed template size stays under max_bytes."""
+    events = [make_event(content=f"Content {i}") for i in range(3)]
+    size = len(render_template(events[0]).data)
+    cache = MessageCache(max_bytes=size * 2 + size // 2)
+
+    cache.get(events[0])
+    cache.get(events[1])
+    cache.get(events[0])
+    cache.get(events[2])
+
+    assert len(cache) == 2
+    assert cache.size <= cache.max_bytes
+    # events[1] was the least recently used
+    cache.get(events[0])
+    cache.get(events[2])
+    assert cache.misses == 3
+
+
+def test_cache_skips_oversized_templates(make_event):
+    """A template larger than the whole cache is not stored."""
+    event = make_event(content="x" * 1000)
+    cache = MessageCache(max_bytes=100)
+
+    cache.get(event)
+
+    assert len(cache) == 0
+    assert cache.size == 0
+
+
+@pytest.mark.parametrize("field", ["name", "notes"])
+def test_event_service_update_invalidates(app, make_event, field):
+    """Editing the subject or content drops the event's templates."""
+    event = make_event()
+    cache = get_message_cache()
+    cache.get(event)
+    assert len(cache._by_event.get(event.id, ())) == 1
+
+    assert EventService.update(event.id, {field: "Changed"}) is True
+
+    assert event.id not in cache._by_event
@@ -0,0 +1,154 @@
+"""Tests for per-recipient personalization."""
+
+from datetime import UTC, datetime
+from email import message_from_bytes
+from email.header import decode_header, make_header
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.database.models import Event, Recipient
+from app.event.jobs import send_mail, validate_event
+from app.event.message_cache import render_template
+from app.event.personalize import (
+    TemplateCache,
+    compile_template,
+    get_template_cache,
+    has_placeholders,
+    recipient_values,
+)
+
+HTML = '<html><body><p>Hi {{ name | default("there") }},</p></body></html>'
+
+
+def parts_of(data):
+    """Decoded text parts of a rendered message, by content type."""
+    parsed = message_from_bytes(data)
+    return parsed, {
+        part.get_content_type(): part.get_payload(decode=True).decode()
+        for part in parsed.walk()
+        if not part.is_multipart()
+    }
+
+
+def test_compile_and_render():
+    """Placeholders are filled in, escaped on request, with defaults."""
+    template = compile_template('Dear {{ first_name|default("you") }} <{{email}}>')
+
+    assert template.render(recipient_values("a@example.com", "Ann Lee")) == (
+        "Dear Ann <a@example.com>"
+    )
+    assert template.render(recipient_values("b@example.com", None)) == (
+        "Dear you <b@example.com>"
+    )
+    escaped = compile_template("{{ name }}").render(
+        recipient_values("c@example.com", "<b>Bo</b>"), escape=True
+    )
+    assert escaped == "&lt;b&gt;Bo&lt;/b&gt;"
+    assert compile_template("No placeholders").is_static
+
+
+def test_unknown_placeholders():
+    """Unknown fields are rejected, or kept as text for stored events."""
+    with pytest.raises(ValueError, match="Unknown placeholder"):
+        compile_template("Hi {{ nmae }}")
+    assert not has_placeholders("Hi {{ nmae }}")
+    lenient = compile_template("{{ nmae }} {{ name }}", strict=False)
+    assert lenient.render({"name": "Al"}) == "{{ nmae }} Al"
+    with pytest.raises(ValueError, match="Unknown placeholder"):
+        validate_event(
+            {
+                "subject": "Hi {{ nmae }}",
+                "content": "Body",
+                "timestamp": "2030-01-01T09:00:00Z",
+                "recipients": "a@example.com",
+            }
+        )
+
+
+def test_template_cache_is_bounded():
+    """The least recently used templates are evicted; hits skip loading."""
+    cache = TemplateCache(max_entries=2)
+    loads = []
+
+    def build(source):
+        loads.append(source)
+        return compile_template(source)
+
+    cache.get("a", lambda: build("A {{ name }}"))
+    cache.get("b", lambda: build("B"))
+    cache.get("a", lambda: build("A {{ name }}"))
+    cache.get("c", lambda: build("C"))
+
+    assert loads == ["A {{ name }}", "B", "C"]
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (1, 3)
+    cache.get("b", lambda: build("B"))
+    assert loads[-1] == "B"
+
+
+def test_render_personalized_message(make_event, app):
+    """Subject and both body parts are rendered per recipient."""
+    get_template_cache().clear()
+    event = make_event(subject="News for {{ name }} ✉", content=HTML)
+    template = render_template(event)
+    assert template.personalized
+
+    parsed, parts = parts_of(
+        template.render("a@example.com", "<id@example.com>", "Zoë <Z>")
+    )
+    assert str(make_header(decode_header(parsed["Subject"]))) == "News for Zoë <Z> ✉"
+    assert parsed.get_all("To") == ["a@example.com"]
+    assert "Hi Zoë &lt;Z&gt;," in parts["text/html"]
+    assert "Hi Zoë <Z>," in parts["text/plain"]
+
+    _, parts = parts_of(template.render("b@example.com", "<id2@example.com>"))
+    assert "Hi there," in parts["text/html"]
+
+    # A second event with the same body reuses the compiled body
+    misses = get_template_cache().misses
+    other = render_template(make_event(subject="Again", content=HTML))
+    assert other.body_template is template.body_template
+    assert other.subject_template is None
+    assert get_template_cache().misses == misses
+
+
+def test_subject_cannot_inject_headers(make_event, app):
+    """Line breaks in a name never start a new header."""
+    event = make_event(subject="Hello {{ name }}", content="Static body")
+    template = render_template(event)
+
+    data = template.render("a@example.com", "<id@example.com>", "Al\r\nBcc: x@y.z")
+
+    parsed = message_from_bytes(data)
+    assert parsed["Subject"] == "Hello Al Bcc: x@y.z"
+    assert parsed["Bcc"] is None
+    assert template.body_template is None
+
+
+@patch("app.event.jobs.mail")
+def test_send_personalized_event(mock_mail, session):
+    """Deliveries fill in each recipient's name."""
+    event = Event(
+        email_subject='Hi {{ first_name | default("friend") }}',
+        email_content="Dear {{ name }}",
+        timestamp=datetime.now(UTC),
+    )
+    session.add(event)
+    session.commit()
+    session.add(Recipient(email="ann@example.com", event_id=event.id, name="Ann Lee"))
+    session.add(Recipient(email="bo@example.com", event_id=event.id))
+    session.commit()
+    conn = MagicMock()
+    mock_mail.connect.return_value.__enter__.return_value = conn
+
+    assert "Success" in send_mail(event.id)
+
+    sent = [
+        message_from_bytes(call.args[0].as_bytes()) for call in conn.send.call_args_list
+    ]
+    assert [(m["To"], m["Subject"]) for m in sent] == [
+        ("ann@example.com", "Hi Ann"),
+        ("bo@example.com", "Hi friend"),
+    ]
+    assert sent[0].get_payload(decode=True).decode() == "Dear Ann Lee"
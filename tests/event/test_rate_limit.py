@@ -0,0 +1,138 @@
+"""Tests for relay send rate limiting."""
+
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.database.models import DeliveryStatus, Recipient
+from app.event.jobs import SEND_MAIL_PAYLOAD_VERSION, send_mail, send_mail_chunk
+from app.event.rate_limit import (
+    DAY,
+    MINUTE,
+    RateLimited,
+    SendRateLimiter,
+    get_rate_limiter,
+)
+from app.utils import metrics
+
+
+def make_limiter(results, max_wait=30):
+    """Build a limiter whose Lua script returns the given results."""
+    connection = MagicMock()
+    connection.register_script.return_value.side_effect = results
+    return SendRateLimiter(connection, "smtp.example.com:user", [(2, 60)], max_wait)
+
+
+@patch("app.event.rate_limit.metrics")
+def test_acquire_without_waiting(mock_metrics):
+    """A token that is available is taken right away."""
+    limiter = make_limiter([b"0"])
+
+    assert limiter.acquire() == 0
+    script = limiter._script
+    script.assert_called_once_with(
+        keys=["mail_scheduler:ratelimit:smtp.example.com:user:60"], args=[1, 2, 60]
+    )
+    assert not mock_metrics.incr.called
+
+
+@patch("app.event.rate_limit.metrics")
+@patch("app.event.rate_limit.time.sleep")
+def test_acquire_blocks_until_refilled(mock_sleep, mock_metrics):
+    """An empty bucket blocks the caller and records the wait."""
+    limiter = make_limiter([b"0.5", b"0.25", b"0"])
+
+    assert limiter.acquire() == 0.75
+    assert [c.args[0] for c in mock_sleep.call_args_list] == [0.5, 0.25]
+    mock_metrics.incr.assert_called_once_with("rate_limit.throttled_sends")
+    mock_metrics.observe.assert_called_once_with("rate_limit.wait_seconds", 0.75)
+
+
+@patch("app.event.rate_limit.metrics")
+@patch("app.event.rate_limit.time.sleep")
+def test_acquire_gives_up_after_max_wait(mock_sleep, mock_metrics):
+    """Waits longer than max_wait raise RateLimited instead of blocking."""
+    limiter = make_limiter([b"3600"], max_wait=30)
+
+    with pytest.raises(RateLimited) as exc_info:
+        limiter.acquire()
+
+    assert exc_info.value.retry_after == 3600
+    assert not mock_sleep.called
+    mock_metrics.incr.assert_called_once_with("rate_limit.rescheduled")
+
+
+def test_get_rate_limiter_from_config(app, monkeypatch):
+    """The limiter is keyed by relay and account and off by default."""
+    assert get_rate_limiter() is None
+
+    monkeypatch.setitem(app.config, "MAIL_RATE_LIMIT_PER_MINUTE", 100)
+    monkeypatch.setitem(app.config, "MAIL_RATE_LIMIT_PER_DAY", 10000)
+    with patch("app.event.rate_limit.rq") as mock_rq:
+        limiter = get_rate_limiter()
+
+    assert limiter.limits == [(100, MINUTE), (10000, DAY)]
+    server, user = app.config["MAIL_SERVER"], app.config["MAIL_USERNAME"]
+    assert limiter.name == f"{server}:{user}"
+    mock_rq.connection.register_script.assert_called_once()
+
+
+@pytest.fixture
+def mock_conn(monkeypatch):
+    """Mocked SMTP connection used by send_mail."""
+    mock_mail = MagicMock()
+    monkeypatch.setattr("app.event.jobs.mail", mock_mail)
+    return mock_mail.connect.return_value.__enter__.return_value
+
+
+def test_send_mail_reschedules_when_rate_limited(
+    make_event, mock_conn, mock_redis, monkeypatch
+):
+    """A send out of quota is rescheduled and keeps what it already sent."""
+    event = make_event(recipients=["a@example.com", "b@example.com"])
+    limiter = MagicMock()
+    limiter.acquire.side_effect = [0.0, RateLimited(42.5)]
+    monkeypatch.setattr("app.event.jobs.get_rate_limiter", lambda: limiter)
+
+    result = send_mail(event.id)
+
+    assert "rescheduled" in result
+    args, kwargs = mock_redis.enqueue_at.call_args
+    assert args[1:] == (send_mail, event.id, SEND_MAIL_PAYLOAD_VERSION)
+    assert kwargs["job_id"] == event.job_id == f"send:{event.id}:1"
+    assert mock_conn.send.call_count == 1
+    statuses = [r.status for r in event.recipients.order_by(Recipient.id)]
+    assert statuses == [DeliveryStatus.SENT, DeliveryStatus.QUEUED]
+    assert event.is_done is False
+
+
+def test_send_mail_chunk_reschedules_itself(
+    make_event, mock_conn, mock_redis, monkeypatch
+):
+    """A rate limited chunk is rescheduled with its own range."""
+    event = make_event(recipients=["a@example.com", "b@example.com"])
+    first_id = event.recipients.order_by(Recipient.id).first().id
+    limiter = MagicMock()
+    limiter.acquire.side_effect = RateLimited(10)
+    monkeypatch.setattr("app.event.jobs.get_rate_limiter", lambda: limiter)
+
+    result = send_mail_chunk(event.id, first_id, None)
+
+    assert "rescheduled" in result
+    mock_redis.enqueue_in.assert_called_once_with(
+        timedelta(seconds=10), send_mail_chunk, event.id, first_id, None
+    )
+    assert not mock_conn.send.called
+    assert event.chunks_done == 0
+
+
+def test_metrics_survive_redis_outage(app):
+    """Recording a metric never fails the send when Redis is down."""
+    with patch("app.utils.metrics.rq") as mock_rq:
+        mock_rq.connection.hincrbyfloat.side_effect = RedisConnectionError("down")
+        mock_rq.connection.hgetall.side_effect = RedisConnectionError("down")
+
+        metrics.incr("rate_limit.throttled_sends")
+        assert metrics.snapshot() == {}
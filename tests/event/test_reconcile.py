@@ -0,0 +1,212 @@
+"""Tests for reconciling pending events with the scheduled job set."""
+
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.event.reconcile import (
+    RECONCILE_JOB_ID,
+    ReconcileReport,
+    check_events,
+    reconcile_schedule_job,
+    remove_orphans,
+    schedule_reconcile,
+    stuck_events,
+)
+
+DUE = datetime(2031, 1, 1, 9, 0)
+DUE_UNIX = 1925024400
+
+
+@pytest.fixture
+def scheduler():
+    """Scheduler whose pipelines are recorded."""
+    scheduler = MagicMock()
+    scheduler.scheduled_jobs_key = "rq:scheduler:scheduled_jobs"
+    scheduler.queue_name = "default"
+    # rq caches the server version on the connection
+    setattr(scheduler.connection, "__rq_redis_server_version", (7, 2, 4))
+    return scheduler
+
+
+def row(event_id, job_id=None):
+    """A pending event row as streamed by reconcile()."""
+    return SimpleNamespace(id=event_id, job_id=job_id, timestamp=DUE)
+
+
+@patch("app.event.reconcile.notify_dispatcher")
+def test_check_events_classifies_and_repairs(mock_notify, app, scheduler):
+    """Lost jobs are scheduled again and stale ones moved, in one pipeline."""
+    pipe = scheduler.connection.pipeline.return_value
+    created = b"2030-01-01T00:00:00.000000Z"
+    pipe.execute.side_effect = [
+        [
+            DUE_UNIX,
+            (None, created),  # in sync
+            DUE_UNIX - 60,
+            (None, created),  # stale
+            None,
+            (None, None),  # lost
+            None,
+            (b"queued", created),  # in flight
+            DUE_UNIX,
+            (None, None),  # scheduled, but the job record is gone
+        ],
+        [],
+    ]
+    rows = [
+        row(900001, "send:900001:1"),
+        row(900002, "send:900002:1"),
+        row(900003, "send:900003:2"),
+        row(900004, "send:900004:1"),
+        row(900005),
+    ]
+    report = ReconcileReport()
+
+    check_events(scheduler, rows, report)
+
+    assert (report.checked, report.in_sync, report.in_flight) == (5, 1, 1)
+    assert (report.missing, report.stale, report.started) == (2, 1, 0)
+    assert report.samples["missing"] == ["send:900003:2", "send:900005:1"]
+    key = scheduler.scheduled_jobs_key
+    pipe.zadd.assert_any_call(key, {"send:900003:2": DUE_UNIX})
+    pipe.zadd.assert_any_call(key, {"send:900005:1": DUE_UNIX})
+    pipe.zadd.assert_any_call(key, {"send:900002:1": DUE_UNIX}, xx=True)
+    saved = [c.args[0] for c in pipe.hset.call_args_list]
+    assert saved == [b"rq:job:send:900003:2", b"rq:job:send:900005:1"]
+    mock_notify.assert_called_once_with(scheduler.connection, DUE)
+
+
+def test_check_events_dry_run_only_reports(app, scheduler):
+    """A dry run reads Redis but writes nothing."""
+    pipe = scheduler.connection.pipeline.return_value
+    pipe.execute.return_value = [None, (None, None)]
+    report = ReconcileReport(dry_run=True)
+
+    check_events(scheduler, [row(900010)], report)
+
+    assert report.missing == 1
+    assert pipe.execute.call_count == 1
+    assert not pipe.zadd.called
+    assert "would repair: 1 missing" in report.summary()
+
+
+def test_started_send_is_not_rescheduled(make_event, scheduler):
+    """An event whose send already ran is left to retries and dead letters."""
+    event = make_event()
+    event.recipients.first().attempts = 1
+    pipe = scheduler.connection.pipeline.return_value
+    pipe.execute.return_value = [None, (None, None)]
+    report = ReconcileReport()
+
+    check_events(scheduler, [row(event.id)], report)
+
+    assert (report.started, report.missing) == (1, 0)
+    assert pipe.execute.call_count == 1
+
+
+def test_pending_retry_is_not_moved_back(make_event, scheduler):
+    """A job due after its started event is a retry, not a stale job."""
+    retrying, unsent = make_event(), make_event()
+    retrying.recipients.first().attempts = 1
+    pipe = scheduler.connection.pipeline.return_value
+    created = b"2030-01-01T00:00:00.000000Z"
+    pipe.execute.side_effect = [
+        [DUE_UNIX + 300, (None, created), DUE_UNIX + 300, (None, created)],
+        [],
+    ]
+    report = ReconcileReport()
+
+    with patch("app.event.reconcile.notify_dispatcher"):
+        check_events(
+            scheduler,
+            [row(retrying.id, f"send:{retrying.id}:2"), row(unsent.id)],
+            report,
+        )
+
+    assert (report.in_flight, report.stale) == (1, 1)
+    pipe.zadd.assert_called_once_with(
+        scheduler.scheduled_jobs_key, {f"send:{unsent.id}:1": DUE_UNIX}, xx=True
+    )
+
+
+def test_event_with_dead_lettered_chunk_is_stuck(scheduler):
+    """A send that lost a chunk is reported, not counted as in flight."""
+    chunk, send = MagicMock(), MagicMock()
+    chunk.func_name, chunk.args = "app.event.jobs.send_mail_chunk", (900030, 1, 50)
+    send.func_name, send.args = "app.event.jobs.send_mail", (900031, 2)
+    queue = MagicMock()
+    queue.get_jobs.return_value = [chunk, send]
+    with patch("app.event.reconcile.get_dead_letter_queue", return_value=queue):
+        stuck = stuck_events()
+    assert stuck == {900030}
+    pipe = scheduler.connection.pipeline.return_value
+    pipe.execute.return_value = [None, (b"finished", b"2030-01-01T00:00:00Z")]
+    report = ReconcileReport(dry_run=True)
+
+    check_events(scheduler, [row(900030, "send:900030:1")], report, stuck)
+
+    assert (report.stuck, report.in_flight) == (1, 0)
+    assert report.samples == {"stuck": ["send:900030:1"]}
+    assert "1 stuck on a dead-lettered chunk" in report.summary()
+
+
+def test_remove_orphans(make_event, session, scheduler):
+    """Jobs of deleted or done events and superseded versions are removed."""
+    pending, done = make_event(), make_event()
+    pending.job_id = f"send:{pending.id}:2"
+    done.is_done = True
+    session.commit()
+    members = [
+        (f"send:{pending.id}:2".encode(), 1.0),
+        (f"send:{pending.id}:1".encode(), 1.0),
+        (f"send:{done.id}:1".encode(), 1.0),
+        (b"send:999999:1", 1.0),
+        (RECONCILE_JOB_ID.encode(), 1.0),
+    ]
+    scheduler.connection.zscan.side_effect = [(7, members[:2]), (0, members[2:])]
+    report = ReconcileReport()
+
+    remove_orphans(scheduler, 2, report)
+
+    orphans = [f"send:{pending.id}:1", f"send:{done.id}:1", "send:999999:1"]
+    assert report.orphaned == 3
+    assert report.samples["orphaned"] == orphans
+    pipe = scheduler.connection.pipeline.return_value
+    removed = [c.args[1:] for c in pipe.zrem.call_args_list]
+    assert removed == [(orphans[0],), tuple(orphans[1:])]
+
+
+def test_schedule_reconcile(mock_redis):
+    """The periodic job replaces an earlier one; 0 only removes it."""
+    schedule_reconcile(300)
+
+    mock_redis.cancel.assert_called_once_with(RECONCILE_JOB_ID)
+    args, kwargs = mock_redis.schedule.call_args
+    assert args[1] is reconcile_schedule_job
+    assert kwargs["interval"] == 300
+    assert kwargs["id"] == RECONCILE_JOB_ID
+
+    mock_redis.reset_mock()
+    schedule_reconcile(0)
+    assert mock_redis.cancel.called
+    assert not mock_redis.schedule.called
+
+
+def test_reconcile_cli(app):
+    """The CLI prints the report or installs the periodic job."""
+    runner = app.test_cli_runner()
+    report = ReconcileReport(dry_run=True, checked=3, stale=1)
+
+    with patch("app.commands.reconcile", return_value=report) as mock_reconcile:
+        result = runner.invoke(args=["reconcile-schedule", "--dry-run"])
+    assert result.exit_code == 0
+    assert "Checked 3 pending event(s)" in result.output
+    mock_reconcile.assert_called_once_with(dry_run=True)
+
+    with patch("app.commands.schedule_reconcile") as mock_schedule:
+        result = runner.invoke(args=["reconcile-schedule", "--every", "600"])
+    assert result.exit_code == 0
+    mock_schedule.assert_called_once_with(600)
@@ -0,0 +1,188 @@
+"""Tests for cancelling and re-timing scheduled send jobs."""
+
+from datetime import UTC, datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from rq.job import JobStatus
+
+from app.database.models import Event
+from app.event.jobs import (
+    SEND_MAIL_PAYLOAD_VERSION,
+    SendInProgress,
+    cancel_mail,
+    retime_mail,
+    send_mail,
+)
+from app.services.event_service import EventService
+
+
+@pytest.fixture
+def scheduled_event(make_event, session):
+    """An event linked to its first send job."""
+    event = make_event()
+    event.job_id = f"send:{event.id}:1"
+    session.commit()
+    return event
+
+
+def test_cancel_removes_scheduled_job(scheduled_event, mock_redis):
+    """A scheduled job is dropped from the scheduler by ID."""
+    mock_redis.connection.zrem.return_value = 1
+
+    assert cancel_mail(scheduled_event) is True
+
+    mock_redis.connection.zrem.assert_called_once_with(
+        mock_redis.scheduled_jobs_key, scheduled_event.job_id
+    )
+    mock_redis.connection.delete.assert_called_once_with(
+        f"rq:job:{scheduled_event.job_id}".encode()
+    )
+
+
+def test_cancel_deletes_queued_job(scheduled_event, mock_redis):
+    """A job already moved to the queue is deleted from there."""
+    mock_redis.connection.zrem.return_value = 0
+    job = MagicMock()
+    job.get_status.return_value = JobStatus.QUEUED
+
+    with patch("app.event.jobs.Job.fetch", return_value=job):
+        assert cancel_mail(scheduled_event) is True
+
+    job.delete.assert_called_once_with()
+
+
+def test_cancel_leaves_running_job(scheduled_event, mock_redis):
+    """A job that started is not touched."""
+    mock_redis.connection.zrem.return_value = 0
+    job = MagicMock()
+    job.get_status.return_value = JobStatus.STARTED
+
+    with patch("app.event.jobs.Job.fetch", return_value=job):
+        assert cancel_mail(scheduled_event) is False
+
+    assert not job.delete.called
+
+
+def test_retime_moves_job_in_place(scheduled_event, mock_redis):
+    """A scheduled job keeps its ID and only gets a new score."""
+    mock_redis.connection.zadd.return_value = 1
+
+    assert retime_mail(scheduled_event) == scheduled_event.job_id
+
+    args, kwargs = mock_redis.connection.zadd.call_args
+    assert args[0] == mock_redis.scheduled_jobs_key
+    assert list(args[1]) == [scheduled_event.job_id]
+    assert kwargs == {"xx": True, "ch": True}
+    assert not mock_redis.enqueue_at.called
+
+
+def test_retime_schedules_next_version(scheduled_event, mock_redis):
+    """A job that left the scheduler is replaced by the next version."""
+    scheduled_event.timestamp = datetime(2031, 2, 3, 4, 5)
+    mock_redis.connection.zadd.return_value = 0
+    mock_redis.connection.zscore.return_value = None
+    mock_redis.connection.zrem.return_value = 0
+
+    with patch("app.event.jobs.Job.fetch", return_value=None):
+        job_id = retime_mail(scheduled_event)
+
+    assert job_id == f"send:{scheduled_event.id}:2"
+    assert scheduled_event.job_id == job_id
+    mock_redis.enqueue_at.assert_called_once_with(
+        scheduled_event.timestamp,
+        send_mail,
+        scheduled_event.id,
+        SEND_MAIL_PAYLOAD_VERSION,
+        job_id=job_id,
+    )
+
+
+def test_retime_ignores_done_event(scheduled_event, mock_redis):
+    """Sent events are never scheduled again."""
+    scheduled_event.is_done = True
+
+    assert retime_mail(scheduled_event) is None
+    assert not mock_redis.connection.zadd.called
+
+
+def test_service_update_retimes_job(scheduled_event, mock_redis):
+    """A new timestamp moves the job; an unchanged one does not."""
+    mock_redis.connection.zadd.return_value = 1
+
+    assert EventService.update(scheduled_event.id, {"name": "Same time"}) is True
+    assert not mock_redis.connection.zadd.called
+
+    result = EventService.update(
+        scheduled_event.id, {"timestamp": "2031-02-03T04:05:00+00:00"}
+    )
+
+    assert result is True
+    assert scheduled_event.timestamp == datetime(2031, 2, 3, 4, 5)
+    score = mock_redis.connection.zadd.call_args.args[1][scheduled_event.job_id]
+    assert score == datetime(2031, 2, 3, 4, 5, tzinfo=UTC).timestamp()
+
+
+def test_event_being_sent_is_not_retimed(app, scheduled_event, session, mock_redis):
+    """Moving a send under way would dispatch its chunks again."""
+    scheduled_event.chunks_total, scheduled_event.chunks_done = 4, 1
+    session.commit()
+    new_time = {"timestamp": "2031-02-03T04:05:00+00:00"}
+
+    response = app.test_client().put(f"/api/events/{scheduled_event.id}", json=new_time)
+    with pytest.raises(SendInProgress):
+        retime_mail(scheduled_event)
+    # The rollback is patched too, it would end the test's transaction
+    with patch.object(session, "commit") as commit, patch.object(session, "rollback"):
+        result = EventService.update(scheduled_event.id, new_time)
+
+    assert response.status_code == 409
+    assert "being sent" in result
+    assert not commit.called
+    assert not mock_redis.connection.zadd.called
+    assert not mock_redis.enqueue_at.called
+
+
+def test_failed_retime_saves_nothing(scheduled_event, session, mock_redis):
+    """The new time is only saved once the job moved."""
+    mock_redis.connection.zadd.side_effect = ConnectionError("Redis is down")
+
+    with patch.object(session, "commit") as commit, patch.object(session, "rollback"):
+        result = EventService.update(
+            scheduled_event.id, {"timestamp": "2031-02-03T04:05:00+00:00"}
+        )
+
+    assert "Redis is down" in result
+    assert not commit.called
+
+
+def test_service_delete_cancels_job(scheduled_event, session, mock_redis):
+    """Deleting an event removes its scheduled job first."""
+    mock_redis.connection.zrem.return_value = 1
+    event_id, job_id = scheduled_event.id, scheduled_event.job_id
+
+    assert EventService.delete(event_id) is True
+
+    mock_redis.connection.zrem.assert_called_once_with(
+        mock_redis.scheduled_jobs_key, job_id
+    )
+    assert session.get(Event, event_id) is None
+
+
+def test_api_update_and_delete(app, scheduled_event, mock_redis):
+    """The API edits and deletes events together with their jobs."""
+    mock_redis.connection.zadd.return_value = 1
+    mock_redis.connection.zrem.return_value = 1
+    client = app.test_client()
+    url = f"/api/events/{scheduled_event.id}"
+
+    response = client.put(url, json={"timestamp": "2031-02-03T04:05:00+00:00"})
+    assert response.status_code == 200
+    assert response.json["job_id"] == scheduled_event.job_id
+    assert mock_redis.connection.zadd.called
+
+    response = client.delete(url)
+    assert response.status_code == 200
+    assert mock_redis.connection.zrem.called
+
+    assert client.delete(url).status_code == 404
@@ -0,0 +1,344 @@
+"""Tests for send retries and the dead-letter queue."""
+
+import smtplib
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.database.models import DeliveryStatus, Recipient
+from app.event.jobs import retry_send_mail, send_mail
+from app.event.retry import (
+    DeliveryDeferred,
+    RetryPolicy,
+    dead_letter,
+    handle_failure,
+    redrive,
+)
+
+
+@pytest.mark.parametrize(
+    "error, retryable",
+    [
+        (smtplib.SMTPResponseException(421, b"Try again later"), True),
+        (smtplib.SMTPSenderRefused(451, b"Local error", "a@example.com"), True),
+        (smtplib.SMTPResponseException(554, b"Transaction failed"), False),
+        (smtplib.SMTPRecipientsRefused({"a@example.com": (450, b"Busy")}), True),
+        (
+            smtplib.SMTPRecipientsRefused(
+                {"a@example.com": (450, b"Busy"), "b@example.com": (550, b"No")}
+            ),
+            False,
+        ),
+        (smtplib.SMTPServerDisconnected("Connection lost"), True),
+        (smtplib.SMTPNotSupportedError("No STARTTLS"), False),
+        (ConnectionRefusedError(111, "Connection refused"), True),
+        (OperationalError("SELECT 1", {}, Exception("server closed")), True),
+        (DeliveryDeferred(3), True),
+        (ValueError("Event with ID 1 not found"), False),
+    ],
+)
+def test_policy_classifies_errors(error, retryable):
+    """Transient SMTP replies and connection errors are retried, 5xx are not."""
+    assert RetryPolicy().is_retryable(error) is retryable
+
+
+def test_policy_backoff_doubles_up_to_max():
+    """Delays grow exponentially and stop at backoff_max."""
+    policy = RetryPolicy(backoff_base=30, backoff_max=200, jitter=0)
+
+    assert [policy.delay(attempt) for attempt in range(1, 6)] == [
+        30,
+        60,
+        120,
+        200,
+        200,
+    ]
+
+
+def test_policy_jitter_stays_in_bounds():
+    """Jitter spreads the delay by at most the configured fraction."""
+    policy = RetryPolicy(backoff_base=100, jitter=0.2)
+
+    delays = [policy.delay(1) for _ in range(200)]
+
+    assert all(80 <= delay <= 120 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_policy_from_config(app, monkeypatch):
+    """Every setting is read from MAIL_RETRY_*."""
+    monkeypatch.setitem(app.config, "MAIL_RETRY_MAX_ATTEMPTS", 3)
+    monkeypatch.setitem(app.config, "MAIL_RETRY_SMTP_CODES", (421,))
+
+    policy = RetryPolicy.from_config(app.config)
+
+    assert policy.max_attempts == 3
+    assert policy.is_retryable_code(421)
+    assert not policy.is_retryable_code(450)
+
+
+def make_job(attempt=None):
+    """A running job as returned by get_current_job."""
+    job = MagicMock()
+    job.id = "job-1"
+    job.func_name = "app.event.jobs.send_mail"
+    job.args = (7, 2)
+    job.kwargs = {}
+    job.origin = "default"
+    job.description = "app.event.jobs.send_mail(7, 2)"
+    job.meta = {} if attempt is None else {"attempt": attempt}
+    return job
+
+
+@patch("app.event.retry.metrics")
+@patch("app.event.retry.dead_letter")
+def test_transient_failure_is_retried_with_backoff(
+    mock_dead_letter, mock_metrics, app, mock_redis, monkeypatch
+):
+    """The job is enqueued again with the next attempt number."""
+    monkeypatch.setitem(app.config, "MAIL_RETRY_JITTER", 0)
+    error = smtplib.SMTPServerDisconnected("Connection lost")
+
+    result = handle_failure(make_job(attempt=2), error)
+
+    assert "retry 2 scheduled in 60s" in result
+    mock_redis.enqueue_in.assert_called_once_with(
+        timedelta(seconds=60),
+        "app.event.jobs.send_mail",
+        7,
+        2,
+        meta={"attempt": 3},
+        queue_name="default",
+    )
+    assert not mock_dead_letter.called
+    mock_metrics.incr.assert_called_once_with("retry.scheduled")
+
+
+@pytest.mark.parametrize(
+    "attempt, error",
+    [
+        (1, smtplib.SMTPResponseException(550, b"Relaying denied")),
+        (5, smtplib.SMTPServerDisconnected("Connection lost")),
+    ],
+)
+@patch("app.event.retry.metrics")
+@patch("app.event.retry.dead_letter")
+def test_permanent_or_exhausted_failure_is_dead_lettered(
+    mock_dead_letter, mock_metrics, app, mock_redis, attempt, error
+):
+    """Permanent errors and the last attempt go to the dead-letter queue."""
+    job = make_job(attempt=attempt)
+
+    result = handle_failure(job, error)
+
+    assert result.startswith("Dead-lettered")
+    assert not mock_redis.enqueue_in.called
+    reason = mock_dead_letter.call_args.args[1]
+    mock_dead_letter.assert_called_once_with(job, reason, attempt)
+    assert type(error).__name__ in reason
+    mock_metrics.incr.assert_called_once_with("retry.dead_lettered")
+
+
+@patch("app.event.retry.metrics")
+@patch("app.event.retry.get_current_job")
+def test_job_wrapper_retries_instead_of_raising(
+    mock_current_job, mock_metrics, app, make_event, mock_redis
+):
+    """Inside a worker a failing send returns after scheduling its retry."""
+    event = make_event()
+    event.job_id = f"send:{event.id}:1"
+    job = make_job()
+    job.id, job.args = event.job_id, (event.id, 2)
+    mock_current_job.return_value = job
+
+    error = smtplib.SMTPServerDisconnected("Connection lost")
+    with patch("app.event.jobs.deliver", side_effect=error):
+        result = send_mail(event.id, 2)
+
+    assert result.startswith("Failed, retry 1")
+    kwargs = mock_redis.enqueue_at.call_args.kwargs
+    assert kwargs["meta"] == {"attempt": 2}
+    assert kwargs["queue_name"] == "default"
+    # The retry is the event's job, so cancelling or re-timing finds it
+    assert kwargs["job_id"] == event.job_id == f"send:{event.id}:2"
+
+
+def test_retry_of_a_moved_or_deleted_event_is_dropped(app, make_event, mock_redis):
+    """No retry is scheduled for an event that has another job or is gone."""
+    event = make_event()
+    event.job_id = f"send:{event.id}:3"
+    mock_redis.connection.zscore.return_value = 1925024400.0
+    job = make_job(attempt=1)
+    job.id, job.args = f"send:{event.id}:2", (event.id, 2)
+
+    moved = handle_failure(job, smtplib.SMTPServerDisconnected("Lost"), retry_send_mail)
+    job.args = (999999, 2)
+    deleted = handle_failure(
+        job, smtplib.SMTPServerDisconnected("Lost"), retry_send_mail
+    )
+
+    assert moved.startswith("Failed, nothing left to retry")
+    assert deleted.startswith("Failed, nothing left to retry")
+    assert not mock_redis.enqueue_at.called
+    assert event.job_id == f"send:{event.id}:3"
+
+
+def test_send_mail_outside_worker_still_raises(app, session):
+    """Without a current job the error reaches the caller."""
+    with pytest.raises(ValueError):
+        send_mail(999999)
+
+
+@patch("app.event.jobs.mail")
+def test_deferred_recipients_are_retried_without_resending(mock_mail, make_event):
+    """A retry only sends to the recipients the relay deferred."""
+    event = make_event(recipients=["a@example.com", "b@example.com", "c@example.com"])
+    mock_conn = MagicMock()
+    mock_mail.connect.return_value.__enter__.return_value = mock_conn
+    mock_conn.send.side_effect = [
+        None,
+        smtplib.SMTPRecipientsRefused({"b@example.com": (451, b"Greylisted")}),
+        smtplib.SMTPRecipientsRefused({"c@example.com": (550, b"No such user")}),
+    ]
+
+    with pytest.raises(DeliveryDeferred) as exc_info:
+        send_mail(event.id)
+
+    assert exc_info.value.count == 1
+    rows = {r.email: r for r in event.recipients.order_by(Recipient.id)}
+    assert rows["a@example.com"].status == DeliveryStatus.SENT
+    assert rows["b@example.com"].status == DeliveryStatus.DEFERRED
+    assert "Greylisted" in rows["b@example.com"].last_error
+    assert rows["c@example.com"].status == DeliveryStatus.FAILED
+    assert event.is_done is False
+
+    mock_conn.send.reset_mock(side_effect=True)
+    result = send_mail(event.id)
+
+    assert "Success" in result
+    assert [c.args[0].recipients for c in mock_conn.send.call_args_list] == [
+        ["b@example.com"]
+    ]
+    assert rows["b@example.com"].status == DeliveryStatus.SENT
+    assert rows["b@example.com"].attempts == 2
+    assert event.is_done is True
+
+
+def test_dead_letter_keeps_call_and_reason(app):
+    """The dead letter is pushed without running, carrying the reason."""
+    queue = MagicMock()
+    queue.name = "dead-letter"
+    # rq caches the server version on the connection
+    setattr(queue.connection, "__rq_redis_server_version", (7, 2, 4))
+    with patch("app.event.retry.get_dead_letter_queue", return_value=queue):
+        letter = dead_letter(make_job(), "SMTPResponseException: (550, ...)", 5)
+
+    assert letter.func_name == "app.event.jobs.send_mail"
+    assert letter.args == (7, 2)
+    assert letter.origin == "dead-letter"
+    assert letter.meta["reason"] == "SMTPResponseException: (550, ...)"
+    assert letter.meta["attempts"] == 5
+    assert letter.meta["queue"] == "default"
+    queue.push_job_id.assert_called_once_with(letter.id)
+
+
+def test_redrive_enqueues_with_fresh_attempts(app):
+    """Re-driven letters start over at attempt 1 and leave the queue."""
+    letter = make_job()
+    letter.func_name = "app.event.jobs.send_mail_chunk"
+    letter.meta = {"queue": "default", "reason": "...", "attempts": 5}
+    queue = MagicMock()
+    queue.get_jobs.return_value = [letter]
+
+    with (
+        patch("app.event.retry.get_dead_letter_queue", return_value=queue),
+        patch("app.event.retry.rq") as mock_rq,
+    ):
+        target = mock_rq.get_queue.return_value
+        assert redrive() == ["job-1"]
+
+    mock_rq.get_queue.assert_called_once_with("default")
+    target.create_job.assert_called_once_with(
+        "app.event.jobs.send_mail_chunk",
+        args=(7, 2),
+        kwargs={},
+        description=letter.description,
+        meta={"attempt": 1},
+    )
+    target.enqueue_job.assert_called_once_with(target.create_job.return_value)
+    letter.delete.assert_called_once_with()
+
+
+def send_mail_letter(event):
+    """Dead letter of the event's current send_mail job."""
+    letter = make_job()
+    letter.id = "letter-1"
+    letter.args = (event.id, 2)
+    letter.meta = {"queue": "default", "job_id": event.job_id, "attempts": 5}
+    queue = MagicMock()
+    queue.get_jobs.return_value = [letter]
+    setattr(queue.connection, "__rq_redis_server_version", (7, 2, 4))
+    return letter, queue
+
+
+@patch("app.event.jobs.notify_dispatcher")
+def test_redrive_send_mail_under_next_job_id(mock_notify, make_event, mock_redis):
+    """A re-driven send becomes the event's next job, not a random one."""
+    event = make_event()
+    event.job_id = f"send:{event.id}:1"
+    letter, queue = send_mail_letter(event)
+
+    with patch("app.event.retry.get_dead_letter_queue", return_value=queue):
+        assert redrive() == ["letter-1"]
+
+    assert event.job_id == f"send:{event.id}:2"
+    kwargs = mock_redis.enqueue_at.call_args.kwargs
+    assert kwargs["job_id"] == event.job_id
+    assert kwargs["meta"] == {"attempt": 1}
+    assert kwargs["queue_name"] == "default"
+    letter.delete.assert_called_once_with()
+
+
+def test_redrive_drops_letter_of_done_event(make_event, mock_redis):
+    """Nothing is sent again for an event that finished meanwhile."""
+    event = make_event()
+    event.job_id = f"send:{event.id}:1"
+    event.is_done = True
+    letter, queue = send_mail_letter(event)
+
+    with patch("app.event.retry.get_dead_letter_queue", return_value=queue):
+        assert redrive() == []
+
+    assert not mock_redis.enqueue_at.called
+    letter.delete.assert_called_once_with()
+
+
+def test_dead_letter_api(client):
+    """The API lists dead letters and re-drives the selected ones."""
+    letters = [{"id": "job-1", "reason": "SMTPResponseException", "attempts": 5}]
+    with patch("app.api.routes.list_dead_letters", return_value=letters):
+        response = client.get("/api/dead-letters")
+    assert response.status_code == 200
+    assert response.json[0]["id"] == "job-1"
+
+    with patch("app.api.routes.redrive", return_value=["job-1"]) as mock_redrive:
+        response = client.post("/api/dead-letters/redrive", json={"ids": ["job-1"]})
+    assert response.status_code == 200
+    assert response.json == {"redriven": ["job-1"], "count": 1}
+    mock_redrive.assert_called_once_with(["job-1"])
+
+
+def test_dead_letter_cli(app):
+    """The CLI re-drives only when told which letters or --all."""
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["dead-letters", "redrive"])
+    assert result.exit_code != 0
+
+    with patch("app.commands.redrive", return_value=["a", "b"]) as mock_redrive:
+        result = runner.invoke(args=["dead-letters", "redrive", "--all"])
+    assert result.exit_code == 0
+    assert "Re-drove 2 dead letter(s)" in result.output
+    mock_redrive.assert_called_once_with(None)
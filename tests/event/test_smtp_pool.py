@@ -0,0 +1,132 @@
+"""Tests for the worker SMTP connection pool."""
+
+import smtplib
+import socket
+from unittest.mock import MagicMock
+
+import pytest
+from flask_mail import Message
+
+from app.event.smtp_pool import SMTPConnectionPool, get_smtp_pool
+from app.extensions import mail
+
+
+def make_message(to="user@example.com"):
+    """Build a small test message."""
+    return Message(subject="Hi", recipients=[to], body="Hello", sender="a@b.com")
+
+
+def test_pool_reuses_connection(sink):
+    """Several sends share one SMTP session."""
+    pool = SMTPConnectionPool(mail, size=1)
+
+    for i in range(5):
+        with pool.connection() as conn:
+            conn.send(make_message(f"user{i}@example.com"))
+    pool.close()
+
+    assert len(sink.messages) == 5
+    assert sink.connections == 1
+
+
+def test_pool_recycles_after_max_messages(sink):
+    """A connection is closed once it has sent max_messages messages."""
+    pool = SMTPConnectionPool(mail, size=1, max_messages=2)
+
+    for _ in range(4):
+        with pool.connection() as conn:
+            conn.send(make_message())
+    pool.close()
+
+    assert len(sink.messages) == 4
+    assert sink.connections == 2
+
+
+def test_one_checkout_reconnects_after_max_messages(sink):
+    """A connection held for many sends still opens a new session per quota."""
+    pool = SMTPConnectionPool(mail, size=1, max_messages=2)
+
+    with pool.connection() as conn:
+        for _ in range(5):
+            conn.send(make_message())
+        assert conn.num_messages == 1
+    pool.close()
+
+    assert len(sink.messages) == 5
+    assert sink.connections == 3
+
+
+def test_pool_drops_idle_connection(sink):
+    """Connections idle past the timeout are replaced."""
+    pool = SMTPConnectionPool(mail, size=1, idle_timeout=0)
+
+    with pool.connection() as conn:
+        conn.send(make_message())
+    with pool.connection() as conn:
+        conn.send(make_message())
+    pool.close()
+
+    assert sink.connections == 2
+
+
+def test_pool_healthcheck_replaces_dead_connection(sink):
+    """A connection failing NOOP is discarded on acquire."""
+    pool = SMTPConnectionPool(mail, size=1, healthcheck_after=0)
+
+    with pool.connection() as conn:
+        conn.send(make_message())
+        conn.host.sock.shutdown(socket.SHUT_RDWR)
+
+    with pool.connection() as conn:
+        conn.send(make_message())
+    pool.close()
+
+    assert len(sink.messages) == 2
+    assert sink.connections == 2
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        smtplib.SMTPServerDisconnected("gone"),
+        smtplib.SMTPDataError(421, b"Service not available"),
+    ],
+)
+def test_send_reconnects_on_disconnect(sink, error):
+    """A dropped session or a 421 reply triggers one transparent reconnect."""
+    pool = SMTPConnectionPool(mail, size=1)
+
+    with pool.connection() as conn:
+        conn.connection.send = MagicMock(side_effect=error)
+        conn.send(make_message())
+    pool.close()
+
+    assert len(sink.messages) == 1
+    assert sink.connections == 2
+
+
+def test_send_raises_permanent_errors(sink):
+    """Errors other than disconnects are propagated and the session dropped."""
+    pool = SMTPConnectionPool(mail, size=1)
+
+    with pytest.raises(smtplib.SMTPDataError):
+        with pool.connection() as conn:
+            conn.connection.send = MagicMock(
+                side_effect=smtplib.SMTPDataError(554, b"Rejected")
+            )
+            conn.send(make_message())
+
+    assert pool._idle == []
+    assert pool._in_use == 0
+
+
+def test_get_smtp_pool_is_per_app(app):
+    """The worker pool is created once and configured from the app."""
+    with app.app_context():
+        app.extensions.pop("smtp_pool", None)
+        pool = get_smtp_pool()
+
+        assert get_smtp_pool() is pool
+        assert pool.size == app.config["MAIL_POOL_SIZE"]
+        assert pool.max_messages == app.config["MAIL_POOL_MAX_MESSAGES"]
+        app.extensions.pop("smtp_pool", None)
@@ -128,3 +128,44 @@ def test_event_detail_view(app, client, db):
         response = client.get(url_for("items.edit_event", event_id=event.id))
         # Either success or redirect due to login required
         assert response.status_code in [200, 302]
+
+
+@pytest.mark.parametrize(
+    "posted, expected",
+    [
+        # Untouched form: shown in Jakarta time, saved as it was
+        ("2030-01-01T19:00", datetime(2030, 1, 1, 12, 0, 30)),
+        ("2030-01-01T20:00", datetime(2030, 1, 1, 13, 0)),
+    ],
+)
+def test_edit_event_keeps_local_time(
+    posted, expected, app, client, session, local_zone
+):
+    """The edit form shows local time and an untouched save re-times nothing."""
+    from zoneinfo import ZoneInfo
+
+    local_zone(ZoneInfo("Asia/Jakarta"))
+    event = Event("Subject", "Content", datetime(2030, 1, 1, 12, 0, 30))
+    session.add(event)
+    session.commit()
+    event_id = event.id
+    data = {
+        "name": "Subject",
+        "notes": "Content",
+        "recipients": "test@example.com",
+        "schedule_time": posted,
+    }
+
+    with (
+        app.test_request_context(),
+        patch("flask_login.utils._get_user") as mock_get_user,
+        patch("app.services.event_service.retime_mail") as retime,
+    ):
+        mock_get_user.return_value = MagicMock(is_authenticated=True, id=1)
+        page = client.get(url_for("items.edit_event", event_id=event_id))
+        assert b'value="2030-01-01T19:00"' in page.data
+
+        client.post(url_for("items.edit_event", event_id=event_id), data=data)
+
+    assert session.get(Event, event_id).timestamp == expected
+    assert retime.called == (posted != "2030-01-01T19:00")
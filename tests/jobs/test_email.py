@@ -1,128 +1,125 @@
 """Tests for email sending functionality."""
 
-from datetime import UTC, datetime
+from email import message_from_bytes
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from app.database.models import Event, Recipient
+from app.event.delivery import message_id
 from app.event.jobs import send_mail
 
 
-@patch("app.event.jobs.BeautifulSoup")
 @patch("app.extensions.mail.connect")
-@patch("app.database.db.session.add")
-@patch("app.database.db.session.commit")
-def test_send_mail_plain_text(mock_commit, mock_add, mock_mail_connect, mock_bs, db):
+def test_send_mail_plain_text(mock_mail_connect, session, make_event):
     """Test sending a plain text email."""
-    # Mock Event query
-    mock_event = MagicMock()
-    mock_event.email_subject = "Test Subject"
-    mock_event.email_content = "This is a plain text email"
-
-    # Create a mock query result
-    with patch("app.event.jobs.Event.query") as mock_query:
-        mock_query_obj = MagicMock()
-        mock_query_obj.get.return_value = mock_event
-        mock_query.return_value = mock_query_obj
-
-        # Mock BeautifulSoup to indicate no HTML
-        mock_soup = MagicMock()
-        mock_soup.find.return_value = None
-        mock_bs.return_value = mock_soup
-
-        # Mock mail connection
-        mock_conn = MagicMock()
-        mock_context = MagicMock()
-        mock_context.__enter__.return_value = mock_conn
-        mock_mail_connect.return_value = mock_context
-
-        # Call the function
-        result = send_mail(1, ["test@example.com"])
-
-        # Assertions
-        assert "Success" in result
-        assert mock_conn.send.called
-        assert mock_add.called
-        assert mock_commit.called
-
-
-@patch("app.event.jobs.BeautifulSoup")
+    event = make_event(content="This is a plain text email")
+
+    # Mock mail connection
+    mock_conn = MagicMock()
+    mock_context = MagicMock()
+    mock_context.__enter__.return_value = mock_conn
+    mock_mail_connect.return_value = mock_context
+
+    # Call the function; the content was classified when it was stored
+    with patch("app.database.models_core.classify_content") as mock_classify:
+        result = send_mail(event.id)
+
+    # Assertions
+    assert "Success" in result
+    assert not mock_classify.called
+    assert mock_conn.send.called
+    parsed = message_from_bytes(mock_conn.send.call_args.args[0].as_bytes())
+    assert parsed.get_content_type() == "text/plain"
+    assert parsed.get_payload(decode=True) == b"This is a plain text email"
+    session.refresh(event)
+    assert event.is_done is True
+
+
 @patch("app.extensions.mail.connect")
-@patch("app.database.db.session.add")
-@patch("app.database.db.session.commit")
-def test_send_mail_html(mock_commit, mock_add, mock_mail_connect, mock_bs, db):
+def test_send_mail_html(mock_mail_connect, session, make_event):
     """Test sending an HTML email."""
-    # Mock Event query
-    mock_event = MagicMock()
-    mock_event.email_subject = "Test Subject"
-    mock_event.email_content = "<p>This is an HTML email</p>"
-
-    # Create a mock query result
-    with patch("app.event.jobs.Event.query") as mock_query:
-        mock_query_obj = MagicMock()
-        mock_query_obj.get.return_value = mock_event
-        mock_query.return_value = mock_query_obj
-
-        # Mock BeautifulSoup to indicate HTML content
-        mock_soup = MagicMock()
-        mock_soup.find.return_value = True  # Indicate HTML content
-        mock_bs.return_value = mock_soup
-
-        # Mock mail connection
-        mock_conn = MagicMock()
-        mock_context = MagicMock()
-        mock_context.__enter__.return_value = mock_conn
-        mock_mail_connect.return_value = mock_context
-
-        # Call the function
-        result = send_mail(1, ["test@example.com"])
-
-        # Assertions
-        assert "Success" in result
-        assert mock_conn.send.called
-        assert mock_add.called
-        assert mock_commit.called
-
-
-@patch("app.event.jobs.Event.query")
+    event = make_event(content="<p>This is an HTML email</p>")
+
+    # Mock mail connection
+    mock_conn = MagicMock()
+    mock_context = MagicMock()
+    mock_context.__enter__.return_value = mock_conn
+    mock_mail_connect.return_value = mock_context
+
+    # Call the function; the content was classified when it was stored
+    with patch("app.database.models_core.classify_content") as mock_classify:
+        result = send_mail(event.id)
+
+    # Assertions
+    assert "Success" in result
+    assert not mock_classify.called
+    assert mock_conn.send.called
+    parsed = message_from_bytes(mock_conn.send.call_args.args[0].as_bytes())
+    # Both parts are sent as multipart/alternative
+    (alternative,) = parsed.get_payload()
+    assert alternative.get_content_type() == "multipart/alternative"
+    text, html = alternative.get_payload()
+    assert text.get_payload(decode=True) == b"This is an HTML email"
+    assert html.get_payload(decode=True) == b"<p>This is an HTML email</p>"
+    session.refresh(event)
+    assert event.is_done is True
+
+
 @patch("app.extensions.mail.connect")
-@patch("app.database.db.session.add")
-@patch("app.database.db.session.commit")
-def test_send_mail_multiple_recipients(
-    mock_commit, mock_add, mock_mail_connect, mock_event_query, db
-):
+def test_send_mail_multiple_recipients(mock_mail_connect, session, make_event):
     """Test sending email to multiple recipients."""
-    # Setup mock event with actual string content
-    mock_event = MagicMock()
-    mock_event.email_subject = "Test Subject"
-    mock_event.email_content = "Test Content"
-
-    # Mock Event.query.get to return our mock event
-    mock_event_query.get.return_value = mock_event
-
-    # Create a mock Message class
-    mock_message = MagicMock()
-
-    with patch("app.event.jobs.Message", return_value=mock_message):
-        # Mock mail connection
-        mock_conn = MagicMock()
-        mock_context = MagicMock()
-        mock_context.__enter__.return_value = mock_conn
-        mock_mail_connect.return_value = mock_context
-
-        # Call the function with multiple recipients
-        recipients = [
-            "test1@example.com",
-            "test2@example.com",
-            "test3@example.com",
-        ]
-        result = send_mail(1, recipients)
-
-        # Assertions
-        assert "Success" in result
-        assert mock_add.called
-        assert mock_commit.called
-
-        # Verify recipients were added
-        assert mock_message.add_recipient.call_count == 3
+    recipients = [
+        "test1@example.com",
+        "test2@example.com",
+        "test3@example.com",
+    ]
+    event = make_event(recipients=recipients, content="Test Content")
+
+    # Mock mail connection
+    mock_conn = MagicMock()
+    mock_context = MagicMock()
+    mock_context.__enter__.return_value = mock_conn
+    mock_mail_connect.return_value = mock_context
+
+    # Call the function; recipients come from the database
+    result = send_mail(event.id)
+
+    # Assertions
+    assert "Success" in result
+    assert mock_conn.send.call_count == 3
+
+    # Verify every recipient got its own To header
+    to = [
+        message_from_bytes(c.args[0].as_bytes())["To"]
+        for c in mock_conn.send.call_args_list
+    ]
+    assert to == recipients
+
+
+def test_send_mail_skips_done_event(session, make_event):
+    """A job for an event that already went out sends nothing."""
+    event = make_event()
+    event.is_done = True
+    session.commit()
+
+    with patch("app.extensions.mail.connect") as mock_mail_connect:
+        result = send_mail(event.id)
+
+    assert "Skipped" in result
+    assert not mock_mail_connect.called
+
+
+@pytest.mark.parametrize("recipient", ["user@example.com", "User@Example.com"])
+def test_send_mail_sets_deterministic_message_id(session, make_event, recipient):
+    """The Message-ID only depends on the event and the recipient."""
+    event = make_event(recipients=[recipient])
+
+    with patch("app.extensions.mail.connect") as mock_mail_connect:
+        mock_conn = mock_mail_connect.return_value.__enter__.return_value
+        send_mail(event.id)
+
+    sent = mock_conn.send.call_args.args[0]
+    assert sent.msgId.startswith(f"<event-{event.id}.")
+    assert sent.msgId.endswith("@example.com>")
+    # Same address, same ID; regardless of case
+    assert sent.msgId == message_id(event.id, "user@example.com", sent.sender)
@@ -36,6 +36,7 @@ def test_add_event_database_error(mock_commit, mock_add, mock_event):
     """Test database error handling in add_event."""
     # Setup mock to raise exception when accessing property
     mock_event_instance = MagicMock()
+    mock_event_instance.id = 1
     mock_event.return_value = mock_event_instance
     mock_commit.side_effect = Exception("Database error")
 
@@ -19,25 +19,24 @@ def test_dt_utc_with_timezone():
     assert result == expected
 
 
-def test_dt_utc_without_timezone():
+def test_dt_utc_without_timezone(local_zone):
     """Test dt_utc with a timezone-naive datetime string."""
     # Local timezone will be applied first, then converted to UTC
-    with patch("app.event.jobs.get_localzone") as mock_tz:
-        # Mock the local timezone to be UTC+8
-        mock_timezone = MagicMock()
-        mock_timezone.localize.return_value = MagicMock()
-        mock_timezone.localize.return_value.astimezone.return_value = MagicMock()
-        mock_timezone.localize.return_value.astimezone.return_value.replace.return_value = datetime(
-            2025, 5, 10, 4, 0, 0
-        )
-        mock_tz.return_value = mock_timezone
-
-        dt_str = "2025-05-10 12:00:00"  # Local time (no TZ info)
-        result = dt_utc(dt_str)
+    # Mock the local timezone to be UTC+8
+    mock_timezone = MagicMock()
+    mock_timezone.localize.return_value = MagicMock()
+    mock_timezone.localize.return_value.astimezone.return_value = MagicMock()
+    mock_timezone.localize.return_value.astimezone.return_value.replace.return_value = (
+        datetime(2025, 5, 10, 4, 0, 0)
+    )
+    local_zone(mock_timezone)
+
+    dt_str = "2025-05-10 12:00:00"  # Local time (no TZ info)
+    result = dt_utc(dt_str)
 
-        # Should be converted to UTC (8 hours earlier)
-        expected = datetime(2025, 5, 10, 4, 0, 0)  # UTC time
-        assert result == expected
+    # Should be converted to UTC (8 hours earlier)
+    expected = datetime(2025, 5, 10, 4, 0, 0)  # UTC time
+    assert result == expected
 
 
 def test_add_recipients(db, session):
@@ -93,15 +92,15 @@ def test_schedule_mail(mock_get_scheduler, db):
     """Test scheduling a mail job."""
     # Mock the scheduler
     mock_scheduler = MagicMock()
+    mock_scheduler.connection.exists.return_value = 0
     mock_get_scheduler.return_value = mock_scheduler
 
     # Test data
     event_id = 1
-    recipients = ["test@example.com"]
     timestamp = datetime.now(UTC) + timedelta(days=1)
 
     # Call the function
-    schedule_mail(event_id, recipients, timestamp)
+    schedule_mail(event_id, timestamp)
 
     # Verify the job was scheduled
     assert mock_scheduler.enqueue_at.called
@@ -110,4 +109,6 @@ def test_schedule_mail(mock_get_scheduler, db):
     assert args[0] == timestamp  # First arg should be the timestamp
     assert args[1].__name__ == "send_mail"  # Second arg should be the function
     assert args[2] == event_id  # Third arg should be event_id
-    assert args[3] == recipients  # Fourth arg should be recipients
+    assert args[3] == 2  # Fourth arg should be the payload version
+    assert len(args) == 4  # Recipients are no longer part of the payload
+    assert kwargs == {"job_id": "send:1:1"}
@@ -6,6 +6,7 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 from app.database.models import Event, Recipient
+from app.event import jobs
 from app.event.jobs import add_event, add_recipients, dt_utc
 
 
@@ -92,3 +93,26 @@ def test_add_event(mock_schedule, session):
 
     # Verify schedule_mail was called
     assert mock_schedule.called
+
+
+@patch("app.event.jobs.schedule_mail")
+def test_add_event_parses_recipients_once(mock_schedule, session):
+    """The recipients validated for the event are the ones stored."""
+    data = {
+        "subject": "Test Subject",
+        "content": "Test Content",
+        "timestamp": "2025-05-10 12:00:00",
+        "recipients": ["Ann <ANN@example.com>", "bob@example.com", "ann@example.com"],
+    }
+
+    with patch(
+        "app.event.jobs.parse_addresses", wraps=jobs.parse_addresses
+    ) as mock_parse:
+        event_id = add_event(data)
+
+    assert mock_parse.call_count == 1
+    recipients = session.query(Recipient).filter_by(event_id=event_id).all()
+    assert sorted((r.email, r.name) for r in recipients) == [
+        ("ann@example.com", "Ann"),
+        ("bob@example.com", None),
+    ]
@@ -8,7 +8,7 @@ import pytest
 from app.event.jobs import add_event, add_recipients, dt_utc
 
 
-@patch("app.event.jobs.add_recipients")
+@patch("app.event.jobs.insert_recipients")
 @patch("app.event.jobs.dt_utc")
 @patch("app.database.db.session.add")
 @patch("app.database.db.session.commit")
@@ -18,13 +18,13 @@ def test_add_event(
     mock_commit,
     mock_add,
     mock_dt_utc,
-    mock_add_recipients,
+    mock_insert_recipients,
     mock_redis,
 ):
     """Test adding an event to the scheduler."""
     # Setup mocks
     mock_dt_utc.return_value = datetime(2025, 5, 10, 12, 0, 0)
-    mock_add_recipients.return_value = ["test@example.com"]
+    mock_insert_recipients.return_value = 1
 
     # Mock Event instance
     mock_event = MagicMock()
@@ -47,10 +47,12 @@ def test_add_event(
     # Assertions
     print(f"mock_add called: {mock_add.called}")
     print(f"mock_commit called: {mock_commit.called}")
-    print(f"mock_add_recipients called: {mock_add_recipients.called}")
+    print(f"mock_insert_recipients called: {mock_insert_recipients.called}")
     assert mock_add.called
     assert mock_commit.called
-    assert mock_add_recipients.called
+    assert list(mock_insert_recipients.call_args.args[0]) == [
+        (12345, "test@example.com", None)
+    ]
     assert result == 12345  # Should match the mocked event ID
 
 
@@ -79,7 +81,7 @@ def test_dt_utc_without_timezone():
 
 def test_add_recipients():
     """Test adding recipients to the database."""
-    with patch("app.database.db.session.add") as mock_add:
+    with patch("app.database.db.session.execute") as mock_execute:
         with patch("app.database.db.session.commit") as mock_commit:
             recipients = "test1@example.com, test2@example.com"
             event_id = 1
@@ -89,5 +91,5 @@ def test_add_recipients():
             assert len(result) == 2
             assert "test1@example.com" in result
             assert "test2@example.com" in result
-            assert mock_add.call_count == 2
+            assert mock_execute.call_count == 1
             assert mock_commit.call_count == 1
@@ -0,0 +1,73 @@
+"""Tests for send time parsing."""
+
+from datetime import datetime
+
+import pytest
+
+from app.event.bulk import validate_items
+from app.utils.timestamps import dt_utc, get_timezone, parse_timestamp
+
+
+def test_iso_and_fallback_formats():
+    """ISO strings and dateutil formats give the same UTC time."""
+    expected = datetime(2025, 5, 10, 4, 0)
+    assert dt_utc("2025-05-10T12:00:00+08:00") == expected
+    assert dt_utc("2025-05-10T04:00:00Z") == expected
+    assert dt_utc("10 May 2025 12:00 +08") == expected
+    assert dt_utc("Sat, 10 May 2025 04:00:00 +0000") == expected
+
+
+def test_explicit_timezone():
+    """A zone given apart or after the time applies to naive times only."""
+    assert dt_utc("2025-01-10 12:00", "Asia/Jakarta") == datetime(2025, 1, 10, 5)
+    assert dt_utc("2025-07-10 12:00 Europe/Berlin") == datetime(2025, 7, 10, 10)
+    assert dt_utc(datetime(2025, 1, 10, 12), "America/New_York") == datetime(
+        2025, 1, 10, 17
+    )
+    # An offset in the string wins over the zone
+    assert dt_utc("2025-01-10T12:00+00:00", "Asia/Jakarta") == datetime(2025, 1, 10, 12)
+    assert get_timezone("Asia/Jakarta") is get_timezone("Asia/Jakarta")
+
+
+@pytest.mark.parametrize(
+    "value, tz",
+    [
+        ("not a valid timestamp", None),
+        ("2025-13-45 12:00", None),
+        ("2025-05-10 12:00", "Mars/Olympus"),
+        ("2025-05-10 12:00 Mars/Olympus", None),
+        (12345, None),
+    ],
+)
+def test_invalid_values_raise(value, tz):
+    """Nothing unparseable falls back to the current time."""
+    with pytest.raises(ValueError):
+        dt_utc(value, tz)
+
+
+def test_repeated_strings_are_parsed_once():
+    """Bulk submissions repeating a send time reuse its parse."""
+    parse_timestamp.cache_clear()
+    for _ in range(3):
+        dt_utc("2030-01-01T09:00:00Z")
+    info = parse_timestamp.cache_info()
+    assert (info.hits, info.misses) == (2, 1)
+
+
+def test_bulk_reports_bad_timestamps(session):
+    """Invalid times and zones are item errors, not request failures."""
+    base = {"subject": "Hi", "content": "Body", "recipients": "a@example.com"}
+    items = [
+        dict(base, timestamp="2030-01-01 09:00", timezone="Europe/Paris"),
+        dict(base, timestamp="someday"),
+        dict(base, timestamp="2030-01-01 09:00", timezone="Nowhere/City"),
+    ]
+
+    valid, errors = validate_items(items)
+
+    assert [(index, fields["timestamp"]) for index, fields in valid] == [
+        (0, datetime(2030, 1, 1, 8))
+    ]
+    assert [error["index"] for error in errors] == [1, 2]
+    assert "Invalid datetime format" in errors[0]["error"]
+    assert "Unknown timezone" in errors[1]["error"]
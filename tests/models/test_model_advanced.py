@@ -5,6 +5,7 @@ from datetime import UTC, datetime, timedelta
 import pytest
 
 from app.database.models import Event, Recipient
+from app.utils.content import CONTENT_TYPE_HTML, CONTENT_TYPE_TEXT, content_hash
 
 
 def test_event_repr(session):
@@ -119,3 +120,48 @@ def test_event_relationship_cascade(session):
     # Verify recipients were also deleted
     assert session.get(Recipient, recipient1_id) is None
     assert session.get(Recipient, recipient2_id) is None
+
+
+def test_event_classifies_content_on_write(session):
+    """Content type, text alternative and hash are stored with the content."""
+    event = Event(
+        email_subject="Test Event",
+        email_content="Plain text",
+        timestamp=datetime.now(UTC),
+    )
+    session.add(event)
+    session.commit()
+
+    assert event.content_type == CONTENT_TYPE_TEXT
+    assert event.content_text is None
+    assert event.content_hash == content_hash("Plain text")
+
+    event.email_content = (
+        "<html><head><style>p {}</style></head>"
+        "<body><h1>Hello</h1><p>First<br>Second</p></body></html>"
+    )
+    session.commit()
+
+    assert event.content_type == CONTENT_TYPE_HTML
+    assert event.content_text == "Hello\nFirst\nSecond"
+    assert event.content_hash == content_hash(event.email_content)
+
+
+def test_event_classifies_legacy_content_on_read(session):
+    """Rows stored before classification are classified on first use."""
+    event = Event(
+        email_subject="Test Event",
+        email_content="",
+        timestamp=datetime.now(UTC),
+    )
+    session.add(event)
+    session.commit()
+    # A row from before the body store and the classification
+    event._email_content = "<p>Hi</p>"
+    event.content_type = event.content_hash = None
+
+    parts = event.content_parts()
+
+    assert parts.is_html
+    assert parts.text == "Hi"
+    assert event.content_hash == content_hash("<p>Hi</p>")